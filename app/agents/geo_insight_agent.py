@@ -6,6 +6,7 @@ from app.agents.visualization_agent import VisualizationAgent
 from app.core.config import settings
 from app.services.geo_insights_service import GeoInsightsService
 from app.services.geo_visualization_service import GeoVisualizationService
+from app.utils.executors import get_executor_pool
 import logging
 
 logger = logging.getLogger(__name__)
@@ -116,14 +117,16 @@ class GeoInsightAgent(BaseAgent):
             viz_type = viz_params.get('type', 'map')
             data = viz_params.get('data', {})
             
+            # Figures are built in the CPU pool, off the event loop
+            cpu_pool = get_executor_pool("cpu")
             if viz_type == 'map':
-                return self.viz_service.create_region_map(data)
+                return await cpu_pool.run(self.viz_service.create_region_map, data)
             elif viz_type == 'hotspot':
-                return self.viz_service.create_hotspot_map(data)
+                return await cpu_pool.run(self.viz_service.create_hotspot_map, data)
             elif viz_type == 'pattern':
-                return self.viz_service.create_spatial_pattern_chart(data)
+                return await cpu_pool.run(self.viz_service.create_spatial_pattern_chart, data)
             elif viz_type == 'comparison':
-                return self.viz_service.create_region_comparison(data)
+                return await cpu_pool.run(self.viz_service.create_region_comparison, data)
             else:
                 # Fall back to standard visualization agent for non-geographic charts
                 return await self.viz_agent.generate_visualization(
@@ -138,7 +141,7 @@ class GeoInsightAgent(BaseAgent):
     async def _get_region_insights(self, region_id: str) -> Dict[str, Any]:
         """Get detailed insights about a specific region"""
         try:
-            insights = await self.geo_service.get_region_insights(region_id)
+            insights = await get_executor_pool("db").run(self.geo_service.get_region_insights, region_id)
             return {"success": True, "result": insights}
         except Exception as e:
             logger.error(f"Error getting region insights: {str(e)}")
@@ -147,7 +150,7 @@ class GeoInsightAgent(BaseAgent):
     async def _analyze_spatial_patterns(self, region_id: str) -> Dict[str, Any]:
         """Analyze spatial patterns within a region"""
         try:
-            patterns = await self.geo_service.get_spatial_patterns(region_id)
+            patterns = await get_executor_pool("db").run(self.geo_service.get_spatial_patterns, region_id)
             return {"success": True, "result": patterns}
         except Exception as e:
             logger.error(f"Error analyzing spatial patterns: {str(e)}")
@@ -156,7 +159,7 @@ class GeoInsightAgent(BaseAgent):
     async def _detect_hotspots(self, region_id: str) -> Dict[str, Any]:
         """Detect hotspots of activity within a region"""
         try:
-            hotspots = await self.geo_service.get_hotspots(region_id)
+            hotspots = await get_executor_pool("db").run(self.geo_service.get_hotspots, region_id)
             return {"success": True, "result": hotspots}
         except Exception as e:
             logger.error(f"Error detecting hotspots: {str(e)}")
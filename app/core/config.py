@@ -33,6 +33,24 @@ class Settings(BaseSettings):
     
     # LLM Settings
     LLM_API_TIMEOUT: int = int(os.getenv("LLM_API_TIMEOUT", "45"))  # Timeout for LLM API calls in seconds
+
+    # Shared admission budget of all LLM calls (app/llm/llm_scheduler.py)
+    LLM_REQUESTS_PER_MINUTE: float = float(os.getenv("LLM_REQUESTS_PER_MINUTE", "500"))
+    LLM_TOKENS_PER_MINUTE: float = float(os.getenv("LLM_TOKENS_PER_MINUTE", "300000"))
+    LLM_MAX_CONCURRENCY: int = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+    LLM_MAX_QUEUE_DEPTH: int = int(os.getenv("LLM_MAX_QUEUE_DEPTH", "100"))  # 0 for no limit
+    LLM_MAX_RETRIES: int = int(os.getenv("LLM_MAX_RETRIES", "3"))
+
+    # Shared HTTP transport of the LLM clients (app/llm/llm_transport.py)
+    LLM_HTTP2: bool = os.getenv("LLM_HTTP2", "true").lower() == "true"  # needs the h2 package
+    LLM_MAX_CONNECTIONS: int = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+    LLM_MAX_KEEPALIVE_CONNECTIONS: int = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "10"))
+    LLM_KEEPALIVE_EXPIRY: float = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "60"))
+    LLM_CONNECT_TIMEOUT: float = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+    LLM_HEDGING_ENABLED: bool = os.getenv("LLM_HEDGING_ENABLED", "false").lower() == "true"
+    LLM_HEDGE_API_BASES: str = os.getenv("LLM_HEDGE_API_BASES", "")  # comma-separated, hedges go to OPENAI_API_BASE if empty
+    LLM_HEDGE_QUANTILE: float = float(os.getenv("LLM_HEDGE_QUANTILE", "0.95"))
+    LLM_HEDGE_MIN_DELAY: float = float(os.getenv("LLM_HEDGE_MIN_DELAY", "1.0"))
     
     # Security Settings
     SECRET_KEY: str = os.getenv("SECRET_KEY", "your-secret-key")
@@ -48,6 +66,70 @@ class Settings(BaseSettings):
     DW_MAX_OVERFLOW: int = 10
     DW_POOL_TIMEOUT: int = 30
     DW_POOL_RECYCLE: int = 1800
+
+    # Answer month-level aggregates from the dw.rollup_* tables (dw2/task9_rollup_tables.sql)
+    ROLLUP_ROUTING_ENABLED: bool = os.getenv("ROLLUP_ROUTING_ENABLED", "true").lower() == "true"
+
+    # How often a streaming request checks whether its client is still connected
+    STREAM_DISCONNECT_POLL_SECONDS: float = float(os.getenv("STREAM_DISCONNECT_POLL_SECONDS", "0.5"))
+
+    # Share one pipeline run between identical concurrent /chat/stream requests
+    CHAT_COALESCING_ENABLED: bool = os.getenv("CHAT_COALESCING_ENABLED", "true").lower() == "true"
+
+    # EXPLAIN-based guard for generated SQL (app/utils/query_guard.py)
+    QUERY_GUARD_ENABLED: bool = os.getenv("QUERY_GUARD_ENABLED", "true").lower() == "true"
+    QUERY_GUARD_MAX_COST: float = float(os.getenv("QUERY_GUARD_MAX_COST", "5000000"))
+    QUERY_GUARD_MAX_ROWS: float = float(os.getenv("QUERY_GUARD_MAX_ROWS", "100000"))
+    QUERY_GUARD_AUTO_LIMIT: int = int(os.getenv("QUERY_GUARD_AUTO_LIMIT", "1000"))  # 0 disables
+    QUERY_GUARD_MIN_TIMEOUT_MS: int = int(os.getenv("QUERY_GUARD_MIN_TIMEOUT_MS", "2000"))
+    QUERY_GUARD_MAX_TIMEOUT_MS: int = int(os.getenv("QUERY_GUARD_MAX_TIMEOUT_MS", "15000"))
+    QUERY_GUARD_COST_UNITS_PER_SECOND: float = float(os.getenv("QUERY_GUARD_COST_UNITS_PER_SECOND", "200000"))
+
+    # Per-request sampling profiler (app/utils/profiler.py); opt in with the X-Profile header or ?profile=1
+    PROFILE_ON_DEMAND: bool = os.getenv("PROFILE_ON_DEMAND", "false").lower() == "true"
+    PROFILE_TOKEN: str = os.getenv("PROFILE_TOKEN", "")  # when set, X-Profile-Token must carry it to trigger or download
+    PROFILE_SAMPLE_RATE: float = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))  # fraction of all requests profiled
+    PROFILE_INTERVAL_MS: float = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+    PROFILE_DIR: str = os.getenv("PROFILE_DIR", "profiles")
+    PROFILE_MAX_FILES: int = int(os.getenv("PROFILE_MAX_FILES", "200"))
+
+    # Event-loop blocking detector (app/utils/loop_watchdog.py)
+    LOOP_WATCHDOG_ENABLED: bool = os.getenv("LOOP_WATCHDOG_ENABLED", "true").lower() == "true"
+    LOOP_WATCHDOG_THRESHOLD_MS: float = float(os.getenv("LOOP_WATCHDOG_THRESHOLD_MS", "100"))
+    LOOP_WATCHDOG_INTERVAL_MS: float = float(os.getenv("LOOP_WATCHDOG_INTERVAL_MS", "25"))
+
+    # Executor pools for blocking work (app/utils/executors.py)
+    DB_EXECUTOR_WORKERS: int = int(os.getenv("DB_EXECUTOR_WORKERS", "15"))  # DW pool size + overflow
+    CPU_EXECUTOR_KIND: str = os.getenv("CPU_EXECUTOR_KIND", "thread")  # "thread" or "process"
+    CPU_EXECUTOR_WORKERS: int = int(os.getenv("CPU_EXECUTOR_WORKERS", str(min(os.cpu_count() or 2, 4))))
+
+    # Write-behind conversation persistence (app/services/conversation_writer.py)
+    CONVERSATION_PERSISTENCE_ENABLED: bool = os.getenv("CONVERSATION_PERSISTENCE_ENABLED", "true").lower() == "true"
+    CONVERSATION_BATCH_SIZE: int = int(os.getenv("CONVERSATION_BATCH_SIZE", "50"))
+    CONVERSATION_FLUSH_INTERVAL: float = float(os.getenv("CONVERSATION_FLUSH_INTERVAL", "1.0"))
+    CONVERSATION_QUEUE_SIZE: int = int(os.getenv("CONVERSATION_QUEUE_SIZE", "10000"))
+
+    # Persistent index of conversation prompt embeddings (similar-question search)
+    CONVERSATION_INDEX_DIR: str = os.getenv("CONVERSATION_INDEX_DIR", "vector_index/conversations")
+    CONVERSATION_EMBEDDING_DIM: int = int(os.getenv("CONVERSATION_EMBEDDING_DIM", "256"))
+
+    # Persistent schema vector store (app/db/vector_store.py)
+    SCHEMA_VECTOR_STORE_DIR: str = os.getenv("SCHEMA_VECTOR_STORE_DIR", "vector_index/schema")
+
+    # Few-shot examples from earlier successful SQL (app/rag/sql_examples.py)
+    SQL_FEW_SHOT_ENABLED: bool = os.getenv("SQL_FEW_SHOT_ENABLED", "true").lower() == "true"
+    SQL_FEW_SHOT_EXAMPLES: int = int(os.getenv("SQL_FEW_SHOT_EXAMPLES", "3"))
+    SQL_FEW_SHOT_MIN_SIMILARITY: float = float(os.getenv("SQL_FEW_SHOT_MIN_SIMILARITY", "0.5"))
+
+    # Caches shared by the worker processes (app/utils/shared_cache.py); TTLs in seconds, 0 disables
+    SHARED_CACHE_URL: str = os.getenv("SHARED_CACHE_URL", "")  # "" (in-process), sqlite:///path or redis://host:port/db
+    MEMORY_CACHE_MAX_BYTES: int = int(os.getenv("MEMORY_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))  # in-process backend only
+    SCHEMA_CACHE_TTL: int = int(os.getenv("SCHEMA_CACHE_TTL", "3600"))
+    DW_CONTEXT_CACHE_TTL: int = int(os.getenv("DW_CONTEXT_CACHE_TTL", "300"))
+    SQL_CACHE_TTL: int = int(os.getenv("SQL_CACHE_TTL", "3600"))
+    # Results are also keyed by the incremental loader's last change; full reloads only expire them
+    RESULT_CACHE_TTL: int = int(os.getenv("RESULT_CACHE_TTL", "300"))
+    RESULT_CACHE_MAX_ROWS: int = int(os.getenv("RESULT_CACHE_MAX_ROWS", "5000"))
     
     @property
     def DATABASE_URL(self) -> str:
@@ -0,0 +1,271 @@
+"""
+Prometheus metrics of the API.
+
+All metrics are defined here so their names and labels stay consistent
+across the services that record them. They are served by the /metrics
+endpoint of app/main.py.
+
+With several worker processes (run_server.py --workers), PROMETHEUS_MULTIPROC_DIR
+is set and every worker writes its values to files there; /metrics then
+aggregates the files of all workers (metrics_registry). Gauges that count
+things (queued calls, open streams) are summed over the live workers.
+"""
+import os
+import time
+from typing import Any, Dict, Optional
+
+from prometheus_client import REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, multiprocess
+from prometheus_client.core import GaugeMetricFamily
+
+# Requests abandoned before the pipeline finished
+CHAT_CANCELLATIONS = Counter(
+    "chat_cancellations_total",
+    "Chat requests cancelled before completion",
+    ["endpoint", "stage", "reason"],
+)
+
+# Statements cancelled on the database server
+DB_QUERY_CANCELLATIONS = Counter(
+    "db_query_cancellations_total",
+    "Running SQL statements cancelled because their request was cancelled",
+    ["method"],
+)
+
+# Streaming requests that started a pipeline run vs. attached to a running one
+CHAT_COALESCED_REQUESTS = Counter(
+    "chat_coalesced_requests_total",
+    "Streaming chat requests by role in single-flight coalescing",
+    ["role"],
+)
+
+# LLM scheduler (app/llm/llm_scheduler.py)
+LLM_QUEUE_DEPTH = Gauge(
+    "llm_queue_depth",
+    "LLM calls waiting for admission",
+    ["priority"],
+    multiprocess_mode="livesum",
+)
+
+LLM_IN_FLIGHT = Gauge(
+    "llm_in_flight",
+    "LLM calls admitted and not yet finished",
+    multiprocess_mode="livesum",
+)
+
+LLM_QUEUE_WAIT_SECONDS = Histogram(
+    "llm_queue_wait_seconds",
+    "Time LLM calls spent waiting for admission",
+    ["priority"],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+
+LLM_RETRIES = Counter(
+    "llm_retries_total",
+    "LLM calls retried after a rate limit or transient failure",
+    ["reason"],
+)
+
+# Hedged LLM requests (app/llm/llm_transport.py)
+LLM_HEDGED_REQUESTS = Counter(
+    "llm_hedged_requests_total",
+    "Duplicate LLM requests sent for slow calls, and how many of them answered first",
+    ["outcome"],
+)
+
+# Chat pipeline stages (app/services/chat_service.py)
+CHAT_STAGE_SECONDS = Histogram(
+    "chat_stage_duration_seconds",
+    "Time spent in each stage of the chat pipeline",
+    ["endpoint", "stage", "outcome"],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120),
+)
+
+# Open server-sent event streams
+SSE_CONNECTIONS = Gauge(
+    "sse_connections",
+    "Server-sent event streams currently open",
+    ["endpoint"],
+    multiprocess_mode="livesum",
+)
+
+# Tokens reported by the LLM API (usage field of the completions)
+LLM_TOKENS = Counter(
+    "llm_tokens_total",
+    "Tokens used by LLM calls",
+    ["kind", "priority"],
+)
+
+# Cache lookups (in-process and shared); the hit ratio is hits / (hits + misses)
+CACHE_LOOKUPS = Counter(
+    "cache_lookups_total",
+    "Lookups in in-process and shared caches",
+    ["cache", "result"],
+)
+
+
+class StageTimer:
+    """
+    Records the duration of consecutive pipeline stages in CHAT_STAGE_SECONDS.
+
+    Used next to the DebugService steps: start() begins a stage (finishing the
+    previous one), finish() ends the current one with an outcome.
+    """
+
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+        self.stage: Optional[str] = None
+        self._started = 0.0
+
+    def start(self, stage: str) -> None:
+        if self.stage is not None:
+            self.finish()
+        self.stage = stage
+        self._started = time.perf_counter()
+
+    def finish(self, outcome: str = "ok") -> None:
+        if self.stage is None:
+            return
+        CHAT_STAGE_SECONDS.labels(endpoint=self.endpoint, stage=self.stage, outcome=outcome).observe(
+            time.perf_counter() - self._started)
+        self.stage = None
+
+
+def is_multiprocess() -> bool:
+    return bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+
+
+class _PoolCollector:
+    """Reports the state of registered SQLAlchemy connection pools at scrape time.
+
+    Pools live in the memory of one process; with several workers the gauges
+    carry the pid of the worker that answered the scrape.
+    """
+
+    def __init__(self):
+        self._engines: Dict[str, Any] = {}
+
+    def add(self, name: str, engine) -> None:
+        self._engines[name] = engine
+
+    def collect(self):
+        labels = ["engine", "pid"] if is_multiprocess() else ["engine"]
+        gauges = {
+            "size": GaugeMetricFamily("db_pool_size", "Configured size of the connection pool", labels=labels),
+            "checkedout": GaugeMetricFamily("db_pool_checked_out", "Connections currently checked out of the pool", labels=labels),
+            "checkedin": GaugeMetricFamily("db_pool_checked_in", "Idle connections in the pool", labels=labels),
+            "overflow": GaugeMetricFamily("db_pool_overflow", "Connections open beyond the pool size", labels=labels),
+        }
+        for name, engine in self._engines.items():
+            label_values = [name, str(os.getpid())] if is_multiprocess() else [name]
+            for method, gauge in gauges.items():
+                # Pools without a fixed size (NullPool, StaticPool) lack these methods
+                value = getattr(engine.pool, method, None)
+                if callable(value):
+                    # QueuePool.overflow() counts up from -pool_size
+                    gauge.add_metric(label_values, max(value(), 0) if method == "overflow" else value())
+        yield from gauges.values()
+
+
+_POOL_COLLECTOR = _PoolCollector()
+REGISTRY.register(_POOL_COLLECTOR)
+
+
+def register_engine_pool(name: str, engine) -> None:
+    """Export the connection pool gauges of a SQLAlchemy engine under the given name"""
+    _POOL_COLLECTOR.add(name, engine)
+
+
+_multiprocess_registry: Optional[CollectorRegistry] = None
+
+
+def metrics_registry() -> CollectorRegistry:
+    """The registry /metrics serves: this process's, or the aggregate of all workers"""
+    global _multiprocess_registry
+    if not is_multiprocess():
+        return REGISTRY
+    if _multiprocess_registry is None:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        registry.register(_POOL_COLLECTOR)
+        _multiprocess_registry = registry
+    return _multiprocess_registry
+
+
+def mark_worker_exited() -> None:
+    """Drop this worker's live gauges from the aggregate (called on shutdown)"""
+    if is_multiprocess():
+        multiprocess.mark_process_dead(os.getpid())
+
+# Event-loop watchdog (app/utils/loop_watchdog.py)
+EVENT_LOOP_LAG_SECONDS = Histogram(
+    "event_loop_lag_seconds",
+    "How late the event loop ran a timer scheduled by the watchdog",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+
+EVENT_LOOP_BLOCKS = Counter(
+    "event_loop_blocks_total",
+    "Times the event loop was blocked past the watchdog threshold, by innermost application frame",
+    ["location"],
+)
+
+EVENT_LOOP_BLOCK_SECONDS = Histogram(
+    "event_loop_block_duration_seconds",
+    "Duration of event-loop blocks past the watchdog threshold",
+    buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+
+# Executor pools for blocking work (app/utils/executors.py)
+EXECUTOR_WORKERS = Gauge(
+    "executor_workers",
+    "Workers of each executor pool",
+    ["pool"],
+    multiprocess_mode="livesum",
+)
+
+EXECUTOR_PENDING = Gauge(
+    "executor_pending_tasks",
+    "Tasks submitted to an executor pool and not yet finished (queued or running)",
+    ["pool"],
+    multiprocess_mode="livesum",
+)
+
+EXECUTOR_QUEUE_WAIT_SECONDS = Histogram(
+    "executor_queue_wait_seconds",
+    "Time tasks waited for a free worker",
+    ["pool"],
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+
+EXECUTOR_TASK_SECONDS = Histogram(
+    "executor_task_duration_seconds",
+    "Time tasks ran in an executor pool",
+    ["pool"],
+    buckets=(0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+
+# Write-behind conversation persistence (app/services/conversation_writer.py)
+CONVERSATION_QUEUE_DEPTH = Gauge(
+    "conversation_queue_depth",
+    "Conversations waiting to be persisted",
+    multiprocess_mode="livesum",
+)
+
+CONVERSATION_WRITES = Counter(
+    "conversation_writes_total",
+    "Conversation records by persistence outcome",
+    ["outcome"],
+)
+
+# Few-shot SQL examples (app/rag/sql_examples.py)
+SQL_EXAMPLE_LOOKUPS = Counter(
+    "sql_example_lookups_total",
+    "Few-shot example lookups before SQL generation; hit when at least one example was found",
+    ["result"],
+)
+
+SQL_FIRST_ATTEMPTS = Counter(
+    "sql_first_attempts_total",
+    "Outcome of the first SQL generated for a question (ok, empty, fallback, error), by few-shot use",
+    ["outcome", "few_shot"],
+)
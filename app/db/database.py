@@ -2,8 +2,8 @@ from sqlalchemy import create_engine, text, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
 from ..core.config import settings
+from ..core.metrics import register_engine_pool
 from typing import Dict, Any, Optional, List, Generator, Union, Tuple
-import pandas as pd
 import logging
 import traceback
 import asyncio
@@ -50,6 +50,8 @@ def on_checkout(dbapi_connection, connection_record, connection_proxy):
 def on_checkin(dbapi_connection, connection_record):
     logger.debug("Connection returned to pool")
 
+register_engine_pool("app", engine)
+
 # Create SessionLocal class with proper session management
 SessionLocal = sessionmaker(
     autocommit=False,
@@ -61,18 +63,19 @@ SessionLocal = sessionmaker(
 # Create Base class
 Base = declarative_base()
 
-# Make sure the database is available
-try:
-    logger.debug("Initializing DatabaseService")
-    with engine.connect() as connection:
-        connection.execute(text("SELECT 1"))
-    logger.debug("Created database engine")
-except Exception as e:
-    logger.error(f"Database connection error: {str(e)}")
-    raise
-
 logger.debug("Created session factory")
 
+
+def check_database_connection() -> None:
+    """Make sure the database is available; called from the startup hook, not at import"""
+    try:
+        with engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+        logger.debug("Database connection verified")
+    except Exception as e:
+        logger.error(f"Database connection error: {str(e)}")
+        raise
+
 def get_db():
     """Dependency for getting a database session"""
     db = SessionLocal()
@@ -89,6 +92,7 @@ dw_engine = create_engine(
     pool_timeout=settings.DW_POOL_TIMEOUT,
     pool_recycle=settings.DW_POOL_RECYCLE
 )
+register_engine_pool("dw", dw_engine)
 
 # Create DW session factory
 DWSessionLocal = sessionmaker(
@@ -179,4 +183,4 @@ class DatabaseService:
             logger.error(f"Error validating query: {str(e)}")
             return False
 
-__all__ = ['engine', 'SessionLocal', 'get_db', 'DatabaseService'] 
\ No newline at end of file
+__all__ = ['engine', 'SessionLocal', 'get_db', 'check_database_connection', 'DatabaseService'] 
\ No newline at end of file
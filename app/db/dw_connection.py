@@ -2,6 +2,7 @@ from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from app.core.config import settings
+from app.core.metrics import register_engine_pool
 
 # Create base for declarative models
 Base = declarative_base()
@@ -14,6 +15,7 @@ DW_ENGINE = create_engine(
     pool_timeout=30,
     pool_recycle=1800
 )
+register_engine_pool("dw_session", DW_ENGINE)
 
 # Create session factory
 DWSession = sessionmaker(
@@ -1,71 +1,138 @@
-from chromadb import Client, Settings
-from app.core.config import settings
-from typing import List, Dict, Any
+"""
+Persistent vector store for schema documents.
+
+Documents are kept in a Chroma collection on disk (SCHEMA_VECTOR_STORE_DIR),
+so the schema is embedded once and survives restarts. Ids are content hashes
+of document and metadata: a document that is already stored has the same id
+and is neither sent nor re-embedded again, and documents added by different
+calls can no longer overwrite each other. Each sync is a single batched
+upsert of the new documents.
+
+Nothing is opened at import time; the client and collection are created on
+first use.
+"""
+import hashlib
 import json
+import logging
+import threading
+from typing import List, Dict, Any, Optional, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
 
-# Initialize ChromaDB client
-client = Client()
+# Metadata types of the documents built from the database schema
+SCHEMA_DOCUMENT_TYPES = ["table", "foreign_key"]
 
-# Create or get the collection
-collection = client.get_or_create_collection(
-    name="tourism_data",
-    metadata={"hnsw:space": "cosine"}
-)
 
-vector_store = {
-    "client": client,
-    "collection": collection
-}
+def content_id(document: str, metadata: Dict[str, Any]) -> str:
+    """Stable id derived from the document and its metadata"""
+    payload = json.dumps({"document": document, "metadata": metadata}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+
 
 class VectorStore:
-    def __init__(self):
-        self.client = Client()
-        self.collection = self.client.get_or_create_collection(
-            name="tourism_data",
-            metadata={"hnsw:space": "cosine"}
-        )
-    
-    def add_schema_documents(self, schema_info: Dict[str, Dict[str, List[Dict[str, Any]]]]):
-        """Add database schema information to the vector store"""
+    def __init__(self, path: Optional[str] = None, collection_name: str = "tourism_data",
+                 embedding_function=None):
+        self.path = path or settings.SCHEMA_VECTOR_STORE_DIR
+        self.collection_name = collection_name
+        # None keeps Chroma's default embedding model
+        self.embedding_function = embedding_function
+        self._collection = None
+        self._lock = threading.Lock()
+
+    @property
+    def collection(self):
+        """The Chroma collection, opened on first use"""
+        if self._collection is None:
+            with self._lock:
+                if self._collection is None:
+                    import chromadb
+                    from chromadb.config import Settings
+
+                    client = chromadb.PersistentClient(
+                        path=self.path, settings=Settings(anonymized_telemetry=False))
+                    kwargs = {"embedding_function": self.embedding_function} if self.embedding_function else {}
+                    self._collection = client.get_or_create_collection(
+                        name=self.collection_name,
+                        metadata={"hnsw:space": "cosine"},
+                        **kwargs
+                    )
+                    logger.info(f"Opened vector store {self.collection_name} in {self.path} "
+                                f"({self._collection.count()} documents)")
+        return self._collection
+
+    def upsert(self, documents: List[str], metadatas: List[Dict[str, Any]]) -> Tuple[List[str], int]:
+        """
+        Store the documents that are not stored yet, in one batched upsert.
+
+        Returns the ids of all given documents and how many were new.
+        """
+        ids = [content_id(doc, meta) for doc, meta in zip(documents, metadatas)]
+        if not ids:
+            return [], 0
+        seen = set(self.collection.get(ids=ids, include=[])["ids"])
+        new = []
+        for i, doc_id in enumerate(ids):
+            if doc_id not in seen:
+                seen.add(doc_id)
+                new.append(i)
+        if new:
+            self.collection.upsert(
+                ids=[ids[i] for i in new],
+                documents=[documents[i] for i in new],
+                metadatas=[metadatas[i] for i in new]
+            )
+        return ids, len(new)
+
+    def add_schema_documents(self, schema_info: Dict[str, Dict[str, List[Dict[str, Any]]]]) -> int:
+        """
+        Sync database schema information into the vector store.
+
+        Only new or changed columns and foreign keys are embedded; documents
+        of columns and keys that no longer exist are removed. Returns the
+        number of documents added.
+        """
+        documents, metadatas = [], []
+
         # Process tables
         for table_name, columns in schema_info["tables"].items():
             for column in columns:
-                doc = f"Table {table_name} has column {column['column_name']} of type {column['data_type']}"
-                metadata = {
+                documents.append(f"Table {table_name} has column {column['column_name']} of type {column['data_type']}")
+                metadatas.append({
                     "type": "table",
                     "table_name": table_name,
                     "column_name": column["column_name"],
                     "data_type": column["data_type"]
-                }
-                self.collection.add(
-                    documents=[doc],
-                    metadatas=[metadata],
-                    ids=[f"table_{table_name}_{column['column_name']}"]
-                )
-        
+                })
+
         # Process foreign keys
-        for table_name, foreign_keys in schema_info["foreign_keys"].items():
+        for table_name, foreign_keys in schema_info.get("foreign_keys", {}).items():
             for fk in foreign_keys:
-                doc = f"Table {table_name} has foreign key {fk['column']} referencing {fk['references']}"
-                metadata = {
+                documents.append(f"Table {table_name} has foreign key {fk['column']} referencing {fk['references']}")
+                metadatas.append({
                     "type": "foreign_key",
                     "table_name": table_name,
                     "column_name": fk["column"],
                     "references": fk["references"]
-                }
-                self.collection.add(
-                    documents=[doc],
-                    metadatas=[metadata],
-                    ids=[f"fk_{table_name}_{fk['column']}"]
-                )
-    
+                })
+
+        ids, added = self.upsert(documents, metadatas)
+        current = set(ids)
+        stored = self.collection.get(where={"type": {"$in": SCHEMA_DOCUMENT_TYPES}}, include=[])["ids"]
+        stale = [doc_id for doc_id in stored if doc_id not in current]
+        if stale:
+            self.collection.delete(ids=stale)
+        logger.info(f"Schema vector store synced: {added} added, {len(stale)} removed, {len(current)} total")
+        return added
+
     def query_schema(self, query: str, n_results: int = 5) -> List[Dict[str, Any]]:
         """Query the schema information using natural language"""
         results = self.collection.query(
             query_texts=[query],
             n_results=n_results
         )
-        
+
         return [
             {
                 "document": doc,
@@ -78,11 +145,11 @@ class VectorStore:
                 results["distances"][0]
             )
         ]
-    
+
     def get_schema_context(self, query: str) -> Dict[str, Any]:
         """Get relevant schema context for a given query"""
         results = self.query_schema(query)
-        
+
         # Extract table and column information from results
         tables = {}
         for result in results:
@@ -95,22 +162,17 @@ class VectorStore:
                     "column_name": meta["column_name"],
                     "data_type": meta["data_type"]
                 })
-        
+
         return {
             "tables": tables,
             "context": "\n".join([f"- {result['document']}" for result in results])
         }
 
-    def add_documents(self, documents: List[str], metadatas: List[Dict[str, Any]] = None):
-        """Add documents to the vector store"""
+    def add_documents(self, documents: List[str], metadatas: List[Dict[str, Any]] = None) -> List[str]:
+        """Add documents to the vector store; returns their ids"""
         if not metadatas:
-            metadatas = [{"source": f"doc_{i}"} for i in range(len(documents))]
-        
-        self.collection.add(
-            documents=documents,
-            metadatas=metadatas,
-            ids=[f"doc_{i}" for i in range(len(documents))]
-        )
+            metadatas = [{"source": "document"} for _ in documents]
+        return self.upsert(documents, metadatas)[0]
 
     def search(self, query: str, n_results: int = 5) -> List[Dict[str, Any]]:
         """Search for similar documents"""
@@ -120,5 +182,13 @@ class VectorStore:
         )
         return results
 
-# Initialize vector store
-vector_store = VectorStore() 
\ No newline at end of file
+
+_vector_store: Optional[VectorStore] = None
+
+
+def get_vector_store() -> VectorStore:
+    """The process-wide schema vector store (the collection itself opens on first use)"""
+    global _vector_store
+    if _vector_store is None:
+        _vector_store = VectorStore()
+    return _vector_store
@@ -0,0 +1,292 @@
+"""
+Admission control and priority scheduling for LLM calls.
+
+Every call to the language model provider goes through one scheduler per
+process, which
+- keeps the request rate and the token rate under the provider's per-minute
+  budgets (two token buckets), so load shows up as queueing here rather than
+  as 429 responses for every request at once
+- bounds the number of calls in flight
+- admits waiting calls by priority class: interactive work (SQL generation,
+  intent parsing) goes ahead of narrative text, which goes ahead of background
+  work; calls in the same class are admitted in arrival order
+- retries rate-limited and transient failures with jittered exponential
+  backoff, waiting at least as long as the provider's Retry-After says; a
+  Retry-After pauses admission for all callers, not just the one that got it
+- rejects new calls outright when the queue is already too deep
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import random
+import time
+from email.utils import parsedate_to_datetime
+from typing import Awaitable, Callable, Optional, TypeVar
+
+from app.core.config import settings
+from app.core.metrics import LLM_IN_FLIGHT, LLM_QUEUE_DEPTH, LLM_QUEUE_WAIT_SECONDS, LLM_RETRIES
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Priority classes, lower values are admitted first
+INTERACTIVE = "interactive"
+NARRATIVE = "narrative"
+BACKGROUND = "background"
+PRIORITIES = {INTERACTIVE: 0, NARRATIVE: 1, BACKGROUND: 2}
+
+# HTTP statuses worth retrying: timeouts, conflicts, rate limits and server errors
+_RETRYABLE_STATUSES = {408, 409, 429}
+
+
+class LLMSchedulerBusyError(Exception):
+    """Raised when a call is rejected because too many calls are already queued"""
+    pass
+
+
+class TokenBucket:
+    """Refilling budget of units (requests or tokens) per minute"""
+
+    def __init__(self, per_minute: float, clock: Callable[[], float] = time.monotonic):
+        self.capacity = float(per_minute)
+        self.rate = float(per_minute) / 60.0
+        self.clock = clock
+        self.level = self.capacity
+        self.updated = clock()
+
+    def _refill(self) -> None:
+        now = self.clock()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def time_until(self, amount: float) -> float:
+        """Seconds until amount units are available (0 if they are now)"""
+        self._refill()
+        # A single call larger than the whole budget waits for a full bucket
+        missing = min(amount, self.capacity) - self.level
+        return max(0.0, missing / self.rate)
+
+    def consume(self, amount: float) -> None:
+        """Take amount units; negative levels are debt that later refills pay off"""
+        self._refill()
+        self.level -= amount
+
+
+def estimate_tokens(prompt: str, max_tokens: int) -> int:
+    """Rough token count of a completion call: prompt at ~4 characters per token plus the completion budget"""
+    return len(prompt) // 4 + max_tokens
+
+
+def _status_code(error: BaseException) -> Optional[int]:
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status
+
+
+def retry_after_seconds(error: BaseException) -> Optional[float]:
+    """Delay requested by the provider in the Retry-After(-ms) header of an error's response, if any"""
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if not headers:
+        return None
+    value = headers.get("retry-after-ms")
+    if value is not None:
+        try:
+            return max(0.0, float(value) / 1000.0)
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Whether a failed call is worth retrying (rate limits, timeouts, connection and server errors)"""
+    if isinstance(error, asyncio.TimeoutError):
+        return True
+    status = _status_code(error)
+    if status is not None:
+        return status in _RETRYABLE_STATUSES or status >= 500
+    # Connection failures carry no response
+    return type(error).__name__ in ("APIConnectionError", "APITimeoutError")
+
+
+class LLMScheduler:
+    """Admits LLM calls by priority within rate, token and concurrency budgets"""
+
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float, max_concurrency: int,
+                 max_queue_depth: int = 100, max_retries: int = 3,
+                 base_backoff: float = 0.5, max_backoff: float = 30.0,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        Args:
+            requests_per_minute: Request budget of the provider
+            tokens_per_minute: Token budget of the provider (prompt and completion)
+            max_concurrency: Calls in flight at most
+            max_queue_depth: Calls waiting at most before new ones are rejected (0 for no limit)
+            max_retries: Retries of a rate-limited or transiently failed call
+            base_backoff: First backoff ceiling in seconds, doubled per retry
+            max_backoff: Largest backoff ceiling in seconds
+            clock: Monotonic clock, replaceable in tests
+        """
+        self.max_concurrency = max_concurrency
+        self.max_queue_depth = max_queue_depth
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.clock = clock
+        self._requests = TokenBucket(requests_per_minute, clock)
+        self._tokens = TokenBucket(tokens_per_minute, clock)
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._waiting = []
+        self._sequence = itertools.count()
+        self._condition = asyncio.Condition()
+
+    @classmethod
+    def from_settings(cls, settings) -> "LLMScheduler":
+        return cls(
+            requests_per_minute=settings.LLM_REQUESTS_PER_MINUTE,
+            tokens_per_minute=settings.LLM_TOKENS_PER_MINUTE,
+            max_concurrency=settings.LLM_MAX_CONCURRENCY,
+            max_queue_depth=settings.LLM_MAX_QUEUE_DEPTH,
+            max_retries=settings.LLM_MAX_RETRIES,
+        )
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiting)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Delay before retry number attempt (1-based): full jitter, never shorter than Retry-After"""
+        ceiling = min(self.max_backoff, self.base_backoff * (2 ** (attempt - 1)))
+        delay = random.uniform(0, ceiling)
+        if retry_after is not None:
+            delay += retry_after
+        return delay
+
+    async def run(self, call: Callable[[], Awaitable[T]], priority: str = INTERACTIVE,
+                  estimated_tokens: int = 0,
+                  actual_tokens: Optional[Callable[[T], Optional[int]]] = None) -> T:
+        """
+        Run a provider call once admitted, retrying transient failures.
+
+        Args:
+            call: Starts one attempt of the call
+            priority: INTERACTIVE, NARRATIVE or BACKGROUND
+            estimated_tokens: Tokens the call is expected to use, charged on admission
+            actual_tokens: Optional, reads the tokens actually used from the result to correct the charge
+
+        Returns:
+            The result of the first successful attempt
+
+        Raises:
+            LLMSchedulerBusyError: If the queue is full
+            Exception: The last error if the call failed and retries are exhausted or it is not retryable
+        """
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown LLM priority class: {priority}")
+        attempt = 0
+        while True:
+            await self._acquire(priority, estimated_tokens)
+            try:
+                result = await call()
+                error = None
+            except Exception as e:
+                error = e
+            finally:
+                await self._release()
+
+            if error is None:
+                if actual_tokens is not None:
+                    used = actual_tokens(result)
+                    if used is not None:
+                        self._tokens.consume(used - estimated_tokens)
+                return result
+
+            if attempt >= self.max_retries or not is_retryable(error):
+                raise error
+            attempt += 1
+            retry_after = retry_after_seconds(error)
+            if retry_after is not None:
+                # The provider asked everyone to wait, not just this call
+                self._paused_until = max(self._paused_until, self.clock() + retry_after)
+            delay = self.backoff(attempt, retry_after)
+            status = _status_code(error)
+            LLM_RETRIES.labels(reason=str(status) if status else type(error).__name__).inc()
+            logger.warning(f"LLM call failed ({error}), retry {attempt}/{self.max_retries} in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+    def _admission_delay(self, entry, tokens: int) -> Optional[float]:
+        """Seconds until the call can be admitted, or None while it has to wait for others"""
+        if self._waiting[0] != entry or self._in_flight >= self.max_concurrency:
+            return None
+        return max(self._paused_until - self.clock(),
+                   self._requests.time_until(1),
+                   self._tokens.time_until(tokens))
+
+    async def _acquire(self, priority: str, tokens: int) -> None:
+        if self.max_queue_depth and len(self._waiting) >= self.max_queue_depth:
+            raise LLMSchedulerBusyError(f"LLM queue is full ({len(self._waiting)} calls waiting)")
+
+        entry = (PRIORITIES[priority], next(self._sequence))
+        queued_at = self.clock()
+        LLM_QUEUE_DEPTH.labels(priority=priority).inc()
+        async with self._condition:
+            heapq.heappush(self._waiting, entry)
+            try:
+                while True:
+                    delay = self._admission_delay(entry, tokens)
+                    if delay is not None and delay <= 0:
+                        break
+                    try:
+                        await asyncio.wait_for(self._condition.wait(), timeout=delay)
+                    except asyncio.TimeoutError:
+                        pass
+            except BaseException:
+                # Cancelled while waiting: give up the place in the queue
+                self._waiting.remove(entry)
+                heapq.heapify(self._waiting)
+                raise
+            else:
+                heapq.heappop(self._waiting)
+                self._requests.consume(1)
+                self._tokens.consume(tokens)
+                self._in_flight += 1
+                LLM_IN_FLIGHT.set(self._in_flight)
+            finally:
+                LLM_QUEUE_DEPTH.labels(priority=priority).dec()
+                # The next waiter may be admissible now
+                self._condition.notify_all()
+        LLM_QUEUE_WAIT_SECONDS.labels(priority=priority).observe(self.clock() - queued_at)
+
+    async def _release(self) -> None:
+        async with self._condition:
+            self._in_flight -= 1
+            LLM_IN_FLIGHT.set(self._in_flight)
+            self._condition.notify_all()
+
+
+_scheduler: Optional[LLMScheduler] = None
+
+
+def get_llm_scheduler() -> LLMScheduler:
+    """The process-wide scheduler, created from settings on first use"""
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = LLMScheduler.from_settings(settings)
+    return _scheduler
@@ -0,0 +1,214 @@
+"""
+Shared HTTP transport for language model calls.
+
+All LLM clients of the process (the AsyncOpenAI clients of OpenAIAdapter and
+the LangChain ChatOpenAI models) use the same pooled httpx clients, so
+connections are kept alive and reused instead of every client opening its own.
+HTTP/2 is used when the h2 package is installed, which multiplexes concurrent
+calls over a few connections.
+
+LLMTransport adds per-call deadlines and, optionally, hedged requests: when a
+completion has not returned after the recent p95 latency, a duplicate is sent
+(to the next configured endpoint, if there are several) and whichever reply
+arrives first is used. The slower call is cancelled. Hedging trades a few
+extra calls for a shorter latency tail; it stays off until enough latencies
+have been observed to know the p95.
+"""
+import asyncio
+import importlib.util
+import logging
+from collections import deque
+from typing import Any, List, Optional
+
+import httpx
+
+from app.core.config import settings
+from app.core.metrics import LLM_HEDGED_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+
+def http2_available() -> bool:
+    """Whether httpx can speak HTTP/2 (needs the h2 package)"""
+    return importlib.util.find_spec("h2") is not None
+
+
+def _client_options() -> dict:
+    http2 = settings.LLM_HTTP2 and http2_available()
+    if settings.LLM_HTTP2 and not http2:
+        logger.warning("h2 is not installed, LLM calls use HTTP/1.1 keep-alive connections")
+    return {
+        "http2": http2,
+        "limits": httpx.Limits(
+            max_connections=settings.LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.LLM_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.LLM_KEEPALIVE_EXPIRY,
+        ),
+        "timeout": httpx.Timeout(settings.LLM_API_TIMEOUT, connect=settings.LLM_CONNECT_TIMEOUT),
+    }
+
+
+_async_http_client: Optional[httpx.AsyncClient] = None
+_sync_http_client: Optional[httpx.Client] = None
+_transport: Optional["LLMTransport"] = None
+
+
+def get_async_http_client() -> httpx.AsyncClient:
+    """The pooled async HTTP client shared by all LLM clients"""
+    global _async_http_client
+    if _async_http_client is None or _async_http_client.is_closed:
+        _async_http_client = httpx.AsyncClient(**_client_options())
+    return _async_http_client
+
+
+def get_sync_http_client() -> httpx.Client:
+    """The pooled sync HTTP client shared by LangChain models called synchronously"""
+    global _sync_http_client
+    if _sync_http_client is None or _sync_http_client.is_closed:
+        _sync_http_client = httpx.Client(**_client_options())
+    return _sync_http_client
+
+
+class LatencyTracker:
+    """Rolling window of recent call latencies"""
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.samples = deque(maxlen=window)
+        self.min_samples = min_samples
+
+    def record(self, seconds: float) -> None:
+        self.samples.append(seconds)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """The q-quantile of the window, or None while there are fewer than min_samples"""
+        if len(self.samples) < self.min_samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class LLMTransport:
+    """Chat completions over the shared connection pool, with deadlines and optional hedging"""
+
+    def __init__(self, api_key: str, api_bases: List[str], deadline: float,
+                 hedging: bool = False, hedge_quantile: float = 0.95, hedge_min_delay: float = 1.0,
+                 http_client: Optional[httpx.AsyncClient] = None):
+        """
+        Args:
+            api_key: Key for all endpoints
+            api_bases: Endpoints; the first gets every call, the others only hedges
+            deadline: Default deadline of a call in seconds, hedge included
+            hedging: Whether to send a duplicate of calls slower than the hedge delay
+            hedge_quantile: Latency quantile after which a duplicate is sent
+            hedge_min_delay: Shortest hedge delay in seconds
+            http_client: Pooled client to use, the shared one if not given
+        """
+        if not api_bases:
+            raise ValueError("At least one API base is required")
+        self.api_bases = api_bases
+        self.deadline = deadline
+        self.hedging = hedging
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_delay = hedge_min_delay
+        self.latency = LatencyTracker()
+        http_client = http_client or get_async_http_client()
+        # The openai package takes ~0.5s to import; loaded here rather than at module import
+        from openai import AsyncOpenAI
+        # Retries are left to the LLM scheduler
+        self.clients = [
+            AsyncOpenAI(api_key=api_key, base_url=api_base, http_client=http_client, max_retries=0)
+            for api_base in api_bases
+        ]
+
+    @classmethod
+    def from_settings(cls, settings, api_key: Optional[str] = None, api_base: Optional[str] = None) -> "LLMTransport":
+        hedge_bases = [b.strip() for b in settings.LLM_HEDGE_API_BASES.split(",") if b.strip()]
+        return cls(
+            api_key=api_key or settings.OPENAI_API_KEY,
+            api_bases=[api_base or settings.OPENAI_API_BASE] + hedge_bases,
+            deadline=settings.LLM_API_TIMEOUT,
+            hedging=settings.LLM_HEDGING_ENABLED,
+            hedge_quantile=settings.LLM_HEDGE_QUANTILE,
+            hedge_min_delay=settings.LLM_HEDGE_MIN_DELAY,
+        )
+
+    def hedge_delay(self) -> Optional[float]:
+        """Seconds after which a duplicate is sent, or None for no hedge"""
+        if not self.hedging:
+            return None
+        quantile = self.latency.quantile(self.hedge_quantile)
+        if quantile is None:
+            return None
+        return max(self.hedge_min_delay, quantile)
+
+    async def chat_completion(self, deadline: Optional[float] = None, **kwargs) -> Any:
+        """
+        Create a chat completion, hedged if the call is slow.
+
+        Args:
+            deadline: Seconds the call may take in total, the transport default if not given
+            **kwargs: Arguments of chat.completions.create
+
+        Returns:
+            The first successful completion
+
+        Raises:
+            asyncio.TimeoutError: If no reply arrived before the deadline
+            Exception: The provider error if every attempt failed
+        """
+        deadline = deadline or self.deadline
+        return await asyncio.wait_for(self._hedged(deadline, kwargs), timeout=deadline)
+
+    async def _attempt(self, index: int, deadline: float, kwargs: dict) -> Any:
+        client = self.clients[index % len(self.clients)]
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        response = await client.with_options(timeout=deadline).chat.completions.create(**kwargs)
+        self.latency.record(loop.time() - started)
+        return response
+
+    async def _hedged(self, deadline: float, kwargs: dict) -> Any:
+        tasks = [asyncio.create_task(self._attempt(0, deadline, kwargs))]
+        try:
+            delay = self.hedge_delay()
+            if delay is not None:
+                await asyncio.wait(tasks, timeout=delay)
+                if not tasks[0].done():
+                    logger.info(f"LLM call slower than {delay:.2f}s, sending a hedged request")
+                    LLM_HEDGED_REQUESTS.labels(outcome="sent").inc()
+                    tasks.append(asyncio.create_task(self._attempt(1, deadline, kwargs)))
+
+            pending = set(tasks)
+            errors = []
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not tasks[0]:
+                            LLM_HEDGED_REQUESTS.labels(outcome="won").inc()
+                        return task.result()
+                    errors.append(task.exception())
+            raise errors[0]
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def get_llm_transport() -> LLMTransport:
+    """The process-wide transport for the configured endpoints"""
+    global _transport
+    if _transport is None:
+        _transport = LLMTransport.from_settings(settings)
+    return _transport
+
+
+async def close_llm_transport() -> None:
+    """Close the shared connection pools (on application shutdown)"""
+    global _async_http_client, _sync_http_client, _transport
+    if _async_http_client is not None:
+        await _async_http_client.aclose()
+    if _sync_http_client is not None:
+        _sync_http_client.close()
+    _async_http_client = _sync_http_client = _transport = None
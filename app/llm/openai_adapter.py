@@ -3,16 +3,14 @@ import logging
 import traceback
 import asyncio
 import os
+from functools import cached_property
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
-from langchain_core.output_parsers import StrOutputParser, JsonOutputParser
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain.memory import ConversationBufferMemory
-from langchain_core.runnables import RunnablePassthrough
 from app.core.config import settings
+from app.core.metrics import LLM_TOKENS
 from sqlalchemy import create_engine, text
-from openai import AsyncOpenAI
 from app.db.schema_manager import schema_manager
+from app.llm.llm_scheduler import INTERACTIVE, LLMSchedulerBusyError, estimate_tokens, get_llm_scheduler
+from app.llm.llm_transport import LLMTransport, get_async_http_client, get_llm_transport, get_sync_http_client
 import json
 import re
 
@@ -36,30 +34,41 @@ class OpenAIAdapter:
             
         logger.info(f"Initializing OpenAI adapter with API base: {self.api_base}")
             
-        # Initialize OpenAI client
-        self.client = AsyncOpenAI(
-            api_key=self.api_key,
-            base_url=self.api_base
-        )
-        
-        # Initialize LangChain chat model
-        self.chat_model = ChatOpenAI(
+        # Pooled, keep-alive transport shared with the other LLM clients of the process
+        if self.api_key == settings.OPENAI_API_KEY and self.api_base == settings.OPENAI_API_BASE:
+            self.transport = get_llm_transport()
+        else:
+            self.transport = LLMTransport.from_settings(settings, api_key=self.api_key, api_base=self.api_base)
+        self.client = self.transport.clients[0]
+
+    # The LangChain objects below are only used by the agents. LangChain takes over a
+    # second to import, so it is loaded when one of them is first used.
+
+    @cached_property
+    def chat_model(self):
+        """LangChain chat model on the shared HTTP clients"""
+        from langchain_openai import ChatOpenAI
+        return ChatOpenAI(
             api_key=self.api_key,
             model_name=settings.OPENAI_MODEL,
-            openai_api_base=self.api_base
+            openai_api_base=self.api_base,
+            http_client=get_sync_http_client(),
+            http_async_client=get_async_http_client()
         )
-        
-        # Initialize memory and prompts
-        self.memory = ConversationBufferMemory(
+
+    @cached_property
+    def memory(self):
+        from langchain.memory import ConversationBufferMemory
+        return ConversationBufferMemory(
             return_messages=True,
             memory_key="chat_history"
         )
-        self._initialize_prompts()
-            
-    def _initialize_prompts(self):
-        """Initialize prompt templates with intelligent schema context"""
-        # SQL generation prompt with dynamic schema context
-        self.prompt = ChatPromptTemplate.from_messages([
+
+    @cached_property
+    def prompt(self):
+        """SQL generation prompt with dynamic schema context"""
+        from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+        return ChatPromptTemplate.from_messages([
             ("system", """You are a helpful assistant that generates SQL queries for tourism data analysis.
             You have access to a dynamic schema context that will be provided for each query.
             
@@ -93,8 +102,11 @@ class OpenAIAdapter:
             ("human", "Schema Context: {schema_context}")
         ])
         
-        # Analysis prompt for query results
-        self.analysis_prompt = ChatPromptTemplate.from_messages([
+    @cached_property
+    def analysis_prompt(self):
+        """Analysis prompt for query results"""
+        from langchain_core.prompts import ChatPromptTemplate
+        return ChatPromptTemplate.from_messages([
             ("system", """You are a tourism data analyst. Analyze the query results using the schema context.
             Consider:
             1. Visitor Patterns:
@@ -293,8 +305,14 @@ Return a visualization configuration as JSON."""
             logger.error(traceback.format_exc())
             return None
 
-    async def agenerate_text(self, prompt: str, output_type: str = "text") -> str:
-        """Generate text using OpenAI API with error handling"""
+    async def agenerate_text(self, prompt: str, output_type: str = "text", priority: str = INTERACTIVE) -> str:
+        """Generate text using OpenAI API with error handling
+        
+        Args:
+            prompt: The user prompt
+            output_type: "json" for structured output, "text" otherwise
+            priority: Scheduling class of the call (see app/llm/llm_scheduler.py)
+        """
         try:
             # Check if API key is available
             if not self.api_key:
@@ -317,35 +335,38 @@ Return a visualization configuration as JSON."""
                     {"role": "system", "content": "You are a helpful assistant that provides accurate information in JSON format."},
                     {"role": "user", "content": prompt}
                 ]
-                
-                logger.info(f"OPENAI REQUEST - About to call OpenAI with model: {settings.OPENAI_MODEL}")
-                response = await self.client.chat.completions.create(
-                    model=settings.OPENAI_MODEL,
-                    messages=messages,
-                    temperature=0.2,
-                    max_tokens=500
-                )
-                
-                logger.info(f"OPENAI RESPONSE - Model used: {response.model}")
-                return response.choices[0].message.content
+                temperature, max_tokens = 0.2, 500
             else:
                 # For text output
                 messages = [
                     {"role": "system", "content": "You are a helpful assistant that provides accurate information."},
                     {"role": "user", "content": prompt}
                 ]
-                
-                logger.info(f"OPENAI REQUEST - About to call OpenAI with model: {settings.OPENAI_MODEL}")
-                response = await self.client.chat.completions.create(
+                temperature, max_tokens = 0.7, 1000
+            
+            logger.info(f"OPENAI REQUEST - About to call OpenAI with model: {settings.OPENAI_MODEL} ({priority})")
+            response = await get_llm_scheduler().run(
+                lambda: self.transport.chat_completion(
                     model=settings.OPENAI_MODEL,
                     messages=messages,
-                    temperature=0.7,
-                    max_tokens=1000
-                )
-                
-                logger.info(f"OPENAI RESPONSE - Model used: {response.model}")
-                return response.choices[0].message.content
+                    temperature=temperature,
+                    max_tokens=max_tokens
+                ),
+                priority=priority,
+                estimated_tokens=estimate_tokens(prompt, max_tokens),
+                actual_tokens=lambda r: r.usage.total_tokens if getattr(r, "usage", None) else None
+            )
+            
+            logger.info(f"OPENAI RESPONSE - Model used: {response.model}")
+            usage = getattr(response, "usage", None)
+            if usage:
+                LLM_TOKENS.labels(kind="prompt", priority=priority).inc(usage.prompt_tokens or 0)
+                LLM_TOKENS.labels(kind="completion", priority=priority).inc(usage.completion_tokens or 0)
+            return response.choices[0].message.content
                 
+        except LLMSchedulerBusyError as e:
+            logger.error(f"LLM call rejected: {e}")
+            return "Error: The language model service is busy, please try again shortly."
         except Exception as e:
             error_message = str(e)
             logger.error(f"Error generating text: {error_message}")
@@ -366,11 +387,23 @@ Return a visualization configuration as JSON."""
 
     async def close(self):
         """Cleanup resources"""
-        if hasattr(self, 'client'):
-            await self.client.close()
-        if hasattr(self, 'chat_model'):
-            await self.chat_model.aclose()
+        # The HTTP connection pools are shared and closed by close_llm_transport() on shutdown
         logger.info("OpenAIAdapter closed successfully")
 
-# Initialize OpenAI adapter
-openai_adapter = OpenAIAdapter() 
\ No newline at end of file
+_openai_adapter: Optional[OpenAIAdapter] = None
+
+
+def get_openai_adapter() -> OpenAIAdapter:
+    """The shared adapter configured from the environment, created on first use"""
+    global _openai_adapter
+    if _openai_adapter is None:
+        _openai_adapter = OpenAIAdapter()
+    return _openai_adapter
+
+
+def __getattr__(name: str):
+    # `from app.llm.openai_adapter import openai_adapter` keeps working, without creating
+    # the adapter (and requiring an API key) whenever this module is imported
+    if name == "openai_adapter":
+        return get_openai_adapter()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,6 +1,7 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import StreamingResponse, Response, FileResponse
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 from sqlalchemy.orm import Session
 import logging
 from dataclasses import asdict
@@ -13,6 +14,15 @@ from app.schemas.chat import ChatRequest, ChatResponse
 from app.core.config import settings
 from app.db.schema_manager import SchemaManager
 from app.llm.openai_adapter import OpenAIAdapter
+from app.llm.llm_transport import close_llm_transport
+from app.core.metrics import SSE_CONNECTIONS, mark_worker_exited, metrics_registry
+from app.utils.profiler import ProfileStore, SamplingProfiler, has_profile_access, should_profile
+from app.utils.loop_watchdog import LoopWatchdog
+from app.utils.executors import shutdown_executor_pools
+from app.services.conversation_writer import ConversationWriter
+from app.services.conversation_service import ConversationService
+from app.rag.sql_examples import SQLExampleRetriever
+from app.db.database import SessionLocal, check_database_connection
 from app.rag.debug_service import DebugStep, DebugService
 import traceback
 import sys
@@ -103,14 +113,22 @@ app.add_middleware(
 # Global chat service instance
 chat_service = None
 debug_service = None
+loop_watchdog = None
+conversation_writer = None
 
 
 @app.on_event("startup")
 async def startup_event():
-    global chat_service, debug_service
+    global chat_service, debug_service, loop_watchdog, conversation_writer
+    if settings.LOOP_WATCHDOG_ENABLED:
+        loop_watchdog = LoopWatchdog.from_settings(settings)
+        loop_watchdog.start()
     try:
         logger.info("Starting up chat service...")
 
+        # Fail startup (rather than the first request) when the database is unreachable
+        await asyncio.to_thread(check_database_connection)
+
         # Get database session for initialization
         dw_db = next(get_dw_db())
         logger.info("Database session created")
@@ -148,6 +166,17 @@ async def startup_event():
         sql_execution_service = SQLExecutionService(debug_service=debug_service)
         logger.info("SQL execution service initialized")
 
+        # Conversations are persisted in batches, off the request path
+        if settings.CONVERSATION_PERSISTENCE_ENABLED:
+            conversation_writer = ConversationWriter.from_settings(
+                settings, lambda: ConversationService(SessionLocal()))
+            conversation_writer.start()
+
+        # Earlier questions whose SQL worked are added to SQL prompts as examples
+        sql_example_retriever = None
+        if settings.SQL_FEW_SHOT_ENABLED:
+            sql_example_retriever = SQLExampleRetriever.from_settings(settings, SessionLocal)
+
         # Initialize chat service with the updated constructor signature
         chat_service = ChatService(
             schema_service=schema_service,
@@ -156,7 +185,9 @@ async def startup_event():
             sql_execution_service=sql_execution_service,
             visualization_service=visualization_service,
             response_generation_service=response_generation_service,
-            debug_service=debug_service
+            debug_service=debug_service,
+            conversation_writer=conversation_writer,
+            sql_example_retriever=sql_example_retriever
         )
 
         logger.info("Chat service initialized successfully")
@@ -180,6 +211,13 @@ async def shutdown_event():
         except Exception as e:
             logger.error(f"Error closing chat service: {str(e)}")
             logger.error(traceback.format_exc())
+    if conversation_writer:
+        await conversation_writer.close()
+    await close_llm_transport()
+    shutdown_executor_pools()
+    if loop_watchdog:
+        await loop_watchdog.stop()
+    mark_worker_exited()
 
 # Dependency functions for FastAPI
 
@@ -203,6 +241,34 @@ def get_debug_service() -> DebugService:
     return debug_service
 
 
+profile_store = ProfileStore(settings.PROFILE_DIR, settings.PROFILE_MAX_FILES)
+
+
+def start_request_profiler(http_request: Request) -> Optional[SamplingProfiler]:
+    """Start the sampling profiler when the request asks for it (X-Profile header or ?profile=1) or is sampled.
+
+    Asking needs PROFILE_ON_DEMAND and, when set, PROFILE_TOKEN in X-Profile-Token. Only one
+    request is profiled at a time; others are served unprofiled.
+    """
+    flags = (http_request.headers.get("x-profile", ""), http_request.query_params.get("profile", ""))
+    requested = (any(flag.lower() in ("1", "true", "yes") for flag in flags)
+                 and has_profile_access(http_request.headers.get("x-profile-token", ""), settings.PROFILE_TOKEN))
+    if not should_profile(requested, settings.PROFILE_SAMPLE_RATE, settings.PROFILE_ON_DEMAND):
+        return None
+    return SamplingProfiler.start_exclusive(interval=settings.PROFILE_INTERVAL_MS / 1000)
+
+
+async def save_request_profile(profiler: SamplingProfiler, message_id: Optional[str]) -> Optional[str]:
+    """Stop the profiler and store its samples under the message id; returns the retrieval URL."""
+    profiler.stop()
+    if not message_id:
+        return None
+    path = await asyncio.to_thread(profile_store.save, message_id, profiler)
+    if path:
+        logger.info(f"Stored profile of {message_id} ({profiler.sample_count} samples) at {path}")
+    return f"/profiles/{message_id}" if path else None
+
+
 def prepare_debug_info(debug_info):
     """Prepare debug info for JSON serialization by converting DebugStep objects to dictionaries."""
     if not debug_info:
@@ -228,19 +294,35 @@ def prepare_debug_info(debug_info):
 
 @app.post("/chat/stream")
 async def stream_chat(request: ChatRequest, 
+                      http_request: Request,
                       chat_service: ChatService = Depends(get_chat_service), 
                       db: Session = Depends(get_dw_db)) -> StreamingResponse:
-    """Handles streaming chat requests."""
+    """Handles streaming chat requests. The pipeline is cancelled when the client disconnects."""
     
     async def generate():
         start_time = time.time()
+        profiler = start_request_profiler(http_request)
+        message_id = None
         logger.info(f"Received streaming chat request: {request.message}")
+        if settings.CHAT_COALESCING_ENABLED:
+            # Identical concurrent questions share one pipeline run
+            stream = chat_service.process_chat_stream_coalesced(
+                message=request.message,
+                session_id=request.session_id or "default_session",
+                is_direct_query=request.is_direct_query,
+                is_disconnected=http_request.is_disconnected)
+        else:
+            stream = chat_service.process_chat_stream(
+                message=request.message, 
+                session_id=request.session_id or "default_session",
+                is_direct_query=request.is_direct_query,
+                dw_db=db,
+                is_disconnected=http_request.is_disconnected)
+        SSE_CONNECTIONS.labels(endpoint="chat_stream").inc()
         try:
-            async for chunk in chat_service.process_chat_stream(
-                    message=request.message, 
-                    session_id=request.session_id or "default_session",
-                    is_direct_query=request.is_direct_query,
-                    dw_db=db):
+            async for chunk in stream:
+                if message_id is None and chunk.get("message_id"):
+                    message_id = chunk["message_id"]
                 try:
                     # Use the new custom serializer
                     yield "data: " + json.dumps(chunk, default=custom_json_serializer) + "\n\n"
@@ -253,6 +335,14 @@ async def stream_chat(request: ChatRequest,
                         "message_id": chunk.get("message_id", "N/A") 
                     }
                     yield "data: " + json.dumps(error_chunk) + "\n\n"
+            if profiler:
+                profile_url = await save_request_profile(profiler, message_id)
+                if profile_url:
+                    yield "data: " + json.dumps({"type": "profile", "message_id": message_id, "url": profile_url}) + "\n\n"
+        except asyncio.CancelledError:
+            # The client went away; nothing can be sent any more
+            logger.info(f"Stream cancelled for request: {request.message}")
+            raise
         except Exception as e:
             logger.error(f"Error in stream generation: {str(e)}", exc_info=True)
             # Yield a final error chunk if the stream fails
@@ -266,10 +356,16 @@ async def stream_chat(request: ChatRequest,
             except Exception as final_err:
                  logger.error(f"Failed to yield final error chunk: {final_err}")
         finally:
+            SSE_CONNECTIONS.labels(endpoint="chat_stream").dec()
+            if profiler and profiler.stopped_at is None:
+                # Cancelled or failed: keep the profile, written in the background
+                profiler.stop()
+                if message_id:
+                    asyncio.get_running_loop().run_in_executor(None, profile_store.save, message_id, profiler)
             end_time = time.time()
             logger.info(f"Stream ended for request: {request.message}. Duration: {end_time - start_time:.2f}s")
-            # Ensure the generator finishes properly
-            yield "event: end\ndata: {}\n\n"
+        # Ensure the generator finishes properly
+        yield "event: end\ndata: {}\n\n"
 
     headers = {
         "Content-Type": "text/event-stream",
@@ -283,6 +379,7 @@ async def stream_chat(request: ChatRequest,
 @app.post("/chat")
 async def chat(
     request: ChatRequest,
+    http_request: Request,
     dw_db: Session = Depends(get_dw_db),
     chat_service: ChatService = Depends(get_chat_service),
     debug_service: DebugService = Depends(get_debug_service)
@@ -298,6 +395,7 @@ async def chat(
                 detail="Chat service not initialized")
 
         # Process the chat message using the chat service
+        profiler = start_request_profiler(http_request)
         try:
             # Start debug tracking
             if debug_service:
@@ -315,10 +413,16 @@ async def chat(
             
             # Return the response with custom JSON encoder
             serialized_content = json.dumps(result, cls=CustomJSONEncoder)
+            headers = {}
+            if profiler:
+                profile_url = await save_request_profile(profiler, result.get("message_id"))
+                if profile_url:
+                    headers["X-Profile-URL"] = profile_url
             return JSONResponse(
                 content=json.loads(serialized_content), 
                 status_code=200,
                 media_type="application/json",
+                headers=headers,
             )
             
         except Exception as e:
@@ -337,6 +441,10 @@ async def chat(
             return JSONResponse(
                 content=json.loads(serialized_error)
             )
+        finally:
+            if profiler and profiler.stopped_at is None:
+                # Failed or cancelled: release the sampler thread and the profiling lock
+                profiler.stop()
 
     except Exception as e:
         logger.error(f"Error processing chat request: {str(e)}")
@@ -353,6 +461,23 @@ async def chat(
         )
 
 
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics: pipeline stage latencies, LLM tokens and queueing, DB pools, caches, SSE streams"""
+    return Response(generate_latest(metrics_registry()), media_type=CONTENT_TYPE_LATEST)
+
+
+@app.get("/profiles/{message_id}")
+async def get_profile(message_id: str, http_request: Request):
+    """Speedscope profile of a profiled chat request (open it at https://www.speedscope.app)"""
+    if not has_profile_access(http_request.headers.get("x-profile-token", ""), settings.PROFILE_TOKEN):
+        raise HTTPException(status_code=403, detail="Profile token required")
+    path = profile_store.load(message_id)
+    if not path:
+        raise HTTPException(status_code=404, detail="No profile stored for this message")
+    return FileResponse(path, media_type="application/json", filename=f"{message_id}.speedscope.json")
+
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
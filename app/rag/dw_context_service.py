@@ -5,6 +5,7 @@ from sqlalchemy import func, desc
 from app.models.dw_models import FactVisitor, FactSpending, DimRegion, DimDate, DimIndustry
 from app.core.config import settings
 from app.rag.debug_service import DebugService
+from app.utils.shared_cache import get_shared_cache
 
 class DWContextService:
     def __init__(self, dw_db: Session = None):
@@ -258,8 +259,7 @@ class DWContextService:
             # Get base context about regions and dates
             context = {
                 'schema_info': self._get_schema_info(),
-                'available_regions': self._get_available_regions(),
-                'date_range': self._get_date_range()
+                **(await self._get_context_snapshot())
             }
             
             # Add region-specific context if provided
@@ -320,11 +320,20 @@ class DWContextService:
                 'top_municipalities'
             ]
             
+            # Typed side tables holding the JSON metrics (dw2/task10_visitor_attributes.sql)
+            attribute_tables = [
+                'fact_visitor_profile',
+                'fact_visitor_age_band',
+                'fact_visitor_dwell_bucket',
+                'fact_visitor_origin'
+            ]
+            
             schema_info = {
                 'fact_tables': fact_tables,
                 'dimension_tables': dimension_tables,
                 'key_metrics': key_metrics,
-                'json_metrics': json_metrics
+                'json_metrics': json_metrics,
+                'attribute_tables': attribute_tables
             }
             
             self.debug_service.add_step_details(schema_info)
@@ -338,8 +347,22 @@ class DWContextService:
                 'fact_tables': [],
                 'dimension_tables': [],
                 'key_metrics': [],
-                'json_metrics': []
+                'json_metrics': [],
+                'attribute_tables': []
+            }
+
+    async def _get_context_snapshot(self) -> Dict[str, Any]:
+        """Regions and date range, shared by all workers for DW_CONTEXT_CACHE_TTL seconds"""
+        cache = get_shared_cache()
+        snapshot = await cache.aget("dw_context", "snapshot")
+        if snapshot is None:
+            snapshot = {
+                'available_regions': self._get_available_regions(),
+                'date_range': self._get_date_range()
             }
+            if settings.DW_CONTEXT_CACHE_TTL > 0:
+                await cache.aset("dw_context", "snapshot", snapshot, ttl=settings.DW_CONTEXT_CACHE_TTL)
+        return snapshot
 
     def _get_available_regions(self) -> List[Dict[str, Any]]:
         """Get list of available regions with their types"""
@@ -431,7 +454,8 @@ class DWContextService:
         prompt += f"- Fact tables: {', '.join(schema_info.get('fact_tables', []))}\n"
         prompt += f"- Dimension tables: {', '.join(schema_info.get('dimension_tables', []))}\n"
         prompt += f"- Key metrics: {', '.join(schema_info.get('key_metrics', []))}\n"
-        prompt += f"- JSON metrics: {', '.join(schema_info.get('json_metrics', []))}\n\n"
+        prompt += f"- JSON metrics: {', '.join(schema_info.get('json_metrics', []))}\n"
+        prompt += f"- Typed demographics/origin tables (use instead of the JSON metrics): {', '.join(schema_info.get('attribute_tables', []))}\n\n"
         
         # Add region information if available
         if 'region_context' in context:
@@ -0,0 +1,180 @@
+"""
+Local embeddings and a persistent vector index.
+
+HashingEmbedder turns texts into fixed-size vectors without a model: word
+unigrams, word bigrams and character trigrams are hashed (crc32, stable
+across processes and restarts) into `dim` buckets with a sign bit, then
+L2-normalized. A whole batch is tokenized into one array of bucket indices
+and accumulated with a single np.add.at, so embedding is vectorized rather
+than a Python loop over characters. It captures shared wording between
+questions well, which is what finding earlier similar questions needs.
+
+VectorIndex keeps the vectors in a float32 matrix file that is appended to
+and read through np.memmap, with the matching ids in a parallel int64 file.
+It survives restarts, loads in constant time, and answers top-k cosine
+queries with one matrix-vector product (exact search; at the sizes a
+conversation log reaches this takes milliseconds and needs no ANN graph).
+"""
+import fcntl
+import json
+import logging
+import os
+import re
+import threading
+import zlib
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_WORD = re.compile(r"\w+")
+
+
+class HashingEmbedder:
+    """Signed feature hashing of words, word pairs and character trigrams"""
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+
+    def _features(self, text: str) -> List[str]:
+        words = _WORD.findall(text.lower())
+        features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+        for word in words:
+            padded = f"#{word}#"
+            features.extend(padded[i:i + 3] for i in range(len(padded) - 2))
+        return features
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        """Embed a batch of texts into an (n, dim) float32 array of unit vectors (zero for empty texts)"""
+        rows, hashes = [], []
+        for row, text in enumerate(texts):
+            for feature in self._features(text or ""):
+                rows.append(row)
+                hashes.append(zlib.crc32(feature.encode("utf-8")))
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        if hashes:
+            hashes = np.asarray(hashes, dtype=np.uint32)
+            # Low bits choose the bucket, the top bit the sign (so collisions tend to cancel out)
+            signs = np.where(hashes >> 31, -1.0, 1.0).astype(np.float32)
+            np.add.at(matrix, (np.asarray(rows), hashes % self.dim), signs)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.where(norms == 0, 1, norms)
+
+    def embed_one(self, text: str) -> np.ndarray:
+        return self.embed([text])[0]
+
+
+class VectorIndex:
+    """Append-only, memory-mapped matrix of unit vectors with exact top-k cosine search"""
+
+    def __init__(self, directory: str, dim: int):
+        self.directory = directory
+        self.dim = dim
+        self._vectors_path = os.path.join(directory, "vectors.f32")
+        self._ids_path = os.path.join(directory, "ids.i64")
+        self._meta_path = os.path.join(directory, "meta.json")
+        self._lock = threading.Lock()
+        self._vectors: Optional[np.ndarray] = None
+        self._ids: Optional[np.ndarray] = None
+        os.makedirs(directory, exist_ok=True)
+        self._check_meta()
+        self._map()
+
+    def _check_meta(self) -> None:
+        if os.path.exists(self._meta_path):
+            with open(self._meta_path) as f:
+                if json.load(f).get("dim") == self.dim:
+                    return
+            logger.warning(f"Vector index in {self.directory} has another dimension, starting a new one")
+        for path in (self._vectors_path, self._ids_path):
+            if os.path.exists(path):
+                os.remove(path)
+        with open(self._meta_path, "w") as f:
+            json.dump({"dim": self.dim}, f)
+
+    @staticmethod
+    def _rows(path: str, row_size: int) -> int:
+        return os.path.getsize(path) // row_size if os.path.exists(path) else 0
+
+    def _map(self) -> None:
+        """Map the files; a write cut short by a crash leaves a partial row that is ignored"""
+        count = min(self._rows(self._vectors_path, 4 * self.dim), self._rows(self._ids_path, 8))
+        if count == 0:
+            self._vectors = np.zeros((0, self.dim), dtype=np.float32)
+            self._ids = np.zeros(0, dtype=np.int64)
+            return
+        self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="r", shape=(count, self.dim))
+        self._ids = np.memmap(self._ids_path, dtype=np.int64, mode="r", shape=(count,))
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def add(self, ids: Sequence[int], vectors: np.ndarray) -> None:
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        if len(ids) != len(vectors):
+            raise ValueError("ids and vectors differ in length")
+        if not len(ids):
+            return
+        with self._lock, open(self._ids_path, "ab") as ids_file:
+            # Other processes (app workers) append to the same files
+            fcntl.flock(ids_file, fcntl.LOCK_EX)
+            try:
+                # Drop a row left half-written by a crash so vectors and ids stay aligned
+                count = min(self._rows(self._vectors_path, 4 * self.dim), self._rows(self._ids_path, 8))
+                for path, row_size in ((self._vectors_path, 4 * self.dim), (self._ids_path, 8)):
+                    if os.path.exists(path) and os.path.getsize(path) != count * row_size:
+                        os.truncate(path, count * row_size)
+                # Vectors first: an id without its vector would point at the wrong row
+                with open(self._vectors_path, "ab") as f:
+                    f.write(vectors.tobytes())
+                ids_file.write(np.asarray(ids, dtype=np.int64).tobytes())
+                ids_file.flush()
+            finally:
+                fcntl.flock(ids_file, fcntl.LOCK_UN)
+            self._map()
+
+    def _refresh(self) -> None:
+        """Pick up rows appended by other processes"""
+        try:
+            on_disk = os.path.getsize(self._ids_path) // 8
+        except OSError:
+            return
+        if on_disk != len(self._ids):
+            with self._lock:
+                self._map()
+
+    def search(self, vector: np.ndarray, k: int = 5) -> List[Tuple[int, float]]:
+        """(id, cosine similarity) of the k nearest vectors, best first"""
+        self._refresh()
+        vectors, ids = self._vectors, self._ids
+        if len(ids) == 0 or k <= 0:
+            return []
+        scores = vectors @ np.asarray(vector, dtype=np.float32)
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(ids[i]), float(scores[i])) for i in top]
+
+    def reset(self) -> None:
+        with self._lock:
+            for path in (self._vectors_path, self._ids_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            self._map()
+
+
+_conversation_index: Optional[VectorIndex] = None
+_conversation_index_lock = threading.Lock()
+
+
+def get_conversation_index() -> VectorIndex:
+    """The process-wide index of conversation prompts"""
+    global _conversation_index
+    if _conversation_index is None:
+        with _conversation_index_lock:
+            if _conversation_index is None:
+                _conversation_index = VectorIndex(settings.CONVERSATION_INDEX_DIR, settings.CONVERSATION_EMBEDDING_DIM)
+    return _conversation_index
@@ -0,0 +1,90 @@
+"""
+Few-shot examples for SQL generation from earlier successful conversations.
+
+Every answered question is persisted with the SQL that answered it and, in
+its metadata, how that SQL fared ("sql_status"). Before generating SQL for a
+new question, SQLExampleRetriever looks up the most similar earlier questions
+in the conversation index and returns those whose LLM-generated SQL executed
+and returned rows. They are added to the prompt as worked examples, so the
+model starts from a query that is known to run against this schema instead of
+guessing table and column names.
+
+Lookups are counted in sql_example_lookups_total (hit when at least one
+example was found); the effect shows in sql_first_attempts_total, which splits
+the outcome of the first generated query by whether examples were used.
+"""
+import logging
+from typing import Any, Callable, Dict, List
+
+from app.core.metrics import SQL_EXAMPLE_LOOKUPS, SQL_FIRST_ATTEMPTS
+from app.services.conversation_service import ConversationService
+from app.utils.executors import get_executor_pool
+
+logger = logging.getLogger(__name__)
+
+# sql_status values stored with each conversation
+SQL_OK = "ok"              # executed and returned rows
+SQL_EMPTY = "empty"        # executed, no rows
+SQL_FALLBACK = "fallback"  # LLM generation failed, canned fallback query was used
+
+
+def get_sql_status(is_fallback: bool, results: Any) -> str:
+    if is_fallback:
+        return SQL_FALLBACK
+    return SQL_OK if results else SQL_EMPTY
+
+
+def record_first_attempt(outcome: str, examples: List[Dict[str, str]]) -> None:
+    """Count the outcome (a sql_status or "error") of the first query generated for a question"""
+    SQL_FIRST_ATTEMPTS.labels(outcome=outcome, few_shot="yes" if examples else "no").inc()
+
+
+class SQLExampleRetriever:
+    """Finds earlier questions similar to a new one whose generated SQL worked"""
+
+    def __init__(self, session_factory: Callable[[], Any], k: int = 3, min_similarity: float = 0.5):
+        self._session_factory = session_factory
+        self.k = k
+        self.min_similarity = min_similarity
+
+    @classmethod
+    def from_settings(cls, settings, session_factory: Callable[[], Any]) -> "SQLExampleRetriever":
+        return cls(session_factory,
+                   k=settings.SQL_FEW_SHOT_EXAMPLES,
+                   min_similarity=settings.SQL_FEW_SHOT_MIN_SIMILARITY)
+
+    async def retrieve(self, question: str) -> List[Dict[str, str]]:
+        """Up to k {"question", "sql"} examples, most similar first; never raises"""
+        try:
+            examples = await get_executor_pool("db").run(self._lookup, question)
+        except Exception as e:
+            logger.error(f"Error retrieving SQL examples: {e}")
+            SQL_EXAMPLE_LOOKUPS.labels(result="error").inc()
+            return []
+        SQL_EXAMPLE_LOOKUPS.labels(result="hit" if examples else "miss").inc()
+        return examples
+
+    def _lookup(self, question: str) -> List[Dict[str, str]]:
+        with self._session_factory() as db:
+            # Fetch extra candidates: some were answered by fallback SQL or returned nothing
+            rows = ConversationService(db).find_similar_conversations(
+                question, limit=self.k * 3, min_similarity=self.min_similarity)
+        return select_examples(rows, self.k)
+
+
+def select_examples(rows: List[Any], k: int) -> List[Dict[str, str]]:
+    """The first k rows (in similarity order) with working LLM SQL, one per distinct query"""
+    examples: List[Dict[str, str]] = []
+    seen = set()
+    for row in rows:
+        metadata = row.query_metadata or {}
+        if metadata.get("sql_status") != SQL_OK or not row.sql_query:
+            continue
+        sql = row.sql_query.strip()
+        if sql in seen:
+            continue
+        seen.add(sql)
+        examples.append({"question": row.prompt, "sql": sql})
+        if len(examples) == k:
+            break
+    return examples
@@ -12,6 +12,7 @@ from langchain.chains import create_sql_query_chain
 from langchain.memory import ConversationBufferMemory
 from langchain_openai import ChatOpenAI
 from app.core.config import settings
+from app.llm.llm_transport import get_async_http_client, get_sync_http_client
 from app.db.schema_manager import schema_manager
 from app.services.geo_insights_service import GeoInsightsService
 from app.visualization.geo_insights_viz import GeoInsightsVisualizer
@@ -44,7 +45,9 @@ class TourismRAG:
                     model=settings.OPENAI_MODEL,
                     temperature=0.7,
                     api_key=settings.OPENAI_API_KEY,
-                    openai_api_base=settings.OPENAI_API_BASE
+                    openai_api_base=settings.OPENAI_API_BASE,
+                    http_client=get_sync_http_client(),
+                    http_async_client=get_async_http_client()
                 )
             except Exception as e:
                 logger.warning(f"Failed to initialize ChatOpenAI: {str(e)}")
@@ -0,0 +1,426 @@
+#!/usr/bin/env python
+"""
+Bulk ingestion of source extracts into the data lake staging tables.
+
+Loads Swisscom AOI-day payloads (JSON / JSON lines) into data_lake.aoi_days_raw
+and Mastercard spending extracts (CSV) into data_lake.master_card using
+COPY FROM STDIN instead of row-by-row INSERTs:
+- source files are read in chunks and split into one spool file per month
+- a process pool loads the months in parallel, each worker on its own connection
+- rows are validated per batch with vectorized pandas checks; rejected rows are
+  written next to the spool with the reason, valid rows are streamed with COPY
+- each month is loaded in a single transaction (optionally replacing the rows
+  already loaded for that month), so a failed month can simply be re-run
+- the loaded days are queued for the incremental DW load (dw.etl_pending_partition,
+  task8_incremental_loading.sql) in the month's own transaction, so they are
+  loaded even when the month commits after the watermark has moved past its
+  ingestion timestamps
+
+Usage:
+    python app/scripts/bulk_ingest.py mastercard extracts/mastercard_2023_*.csv --workers 6
+    python app/scripts/bulk_ingest.py aoi payloads/*.json --replace
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import pandas as pd
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Reuse the connection handling of the view creation script
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from create_materialized_views import get_db_connection
+
+# Rows read from a source file at a time
+READ_CHUNK_SIZE = 100_000
+
+# Mastercard extract columns, in data_lake.master_card order
+MASTERCARD_COLUMNS = [
+    "yr", "txn_date", "industry", "segment", "txn_amt", "txn_cnt", "acct_cnt",
+    "avg_ticket", "avg_freq", "avg_spend", "geo_type", "geo_name",
+    "central_latitude", "central_longitude", "bounding_box",
+]
+MASTERCARD_NUMERIC_COLUMNS = [
+    "txn_amt", "txn_cnt", "acct_cnt", "avg_ticket", "avg_freq", "avg_spend",
+    "central_latitude", "central_longitude",
+]
+
+# AOI-day payload keys (Swisscom API camelCase or already snake_case) -> columns
+AOI_JSON_FIELDS = {
+    "visitors": "visitors",
+    "dwelltimes": "dwelltimes",
+    "demographics": "demographics",
+    "overnightsFromYesterday": "overnights_from_yesterday",
+    "topForeignCountries": "top_foreign_countries",
+    "topLastCantons": "top_last_cantons",
+    "topLastMunicipalities": "top_last_municipalities",
+    "topSwissCantons": "top_swiss_cantons",
+    "topSwissMunicipalities": "top_swiss_municipalities",
+}
+AOI_COLUMNS = [
+    "aoi_date", "aoi_id", *AOI_JSON_FIELDS.values(),
+    "source_system", "load_date", "ingestion_timestamp", "raw_content",
+]
+
+
+@dataclass
+class SourceSpec:
+    """How one source is read, validated and copied"""
+    name: str
+    table: str
+    date_column: str
+    columns: List[str]
+
+
+SOURCES: Dict[str, SourceSpec] = {
+    "mastercard": SourceSpec("mastercard", "data_lake.master_card", "txn_date", MASTERCARD_COLUMNS),
+    "aoi": SourceSpec("aoi", "data_lake.aoi_days_raw", "aoi_date", AOI_COLUMNS),
+}
+
+
+@dataclass
+class PartitionResult:
+    """Outcome of loading one month"""
+    month: str
+    rows_loaded: int = 0
+    rows_rejected: int = 0
+    rows_replaced: int = 0
+    duration_seconds: float = 0.0
+    error: Optional[str] = None
+
+
+# --- Reading and spooling ---
+
+def read_mastercard_file(path: str) -> Iterator[pd.DataFrame]:
+    """Read a Mastercard CSV extract in chunks, keeping the known columns"""
+    for chunk in pd.read_csv(path, chunksize=READ_CHUNK_SIZE, dtype=str, keep_default_na=False, na_values=[""]):
+        chunk.columns = [c.strip().lower() for c in chunk.columns]
+        yield chunk.reindex(columns=MASTERCARD_COLUMNS)
+
+
+def _iter_aoi_records(path: str) -> Iterator[dict]:
+    """Yield AOI-day payloads from a JSON array, a single JSON object or JSON lines"""
+    with open(path, "r", encoding="utf-8") as f:
+        first = f.read(1)
+        while first and first.isspace():
+            first = f.read(1)
+        f.seek(0)
+        if first == "[":
+            yield from json.load(f)
+        elif path.endswith(".jsonl") or path.endswith(".ndjson"):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            payload = json.load(f)
+            # API responses wrap the days in a list under "data"
+            if isinstance(payload, dict) and isinstance(payload.get("data"), list):
+                yield from payload["data"]
+            else:
+                yield payload
+
+
+def read_aoi_file(path: str) -> Iterator[pd.DataFrame]:
+    """Read AOI-day payloads in chunks as rows of data_lake.aoi_days_raw"""
+    now = datetime.now()
+    rows = []
+    for record in _iter_aoi_records(path):
+        row = {
+            "aoi_date": record.get("date", record.get("aoi_date")),
+            "aoi_id": record.get("aoiId", record.get("aoi_id")),
+            "source_system": "swisscom",
+            "load_date": now.date().isoformat(),
+            "ingestion_timestamp": now.isoformat(sep=" "),
+            "raw_content": json.dumps(record),
+        }
+        for key, column in AOI_JSON_FIELDS.items():
+            value = record.get(key, record.get(column))
+            row[column] = json.dumps(value) if value is not None else None
+        rows.append(row)
+        if len(rows) >= READ_CHUNK_SIZE:
+            yield pd.DataFrame(rows, columns=AOI_COLUMNS)
+            rows = []
+    if rows:
+        yield pd.DataFrame(rows, columns=AOI_COLUMNS)
+
+
+READERS = {
+    "mastercard": read_mastercard_file,
+    "aoi": read_aoi_file,
+}
+
+
+def spool_by_month(source: SourceSpec, paths: List[str], spool_dir: str) -> Dict[str, Tuple[str, int]]:
+    """
+    Split the source files into one CSV spool file per month.
+
+    Rows without a parseable date are kept under the 'invalid' partition so
+    they show up in the reject report instead of disappearing.
+
+    Returns:
+        month ('YYYY-MM') -> (spool path, row count)
+    """
+    partitions: Dict[str, Tuple[str, int]] = {}
+    for path in paths:
+        logger.info(f"Reading {path}...")
+        for chunk in READERS[source.name](path):
+            months = pd.to_datetime(chunk[source.date_column], errors="coerce").dt.strftime("%Y-%m")
+            for month, rows in chunk.groupby(months.fillna("invalid"), sort=False):
+                spool_path, count = partitions.get(month, (os.path.join(spool_dir, f"{month}.csv"), 0))
+                rows.to_csv(spool_path, mode="a", header=(count == 0), index=False)
+                partitions[month] = (spool_path, count + len(rows))
+    return partitions
+
+
+# --- Validation ---
+
+def validate_mastercard(df: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Vectorized checks for Mastercard rows; returns (valid, rejected with reason)"""
+    original, df = df, df.copy()
+    reasons = pd.Series("", index=df.index)
+
+    df["txn_date"] = pd.to_datetime(df["txn_date"], errors="coerce")
+    reasons[df["txn_date"].isna()] += "invalid txn_date;"
+
+    for column in MASTERCARD_NUMERIC_COLUMNS:
+        df[column] = pd.to_numeric(df[column], errors="coerce")
+    reasons[(df["txn_amt"] < 0) | (df["txn_cnt"] < 0)] += "negative amount or count;"
+    reasons[df["txn_amt"].isna() & df["txn_cnt"].isna()] += "missing amount and count;"
+
+    for column in ("industry", "geo_type", "geo_name"):
+        reasons[df[column].isna() | (df[column].astype(str).str.strip() == "")] += f"missing {column};"
+
+    bad_coords = (~df["central_latitude"].between(-90, 90) & df["central_latitude"].notna()) | \
+                 (~df["central_longitude"].between(-180, 180) & df["central_longitude"].notna())
+    reasons[bad_coords] += "coordinates out of range;"
+
+    df["yr"] = pd.to_numeric(df["yr"], errors="coerce").fillna(df["txn_date"].dt.year).astype("Int64")
+    df["txn_date"] = df["txn_date"].dt.strftime("%Y-%m-%d")
+
+    rejected = reasons != ""
+    return df[~rejected], original[rejected].assign(reject_reason=reasons[rejected])
+
+
+def validate_aoi(df: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Vectorized checks for AOI-day rows; returns (valid, rejected with reason)"""
+    original, df = df, df.copy()
+    reasons = pd.Series("", index=df.index)
+
+    df["aoi_date"] = pd.to_datetime(df["aoi_date"], errors="coerce")
+    reasons[df["aoi_date"].isna()] += "invalid aoi_date;"
+    reasons[df["aoi_id"].isna() | (df["aoi_id"].astype(str).str.strip() == "")] += "missing aoi_id;"
+    # The visitor counts are what every downstream view reads
+    reasons[~df["visitors"].fillna("").astype(str).str.lstrip().str.startswith("{")] += "visitors is not an object;"
+
+    df["aoi_date"] = df["aoi_date"].dt.strftime("%Y-%m-%d")
+    rejected = reasons != ""
+    return df[~rejected], original[rejected].assign(reject_reason=reasons[rejected])
+
+
+VALIDATORS = {
+    "mastercard": validate_mastercard,
+    "aoi": validate_aoi,
+}
+
+
+# --- Loading ---
+
+def get_table_columns(connection, table: str) -> List[str]:
+    """Columns that exist in the target table"""
+    schema, name = table.split(".", 1)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT column_name FROM information_schema.columns WHERE table_schema = %s AND table_name = %s;",
+            (schema, name)
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def copy_dataframe(cursor, df: pd.DataFrame, table: str) -> None:
+    """Stream a DataFrame into a table with COPY ... FROM STDIN (CSV)"""
+    buffer = io.StringIO()
+    df.to_csv(buffer, index=False, header=False, na_rep="\\N")
+    buffer.seek(0)
+    columns = ", ".join(df.columns)
+    cursor.copy_expert(f"COPY {table} ({columns}) FROM STDIN WITH (FORMAT csv, NULL '\\N')", buffer)
+
+
+def queue_partitions(cursor, source: SourceSpec, dates: set) -> None:
+    """Queue loaded days for the incremental DW load, when it is installed"""
+    cursor.execute("SELECT to_regclass('dw.etl_pending_partition') IS NOT NULL;")
+    if not dates or not cursor.fetchone()[0]:
+        return
+    cursor.executemany(
+        "INSERT INTO dw.etl_pending_partition (source_system, partition_date) VALUES (%s, %s::DATE) "
+        "ON CONFLICT (source_system, partition_date) DO NOTHING;",
+        [(source.name, date) for date in sorted(dates)]
+    )
+
+
+def load_partition(source_name: str, month: str, spool_path: str, replace: bool,
+                   batch_size: int) -> PartitionResult:
+    """Validate and COPY one month of data; runs in a worker process"""
+    source = SOURCES[source_name]
+    result = PartitionResult(month=month)
+    start_time = time.perf_counter()
+
+    connection = get_db_connection()
+    if connection is None:
+        result.error = "Could not connect to database"
+        return result
+
+    reject_path = spool_path.replace(".csv", ".rejected.csv")
+    loaded_dates = set()
+    try:
+        table_columns = set(get_table_columns(connection, source.table))
+        copy_columns = [c for c in source.columns if c in table_columns]
+
+        with connection.cursor() as cursor:
+            if replace and month != "invalid":
+                # Make re-running a month idempotent
+                month_start = f"{month}-01"
+                cursor.execute(
+                    f"DELETE FROM {source.table} WHERE {source.date_column} >= %s::DATE "
+                    f"AND {source.date_column} < %s::DATE + INTERVAL '1 month';",
+                    (month_start, month_start)
+                )
+                result.rows_replaced = cursor.rowcount
+
+            for batch in pd.read_csv(spool_path, chunksize=batch_size, dtype=str,
+                                     keep_default_na=False, na_values=[""]):
+                valid, rejected = VALIDATORS[source_name](batch)
+                if not rejected.empty:
+                    rejected.to_csv(reject_path, mode="a", header=(result.rows_rejected == 0), index=False)
+                    result.rows_rejected += len(rejected)
+                if not valid.empty:
+                    copy_dataframe(cursor, valid[copy_columns], source.table)
+                    result.rows_loaded += len(valid)
+                    loaded_dates.update(valid[source.date_column].unique())
+            # The rows' ingestion timestamps predate this commit and can fall
+            # behind the watermark, so queue the days with the rows
+            queue_partitions(cursor, source, loaded_dates)
+        connection.commit()
+    except Exception as e:
+        connection.rollback()
+        result.rows_loaded = 0
+        result.error = str(e).strip()
+        logger.error(traceback.format_exc())
+    finally:
+        connection.close()
+
+    result.duration_seconds = time.perf_counter() - start_time
+    return result
+
+
+def ingest(source_name: str, paths: List[str], workers: int = 4, replace: bool = False,
+           batch_size: int = 50_000, reject_dir: Optional[str] = None) -> List[PartitionResult]:
+    """
+    Ingest source files month by month across a process pool.
+
+    Args:
+        source_name: Key of SOURCES
+        paths: Source files
+        workers: Number of worker processes (one connection each)
+        replace: Delete the rows already loaded for each month first
+        batch_size: Rows validated and copied per batch
+        reject_dir: Where to keep rejected rows (default: next to the first file)
+
+    Returns:
+        One PartitionResult per month
+    """
+    source = SOURCES[source_name]
+    spool_dir = tempfile.mkdtemp(prefix=f"ingest_{source_name}_")
+    reject_dir = reject_dir or os.path.dirname(os.path.abspath(paths[0]))
+    run_start = time.perf_counter()
+    results: List[PartitionResult] = []
+    try:
+        partitions = spool_by_month(source, paths, spool_dir)
+        total_rows = sum(count for _, count in partitions.values())
+        logger.info(f"Read {total_rows} rows in {time.perf_counter() - run_start:.1f} seconds, "
+                    f"{len(partitions)} monthly partitions")
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(load_partition, source_name, month, spool_path, replace, batch_size): month
+                for month, (spool_path, _) in sorted(partitions.items())
+            }
+            for future in as_completed(futures):
+                result = future.result()
+                results.append(result)
+                rate = result.rows_loaded / result.duration_seconds if result.duration_seconds else 0
+                if result.error:
+                    logger.error(f"{result.month}: failed after {result.duration_seconds:.1f}s: {result.error}")
+                else:
+                    logger.info(f"{result.month}: {result.rows_loaded} rows loaded, {result.rows_rejected} rejected "
+                                f"in {result.duration_seconds:.1f}s ({rate:,.0f} rows/sec)")
+
+        # Keep the reject files, drop the spool
+        for name in os.listdir(spool_dir):
+            if name.endswith(".rejected.csv"):
+                target = os.path.join(reject_dir, f"{source_name}_{name}")
+                shutil.move(os.path.join(spool_dir, name), target)
+                logger.info(f"Rejected rows written to {target}")
+    finally:
+        shutil.rmtree(spool_dir, ignore_errors=True)
+
+    elapsed = time.perf_counter() - run_start
+    loaded = sum(r.rows_loaded for r in results)
+    rejected = sum(r.rows_rejected for r in results)
+    logger.info(f"Loaded {loaded} rows into {source.table} ({rejected} rejected, "
+                f"{sum(1 for r in results if r.error)} months failed) in {elapsed:.1f} seconds: "
+                f"{loaded / elapsed if elapsed else 0:,.0f} rows/sec")
+    return sorted(results, key=lambda r: r.month)
+
+
+def parse_arguments():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description='Bulk-load source extracts into the data lake with COPY.')
+    parser.add_argument('source', choices=sorted(SOURCES), help='Type of the source files')
+    parser.add_argument('paths', nargs='+', help='Source files (CSV for mastercard, JSON/JSONL for aoi)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 4,
+                        help='Worker processes loading months in parallel (default: CPU count)')
+    parser.add_argument('--batch-size', type=int, default=50_000,
+                        help='Rows validated and copied per batch (default: 50000)')
+    parser.add_argument('--replace', action='store_true',
+                        help='Replace the rows already loaded for each month in the files')
+    parser.add_argument('--reject-dir', help='Directory for rejected rows (default: next to the input)')
+    return parser.parse_args()
+
+
+def main():
+    """Main function to run the ingestion"""
+    args = parse_arguments()
+    missing = [p for p in args.paths if not os.path.isfile(p)]
+    if missing:
+        logger.error(f"Input files not found: {', '.join(missing)}")
+        sys.exit(1)
+
+    try:
+        results = ingest(args.source, args.paths, workers=args.workers, replace=args.replace,
+                         batch_size=args.batch_size, reject_dir=args.reject_dir)
+    except Exception as e:
+        logger.error(f"Ingestion failed: {e}")
+        logger.error(traceback.format_exc())
+        sys.exit(1)
+
+    if any(r.error for r in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -87,6 +87,7 @@ WITH DATA;
 """
 
 INDEX_REGION_SUMMARY_SQL = """
+CREATE UNIQUE INDEX IF NOT EXISTS uq_region_summary_key ON geo_insights.region_summary(geo_type, geo_name);
 CREATE INDEX IF NOT EXISTS idx_region_summary_name ON geo_insights.region_summary(geo_name);
 CREATE INDEX IF NOT EXISTS idx_region_summary_type ON geo_insights.region_summary(geo_type);
 CREATE INDEX IF NOT EXISTS idx_region_summary_id ON geo_insights.region_summary(region_id);
@@ -126,6 +127,7 @@ WITH DATA;
 """
 
 INDEX_REGION_HOTSPOTS_SQL = """
+CREATE UNIQUE INDEX IF NOT EXISTS uq_region_hotspots_key ON geo_insights.region_hotspots(geo_type, geo_name, latitude, longitude, industry);
 CREATE INDEX IF NOT EXISTS idx_region_hotspots_id ON geo_insights.region_hotspots(region_id);
 CREATE INDEX IF NOT EXISTS idx_region_hotspots_industry ON geo_insights.region_hotspots(industry);
 """
@@ -158,6 +160,7 @@ WITH DATA;
 """
 
 INDEX_INDUSTRY_INSIGHTS_SQL = """
+CREATE UNIQUE INDEX IF NOT EXISTS uq_industry_insights_key ON geo_insights.industry_insights(geo_type, geo_name, industry);
 CREATE INDEX IF NOT EXISTS idx_industry_insights_id ON geo_insights.industry_insights(region_id);
 CREATE INDEX IF NOT EXISTS idx_industry_insights_industry ON geo_insights.industry_insights(industry);
 CREATE INDEX IF NOT EXISTS idx_industry_insights_rank ON geo_insights.industry_insights(industry_rank);
@@ -206,6 +209,8 @@ WITH DATA;
 """
 
 INDEX_SPATIAL_PATTERNS_SQL = """
+CREATE UNIQUE INDEX IF NOT EXISTS uq_region_centers_key ON geo_insights.region_centers(geo_type, geo_name);
+CREATE UNIQUE INDEX IF NOT EXISTS uq_spatial_patterns_key ON geo_insights.spatial_patterns(geo_type, geo_name);
 CREATE INDEX IF NOT EXISTS idx_region_centers_id ON geo_insights.region_centers(region_id);
 CREATE INDEX IF NOT EXISTS idx_spatial_patterns_id ON geo_insights.spatial_patterns(region_id);
 """
@@ -235,22 +240,29 @@ WITH DATA;
 """
 
 INDEX_TEMPORAL_INSIGHTS_SQL = """
+CREATE UNIQUE INDEX IF NOT EXISTS uq_temporal_insights_key ON geo_insights.temporal_insights(geo_type, geo_name, year, month);
 CREATE INDEX IF NOT EXISTS idx_temporal_insights_id ON geo_insights.temporal_insights(region_id);
 CREATE INDEX IF NOT EXISTS idx_temporal_insights_month ON geo_insights.temporal_insights(month);
 CREATE INDEX IF NOT EXISTS idx_temporal_insights_year ON geo_insights.temporal_insights(year);
 """
 
+# Sequential, in-database fallback. Views are refreshed CONCURRENTLY (using the
+# uq_* unique indexes) so readers are not locked out; spatial_patterns comes
+# after region_centers, which it reads. For parallel refreshes with per-view
+# timings use app/scripts/refresh_materialized_views.py instead.
 CREATE_REFRESH_FUNCTION_SQL = """
 CREATE OR REPLACE FUNCTION geo_insights.refresh_all_views()
 RETURNS void AS $$
 BEGIN
     RAISE NOTICE 'Refreshing geo_insights views...';
-    REFRESH MATERIALIZED VIEW geo_insights.region_summary;
-    REFRESH MATERIALIZED VIEW geo_insights.region_hotspots;
-    REFRESH MATERIALIZED VIEW geo_insights.industry_insights;
-    REFRESH MATERIALIZED VIEW geo_insights.region_centers;
-    REFRESH MATERIALIZED VIEW geo_insights.spatial_patterns;
-    REFRESH MATERIALIZED VIEW geo_insights.temporal_insights;
+    REFRESH MATERIALIZED VIEW CONCURRENTLY geo_insights.region_summary;
+    REFRESH MATERIALIZED VIEW CONCURRENTLY geo_insights.region_hotspots;
+    REFRESH MATERIALIZED VIEW CONCURRENTLY geo_insights.industry_insights;
+    REFRESH MATERIALIZED VIEW CONCURRENTLY geo_insights.region_centers;
+    REFRESH MATERIALIZED VIEW CONCURRENTLY geo_insights.spatial_patterns;
+    REFRESH MATERIALIZED VIEW CONCURRENTLY geo_insights.temporal_insights;
+    REFRESH MATERIALIZED VIEW CONCURRENTLY geo_insights.combined_spatial_analysis;
+    REFRESH MATERIALIZED VIEW CONCURRENTLY geo_insights.choropleth_analytics;
     RAISE NOTICE 'Geo_insights views refreshed.';
 END;
 $$ LANGUAGE plpgsql;
@@ -349,6 +361,7 @@ WITH DATA;
 """
 
 INDEX_COMBINED_INSIGHTS_SQL = """
+CREATE UNIQUE INDEX IF NOT EXISTS uq_combined_insights_key ON geo_insights.combined_spatial_analysis(geo_type, geo_name, bounding_box, month);
 CREATE INDEX IF NOT EXISTS idx_combined_insights_geo ON geo_insights.combined_spatial_analysis(geo_type, geo_name);
 CREATE INDEX IF NOT EXISTS idx_combined_insights_bbox ON geo_insights.combined_spatial_analysis USING GIST(bounding_box::geometry);
 CREATE INDEX IF NOT EXISTS idx_combined_insights_centroid ON geo_insights.combined_spatial_analysis USING GIST(centroid);
@@ -447,6 +460,7 @@ LEFT JOIN
 
 # Add index creation for the new view
 CREATE_CHOROPLETH_ANALYTICS_INDICES = """
+CREATE UNIQUE INDEX IF NOT EXISTS uq_choropleth_key ON geo_insights.choropleth_analytics(region_name, area_ha, longitude, latitude);
 CREATE INDEX IF NOT EXISTS idx_choropleth_region_name ON geo_insights.choropleth_analytics(region_name);
 CREATE INDEX IF NOT EXISTS idx_choropleth_top_industry ON geo_insights.choropleth_analytics(top_industry);
 """
@@ -467,9 +481,9 @@ SQL_EXECUTION_ORDER = [
     ("Index Region Hotspots", INDEX_REGION_HOTSPOTS_SQL),
     ("Create Spatial Patterns", CREATE_SPATIAL_PATTERNS_SQL),
     ("Index Spatial Patterns", INDEX_SPATIAL_PATTERNS_SQL),
-    ("Create Refresh Function", CREATE_REFRESH_FUNCTION_SQL),
     ("Create Choropleth Analytics", CREATE_CHOROPLETH_ANALYTICS_SQL),
-    ("Create Choropleth Analytics Indices", CREATE_CHOROPLETH_ANALYTICS_INDICES)
+    ("Create Choropleth Analytics Indices", CREATE_CHOROPLETH_ANALYTICS_INDICES),
+    ("Create Refresh Function", CREATE_REFRESH_FUNCTION_SQL)
 ]
 
 def get_db_connection(retry_count=3, retry_delay=5):
@@ -576,13 +590,20 @@ def execute_sql_command(connection, description, sql_command, continue_on_error=
             
             # Use execute_batch for multi-statement SQL commands that might contain errors
             if ";" in sql_command and not sql_command.strip().upper().startswith("SELECT"):
-                # Split by semicolon but ignore semicolons inside quotes
+                # Split by semicolon but ignore semicolons inside quotes and
+                # $$-quoted function bodies
                 statements = []
                 current = ""
                 in_quotes = False
                 quote_char = None
+                in_dollar_quotes = False
                 
-                for char in sql_command:
+                for i, char in enumerate(sql_command):
+                    if char == "$" and not in_quotes and sql_command[i:i + 2] == "$$":
+                        in_dollar_quotes = not in_dollar_quotes
+                    if in_dollar_quotes:
+                        current += char
+                        continue
                     if char in ["'", '"'] and (not in_quotes or quote_char == char):
                         in_quotes = not in_quotes
                         if in_quotes:
@@ -0,0 +1,281 @@
+-- Typed visitor attributes extracted from the dw.fact_visitor JSON columns
+--
+-- demographics, dwell_time, top_foreign_countries and top_swiss_cantons are
+-- stored as JSON on dw.fact_visitor, so every question about gender, age,
+-- dwell time or visitor origin parses JSON for each fact row it reads. This
+-- script flattens them once, at load time, into typed and indexed side tables
+-- keyed by fact_id:
+--   dw.fact_visitor_profile       one row per fact: gender shares, average dwell time
+--   dw.fact_visitor_age_band      one row per fact and age band
+--   dw.fact_visitor_dwell_bucket  one row per fact and dwell time bucket (AOI only)
+--   dw.fact_visitor_origin        one row per fact and top foreign country / Swiss canton
+-- Each side table carries date_id, region_id and source_system, so it can be
+-- joined to dim_date and dim_region directly. The column comments are part of
+-- the schema context given to the SQL generator (app/services/schema_service.py).
+--
+-- The JSON comes in two layouts:
+--   aoi:        {"maleProportion": 0.52, "ageDistribution": [0.2, 0.3, 0.35, 0.15]}
+--               (age bands 0-19, 20-39, 40-64, 65+ as shares of the visitors)
+--   intervista: {"gender": {"male": n, "female": n},
+--                "age": {"15_29": n, "30_44": n, "45_59": n, "60_plus": n}, ...}
+--               (visitor counts)
+-- Both are stored as a share and a visitor count.
+--
+-- The incremental loader (task8_incremental_loading.sql) refreshes the facts of
+-- the partitions it reloads. After a full reload (task6, task7) run:
+--     SELECT * FROM dw.refresh_visitor_attributes();
+
+-- =============================================
+-- 1. SIDE TABLES
+-- =============================================
+
+CREATE TABLE IF NOT EXISTS dw.fact_visitor_profile (
+    fact_id INTEGER PRIMARY KEY REFERENCES dw.fact_visitor(fact_id) ON DELETE CASCADE,
+    date_id INTEGER NOT NULL,
+    region_id INTEGER NOT NULL,
+    source_system TEXT NOT NULL,
+    male_share NUMERIC(6,4),
+    female_share NUMERIC(6,4),
+    avg_dwell_time_mins NUMERIC(8,2),
+    refreshed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_fact_visitor_profile_date_region
+    ON dw.fact_visitor_profile(date_id, region_id);
+
+COMMENT ON TABLE dw.fact_visitor_profile IS
+'Typed demographics of dw.fact_visitor, one row per fact_id. Use instead of parsing fact_visitor.demographics / dwell_time JSON.';
+COMMENT ON COLUMN dw.fact_visitor_profile.male_share IS 'Share of male visitors (0-1)';
+COMMENT ON COLUMN dw.fact_visitor_profile.female_share IS 'Share of female visitors (0-1)';
+COMMENT ON COLUMN dw.fact_visitor_profile.avg_dwell_time_mins IS 'Average dwell time in minutes (aoi only)';
+
+CREATE TABLE IF NOT EXISTS dw.fact_visitor_age_band (
+    fact_id INTEGER NOT NULL REFERENCES dw.fact_visitor(fact_id) ON DELETE CASCADE,
+    date_id INTEGER NOT NULL,
+    region_id INTEGER NOT NULL,
+    source_system TEXT NOT NULL,
+    age_band TEXT NOT NULL,
+    sort_order SMALLINT NOT NULL,
+    share NUMERIC(6,4),
+    visitors NUMERIC,
+    PRIMARY KEY (fact_id, age_band)
+);
+CREATE INDEX IF NOT EXISTS idx_fact_visitor_age_band_date_region
+    ON dw.fact_visitor_age_band(date_id, region_id);
+CREATE INDEX IF NOT EXISTS idx_fact_visitor_age_band_band
+    ON dw.fact_visitor_age_band(age_band, date_id);
+
+COMMENT ON TABLE dw.fact_visitor_age_band IS
+'Visitors per age band, one row per fact_id and band. Use SUM(visitors) for counts.';
+COMMENT ON COLUMN dw.fact_visitor_age_band.age_band IS
+'Age band: 0-19, 20-39, 40-64, 65+ (source_system aoi) or 15-29, 30-44, 45-59, 60+ (intervista)';
+COMMENT ON COLUMN dw.fact_visitor_age_band.share IS 'Share of the fact''s visitors in this band (0-1)';
+COMMENT ON COLUMN dw.fact_visitor_age_band.visitors IS 'Visitors in this band';
+
+CREATE TABLE IF NOT EXISTS dw.fact_visitor_dwell_bucket (
+    fact_id INTEGER NOT NULL REFERENCES dw.fact_visitor(fact_id) ON DELETE CASCADE,
+    date_id INTEGER NOT NULL,
+    region_id INTEGER NOT NULL,
+    source_system TEXT NOT NULL,
+    dwell_bucket TEXT NOT NULL,
+    sort_order SMALLINT NOT NULL,
+    visitors NUMERIC,
+    PRIMARY KEY (fact_id, dwell_bucket)
+);
+CREATE INDEX IF NOT EXISTS idx_fact_visitor_dwell_bucket_date_region
+    ON dw.fact_visitor_dwell_bucket(date_id, region_id);
+
+COMMENT ON TABLE dw.fact_visitor_dwell_bucket IS
+'Visitors per dwell time bucket, one row per fact_id and bucket (aoi only).';
+COMMENT ON COLUMN dw.fact_visitor_dwell_bucket.dwell_bucket IS
+'Dwell time: 0.5-1h, 1-2h, 2-3h, 3-4h, 4-5h, 5-6h, 6-7h, 7-8h, 8-24h (order by sort_order)';
+
+CREATE TABLE IF NOT EXISTS dw.fact_visitor_origin (
+    fact_id INTEGER NOT NULL REFERENCES dw.fact_visitor(fact_id) ON DELETE CASCADE,
+    date_id INTEGER NOT NULL,
+    region_id INTEGER NOT NULL,
+    source_system TEXT NOT NULL,
+    origin_type TEXT NOT NULL,
+    origin_name TEXT NOT NULL,
+    origin_rank SMALLINT NOT NULL,
+    visitors NUMERIC,
+    PRIMARY KEY (fact_id, origin_type, origin_name)
+);
+CREATE INDEX IF NOT EXISTS idx_fact_visitor_origin_date_region
+    ON dw.fact_visitor_origin(date_id, region_id);
+CREATE INDEX IF NOT EXISTS idx_fact_visitor_origin_name
+    ON dw.fact_visitor_origin(origin_type, origin_name, date_id);
+
+COMMENT ON TABLE dw.fact_visitor_origin IS
+'Top origins of the visitors, one row per fact_id and origin. Use instead of parsing top_foreign_countries / top_swiss_cantons JSON.';
+COMMENT ON COLUMN dw.fact_visitor_origin.origin_type IS '''foreign_country'' or ''swiss_canton''';
+COMMENT ON COLUMN dw.fact_visitor_origin.origin_name IS 'Country or canton name';
+COMMENT ON COLUMN dw.fact_visitor_origin.origin_rank IS 'Position in the fact''s top list (1 = most visitors)';
+
+-- =============================================
+-- 2. EXTRACTION
+-- =============================================
+
+-- Re-extract the attributes of all facts (p_dates NULL) or of the facts on the given days
+CREATE OR REPLACE FUNCTION dw.refresh_visitor_attributes(
+    p_dates DATE[] DEFAULT NULL
+)
+RETURNS TABLE (
+    side_table TEXT,
+    rows_written INTEGER
+) AS $$
+DECLARE
+    v_date_ids INTEGER[];
+    v_count INTEGER;
+BEGIN
+    IF p_dates IS NOT NULL THEN
+        SELECT array_agg(DISTINCT TO_CHAR(d, 'YYYYMMDD')::INTEGER)
+        INTO v_date_ids
+        FROM unnest(p_dates) AS d;
+    END IF;
+
+    -- Facts to refresh, with the JSON columns cast once
+    CREATE TEMP TABLE temp_visitor_attributes ON COMMIT DROP AS
+    SELECT
+        f.fact_id,
+        f.date_id,
+        f.region_id,
+        f.source_system,
+        f.total_visitors,
+        f.demographics::JSONB AS demographics,
+        f.dwell_time::JSONB AS dwell_time,
+        f.raw_content::JSONB -> 'dwelltimes' AS dwelltimes,
+        f.top_foreign_countries::JSONB AS top_foreign_countries,
+        f.top_swiss_cantons::JSONB AS top_swiss_cantons
+    FROM dw.fact_visitor f
+    WHERE v_date_ids IS NULL OR f.date_id = ANY(v_date_ids);
+
+    DELETE FROM dw.fact_visitor_profile p
+    USING temp_visitor_attributes t WHERE p.fact_id = t.fact_id;
+    DELETE FROM dw.fact_visitor_age_band a
+    USING temp_visitor_attributes t WHERE a.fact_id = t.fact_id;
+    DELETE FROM dw.fact_visitor_dwell_bucket b
+    USING temp_visitor_attributes t WHERE b.fact_id = t.fact_id;
+    DELETE FROM dw.fact_visitor_origin o
+    USING temp_visitor_attributes t WHERE o.fact_id = t.fact_id;
+
+    -- Profile
+    INSERT INTO dw.fact_visitor_profile (
+        fact_id, date_id, region_id, source_system, male_share, female_share, avg_dwell_time_mins
+    )
+    SELECT
+        t.fact_id, t.date_id, t.region_id, t.source_system,
+        g.male_share,
+        1 - g.male_share,
+        (t.dwell_time->>'avg_dwell_time_mins')::NUMERIC
+    FROM temp_visitor_attributes t
+    CROSS JOIN LATERAL (
+        SELECT CASE
+            WHEN t.demographics ? 'maleProportion'
+                THEN (t.demographics->>'maleProportion')::NUMERIC
+            WHEN t.demographics ? 'gender'
+                THEN (t.demographics->'gender'->>'male')::NUMERIC /
+                     NULLIF((t.demographics->'gender'->>'male')::NUMERIC +
+                            (t.demographics->'gender'->>'female')::NUMERIC, 0)
+        END AS male_share
+    ) g;
+    GET DIAGNOSTICS v_count = ROW_COUNT;
+    RETURN QUERY SELECT 'dw.fact_visitor_profile'::TEXT, v_count;
+
+    -- Age bands: shares for aoi, counts for intervista
+    INSERT INTO dw.fact_visitor_age_band (
+        fact_id, date_id, region_id, source_system, age_band, sort_order, share, visitors
+    )
+    SELECT
+        t.fact_id, t.date_id, t.region_id, t.source_system,
+        (ARRAY['0-19', '20-39', '40-64', '65+'])[a.ordinality],
+        a.ordinality,
+        a.value::NUMERIC,
+        a.value::NUMERIC * t.total_visitors
+    FROM temp_visitor_attributes t
+    CROSS JOIN LATERAL jsonb_array_elements_text(t.demographics->'ageDistribution') WITH ORDINALITY AS a(value, ordinality)
+    WHERE jsonb_typeof(t.demographics->'ageDistribution') = 'array'
+      AND a.ordinality <= 4
+    UNION ALL
+    SELECT
+        t.fact_id, t.date_id, t.region_id, t.source_system,
+        bands.age_band,
+        bands.sort_order,
+        (t.demographics->'age'->>bands.json_key)::NUMERIC /
+            NULLIF(SUM((t.demographics->'age'->>bands.json_key)::NUMERIC) OVER (PARTITION BY t.fact_id), 0),
+        (t.demographics->'age'->>bands.json_key)::NUMERIC
+    FROM temp_visitor_attributes t
+    CROSS JOIN (VALUES
+        ('15_29', '15-29', 1),
+        ('30_44', '30-44', 2),
+        ('45_59', '45-59', 3),
+        ('60_plus', '60+', 4)
+    ) AS bands(json_key, age_band, sort_order)
+    WHERE jsonb_typeof(t.demographics->'age') = 'object';
+    GET DIAGNOSTICS v_count = ROW_COUNT;
+    RETURN QUERY SELECT 'dw.fact_visitor_age_band'::TEXT, v_count;
+
+    -- Dwell time buckets, same ranges as data_lake.visitor_dwell_time
+    INSERT INTO dw.fact_visitor_dwell_bucket (
+        fact_id, date_id, region_id, source_system, dwell_bucket, sort_order, visitors
+    )
+    SELECT
+        t.fact_id, t.date_id, t.region_id, t.source_system,
+        (ARRAY['0.5-1h', '1-2h', '2-3h', '3-4h', '4-5h', '5-6h', '6-7h', '7-8h', '8-24h'])[d.ordinality],
+        d.ordinality,
+        d.value::NUMERIC
+    FROM temp_visitor_attributes t
+    CROSS JOIN LATERAL jsonb_array_elements_text(t.dwelltimes) WITH ORDINALITY AS d(value, ordinality)
+    WHERE jsonb_typeof(t.dwelltimes) = 'array'
+      AND d.ordinality <= 9;
+    GET DIAGNOSTICS v_count = ROW_COUNT;
+    RETURN QUERY SELECT 'dw.fact_visitor_dwell_bucket'::TEXT, v_count;
+
+    -- Top origins; a name listed twice in one fact keeps its best rank
+    INSERT INTO dw.fact_visitor_origin (
+        fact_id, date_id, region_id, source_system, origin_type, origin_name, origin_rank, visitors
+    )
+    SELECT DISTINCT ON (fact_id, origin_type, origin_name)
+        fact_id, date_id, region_id, source_system, origin_type, origin_name, origin_rank, visitors
+    FROM (
+        SELECT
+            t.fact_id, t.date_id, t.region_id, t.source_system,
+            'foreign_country' AS origin_type,
+            COALESCE(e.value->>'country', e.value->>'name') AS origin_name,
+            e.ordinality::SMALLINT AS origin_rank,
+            (e.value->>'visitors')::NUMERIC AS visitors
+        FROM temp_visitor_attributes t
+        CROSS JOIN LATERAL jsonb_array_elements(t.top_foreign_countries) WITH ORDINALITY AS e(value, ordinality)
+        WHERE jsonb_typeof(t.top_foreign_countries) = 'array'
+        UNION ALL
+        SELECT
+            t.fact_id, t.date_id, t.region_id, t.source_system,
+            'swiss_canton',
+            COALESCE(e.value->>'canton', e.value->>'name'),
+            e.ordinality::SMALLINT,
+            (e.value->>'visitors')::NUMERIC
+        FROM temp_visitor_attributes t
+        CROSS JOIN LATERAL jsonb_array_elements(t.top_swiss_cantons) WITH ORDINALITY AS e(value, ordinality)
+        WHERE jsonb_typeof(t.top_swiss_cantons) = 'array'
+    ) origins
+    WHERE origin_name IS NOT NULL
+    ORDER BY fact_id, origin_type, origin_name, origin_rank;
+    GET DIAGNOSTICS v_count = ROW_COUNT;
+    RETURN QUERY SELECT 'dw.fact_visitor_origin'::TEXT, v_count;
+
+    DROP TABLE temp_visitor_attributes;
+END;
+$$ LANGUAGE plpgsql;
+
+COMMENT ON FUNCTION dw.refresh_visitor_attributes(DATE[]) IS
+'Extracts the demographics, dwell time and top origin JSON of dw.fact_visitor into typed side tables.
+Example usage:
+SELECT * FROM dw.refresh_visitor_attributes();                               -- all facts
+SELECT * FROM dw.refresh_visitor_attributes(ARRAY[''2023-07-14''::DATE]);   -- facts of one day';
+
+-- Initial extraction
+SELECT * FROM dw.refresh_visitor_attributes();
+
+ANALYZE dw.fact_visitor_profile;
+ANALYZE dw.fact_visitor_age_band;
+ANALYZE dw.fact_visitor_dwell_bucket;
+ANALYZE dw.fact_visitor_origin;
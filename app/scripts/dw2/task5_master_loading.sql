@@ -704,4 +704,13 @@ ORDER BY batch_id DESC, COUNT(*) DESC;
 -- Show summary of latest load including unmapped records
 SELECT * FROM dw.vw_unmapped_records_summary 
 WHERE batch_id = (SELECT MAX(batch_id) FROM dw.unmapped_records_history)
-LIMIT 10;
\ No newline at end of file
+LIMIT 10;
+
+-- Rebuild the spending rollups (task9_rollup_tables.sql) after the full load
+DO $$
+BEGIN
+    IF to_regproc('dw.refresh_rollups') IS NOT NULL THEN
+        PERFORM dw.refresh_rollups('fact_spending');
+        RAISE NOTICE 'Spending rollups rebuilt';
+    END IF;
+END $$;
@@ -211,6 +211,17 @@ BEGIN
                 RAISE WARNING 'Error processing batch: % (%)', SQLERRM, SQLSTATE;
         END;
     END LOOP;
+
+    -- Rebuild the visitor rollups (task9_rollup_tables.sql) and typed attributes
+    -- (task10_visitor_attributes.sql) from the loaded rows
+    IF v_processed > 0 AND to_regproc('dw.refresh_rollups') IS NOT NULL THEN
+        PERFORM dw.refresh_rollups('fact_visitor');
+        RAISE NOTICE 'Visitor rollups rebuilt';
+    END IF;
+    IF v_processed > 0 AND to_regproc('dw.refresh_visitor_attributes') IS NOT NULL THEN
+        PERFORM dw.refresh_visitor_attributes();
+        RAISE NOTICE 'Visitor attributes extracted';
+    END IF;
     
     v_end_time := CURRENT_TIMESTAMP;
 
@@ -237,6 +248,9 @@ The function takes three parameters:
 - p_end_date: End date (inclusive)
 - p_batch_size: Number of records to process in each batch
 
+The visitor rollups and typed attributes are rebuilt afterwards when
+task9_rollup_tables.sql and task10_visitor_attributes.sql are installed.
+
 Returns a table with:
 - status: SUCCESS, PARTIAL, or FAILED
 - records_processed: Number of records successfully processed
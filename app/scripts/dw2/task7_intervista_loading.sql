@@ -293,4 +293,18 @@ GROUP BY
     dr.region_name,
     dr.region_type
 ORDER BY 
-    year, month, dr.region_name;
\ No newline at end of file
+    year, month, dr.region_name;
+
+-- Rebuild the visitor rollups (task9_rollup_tables.sql) and typed attributes
+-- (task10_visitor_attributes.sql) after the full load
+DO $$
+BEGIN
+    IF to_regproc('dw.refresh_rollups') IS NOT NULL THEN
+        PERFORM dw.refresh_rollups('fact_visitor');
+        RAISE NOTICE 'Visitor rollups rebuilt';
+    END IF;
+    IF to_regproc('dw.refresh_visitor_attributes') IS NOT NULL THEN
+        PERFORM dw.refresh_visitor_attributes();
+        RAISE NOTICE 'Visitor attributes extracted';
+    END IF;
+END $$;
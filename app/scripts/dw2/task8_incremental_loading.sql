@@ -0,0 +1,571 @@
+-- Incremental (watermark-based) loading of dw.fact_spending and dw.fact_visitor
+--
+-- task5_master_loading.sql and task6_load_aoi_days.sql rebuild the facts from the
+-- whole data_lake history. This script sets up an incremental path instead:
+--   1. dw.etl_watermark keeps a high-water mark per source on the ingestion
+--      timestamp of the staging rows (ingestion_timestamp, falling back to load_date)
+--   2. dw.plan_incremental_load() queues the date partitions touched by rows
+--      ingested after the mark in dw.etl_pending_partition and advances the mark
+--   3. dw.process_pending_partitions() recomputes a handful of queued partitions,
+--      upserts them into the fact table and removes them from the queue
+-- Every step commits on its own, so a failed run leaves the remaining partitions
+-- in the queue and the next run resumes from there. The driver is
+-- app/scripts/incremental_dw_load.py.
+
+-- =============================================
+-- 1. WATERMARK AND WORK QUEUE
+-- =============================================
+
+CREATE TABLE IF NOT EXISTS dw.etl_watermark (
+    source_system VARCHAR(50) PRIMARY KEY,
+    source_table TEXT NOT NULL,
+    high_water_mark TIMESTAMP NOT NULL DEFAULT '-infinity',
+    last_batch_id INTEGER,
+    last_run_at TIMESTAMP,
+    rows_loaded BIGINT NOT NULL DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+DROP TRIGGER IF EXISTS update_timestamp_etl_watermark ON dw.etl_watermark;
+CREATE TRIGGER update_timestamp_etl_watermark
+BEFORE UPDATE ON dw.etl_watermark
+FOR EACH ROW
+EXECUTE FUNCTION dw.update_timestamp();
+
+INSERT INTO dw.etl_watermark (source_system, source_table)
+VALUES
+    ('mastercard', 'data_lake.master_card'),
+    ('aoi', 'data_lake.aoi_days_raw')
+ON CONFLICT (source_system) DO NOTHING;
+
+-- Date partitions that still have to be (re)loaded
+CREATE TABLE IF NOT EXISTS dw.etl_pending_partition (
+    source_system VARCHAR(50) NOT NULL REFERENCES dw.etl_watermark(source_system),
+    partition_date DATE NOT NULL,
+    queued_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (source_system, partition_date)
+);
+
+-- =============================================
+-- 2. STAGING AND FACT TABLE PREREQUISITES
+-- =============================================
+
+-- master_card has no ingestion timestamp yet. Existing rows all get the time of
+-- this migration, so the first incremental run loads the full history once.
+ALTER TABLE data_lake.master_card
+    ADD COLUMN IF NOT EXISTS ingestion_timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP;
+
+CREATE INDEX IF NOT EXISTS idx_master_card_ingestion_ts ON data_lake.master_card(ingestion_timestamp);
+CREATE INDEX IF NOT EXISTS idx_master_card_txn_date ON data_lake.master_card(txn_date);
+CREATE INDEX IF NOT EXISTS idx_aoi_days_raw_ingestion_ts
+    ON data_lake.aoi_days_raw((COALESCE(ingestion_timestamp, load_date::TIMESTAMP)));
+CREATE INDEX IF NOT EXISTS idx_aoi_days_raw_aoi_date ON data_lake.aoi_days_raw(aoi_date);
+
+-- Business key used by the fact_visitor upsert (same key as task6)
+CREATE UNIQUE INDEX IF NOT EXISTS uq_fact_visitor_business_key
+    ON dw.fact_visitor(date_id, region_id, source_system);
+
+-- =============================================
+-- 3. PLANNING: QUEUE PARTITIONS INGESTED SINCE THE WATERMARK
+-- =============================================
+
+CREATE OR REPLACE FUNCTION dw.plan_incremental_load(
+    p_source_system VARCHAR,
+    p_settle_time INTERVAL DEFAULT '5 minutes'
+)
+RETURNS TABLE (
+    partitions_queued INTEGER,
+    previous_mark TIMESTAMP,
+    new_mark TIMESTAMP
+) AS $$
+DECLARE
+    v_previous TIMESTAMP;
+    v_new TIMESTAMP;
+    v_cutoff TIMESTAMP := LOCALTIMESTAMP - p_settle_time;
+    v_queued INTEGER := 0;
+BEGIN
+    -- Lock the watermark row so two loaders cannot plan the same source at once
+    SELECT high_water_mark INTO v_previous
+    FROM dw.etl_watermark
+    WHERE source_system = p_source_system
+    FOR UPDATE;
+
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'Unknown source system for incremental load: %', p_source_system;
+    END IF;
+
+    -- Only take rows older than the settle time: an ingestion transaction that is
+    -- still running can commit rows stamped below the current time, and those must
+    -- not end up below the new mark.
+    IF p_source_system = 'mastercard' THEN
+        SELECT MAX(ingestion_timestamp) INTO v_new
+        FROM data_lake.master_card
+        WHERE ingestion_timestamp > v_previous
+          AND ingestion_timestamp <= v_cutoff;
+
+        INSERT INTO dw.etl_pending_partition (source_system, partition_date)
+        SELECT DISTINCT p_source_system, txn_date
+        FROM data_lake.master_card
+        WHERE ingestion_timestamp > v_previous
+          AND ingestion_timestamp <= v_cutoff
+          AND txn_date IS NOT NULL
+        ON CONFLICT (source_system, partition_date) DO NOTHING;
+    ELSIF p_source_system = 'aoi' THEN
+        SELECT MAX(COALESCE(ingestion_timestamp, load_date::TIMESTAMP)) INTO v_new
+        FROM data_lake.aoi_days_raw
+        WHERE COALESCE(ingestion_timestamp, load_date::TIMESTAMP) > v_previous
+          AND COALESCE(ingestion_timestamp, load_date::TIMESTAMP) <= v_cutoff;
+
+        INSERT INTO dw.etl_pending_partition (source_system, partition_date)
+        SELECT DISTINCT p_source_system, aoi_date
+        FROM data_lake.aoi_days_raw
+        WHERE COALESCE(ingestion_timestamp, load_date::TIMESTAMP) > v_previous
+          AND COALESCE(ingestion_timestamp, load_date::TIMESTAMP) <= v_cutoff
+          AND aoi_date IS NOT NULL
+        ON CONFLICT (source_system, partition_date) DO NOTHING;
+    ELSE
+        RAISE EXCEPTION 'No incremental loader for source system: %', p_source_system;
+    END IF;
+
+    GET DIAGNOSTICS v_queued = ROW_COUNT;
+
+    -- The mark and the queue entries commit together, so no delta is lost
+    v_new := COALESCE(v_new, v_previous);
+    UPDATE dw.etl_watermark
+    SET high_water_mark = v_new,
+        last_run_at = CURRENT_TIMESTAMP
+    WHERE source_system = p_source_system;
+
+    RETURN QUERY SELECT v_queued, v_previous, v_new;
+END;
+$$ LANGUAGE plpgsql;
+
+-- =============================================
+-- 4. PARTITION LOADERS
+-- =============================================
+
+-- Recompute dw.fact_spending for the given days from data_lake.master_card.
+-- Same mapping rules as task5_master_loading.sql, restricted to the given days.
+CREATE OR REPLACE FUNCTION dw.load_spending_partitions(
+    p_dates DATE[],
+    p_batch_id INTEGER
+)
+RETURNS TABLE (
+    rows_upserted INTEGER,
+    rows_deleted INTEGER
+) AS $$
+DECLARE
+    v_upserted INTEGER := 0;
+    v_deleted INTEGER := 0;
+    v_date_ids INTEGER[];
+BEGIN
+    SELECT array_agg(TO_CHAR(d, 'YYYYMMDD')::INTEGER) INTO v_date_ids
+    FROM unnest(p_dates) AS d;
+
+    DROP TABLE IF EXISTS temp_incremental_spending_source;
+    CREATE TEMP TABLE temp_incremental_spending_source ON COMMIT DROP AS
+    SELECT
+        txn_date,
+        industry,
+        geo_name,
+        geo_type,
+        central_latitude,
+        central_longitude,
+        txn_amt,
+        txn_cnt
+    FROM data_lake.master_card
+    WHERE txn_date = ANY(p_dates);
+
+    -- Add industries first seen in these partitions
+    INSERT INTO dw.dim_industry (
+        industry_code,
+        industry_name,
+        industry_category,
+        is_active,
+        created_at,
+        updated_at
+    )
+    SELECT
+        'MC_' || SUBSTRING(UPPER(REPLACE(REPLACE(REPLACE(di.industry, ' ', '_'), '-', '_'), '&', 'AND')), 1, 16),
+        di.industry,
+        di.industry,
+        TRUE,
+        CURRENT_TIMESTAMP,
+        CURRENT_TIMESTAMP
+    FROM (SELECT DISTINCT industry FROM temp_incremental_spending_source WHERE industry IS NOT NULL) di
+    WHERE NOT EXISTS (
+        SELECT 1
+        FROM dw.dim_industry existing
+        WHERE LOWER(existing.industry_name) = LOWER(di.industry)
+    )
+    ON CONFLICT (industry_code) DO NOTHING;
+
+    -- Add regions first seen in these partitions (cantons before cities, so
+    -- cities that share a canton's name get the ' City' suffix as in task5)
+    DROP TABLE IF EXISTS temp_incremental_regions;
+    CREATE TEMP TABLE temp_incremental_regions ON COMMIT DROP AS
+    SELECT
+        geo_name,
+        geo_type,
+        CASE
+            WHEN geo_type IN ('State', 'Province') THEN 'canton'
+            WHEN geo_type = 'Msa' THEN 'city'
+            WHEN geo_type = 'Country' THEN 'country'
+            WHEN geo_type = 'Region' THEN 'tourism_region'
+            ELSE 'district'
+        END AS region_type,
+        AVG(central_latitude) AS central_latitude,
+        AVG(central_longitude) AS central_longitude
+    FROM temp_incremental_spending_source
+    GROUP BY geo_name, geo_type;
+
+    INSERT INTO dw.dim_region (region_name, region_type, latitude, longitude, is_active, created_at)
+    SELECT DISTINCT ON (LOWER(r.geo_name), r.region_type)
+        r.geo_name, r.region_type, r.central_latitude, r.central_longitude, TRUE, CURRENT_TIMESTAMP
+    FROM temp_incremental_regions r
+    WHERE r.region_type <> 'city'
+      AND NOT EXISTS (
+        SELECT 1 FROM dw.dim_region dr
+        WHERE LOWER(dr.region_name) = LOWER(r.geo_name)
+          AND dr.region_type = r.region_type
+    )
+    ON CONFLICT (region_name, region_type) DO NOTHING;
+
+    INSERT INTO dw.dim_region (region_name, region_type, latitude, longitude, is_active, created_at)
+    SELECT
+        CASE
+            WHEN EXISTS (
+                SELECT 1 FROM dw.dim_region dr
+                WHERE LOWER(dr.region_name) = LOWER(r.geo_name)
+                  AND dr.region_type = 'canton'
+            ) THEN r.geo_name || ' City'
+            ELSE r.geo_name
+        END,
+        r.region_type, r.central_latitude, r.central_longitude, TRUE, CURRENT_TIMESTAMP
+    FROM temp_incremental_regions r
+    WHERE r.region_type = 'city'
+      AND NOT EXISTS (
+        SELECT 1 FROM dw.dim_region dr
+        WHERE (LOWER(dr.region_name) = LOWER(r.geo_name) OR
+               LOWER(dr.region_name) = LOWER(r.geo_name || ' City'))
+          AND dr.region_type = 'city'
+    )
+    ON CONFLICT (region_name, region_type) DO NOTHING;
+
+    -- Aggregate the partitions with the same grain as task5 (day x industry x region)
+    DROP TABLE IF EXISTS temp_incremental_spending;
+    CREATE TEMP TABLE temp_incremental_spending ON COMMIT DROP AS
+    SELECT
+        TO_CHAR(mc.txn_date, 'YYYYMMDD')::INTEGER AS date_id,
+        im.industry_id,
+        rm.region_id,
+        ROUND(SUM(mc.txn_cnt))::INTEGER AS transaction_count,
+        ROUND(SUM(mc.txn_amt)::NUMERIC, 2) AS total_amount,
+        CASE WHEN SUM(mc.txn_cnt) > 0
+             THEN ROUND((SUM(mc.txn_amt) / SUM(mc.txn_cnt))::NUMERIC, 2)
+             ELSE 0
+        END AS avg_transaction,
+        AVG(mc.central_latitude) AS geo_latitude,
+        AVG(mc.central_longitude) AS geo_longitude
+    FROM temp_incremental_spending_source mc
+    INNER JOIN (
+        SELECT DISTINCT ON (LOWER(industry_name)) industry_id, LOWER(industry_name) AS industry_key
+        FROM dw.dim_industry
+        ORDER BY LOWER(industry_name), industry_id
+    ) im ON im.industry_key = LOWER(mc.industry)
+    INNER JOIN (
+        SELECT DISTINCT ON (r.geo_name, r.geo_type) dr.region_id, r.geo_name, r.geo_type
+        FROM temp_incremental_regions r
+        JOIN dw.dim_region dr ON dr.region_type = r.region_type
+         AND (LOWER(dr.region_name) = LOWER(r.geo_name)
+              OR (r.region_type = 'city' AND LOWER(dr.region_name) = LOWER(r.geo_name || ' City')))
+        ORDER BY r.geo_name, r.geo_type, dr.region_id
+    ) rm ON rm.geo_name = mc.geo_name AND rm.geo_type = mc.geo_type
+    GROUP BY 1, 2, 3;
+
+    INSERT INTO dw.fact_spending (
+        date_id,
+        industry_id,
+        region_id,
+        transaction_count,
+        total_amount,
+        avg_transaction,
+        geo_latitude,
+        geo_longitude,
+        source_system,
+        batch_id,
+        created_at
+    )
+    SELECT
+        date_id,
+        industry_id,
+        region_id,
+        transaction_count,
+        total_amount,
+        avg_transaction,
+        geo_latitude,
+        geo_longitude,
+        'mastercard',
+        p_batch_id,
+        CURRENT_TIMESTAMP
+    FROM temp_incremental_spending
+    ON CONFLICT (date_id, region_id, industry_id, source_system)
+    DO UPDATE SET
+        transaction_count = EXCLUDED.transaction_count,
+        total_amount = EXCLUDED.total_amount,
+        avg_transaction = EXCLUDED.avg_transaction,
+        geo_latitude = EXCLUDED.geo_latitude,
+        geo_longitude = EXCLUDED.geo_longitude,
+        batch_id = EXCLUDED.batch_id
+    -- Skip rows whose values did not change, so unchanged facts are not rewritten
+    WHERE (dw.fact_spending.transaction_count, dw.fact_spending.total_amount,
+           dw.fact_spending.avg_transaction, dw.fact_spending.geo_latitude,
+           dw.fact_spending.geo_longitude)
+          IS DISTINCT FROM
+          (EXCLUDED.transaction_count, EXCLUDED.total_amount,
+           EXCLUDED.avg_transaction, EXCLUDED.geo_latitude, EXCLUDED.geo_longitude);
+
+    GET DIAGNOSTICS v_upserted = ROW_COUNT;
+
+    -- Facts of these days that no longer have source rows
+    DELETE FROM dw.fact_spending fs
+    WHERE fs.source_system = 'mastercard'
+      AND fs.date_id = ANY(v_date_ids)
+      AND NOT EXISTS (
+        SELECT 1 FROM temp_incremental_spending t
+        WHERE t.date_id = fs.date_id
+          AND t.region_id = fs.region_id
+          AND t.industry_id = fs.industry_id
+    );
+
+    GET DIAGNOSTICS v_deleted = ROW_COUNT;
+
+    RETURN QUERY SELECT v_upserted, v_deleted;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Recompute dw.fact_visitor for the given days from data_lake.aoi_days_raw.
+-- Same mapping as dw.load_aoi_days_data() in task6_load_aoi_days.sql, set-based;
+-- when a day was ingested more than once the most recent row wins.
+CREATE OR REPLACE FUNCTION dw.load_visitor_partitions(
+    p_dates DATE[],
+    p_batch_id INTEGER
+)
+RETURNS TABLE (
+    rows_upserted INTEGER,
+    rows_deleted INTEGER
+) AS $$
+DECLARE
+    v_upserted INTEGER := 0;
+    v_deleted INTEGER := 0;
+    v_bellinzona_region_id INTEGER;
+BEGIN
+    SELECT region_id INTO v_bellinzona_region_id
+    FROM dw.dim_region
+    WHERE region_name = 'Bellinzona'
+    LIMIT 1;
+
+    IF v_bellinzona_region_id IS NULL THEN
+        RAISE EXCEPTION 'Bellinzona region not found in dim_region table';
+    END IF;
+
+    DROP TABLE IF EXISTS temp_incremental_visitor;
+    CREATE TEMP TABLE temp_incremental_visitor ON COMMIT DROP AS
+    SELECT DISTINCT ON (a.aoi_date)
+        COALESCE(d.date_id, TO_CHAR(a.aoi_date, 'YYYYMMDD')::INTEGER) AS date_id,
+        a.*
+    FROM data_lake.aoi_days_raw a
+    LEFT JOIN dw.dim_date d ON d.full_date = a.aoi_date
+    WHERE a.aoi_date = ANY(p_dates)
+    ORDER BY a.aoi_date, COALESCE(a.ingestion_timestamp, a.load_date::TIMESTAMP) DESC NULLS LAST, a.id DESC;
+
+    INSERT INTO dw.fact_visitor (
+        date_id,
+        region_id,
+        source_system,
+        total_visitors,
+        swiss_tourists,
+        foreign_tourists,
+        swiss_locals,
+        swiss_commuters,
+        foreign_workers,
+        demographics,
+        dwell_time,
+        top_foreign_countries,
+        top_swiss_cantons,
+        top_municipalities,
+        top_last_cantons,
+        top_last_municipalities,
+        overnights_from_yesterday,
+        transaction_metrics,
+        raw_content,
+        data_quality_metrics,
+        created_at,
+        updated_at
+    )
+    SELECT
+        v.date_id,
+        v_bellinzona_region_id,
+        'aoi',
+        COALESCE((v.visitors->>'total')::INTEGER, 0),
+        COALESCE((v.visitors->>'swissTourist')::INTEGER, 0),
+        COALESCE((v.visitors->>'foreignTourist')::INTEGER, 0),
+        COALESCE((v.visitors->>'swissLocal')::INTEGER, 0),
+        COALESCE((v.visitors->>'swissCommuter')::INTEGER, 0),
+        COALESCE((v.visitors->>'foreignWorker')::INTEGER, 0),
+        v.demographics,
+        jsonb_build_object('avg_dwell_time_mins', dwell.avg_dwell_time),
+        v.top_foreign_countries,
+        v.top_swiss_cantons,
+        v.top_swiss_municipalities,
+        v.top_last_cantons,
+        v.top_last_municipalities,
+        v.overnights_from_yesterday,
+        jsonb_build_object(
+            'total_transactions', COALESCE((v.visitors->>'total')::INTEGER, 0),
+            'avg_transaction_amount', NULL
+        ),
+        v.raw_content,
+        jsonb_build_object(
+            'data_completeness',
+            CASE
+                WHEN v.visitors IS NOT NULL AND v.demographics IS NOT NULL
+                THEN 100 ELSE 50
+            END,
+            'last_validation', CURRENT_TIMESTAMP,
+            'batch_id', p_batch_id
+        ),
+        CURRENT_TIMESTAMP,
+        CURRENT_TIMESTAMP
+    FROM temp_incremental_visitor v
+    LEFT JOIN LATERAL (
+        -- Same bucket weights as dw.load_aoi_days_data()
+        SELECT SUM(elem::NUMERIC * CASE
+                       WHEN idx = 0 THEN 15
+                       WHEN idx = 1 THEN 30
+                       WHEN idx = 2 THEN 60
+                       WHEN idx = 3 THEN 120
+                       WHEN idx = 4 THEN 180
+                       WHEN idx = 5 THEN 240
+                       WHEN idx = 6 THEN 360
+                       ELSE 480
+                   END) / NULLIF(SUM(elem::NUMERIC), 0) AS avg_dwell_time
+        FROM jsonb_array_elements(
+            CASE WHEN jsonb_typeof(v.dwelltimes::JSONB) = 'array' THEN v.dwelltimes::JSONB ELSE '[]'::JSONB END
+        ) WITH ORDINALITY AS arr(elem, idx)
+    ) dwell ON TRUE
+    ON CONFLICT (date_id, region_id, source_system)
+    DO UPDATE SET
+        total_visitors = EXCLUDED.total_visitors,
+        swiss_tourists = EXCLUDED.swiss_tourists,
+        foreign_tourists = EXCLUDED.foreign_tourists,
+        swiss_locals = EXCLUDED.swiss_locals,
+        swiss_commuters = EXCLUDED.swiss_commuters,
+        foreign_workers = EXCLUDED.foreign_workers,
+        demographics = EXCLUDED.demographics,
+        dwell_time = EXCLUDED.dwell_time,
+        top_foreign_countries = EXCLUDED.top_foreign_countries,
+        top_swiss_cantons = EXCLUDED.top_swiss_cantons,
+        top_municipalities = EXCLUDED.top_municipalities,
+        top_last_cantons = EXCLUDED.top_last_cantons,
+        top_last_municipalities = EXCLUDED.top_last_municipalities,
+        overnights_from_yesterday = EXCLUDED.overnights_from_yesterday,
+        transaction_metrics = EXCLUDED.transaction_metrics,
+        raw_content = EXCLUDED.raw_content,
+        data_quality_metrics = EXCLUDED.data_quality_metrics,
+        updated_at = CURRENT_TIMESTAMP;
+
+    GET DIAGNOSTICS v_upserted = ROW_COUNT;
+
+    -- Facts of these days whose source rows were removed
+    DELETE FROM dw.fact_visitor fv
+    WHERE fv.source_system = 'aoi'
+      AND fv.region_id = v_bellinzona_region_id
+      AND fv.date_id IN (SELECT TO_CHAR(d, 'YYYYMMDD')::INTEGER FROM unnest(p_dates) AS d)
+      AND NOT EXISTS (SELECT 1 FROM temp_incremental_visitor t WHERE t.date_id = fv.date_id);
+
+    GET DIAGNOSTICS v_deleted = ROW_COUNT;
+
+    RETURN QUERY SELECT v_upserted, v_deleted;
+END;
+$$ LANGUAGE plpgsql;
+
+-- =============================================
+-- 5. PROCESSING: LOAD QUEUED PARTITIONS IN SMALL TRANSACTIONS
+-- =============================================
+
+CREATE OR REPLACE FUNCTION dw.process_pending_partitions(
+    p_source_system VARCHAR,
+    p_batch_id INTEGER,
+    p_max_partitions INTEGER DEFAULT 31
+)
+RETURNS TABLE (
+    partitions_loaded INTEGER,
+    rows_upserted INTEGER,
+    rows_deleted INTEGER
+) AS $$
+DECLARE
+    v_dates DATE[];
+    v_upserted INTEGER := 0;
+    v_deleted INTEGER := 0;
+BEGIN
+    -- SKIP LOCKED lets parallel workers take disjoint sets of partitions
+    SELECT array_agg(partition_date ORDER BY partition_date) INTO v_dates
+    FROM (
+        SELECT partition_date
+        FROM dw.etl_pending_partition
+        WHERE source_system = p_source_system
+        ORDER BY partition_date
+        LIMIT p_max_partitions
+        FOR UPDATE SKIP LOCKED
+    ) pending;
+
+    IF v_dates IS NULL THEN
+        RETURN QUERY SELECT 0, 0, 0;
+        RETURN;
+    END IF;
+
+    IF p_source_system = 'mastercard' THEN
+        SELECT l.rows_upserted, l.rows_deleted INTO v_upserted, v_deleted
+        FROM dw.load_spending_partitions(v_dates, p_batch_id) l;
+    ELSIF p_source_system = 'aoi' THEN
+        SELECT l.rows_upserted, l.rows_deleted INTO v_upserted, v_deleted
+        FROM dw.load_visitor_partitions(v_dates, p_batch_id) l;
+    ELSE
+        RAISE EXCEPTION 'No incremental loader for source system: %', p_source_system;
+    END IF;
+
+    -- Keep the month rollups (task9_rollup_tables.sql) in step with the facts
+    IF to_regproc('dw.refresh_rollups') IS NOT NULL THEN
+        PERFORM dw.refresh_rollups(
+            CASE p_source_system WHEN 'mastercard' THEN 'fact_spending' ELSE 'fact_visitor' END,
+            v_dates
+        );
+    END IF;
+
+    -- Typed demographics / origin side tables (task10_visitor_attributes.sql)
+    IF p_source_system = 'aoi' AND to_regproc('dw.refresh_visitor_attributes') IS NOT NULL THEN
+        PERFORM dw.refresh_visitor_attributes(v_dates);
+    END IF;
+
+    DELETE FROM dw.etl_pending_partition
+    WHERE source_system = p_source_system
+      AND partition_date = ANY(v_dates);
+
+    UPDATE dw.etl_watermark
+    SET last_batch_id = p_batch_id,
+        rows_loaded = rows_loaded + v_upserted
+    WHERE source_system = p_source_system;
+
+    RETURN QUERY SELECT array_length(v_dates, 1), v_upserted, v_deleted;
+END;
+$$ LANGUAGE plpgsql;
+
+COMMENT ON FUNCTION dw.process_pending_partitions(VARCHAR, INTEGER, INTEGER) IS
+'Loads up to p_max_partitions queued date partitions of one source into its fact table.
+Example usage:
+SELECT * FROM dw.plan_incremental_load(''mastercard'');
+SELECT * FROM dw.process_pending_partitions(''mastercard'', nextval(''dw.etl_metadata_etl_id_seq'')::INTEGER, 31);
+
+Call it repeatedly (one transaction per call) until partitions_loaded is 0.';
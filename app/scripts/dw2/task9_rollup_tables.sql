@@ -0,0 +1,240 @@
+-- Pre-aggregated rollup tables for dw.fact_visitor and dw.fact_spending
+--
+-- Most chat questions aggregate the facts at month and/or region grain. These
+-- tables hold the additive measures already summed at that grain, so such a
+-- question reads a few thousand rollup rows instead of the whole fact table.
+--
+-- Every rollup keeps a date_id that points at the first day of its month in
+-- dw.dim_date. Generated SQL that only uses month-level date attributes
+-- (year, quarter, month, month_name, season) and SUMs of the measures can
+-- therefore be answered by swapping the fact table for a rollup; the joins to
+-- dim_date, dim_region and dim_industry stay valid. The query rewriter is
+-- app/utils/rollup_router.py, which keeps the same list of rollups.
+--
+-- The rollups are maintained by dw.refresh_rollups(), which the incremental
+-- loader (task8_incremental_loading.sql) calls for the months it reloads.
+-- After a full reload (task5, task6, task7) rebuild them with:
+--     SELECT * FROM dw.refresh_rollups('fact_visitor');
+--     SELECT * FROM dw.refresh_rollups('fact_spending');
+
+-- =============================================
+-- 1. VISITOR ROLLUPS
+-- =============================================
+
+-- region x month x visitor type (the visitor types are the measure columns)
+CREATE TABLE IF NOT EXISTS dw.rollup_visitor_region_month (
+    date_id INTEGER NOT NULL,
+    region_id INTEGER,
+    source_system TEXT NOT NULL,
+    total_visitors NUMERIC,
+    swiss_tourists NUMERIC,
+    foreign_tourists NUMERIC,
+    swiss_locals NUMERIC,
+    swiss_commuters NUMERIC,
+    foreign_workers NUMERIC,
+    fact_rows INTEGER NOT NULL,
+    refreshed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE UNIQUE INDEX IF NOT EXISTS uq_rollup_visitor_region_month
+    ON dw.rollup_visitor_region_month(date_id, region_id, source_system);
+CREATE INDEX IF NOT EXISTS idx_rollup_visitor_region_month_region
+    ON dw.rollup_visitor_region_month(region_id);
+
+-- month x visitor type, all regions
+CREATE TABLE IF NOT EXISTS dw.rollup_visitor_month (
+    date_id INTEGER NOT NULL,
+    source_system TEXT NOT NULL,
+    total_visitors NUMERIC,
+    swiss_tourists NUMERIC,
+    foreign_tourists NUMERIC,
+    swiss_locals NUMERIC,
+    swiss_commuters NUMERIC,
+    foreign_workers NUMERIC,
+    fact_rows INTEGER NOT NULL,
+    refreshed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE UNIQUE INDEX IF NOT EXISTS uq_rollup_visitor_month
+    ON dw.rollup_visitor_month(date_id, source_system);
+
+-- =============================================
+-- 2. SPENDING ROLLUPS
+-- =============================================
+
+-- region x month x industry
+CREATE TABLE IF NOT EXISTS dw.rollup_spending_region_month_industry (
+    date_id INTEGER NOT NULL,
+    region_id INTEGER NOT NULL,
+    industry_id INTEGER NOT NULL,
+    source_system VARCHAR(50) NOT NULL,
+    transaction_count BIGINT,
+    total_amount NUMERIC(16,2),
+    fact_rows INTEGER NOT NULL,
+    refreshed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE UNIQUE INDEX IF NOT EXISTS uq_rollup_spending_region_month_industry
+    ON dw.rollup_spending_region_month_industry(date_id, region_id, industry_id, source_system);
+CREATE INDEX IF NOT EXISTS idx_rollup_spending_rmi_region
+    ON dw.rollup_spending_region_month_industry(region_id);
+CREATE INDEX IF NOT EXISTS idx_rollup_spending_rmi_industry
+    ON dw.rollup_spending_region_month_industry(industry_id);
+
+-- region x month, all industries
+CREATE TABLE IF NOT EXISTS dw.rollup_spending_region_month (
+    date_id INTEGER NOT NULL,
+    region_id INTEGER NOT NULL,
+    source_system VARCHAR(50) NOT NULL,
+    transaction_count BIGINT,
+    total_amount NUMERIC(16,2),
+    fact_rows INTEGER NOT NULL,
+    refreshed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE UNIQUE INDEX IF NOT EXISTS uq_rollup_spending_region_month
+    ON dw.rollup_spending_region_month(date_id, region_id, source_system);
+
+-- industry x month, all regions
+CREATE TABLE IF NOT EXISTS dw.rollup_spending_month_industry (
+    date_id INTEGER NOT NULL,
+    industry_id INTEGER NOT NULL,
+    source_system VARCHAR(50) NOT NULL,
+    transaction_count BIGINT,
+    total_amount NUMERIC(16,2),
+    fact_rows INTEGER NOT NULL,
+    refreshed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE UNIQUE INDEX IF NOT EXISTS uq_rollup_spending_month_industry
+    ON dw.rollup_spending_month_industry(date_id, industry_id, source_system);
+
+-- =============================================
+-- 3. MAINTENANCE
+-- =============================================
+
+-- Recompute the rollups of one fact table, either completely (p_months NULL)
+-- or only for the months containing the given dates.
+CREATE OR REPLACE FUNCTION dw.refresh_rollups(
+    p_fact_table TEXT,
+    p_months DATE[] DEFAULT NULL
+)
+RETURNS TABLE (
+    rollup_table TEXT,
+    rows_written INTEGER
+) AS $$
+DECLARE
+    v_month_ids INTEGER[];
+    v_count INTEGER;
+BEGIN
+    -- Loader workers refresh rollups of the same months; serialize them per fact table
+    PERFORM pg_advisory_xact_lock(hashtext('dw.refresh_rollups:' || p_fact_table));
+
+    -- date_id of the first day of every affected month
+    IF p_months IS NOT NULL THEN
+        SELECT array_agg(DISTINCT TO_CHAR(DATE_TRUNC('month', m), 'YYYYMMDD')::INTEGER)
+        INTO v_month_ids
+        FROM unnest(p_months) AS m;
+    END IF;
+
+    IF p_fact_table = 'fact_visitor' THEN
+        DELETE FROM dw.rollup_visitor_region_month
+        WHERE v_month_ids IS NULL OR date_id = ANY(v_month_ids);
+        INSERT INTO dw.rollup_visitor_region_month (
+            date_id, region_id, source_system,
+            total_visitors, swiss_tourists, foreign_tourists,
+            swiss_locals, swiss_commuters, foreign_workers, fact_rows
+        )
+        SELECT
+            (f.date_id / 100) * 100 + 1,
+            f.region_id,
+            f.source_system,
+            SUM(f.total_visitors), SUM(f.swiss_tourists), SUM(f.foreign_tourists),
+            SUM(f.swiss_locals), SUM(f.swiss_commuters), SUM(f.foreign_workers),
+            COUNT(*)
+        FROM dw.fact_visitor f
+        WHERE v_month_ids IS NULL OR (f.date_id / 100) * 100 + 1 = ANY(v_month_ids)
+        GROUP BY 1, 2, 3;
+        GET DIAGNOSTICS v_count = ROW_COUNT;
+        RETURN QUERY SELECT 'dw.rollup_visitor_region_month'::TEXT, v_count;
+
+        DELETE FROM dw.rollup_visitor_month
+        WHERE v_month_ids IS NULL OR date_id = ANY(v_month_ids);
+        INSERT INTO dw.rollup_visitor_month (
+            date_id, source_system,
+            total_visitors, swiss_tourists, foreign_tourists,
+            swiss_locals, swiss_commuters, foreign_workers, fact_rows
+        )
+        SELECT
+            date_id, source_system,
+            SUM(total_visitors), SUM(swiss_tourists), SUM(foreign_tourists),
+            SUM(swiss_locals), SUM(swiss_commuters), SUM(foreign_workers),
+            SUM(fact_rows)
+        FROM dw.rollup_visitor_region_month
+        WHERE v_month_ids IS NULL OR date_id = ANY(v_month_ids)
+        GROUP BY date_id, source_system;
+        GET DIAGNOSTICS v_count = ROW_COUNT;
+        RETURN QUERY SELECT 'dw.rollup_visitor_month'::TEXT, v_count;
+
+    ELSIF p_fact_table = 'fact_spending' THEN
+        DELETE FROM dw.rollup_spending_region_month_industry
+        WHERE v_month_ids IS NULL OR date_id = ANY(v_month_ids);
+        INSERT INTO dw.rollup_spending_region_month_industry (
+            date_id, region_id, industry_id, source_system,
+            transaction_count, total_amount, fact_rows
+        )
+        SELECT
+            (f.date_id / 100) * 100 + 1,
+            f.region_id,
+            f.industry_id,
+            f.source_system,
+            SUM(f.transaction_count), SUM(f.total_amount),
+            COUNT(*)
+        FROM dw.fact_spending f
+        WHERE v_month_ids IS NULL OR (f.date_id / 100) * 100 + 1 = ANY(v_month_ids)
+        GROUP BY 1, 2, 3, 4;
+        GET DIAGNOSTICS v_count = ROW_COUNT;
+        RETURN QUERY SELECT 'dw.rollup_spending_region_month_industry'::TEXT, v_count;
+
+        -- The coarser spending rollups are derived from the finest one
+        DELETE FROM dw.rollup_spending_region_month
+        WHERE v_month_ids IS NULL OR date_id = ANY(v_month_ids);
+        INSERT INTO dw.rollup_spending_region_month (
+            date_id, region_id, source_system, transaction_count, total_amount, fact_rows
+        )
+        SELECT date_id, region_id, source_system, SUM(transaction_count), SUM(total_amount), SUM(fact_rows)
+        FROM dw.rollup_spending_region_month_industry
+        WHERE v_month_ids IS NULL OR date_id = ANY(v_month_ids)
+        GROUP BY date_id, region_id, source_system;
+        GET DIAGNOSTICS v_count = ROW_COUNT;
+        RETURN QUERY SELECT 'dw.rollup_spending_region_month'::TEXT, v_count;
+
+        DELETE FROM dw.rollup_spending_month_industry
+        WHERE v_month_ids IS NULL OR date_id = ANY(v_month_ids);
+        INSERT INTO dw.rollup_spending_month_industry (
+            date_id, industry_id, source_system, transaction_count, total_amount, fact_rows
+        )
+        SELECT date_id, industry_id, source_system, SUM(transaction_count), SUM(total_amount), SUM(fact_rows)
+        FROM dw.rollup_spending_region_month_industry
+        WHERE v_month_ids IS NULL OR date_id = ANY(v_month_ids)
+        GROUP BY date_id, industry_id, source_system;
+        GET DIAGNOSTICS v_count = ROW_COUNT;
+        RETURN QUERY SELECT 'dw.rollup_spending_month_industry'::TEXT, v_count;
+
+    ELSE
+        RAISE EXCEPTION 'No rollups defined for fact table: %', p_fact_table;
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+COMMENT ON FUNCTION dw.refresh_rollups(TEXT, DATE[]) IS
+'Recomputes the rollup tables of dw.fact_visitor or dw.fact_spending.
+Example usage:
+SELECT * FROM dw.refresh_rollups(''fact_spending'');                          -- full rebuild
+SELECT * FROM dw.refresh_rollups(''fact_visitor'', ARRAY[''2023-07-14''::DATE]);  -- one month';
+
+-- Initial build
+SELECT * FROM dw.refresh_rollups('fact_visitor');
+SELECT * FROM dw.refresh_rollups('fact_spending');
+
+-- Fresh statistics so the row estimates used for routing are accurate
+ANALYZE dw.rollup_visitor_region_month;
+ANALYZE dw.rollup_visitor_month;
+ANALYZE dw.rollup_spending_region_month_industry;
+ANALYZE dw.rollup_spending_region_month;
+ANALYZE dw.rollup_spending_month_industry;
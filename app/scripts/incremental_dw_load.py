@@ -0,0 +1,268 @@
+#!/usr/bin/env python
+"""
+Incremental loader for the data warehouse fact tables.
+
+Instead of rebuilding dw.fact_spending and dw.fact_visitor from the whole
+data_lake history (dw2/task5_master_loading.sql, dw2/task6_load_aoi_days.sql),
+this script only loads what was ingested since the last run:
+- a per-source high-water mark on the staging rows' ingestion timestamp
+  (dw.etl_watermark) selects the day partitions touched since the last run
+- those partitions are queued in dw.etl_pending_partition
+- queued partitions are recomputed and upserted a few at a time, one
+  transaction each, and removed from the queue once committed
+
+A failed or interrupted run leaves its unfinished partitions queued; the next
+run picks them up before anything else, so nightly loads scale with the size
+of the daily delta rather than the total history.
+
+The SQL side lives in dw2/task8_incremental_loading.sql (use --setup to install it).
+
+Usage:
+    python app/scripts/incremental_dw_load.py --setup
+    python app/scripts/incremental_dw_load.py --sources mastercard --partitions-per-batch 7 --workers 2
+"""
+
+import os
+import sys
+import time
+import logging
+import argparse
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+import psycopg2
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Reuse the connection handling of the view creation script
+script_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(script_dir)
+from create_materialized_views import get_db_connection
+
+SETUP_SQL_FILE = os.path.join(script_dir, "dw2", "task8_incremental_loading.sql")
+
+# Source systems with an incremental loader, and the fact table they feed
+SOURCES = {
+    "mastercard": "dw.fact_spending",
+    "aoi": "dw.fact_visitor",
+}
+
+
+@dataclass
+class SourceLoadResult:
+    """Outcome of the incremental load of one source system"""
+    source_system: str
+    batch_id: Optional[int] = None
+    partitions_queued: int = 0
+    partitions_loaded: int = 0
+    rows_upserted: int = 0
+    rows_deleted: int = 0
+    duration_seconds: float = 0.0
+    errors: List[str] = field(default_factory=list)
+
+    @property
+    def success(self) -> bool:
+        return not self.errors
+
+
+def run_setup(connection) -> None:
+    """Install the watermark tables and loader functions"""
+    with open(SETUP_SQL_FILE, "r") as f:
+        setup_sql = f.read()
+    logger.info(f"Installing incremental loading objects from {SETUP_SQL_FILE}...")
+    with connection.cursor() as cursor:
+        cursor.execute(setup_sql)
+    connection.commit()
+    logger.info("Incremental loading objects installed.")
+
+
+def start_batch(connection, source_system: str) -> int:
+    """Allocate a batch ID and record the start of the load in dw.etl_metadata"""
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT nextval('dw.etl_metadata_etl_id_seq');")
+        batch_id = cursor.fetchone()[0]
+        cursor.execute(
+            """
+            INSERT INTO dw.etl_metadata (etl_id, task_name, status, message, source_system, start_time)
+            VALUES (%s, 'incremental_fact_load', 'started', 'Incremental load started', %s, CURRENT_TIMESTAMP);
+            """,
+            (batch_id, source_system)
+        )
+    connection.commit()
+    return batch_id
+
+
+def finish_batch(connection, result: SourceLoadResult) -> None:
+    """Record the outcome of the load in dw.etl_metadata"""
+    if result.success:
+        status = "completed"
+        message = (f"Loaded {result.partitions_loaded} partitions into {SOURCES[result.source_system]}: "
+                   f"{result.rows_upserted} rows upserted, {result.rows_deleted} rows deleted")
+    else:
+        status = "failed"
+        message = (f"Loaded {result.partitions_loaded} partitions before failing, "
+                   f"remaining partitions stay queued: {'; '.join(result.errors)}")
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                UPDATE dw.etl_metadata
+                SET status = %s, message = %s, end_time = CURRENT_TIMESTAMP
+                WHERE etl_id = %s;
+                """,
+                (status, message, result.batch_id)
+            )
+        connection.commit()
+    except psycopg2.Error as e:
+        connection.rollback()
+        logger.error(f"Could not record ETL metadata for batch {result.batch_id}: {e}")
+
+
+def plan_source(connection, source_system: str, settle_time: str) -> int:
+    """Queue the partitions ingested since the watermark and advance it"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT partitions_queued, previous_mark, new_mark FROM dw.plan_incremental_load(%s, %s::INTERVAL);",
+            (source_system, settle_time)
+        )
+        queued, previous_mark, new_mark = cursor.fetchone()
+    connection.commit()
+    logger.info(f"{source_system}: watermark {previous_mark} -> {new_mark}, {queued} new partitions queued")
+    return queued
+
+
+def drain_queue(source_system: str, batch_id: int, partitions_per_batch: int) -> SourceLoadResult:
+    """Load queued partitions on a dedicated connection until the queue is empty"""
+    result = SourceLoadResult(source_system=source_system, batch_id=batch_id)
+    connection = get_db_connection()
+    if connection is None:
+        result.errors.append("Could not connect to database")
+        return result
+
+    try:
+        while True:
+            start_time = time.perf_counter()
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        "SELECT partitions_loaded, rows_upserted, rows_deleted "
+                        "FROM dw.process_pending_partitions(%s, %s, %s);",
+                        (source_system, batch_id, partitions_per_batch)
+                    )
+                    loaded, upserted, deleted = cursor.fetchone()
+                connection.commit()
+            except psycopg2.Error as e:
+                # The failed partitions stay queued for the next run
+                connection.rollback()
+                result.errors.append(str(e).strip())
+                logger.error(f"{source_system}: error loading partitions: {e}")
+                break
+
+            if not loaded:
+                break
+            result.partitions_loaded += loaded
+            result.rows_upserted += upserted
+            result.rows_deleted += deleted
+            logger.info(f"{source_system}: loaded {loaded} partitions ({upserted} upserted, {deleted} deleted) "
+                        f"in {time.perf_counter() - start_time:.2f} seconds")
+    finally:
+        connection.close()
+    return result
+
+
+def load_source(connection, source_system: str, partitions_per_batch: int = 31,
+                workers: int = 1, settle_time: str = "5 minutes") -> SourceLoadResult:
+    """
+    Incrementally load one source system.
+
+    Args:
+        connection: Connection used for planning and bookkeeping
+        source_system: Key of SOURCES
+        partitions_per_batch: Day partitions loaded per transaction
+        workers: Parallel connections draining the partition queue
+        settle_time: Rows ingested more recently than this are left for the next run
+
+    Returns:
+        SourceLoadResult
+    """
+    run_start = time.perf_counter()
+    result = SourceLoadResult(source_system=source_system)
+    try:
+        result.batch_id = start_batch(connection, source_system)
+        result.partitions_queued = plan_source(connection, source_system, settle_time)
+    except psycopg2.Error as e:
+        connection.rollback()
+        result.errors.append(str(e).strip())
+        logger.error(f"{source_system}: planning failed: {e}")
+        return result
+
+    # Workers take disjoint partitions (FOR UPDATE SKIP LOCKED in the queue)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(drain_queue, source_system, result.batch_id, partitions_per_batch)
+                   for _ in range(workers)]
+        for future in futures:
+            worker_result = future.result()
+            result.partitions_loaded += worker_result.partitions_loaded
+            result.rows_upserted += worker_result.rows_upserted
+            result.rows_deleted += worker_result.rows_deleted
+            result.errors.extend(worker_result.errors)
+
+    result.duration_seconds = time.perf_counter() - run_start
+    finish_batch(connection, result)
+    return result
+
+
+def parse_arguments():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description='Incrementally load the DW fact tables from data_lake staging.')
+    parser.add_argument('--sources', nargs='+', choices=sorted(SOURCES), default=list(SOURCES),
+                        help='Source systems to load (default: all)')
+    parser.add_argument('--partitions-per-batch', type=int, default=31,
+                        help='Day partitions loaded per transaction (default: 31)')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Parallel connections per source (default: 1)')
+    parser.add_argument('--settle-time', default='5 minutes',
+                        help="Leave rows ingested more recently than this for the next run (default: '5 minutes')")
+    parser.add_argument('--setup', action='store_true',
+                        help='Install the watermark tables and loader functions first')
+    return parser.parse_args()
+
+
+def main():
+    """Main function to run the incremental load"""
+    args = parse_arguments()
+    connection = get_db_connection()
+    if connection is None:
+        sys.exit(1)
+
+    results = []
+    try:
+        if args.setup:
+            run_setup(connection)
+        for source_system in args.sources:
+            results.append(load_source(connection, source_system, args.partitions_per_batch,
+                                       args.workers, args.settle_time))
+    except Exception as e:
+        logger.error(f"Incremental load failed: {e}")
+        logger.error(traceback.format_exc())
+        sys.exit(1)
+    finally:
+        connection.close()
+
+    for result in results:
+        state = "OK" if result.success else "FAILED"
+        logger.info(f"{result.source_system} [{state}] batch {result.batch_id}: "
+                    f"{result.partitions_queued} queued, {result.partitions_loaded} loaded, "
+                    f"{result.rows_upserted} upserted, {result.rows_deleted} deleted "
+                    f"in {result.duration_seconds:.2f} seconds")
+
+    if not all(result.success for result in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,384 @@
+#!/usr/bin/env python
+"""
+Dependency-aware refresh of the geo_insights and data_lake materialized views.
+
+Instead of refreshing every view one after another with a plain
+REFRESH MATERIALIZED VIEW (which locks readers out for the whole run), this
+script:
+- knows which views read from which (VIEW_DEPENDENCIES)
+- makes sure the unique indexes needed for REFRESH ... CONCURRENTLY exist
+- refreshes independent views in parallel, each on its own connection,
+  starting a view as soon as everything it reads from has been refreshed
+- records the duration of every refresh in geo_insights.refresh_log
+
+Usage:
+    python app/scripts/refresh_materialized_views.py
+    python app/scripts/refresh_materialized_views.py --views geo_insights.region_centers --workers 2
+"""
+
+import os
+import sys
+import time
+import uuid
+import logging
+import argparse
+import traceback
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import psycopg2
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Reuse the connection handling of the view creation script
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from create_materialized_views import get_db_connection
+
+# view -> views it reads from. Views that only read base tables have no
+# dependencies and can all be refreshed at the same time.
+VIEW_DEPENDENCIES: Dict[str, Tuple[str, ...]] = {
+    # geo_insights (all built from data_lake.master_card)
+    "geo_insights.region_summary": (),
+    "geo_insights.region_hotspots": (),
+    "geo_insights.industry_insights": (),
+    "geo_insights.region_centers": (),
+    "geo_insights.spatial_patterns": ("geo_insights.region_centers",),
+    "geo_insights.temporal_insights": (),
+    "geo_insights.combined_spatial_analysis": (),
+    "geo_insights.choropleth_analytics": (),
+    # data_lake Swisscom dashboard views (see swisscom_insights_views.sql)
+    "data_lake.region_mapping": (),
+    "data_lake.swisscom_dashboard_view": ("data_lake.region_mapping",),
+    "data_lake.visitor_categories": ("data_lake.swisscom_dashboard_view",),
+    "data_lake.visitor_dwell_time": ("data_lake.region_mapping", "data_lake.swisscom_dashboard_view"),
+    "data_lake.visitor_demographics": ("data_lake.region_mapping", "data_lake.swisscom_dashboard_view"),
+    "data_lake.top_visitor_municipalities": ("data_lake.swisscom_dashboard_view",),
+    "data_lake.region_summary_stats": ("data_lake.region_mapping", "data_lake.swisscom_dashboard_view"),
+    "data_lake.municipality_monthly_stats": ("data_lake.swisscom_dashboard_view",),
+}
+
+# Unique keys that allow REFRESH ... CONCURRENTLY. A view without an entry
+# (swisscom_dashboard_view has one row per day but no day column) falls back
+# to a plain, blocking refresh.
+UNIQUE_KEYS: Dict[str, Tuple[str, Tuple[str, ...]]] = {
+    "geo_insights.region_summary": ("uq_region_summary_key", ("geo_type", "geo_name")),
+    "geo_insights.region_hotspots": ("uq_region_hotspots_key", ("geo_type", "geo_name", "latitude", "longitude", "industry")),
+    "geo_insights.industry_insights": ("uq_industry_insights_key", ("geo_type", "geo_name", "industry")),
+    "geo_insights.region_centers": ("uq_region_centers_key", ("geo_type", "geo_name")),
+    "geo_insights.spatial_patterns": ("uq_spatial_patterns_key", ("geo_type", "geo_name")),
+    "geo_insights.temporal_insights": ("uq_temporal_insights_key", ("geo_type", "geo_name", "year", "month")),
+    "geo_insights.combined_spatial_analysis": ("uq_combined_insights_key", ("geo_type", "geo_name", "bounding_box", "month")),
+    "geo_insights.choropleth_analytics": ("uq_choropleth_key", ("region_name", "area_ha", "longitude", "latitude")),
+    "data_lake.region_mapping": ("idx_region_mapping_id", ("region_id",)),
+    "data_lake.visitor_categories": ("uq_visitor_categories_key", ("region_id", "month", "year", "category_name")),
+    "data_lake.visitor_dwell_time": ("uq_visitor_dwell_time_key", ("region_id", "month", "year", "time_range")),
+    "data_lake.visitor_demographics": ("uq_visitor_demographics_key", ("region_id", "month", "year", "age_group")),
+    "data_lake.top_visitor_municipalities": ("uq_top_visitor_municipalities_key", ("region_id", "month", "year", "municipality_name")),
+    "data_lake.region_summary_stats": ("idx_region_summary_stats_region_month", ("region_id", "month", "year")),
+    "data_lake.municipality_monthly_stats": ("idx_municipality_monthly_stats_key", ("region_id", "municipality_name", "month", "year")),
+}
+
+CREATE_REFRESH_LOG_SQL = """
+CREATE TABLE IF NOT EXISTS geo_insights.refresh_log (
+    id BIGSERIAL PRIMARY KEY,
+    run_id UUID NOT NULL,
+    view_name TEXT NOT NULL,
+    started_at TIMESTAMPTZ NOT NULL,
+    duration_ms DOUBLE PRECISION NOT NULL,
+    concurrent BOOLEAN NOT NULL,
+    status TEXT NOT NULL,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_refresh_log_view ON geo_insights.refresh_log(view_name, started_at DESC);
+"""
+
+# A unique index the planner can use for CONCURRENTLY: plain columns, no predicate
+HAS_USABLE_UNIQUE_INDEX_SQL = """
+SELECT EXISTS (
+    SELECT 1
+    FROM pg_index i
+    WHERE i.indrelid = %s::regclass
+      AND i.indisunique
+      AND i.indpred IS NULL
+      AND i.indexprs IS NULL
+);
+"""
+
+IS_POPULATED_SQL = """
+SELECT ispopulated FROM pg_matviews WHERE schemaname = %s AND matviewname = %s;
+"""
+
+
+@dataclass
+class RefreshResult:
+    """Outcome of refreshing a single materialized view"""
+    view_name: str
+    status: str  # 'refreshed', 'failed', 'skipped'
+    concurrent: bool = False
+    started_at: Optional[datetime] = None
+    duration_ms: float = 0.0
+    error: Optional[str] = None
+
+
+def resolve_views(requested: Optional[Iterable[str]] = None,
+                  include_dependents: bool = True) -> List[str]:
+    """
+    Work out which views to refresh.
+
+    Args:
+        requested: Views to refresh (all known views if None)
+        include_dependents: Also refresh views that read from a requested view,
+            so they do not keep serving stale data
+
+    Returns:
+        List of view names
+    """
+    if not requested:
+        return list(VIEW_DEPENDENCIES)
+
+    selected: Set[str] = set()
+    for view in requested:
+        if view not in VIEW_DEPENDENCIES:
+            raise ValueError(f"Unknown materialized view: {view}")
+        selected.add(view)
+
+    if include_dependents:
+        changed = True
+        while changed:
+            changed = False
+            for view, deps in VIEW_DEPENDENCIES.items():
+                if view not in selected and any(dep in selected for dep in deps):
+                    selected.add(view)
+                    changed = True
+
+    # Keep the declaration order for stable output
+    return [view for view in VIEW_DEPENDENCIES if view in selected]
+
+
+def refresh_levels(views: Iterable[str]) -> List[List[str]]:
+    """
+    Group views into levels that can be refreshed in parallel.
+
+    Every view comes after all of the selected views it depends on. Only used
+    for display: the scheduler starts views as soon as their own dependencies
+    are done rather than waiting for a whole level.
+    """
+    pending = list(views)
+    done: Set[str] = set()
+    levels: List[List[str]] = []
+    while pending:
+        level = [v for v in pending
+                 if all(dep in done or dep not in pending for dep in VIEW_DEPENDENCIES.get(v, ()))]
+        if not level:
+            raise ValueError(f"Dependency cycle between views: {pending}")
+        levels.append(level)
+        done.update(level)
+        pending = [v for v in pending if v not in done]
+    return levels
+
+
+def ensure_unique_indexes(connection, views: Iterable[str]) -> None:
+    """Create the unique indexes needed for REFRESH ... CONCURRENTLY where missing"""
+    for view in views:
+        if view not in UNIQUE_KEYS:
+            continue
+        index_name, columns = UNIQUE_KEYS[view]
+        statement = f"CREATE UNIQUE INDEX IF NOT EXISTS {index_name} ON {view}({', '.join(columns)});"
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(statement)
+            connection.commit()
+        except psycopg2.Error as e:
+            # Duplicate keys or a missing view: that view falls back to a plain refresh
+            connection.rollback()
+            logger.warning(f"Could not create unique index {index_name} on {view}: {e}")
+
+
+def ensure_refresh_log(connection) -> None:
+    """Create the refresh log table if it does not exist"""
+    with connection.cursor() as cursor:
+        cursor.execute("CREATE SCHEMA IF NOT EXISTS geo_insights;")
+        cursor.execute(CREATE_REFRESH_LOG_SQL)
+    connection.commit()
+
+
+def refresh_view(view: str, allow_concurrent: bool = True) -> RefreshResult:
+    """Refresh one view on its own connection, concurrently when possible"""
+    result = RefreshResult(view_name=view, status="failed", started_at=datetime.now())
+    connection = get_db_connection()
+    if connection is None:
+        result.error = "Could not connect to database"
+        return result
+
+    try:
+        connection.autocommit = True
+        schema, name = view.split(".", 1)
+        with connection.cursor() as cursor:
+            cursor.execute(IS_POPULATED_SQL, (schema, name))
+            row = cursor.fetchone()
+            if row is None:
+                result.status = "skipped"
+                result.error = "View does not exist"
+                return result
+            is_populated = row[0]
+
+            cursor.execute(HAS_USABLE_UNIQUE_INDEX_SQL, (view,))
+            has_unique_index = cursor.fetchone()[0]
+
+            # CONCURRENTLY needs a unique index and an already populated view
+            result.concurrent = allow_concurrent and has_unique_index and is_populated
+            if allow_concurrent and not result.concurrent:
+                logger.warning(f"{view}: no usable unique index or not populated, using a blocking refresh")
+
+            mode = "CONCURRENTLY " if result.concurrent else ""
+            logger.info(f"Refreshing {view} {'(concurrently)' if result.concurrent else ''}...")
+            start_time = time.perf_counter()
+            cursor.execute(f"REFRESH MATERIALIZED VIEW {mode}{view};")
+            result.duration_ms = (time.perf_counter() - start_time) * 1000
+            result.status = "refreshed"
+            logger.info(f"Refreshed {view} in {result.duration_ms / 1000:.2f} seconds.")
+    except psycopg2.Error as e:
+        result.error = str(e).strip()
+        logger.error(f"Error refreshing {view}: {result.error}")
+    except Exception as e:
+        result.error = str(e)
+        logger.error(f"Unexpected error refreshing {view}: {e}")
+        logger.error(traceback.format_exc())
+    finally:
+        connection.close()
+    return result
+
+
+def record_results(connection, run_id: str, results: Iterable[RefreshResult]) -> None:
+    """Store per-view refresh durations in geo_insights.refresh_log"""
+    try:
+        with connection.cursor() as cursor:
+            for result in results:
+                cursor.execute(
+                    """
+                    INSERT INTO geo_insights.refresh_log
+                        (run_id, view_name, started_at, duration_ms, concurrent, status, error)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s);
+                    """,
+                    (run_id, result.view_name, result.started_at or datetime.now(),
+                     result.duration_ms, result.concurrent, result.status, result.error)
+                )
+        connection.commit()
+    except psycopg2.Error as e:
+        connection.rollback()
+        logger.error(f"Could not record refresh results: {e}")
+
+
+def refresh_views(views: Optional[Iterable[str]] = None, max_workers: int = 4,
+                  allow_concurrent: bool = True, include_dependents: bool = True,
+                  ensure_indexes: bool = True) -> List[RefreshResult]:
+    """
+    Refresh materialized views in dependency order, in parallel where possible.
+
+    Args:
+        views: Views to refresh (all known views if None)
+        max_workers: Maximum number of views refreshed at the same time
+        allow_concurrent: Use REFRESH ... CONCURRENTLY where the view supports it
+        include_dependents: Also refresh views that read from the requested ones
+        ensure_indexes: Create missing unique indexes before refreshing
+
+    Returns:
+        One RefreshResult per view
+    """
+    selected = resolve_views(views, include_dependents)
+    for i, level in enumerate(refresh_levels(selected), start=1):
+        logger.info(f"Level {i}: {', '.join(level)}")
+
+    run_id = str(uuid.uuid4())
+    connection = get_db_connection()
+    if connection is None:
+        raise psycopg2.OperationalError("Could not connect to database")
+
+    results: Dict[str, RefreshResult] = {}
+    run_start = time.perf_counter()
+    try:
+        ensure_refresh_log(connection)
+        if ensure_indexes and allow_concurrent:
+            ensure_unique_indexes(connection, selected)
+
+        pending = list(selected)
+        running = {}
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while pending or running:
+                # Skip views whose dependencies failed, start views whose dependencies are done
+                for view in list(pending):
+                    deps = [d for d in VIEW_DEPENDENCIES[view] if d in selected]
+                    failed = [d for d in deps if d in results and results[d].status != "refreshed"]
+                    if failed:
+                        results[view] = RefreshResult(view_name=view, status="skipped",
+                                                      error=f"Dependency not refreshed: {', '.join(failed)}")
+                        pending.remove(view)
+                    elif all(d in results for d in deps):
+                        running[executor.submit(refresh_view, view, allow_concurrent)] = view
+                        pending.remove(view)
+
+                if not running:
+                    continue
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    view = running.pop(future)
+                    results[view] = future.result()
+
+        ordered = [results[view] for view in selected]
+        record_results(connection, run_id, ordered)
+    finally:
+        connection.close()
+
+    wall_clock = time.perf_counter() - run_start
+    total = sum(r.duration_ms for r in results.values()) / 1000
+    logger.info(f"Refresh run {run_id} finished in {wall_clock:.2f} seconds "
+                f"({total:.2f} seconds of refresh work).")
+    for result in ordered:
+        mode = "concurrent" if result.concurrent else "blocking"
+        suffix = f" - {result.error}" if result.error else ""
+        logger.info(f"  {result.view_name}: {result.status} ({mode}, {result.duration_ms / 1000:.2f}s){suffix}")
+    return ordered
+
+
+def parse_arguments():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description='Refresh materialized views in dependency order.')
+    parser.add_argument('--views', nargs='+',
+                        help='Views to refresh, schema-qualified (default: all)')
+    parser.add_argument('--workers', type=int, default=4,
+                        help='Number of views refreshed in parallel (default: 4)')
+    parser.add_argument('--no-concurrent', action='store_true',
+                        help='Use plain (blocking) REFRESH MATERIALIZED VIEW')
+    parser.add_argument('--no-dependents', action='store_true',
+                        help='Do not refresh views that read from the requested views')
+    parser.add_argument('--skip-index-check', action='store_true',
+                        help='Do not create missing unique indexes')
+    return parser.parse_args()
+
+
+def main():
+    """Main function to refresh the views"""
+    args = parse_arguments()
+    try:
+        results = refresh_views(
+            views=args.views,
+            max_workers=args.workers,
+            allow_concurrent=not args.no_concurrent,
+            include_dependents=not args.no_dependents,
+            ensure_indexes=not args.skip_index_check
+        )
+    except Exception as e:
+        logger.error(f"Refresh failed: {e}")
+        logger.error(traceback.format_exc())
+        sys.exit(1)
+
+    if any(r.status == "failed" for r in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -22,7 +22,7 @@ FROM
     defined_regions;
 
 -- Create index on region_mapping
-CREATE INDEX idx_region_mapping_id ON data_lake.region_mapping(region_id);
+CREATE UNIQUE INDEX idx_region_mapping_id ON data_lake.region_mapping(region_id);
 
 -- 2. Create the main dashboard view
 DROP MATERIALIZED VIEW IF EXISTS data_lake.swisscom_dashboard_view CASCADE;
@@ -222,6 +222,10 @@ FROM
 CREATE INDEX idx_visitor_categories_region_month 
 ON data_lake.visitor_categories(region_id, month, year);
 
+-- Unique key so the view can be refreshed CONCURRENTLY
+CREATE UNIQUE INDEX uq_visitor_categories_key 
+ON data_lake.visitor_categories(region_id, month, year, category_name);
+
 -- 4. Dwell Time View (used by dwell_time fetch function)
 DROP MATERIALIZED VIEW IF EXISTS data_lake.visitor_dwell_time CASCADE;
 CREATE MATERIALIZED VIEW data_lake.visitor_dwell_time AS
@@ -311,6 +315,10 @@ LEFT JOIN
 CREATE INDEX idx_visitor_dwell_time_region_month 
 ON data_lake.visitor_dwell_time(region_id, month, year);
 
+-- Unique key so the view can be refreshed CONCURRENTLY
+CREATE UNIQUE INDEX uq_visitor_dwell_time_key 
+ON data_lake.visitor_dwell_time(region_id, month, year, time_range);
+
 -- 5. Demographics View (used by age_gender fetch function)
 DROP MATERIALIZED VIEW IF EXISTS data_lake.visitor_demographics CASCADE;
 CREATE MATERIALIZED VIEW data_lake.visitor_demographics AS
@@ -403,6 +411,10 @@ LEFT JOIN
 CREATE INDEX idx_visitor_demographics_region_month 
 ON data_lake.visitor_demographics(region_id, month, year);
 
+-- Unique key so the view can be refreshed CONCURRENTLY
+CREATE UNIQUE INDEX uq_visitor_demographics_key 
+ON data_lake.visitor_demographics(region_id, month, year, age_group);
+
 -- 6. Top Municipalities View (used by top_municipalities fetch function)
 DROP MATERIALIZED VIEW IF EXISTS data_lake.top_visitor_municipalities CASCADE;
 CREATE MATERIALIZED VIEW data_lake.top_visitor_municipalities AS
@@ -652,6 +664,10 @@ LEFT JOIN
 CREATE INDEX idx_top_visitor_municipalities_region_month 
 ON data_lake.top_visitor_municipalities(region_id, month, year);
 
+-- Unique key so the view can be refreshed CONCURRENTLY
+CREATE UNIQUE INDEX uq_top_visitor_municipalities_key 
+ON data_lake.top_visitor_municipalities(region_id, month, year, municipality_name);
+
 -- 7. Region Summary Statistics (additional view for overview)
 DROP MATERIALIZED VIEW IF EXISTS data_lake.region_summary_stats CASCADE;
 CREATE MATERIALIZED VIEW data_lake.region_summary_stats AS
@@ -714,5 +730,179 @@ LEFT JOIN
     actual_stats ast ON arm.region_id = ast.region_id AND arm.month = ast.month AND arm.year = ast.year;
 
 -- Create index for better query performance
-CREATE INDEX idx_region_summary_stats_region_month 
-ON data_lake.region_summary_stats(region_id, month, year);
\ No newline at end of file
+CREATE UNIQUE INDEX idx_region_summary_stats_region_month 
+ON data_lake.region_summary_stats(region_id, month, year);
+
+-- 8. Municipality Monthly Stats (used by the Swisscom Insights municipality page)
+-- Unnests top_swiss_municipalities once per refresh so the dashboard does a
+-- single indexed lookup instead of parsing the JSON array on every rerun.
+-- One typed row per (region, municipality, month): visitor categories are the
+-- region's daily values scaled by the municipality's share of that day's
+-- visitors, demographics are weighted by the municipality's visitors.
+DROP MATERIALIZED VIEW IF EXISTS data_lake.municipality_monthly_stats CASCADE;
+CREATE MATERIALIZED VIEW data_lake.municipality_monthly_stats AS
+WITH municipality_days AS (
+    SELECT
+        sdv.region_id,
+        sdv.region_name,
+        sdv.month,
+        sdv.year,
+        m.value->>'name' AS municipality_name,
+        COALESCE((m.value->>'visitors')::INTEGER, 0) AS municipality_visitors,
+        sdv.total_visitors AS region_visitors,
+        sdv.swiss_commuters,
+        sdv.swiss_locals,
+        sdv.swiss_tourists,
+        sdv.foreign_workers,
+        sdv.foreign_tourists,
+        sdv.dwelltimes,
+        sdv.demographics
+    FROM 
+        data_lake.swisscom_dashboard_view sdv
+    CROSS JOIN LATERAL jsonb_array_elements(sdv.top_swiss_municipalities) AS m(value)
+    WHERE 
+        sdv.top_swiss_municipalities IS NOT NULL AND
+        jsonb_typeof(sdv.top_swiss_municipalities) = 'array' AND
+        m.value->>'name' IS NOT NULL
+),
+visitor_totals AS (
+    SELECT
+        region_id,
+        region_name,
+        municipality_name,
+        month,
+        year,
+        COUNT(*)::INTEGER AS days_with_data,
+        SUM(municipality_visitors)::BIGINT AS total_visitors,
+        -- Scale the region's categories by the municipality share; fall back to a
+        -- fixed visitor mix on days without region totals
+        SUM(CASE WHEN region_visitors > 0
+                 THEN FLOOR(swiss_commuters::NUMERIC * municipality_visitors / region_visitors)
+                 ELSE FLOOR(municipality_visitors * 0.2) END)::BIGINT AS swiss_commuters,
+        SUM(CASE WHEN region_visitors > 0
+                 THEN FLOOR(swiss_locals::NUMERIC * municipality_visitors / region_visitors)
+                 ELSE FLOOR(municipality_visitors * 0.3) END)::BIGINT AS swiss_locals,
+        SUM(CASE WHEN region_visitors > 0
+                 THEN FLOOR(swiss_tourists::NUMERIC * municipality_visitors / region_visitors)
+                 ELSE FLOOR(municipality_visitors * 0.3) END)::BIGINT AS swiss_tourists,
+        SUM(CASE WHEN region_visitors > 0
+                 THEN FLOOR(foreign_workers::NUMERIC * municipality_visitors / region_visitors)
+                 ELSE FLOOR(municipality_visitors * 0.05) END)::BIGINT AS foreign_workers,
+        SUM(CASE WHEN region_visitors > 0
+                 THEN FLOOR(foreign_tourists::NUMERIC * municipality_visitors / region_visitors)
+                 ELSE FLOOR(municipality_visitors * 0.15) END)::BIGINT AS foreign_tourists,
+        -- Visitor-weighted male proportion, plain average if no visitors were counted
+        COALESCE(
+            SUM((demographics->>'maleProportion')::FLOAT * municipality_visitors)
+                FILTER (WHERE demographics ? 'maleProportion' AND demographics ? 'ageDistribution')
+            / NULLIF(SUM(municipality_visitors)
+                FILTER (WHERE demographics ? 'maleProportion' AND demographics ? 'ageDistribution'), 0),
+            AVG((demographics->>'maleProportion')::FLOAT)
+                FILTER (WHERE demographics ? 'maleProportion' AND demographics ? 'ageDistribution')
+        ) AS male_proportion
+    FROM 
+        municipality_days
+    GROUP BY
+        region_id, region_name, municipality_name, month, year
+),
+dwell_totals AS (
+    SELECT
+        md.region_id,
+        md.municipality_name,
+        md.month,
+        md.year,
+        d.ordinality AS idx,
+        SUM((d.value #>> '{}')::NUMERIC) AS visitor_count
+    FROM 
+        municipality_days md
+    CROSS JOIN LATERAL jsonb_array_elements(md.dwelltimes) WITH ORDINALITY AS d(value, ordinality)
+    WHERE 
+        md.dwelltimes IS NOT NULL AND
+        jsonb_typeof(md.dwelltimes) = 'array' AND
+        jsonb_typeof(d.value) = 'number' AND
+        d.ordinality <= 9
+    GROUP BY
+        md.region_id, md.municipality_name, md.month, md.year, d.ordinality
+),
+dwell_arrays AS (
+    SELECT
+        region_id,
+        municipality_name,
+        month,
+        year,
+        array_agg(visitor_count::BIGINT ORDER BY idx) AS dwell_time_counts
+    FROM 
+        dwell_totals
+    GROUP BY
+        region_id, municipality_name, month, year
+),
+age_shares AS (
+    SELECT
+        md.region_id,
+        md.municipality_name,
+        md.month,
+        md.year,
+        a.ordinality AS idx,
+        COALESCE(
+            SUM(a.value::FLOAT * md.municipality_visitors) / NULLIF(SUM(md.municipality_visitors), 0),
+            AVG(a.value::FLOAT)
+        ) AS share
+    FROM 
+        municipality_days md
+    CROSS JOIN LATERAL jsonb_array_elements_text(md.demographics->'ageDistribution') WITH ORDINALITY AS a(value, ordinality)
+    WHERE 
+        md.demographics ? 'maleProportion' AND
+        jsonb_typeof(md.demographics->'ageDistribution') = 'array' AND
+        a.ordinality <= 4
+    GROUP BY
+        md.region_id, md.municipality_name, md.month, md.year, a.ordinality
+),
+age_arrays AS (
+    SELECT
+        region_id,
+        municipality_name,
+        month,
+        year,
+        array_agg(share ORDER BY idx) AS age_distribution
+    FROM 
+        age_shares
+    GROUP BY
+        region_id, municipality_name, month, year
+)
+SELECT 
+    vt.region_id,
+    vt.region_name,
+    vt.municipality_name,
+    vt.month,
+    vt.year,
+    vt.days_with_data,
+    vt.total_visitors,
+    vt.swiss_commuters,
+    vt.swiss_locals,
+    vt.swiss_tourists,
+    vt.foreign_workers,
+    vt.foreign_tourists,
+    da.dwell_time_counts,
+    vt.male_proportion,
+    aa.age_distribution
+FROM 
+    visitor_totals vt
+LEFT JOIN 
+    dwell_arrays da ON vt.region_id = da.region_id 
+                    AND vt.municipality_name = da.municipality_name 
+                    AND vt.month = da.month 
+                    AND vt.year = da.year
+LEFT JOIN 
+    age_arrays aa ON vt.region_id = aa.region_id 
+                  AND vt.municipality_name = aa.municipality_name 
+                  AND vt.month = aa.month 
+                  AND vt.year = aa.year;
+
+-- One row per (region, municipality, month, year); unique so the view can be
+-- refreshed CONCURRENTLY
+CREATE UNIQUE INDEX idx_municipality_monthly_stats_key 
+ON data_lake.municipality_monthly_stats(region_id, municipality_name, month, year);
+
+-- Dashboard lookup: municipality + month
+CREATE INDEX idx_municipality_monthly_stats_municipality_month 
+ON data_lake.municipality_monthly_stats(municipality_name, month);
@@ -1,4 +1,4 @@
-from typing import Dict, Any, Optional, List, AsyncGenerator, Tuple
+from typing import Dict, Any, Optional, List, AsyncGenerator, Tuple, Callable, Awaitable
 from sqlalchemy.orm import Session
 from ..db.database import SessionLocal, DatabaseService, get_db
 from ..llm.openai_adapter import OpenAIAdapter
@@ -16,10 +16,16 @@ import time
 import decimal
 from fastapi import HTTPException, Depends
 from ..core.config import settings
+from ..core.metrics import CHAT_CANCELLATIONS, CHAT_COALESCED_REQUESTS, StageTimer
 from decimal import Decimal
 import uuid
 from ..utils.sql_utils import extract_sql_query, clean_sql_query
 from ..utils.sql_formatter import format_sql
+from ..utils.rollup_router import RollupRouter
+from ..utils.single_flight import SingleFlightStream
+from ..utils.executors import get_executor_pool
+from ..utils.shared_cache import get_shared_cache
+import hashlib
 import re
 import psycopg2
 import plotly.graph_objects as go
@@ -36,13 +42,14 @@ from functools import lru_cache
 from .geo_insights_service import GeoInsightsService
 from .geo_visualization_service import GeoVisualizationService
 from ..utils.hybrid_intent_parser import HybridIntentParser
-from app.db.database import get_dw_db
+from app.db.database import get_dw_db, DWSessionLocal
 from app.rag.dw_context_service import DWContextService
 from app.agents.agent_service import DWAnalyticsAgent
 from app.rag.debug_service import DebugService
+from app.rag.sql_examples import SQL_OK, get_sql_status, record_first_attempt
 from app.services.tourism_region_service import TourismRegionService
 from app.services.sql_generation_service import SQLGenerationService
-from app.services.visualization_service import VisualizationService
+from app.services.visualization_service import VisualizationService, build_visualization
 from app.services.schema_service import SchemaService
 from app.services.response_generation_service import ResponseGenerationService
 # Import VisitorAnalysisService if it exists
@@ -52,6 +59,13 @@ logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
 
+class ClientDisconnectedError(Exception):
+    """Raised when the client of a streaming request has gone away"""
+    def __init__(self, stage: str):
+        super().__init__(f"Client disconnected during {stage}")
+        self.stage = stage
+
+
 class DateTimeEncoder(json.JSONEncoder):
     def default(self, obj):
         if isinstance(obj, datetime):
@@ -68,7 +82,9 @@ class ChatService:
         sql_execution_service = None,
         visualization_service = None,
         response_generation_service = None,
-        debug_service: Optional[DebugService] = None
+        debug_service: Optional[DebugService] = None,
+        conversation_writer = None,
+        sql_example_retriever = None
     ):
         """Initialize the chat service with required dependencies"""
         try:
@@ -90,10 +106,17 @@ class ChatService:
             self.sql_generation_service = SQLGenerationService(
                 llm_adapter=self.llm_adapter, debug_service=self.debug_service)
             self.tourism_region_service = TourismRegionService()
+            self.rollup_router = RollupRouter() if settings.ROLLUP_ROUTING_ENABLED else None
+            # Persists finished conversations in the background (write-behind)
+            self.conversation_writer = conversation_writer
+            # Similar earlier questions with working SQL, used as few-shot examples
+            self.sql_example_retriever = sql_example_retriever
+
+            # Generated SQL and query results, shared by all worker processes
+            self.cache = get_shared_cache()
 
-            # Set up cache for query results
-            self.query_cache = {}
-            self.query_cache_ttl = 3600  # Cache results for 1 hour
+            # Identical concurrent streaming requests share one pipeline run
+            self.stream_flights = SingleFlightStream(poll_interval=settings.STREAM_DISCONNECT_POLL_SECONDS)
 
             # Initialize lock for async initialization
             self._initialization_lock = asyncio.Lock()
@@ -122,6 +145,28 @@ class ChatService:
                 logger.error(f"Failed to initialize chat service: {str(e)}")
                 raise
 
+    async def _route_to_rollup(self, sql_query: str, dw_db: Session, debug_service: DebugService) -> str:
+        """Return the SQL to execute, rewritten to a rollup table when it can answer the query"""
+        if not self.rollup_router or not sql_query:
+            return sql_query
+        try:
+            if dw_db is not None and not self.rollup_router.estimates_current:
+                await get_executor_pool("db").run(self.rollup_router.load_row_estimates, dw_db)
+            rewrite = self.rollup_router.route(sql_query)
+        except Exception as e:
+            logger.warning(f"Rollup routing failed, using the fact table: {e}")
+            return sql_query
+
+        details = rewrite.to_dict()
+        if rewrite.rewritten:
+            details["executed_sql"] = rewrite.sql
+            logger.info(f"Query routed to {rewrite.rollup} (~{rewrite.estimated_rows} rows): {rewrite.reason}")
+        else:
+            logger.debug(f"Query not routed to a rollup: {rewrite.reason}")
+        if debug_service:
+            debug_service.add_step_details(details)
+        return rewrite.sql
+
     async def process_chat(
         self,
         message: str,
@@ -145,6 +190,7 @@ class ChatService:
         """
         message_id = str(uuid.uuid4())
         self.debug_service = debug_service
+        stage_timer = StageTimer("chat")
         
         try:
             # Detect query type
@@ -152,19 +198,22 @@ class ChatService:
             is_natural_language = query_type == "natural_language"
             
             # Get context for this query if it's a natural language query
+            stage_timer.start("context_retrieval")
             schema_context, dw_context = await self._get_context(
                 message, is_natural_language, dw_db
             )
+            stage_timer.finish()
             
             # Generate SQL query
             sql_generation_step = "sql_generation"
             self.debug_service.start_step(sql_generation_step)
+            stage_timer.start("sql_generation")
             
             sql_query = None
+            examples = []
+            sql_status = None
             if is_natural_language:
-                sql_query = await self.sql_generation_service.generate_query(
-                    message, schema_context, dw_context
-                )
+                sql_query, examples, is_fallback = await self._generate_sql(message, schema_context, dw_context)
                 
                 # Attempt to fix common GROUP BY errors first
                 if sql_query:
@@ -173,57 +222,41 @@ class ChatService:
                     if sql_query != original_sql:
                          self.debug_service.add_step_details({"sql_groupby_fix_applied": True, "original_sql": original_sql, "fixed_sql_groupby": sql_query})
 
-                # WORKAROUND: Correct specific SQL pattern for monthly tourist comparison
-                problematic_pattern_1 = "SUM(f.swiss_tourists)"
-                problematic_pattern_2 = "SUM(f.foreign_tourists)"
-                monthly_comparison_keywords = ["month", "swiss", "international", "foreign", "tourist", "bar chart", "visualise"]
-                
-                if (sql_query and 
-                    problematic_pattern_1 in sql_query and 
-                    problematic_pattern_2 in sql_query and 
-                    all(keyword in message.lower() for keyword in monthly_comparison_keywords)):
-                    
-                    logger.warning(f"Applying workaround for generated SQL: Replaced numeric sum with JSONB extraction for query: {message}")
-                    correct_sql = """
-                    SELECT d.year, d.month, d.month_name,
-                           SUM((f.demographics->>'swiss_tourists')::numeric) as swiss_tourists,
-                           SUM((f.demographics->>'foreign_tourists')::numeric) as foreign_tourists
-                    FROM dw.fact_visitor f
-                    JOIN dw.dim_date d ON f.date_id = d.date_id
-                    WHERE d.year = 2023 -- Assuming 2023, adjust if year needs to be dynamic
-                    GROUP BY d.year, d.month, d.month_name
-                    ORDER BY d.year, d.month;
-                    """
-                    sql_query = correct_sql
-                    self.debug_service.add_step_details({"sql_workaround_applied": True, "corrected_sql": sql_query})
-                else:
-                    self.debug_service.add_step_details({"sql_workaround_applied": False})
-
-                self.debug_service.add_step_details({"generated_sql": sql_query})
+                self.debug_service.add_step_details({"generated_sql": sql_query, "few_shot_examples": len(examples)})
             else:
                 # For direct SQL queries, use the message as the query
                 sql_query = message
                 self.debug_service.add_step_details({"sql": "Direct SQL input"})
             
             self.debug_service.end_step(sql_generation_step)
+            stage_timer.finish()
             
             # Execute SQL query
             sql_execution_step = "sql_execution"
             self.debug_service.start_step(sql_execution_step)
+            stage_timer.start("sql_execution")
             
             results = None
             try:
-                results = await self.sql_execution_service.execute_query(sql_query, dw_db)
+                executed_sql = await self._route_to_rollup(sql_query, dw_db, self.debug_service) if is_natural_language else sql_query
+                # Direct SQL is what the user wants to see right now, so it is never cached
+                results = await self._execute_sql(executed_sql, dw_db, use_cache=is_natural_language)
                 self.debug_service.add_step_details({"row_count": len(results) if results else 0})
             except Exception as e:
                 self.debug_service.end_step(sql_execution_step, success=False, error=str(e))
+                if is_natural_language:
+                    await self._record_sql_error(message, examples, is_fallback)
                 raise
+            if is_natural_language:
+                sql_status = await self._record_sql_outcome(message, sql_query, examples, is_fallback, results)
             
             self.debug_service.end_step(sql_execution_step)
+            stage_timer.finish()
             
             # Generate visualization
             visualization_step = "visualization"
             self.debug_service.start_step(visualization_step)
+            stage_timer.start("visualization")
             
             visualization = None
             # Check if visualization is requested, with specific attention to bar chart requests
@@ -234,30 +267,7 @@ class ChatService:
                                       "plot" in message.lower())
             
             if results and visualization_requested:
-                # First try the specialized tourist comparison for Swiss vs. foreign tourists
-                if ("swiss" in message.lower() and 
-                    ("international" in message.lower() or "foreign" in message.lower()) and 
-                    "tourist" in message.lower() and 
-                    "month" in message.lower()):
-                    
-                    logger.info("Creating monthly Swiss vs international tourist comparison visualization")
-                    visualization = self.visualization_service.create_monthly_tourist_comparison(results, message)
-                
-                # If specialized visualization didn't work, use standard visualization
-                if not visualization:
-                    visualization = self.visualization_service.create_visualization(results, message)
-                
-                # Add visualization details to debug info
-                if visualization:
-                    self.debug_service.add_step_details({
-                        "visualization_type": visualization.get("type", "unknown"),
-                        "visualization_created": True
-                    })
-                else:
-                    self.debug_service.add_step_details({
-                        "visualization_created": False,
-                        "reason": "Visualization service failed to create visualization"
-                    })
+                visualization = await self._build_visualization(results, message, self.debug_service)
             else:
                 self.debug_service.add_step_details({
                     "visualization_created": False,
@@ -265,10 +275,12 @@ class ChatService:
                 })
             
             self.debug_service.end_step(visualization_step)
+            stage_timer.finish()
             
             # Generate response
             response_step = "response_generation"
             self.debug_service.start_step(response_step)
+            stage_timer.start("response_generation")
             
             # Use the intent detection if available
             intent = await self._determine_query_intent(message) if is_natural_language else "direct_sql"
@@ -284,6 +296,7 @@ class ChatService:
             )
             
             self.debug_service.end_step(response_step)
+            stage_timer.finish()
             
             # Prepare final response
             response = {
@@ -302,9 +315,11 @@ class ChatService:
             if self.debug_service:
                 response["debug_info"] = self.debug_service.get_flow_info()
             
+            self._persist_conversation(session_id, message, sql_query, content, schema_context, query_type, sql_status)
             return response
 
         except Exception as e:
+            stage_timer.finish("error")
             logger.error(f"Error in process_chat: {str(e)}")
             logger.error(traceback.format_exc())
             
@@ -327,15 +342,97 @@ class ChatService:
             
             return error_response
 
-    async def process_chat_stream(self, message: str, session_id: str, dw_db: Session = None, is_direct_query: bool = False) -> AsyncGenerator[Dict[str, Any], None]:
-        """Process a chat message and stream results back."""
+    async def _unless_disconnected(self, awaitable: Awaitable, is_disconnected: Optional[Callable[[], Awaitable[bool]]], stage: str):
+        """Await a pipeline step, cancelling it (LLM request, SQL statement) if the client disconnects"""
+        if is_disconnected is None:
+            return await awaitable
+        if await is_disconnected():
+            if asyncio.iscoroutine(awaitable):
+                awaitable.close()
+            raise ClientDisconnectedError(stage)
+        task = asyncio.ensure_future(awaitable)
+        try:
+            while True:
+                done, _ = await asyncio.wait({task}, timeout=settings.STREAM_DISCONNECT_POLL_SECONDS)
+                if done:
+                    return task.result()
+                if await is_disconnected():
+                    task.cancel()
+                    # Let the step clean up (e.g. cancel its SQL statement) before giving up
+                    await asyncio.gather(task, return_exceptions=True)
+                    raise ClientDisconnectedError(stage)
+        except asyncio.CancelledError:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            raise
+
+    def _context_version(self) -> str:
+        """Changes whenever the schema context given to the LLM changes"""
+        schema_context = self.schema_service.schema_context or ""
+        return hashlib.md5(schema_context.encode("utf-8")).hexdigest()[:12]
+
+    def _coalescing_key(self, message: str, is_direct_query: bool) -> str:
+        """Key under which identical requests are coalesced"""
+        normalized = " ".join(message.split())
+        if not is_direct_query:
+            # Case and trailing punctuation do not change a question (they can change SQL literals)
+            normalized = normalized.lower().rstrip("?!. ")
+        kind = "sql" if is_direct_query else "nl"
+        return f"{kind}:{self._context_version()}:{normalized}"
+
+    async def process_chat_stream_coalesced(self, message: str, session_id: str, is_direct_query: bool = False,
+                                            is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None) -> AsyncGenerator[Dict[str, Any], None]:
+        """Stream a chat response, sharing one pipeline run between identical concurrent requests.
+
+        The shared run uses its own DW session, since it can outlive the request that started it.
+        Every subscriber gets its own message id and has the conversation persisted under its own
+        session when the final response reaches it.
+        """
+        key = self._coalescing_key(message, is_direct_query)
+        CHAT_COALESCED_REQUESTS.labels(role="follower" if self.stream_flights.in_flight(key) else "leader").inc()
         message_id = str(uuid.uuid4())
+
+        async def run_pipeline(all_subscribers_gone):
+            dw_db = DWSessionLocal()
+            try:
+                async for chunk in self.process_chat_stream(message, session_id, dw_db=dw_db,
+                                                            is_direct_query=is_direct_query,
+                                                            is_disconnected=all_subscribers_gone,
+                                                            message_id=message_id, persist=False):
+                    yield chunk
+            finally:
+                dw_db.close()
+
+        async for chunk in self.stream_flights.subscribe(key, run_pipeline, is_disconnected):
+            # Events are shared by all subscribers: change copies only
+            if "message_id" in chunk:
+                chunk = {**chunk, "message_id": message_id}
+            if chunk.get("type") == "final_response":
+                chunk = dict(chunk)
+                conversation = chunk.pop("conversation", None)
+                if conversation:
+                    self._persist_conversation(session_id, message, **conversation)
+            yield chunk
+
+    async def process_chat_stream(self, message: str, session_id: str, dw_db: Session = None, is_direct_query: bool = False,
+                                  is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None,
+                                  message_id: Optional[str] = None, persist: bool = True) -> AsyncGenerator[Dict[str, Any], None]:
+        """Process a chat message and stream results back.
+
+        is_disconnected (e.g. starlette's Request.is_disconnected) is polled while
+        the slow steps run; when the client has gone, the running step is cancelled.
+        With persist=False the conversation is not persisted but handed over in the
+        "conversation" field of the final response (see process_chat_stream_coalesced).
+        """
+        message_id = message_id or str(uuid.uuid4())
+        stage = "initialization"
         # Instantiate DebugService correctly
         debug_service = DebugService()
         # Set the debug service instance for this request
         self.debug_service = debug_service
         # Start the flow with session and message IDs
         debug_service.start_flow(session_id=session_id, message_id=message_id)
+        stage_timer = StageTimer("chat_stream")
 
         try:
             await self.initialize() # Ensure service is initialized
@@ -343,26 +440,33 @@ class ChatService:
             yield {"type": "status", "message_id": message_id, "status": "Processing started"}
 
             # --- Step 1: Determine Query Type & Get Context ---
+            stage = "context_retrieval"
             debug_service.start_step("context_retrieval")
+            stage_timer.start("context_retrieval")
             query_type = self._determine_query_type(message, is_direct_query) # Assuming stream is always NL
             is_natural_language = query_type == "natural_language"
-            schema_context, dw_context = await self._get_context(message, is_natural_language, dw_db)
+            schema_context, dw_context = await self._unless_disconnected(
+                self._get_context(message, is_natural_language, dw_db), is_disconnected, stage)
             debug_service.add_step_details({
                 "query_type": query_type,
                 "schema_context_retrieved": schema_context is not None,
                 "dw_context_keys": list(dw_context.keys()) if dw_context else []
             })
             debug_service.end_step("context_retrieval")
+            stage_timer.finish()
             yield {"type": "status", "status": "Context retrieved"}
 
             # --- Step 2: Generate SQL Query ---
+            stage = "sql_generation"
             debug_service.start_step("sql_generation")
+            stage_timer.start("sql_generation")
             sql_query = None
+            examples = []
+            sql_status = None
             if is_natural_language:
                 yield {"type": "status", "status": "Generating SQL query..."}
-                sql_query = await self.sql_generation_service.generate_query(
-                    message, schema_context, dw_context
-                )
+                sql_query, examples, is_fallback = await self._unless_disconnected(
+                    self._generate_sql(message, schema_context, dw_context), is_disconnected, stage)
                 
                 # Attempt to fix common GROUP BY errors first
                 if sql_query:
@@ -371,79 +475,54 @@ class ChatService:
                     if sql_query != original_sql:
                          debug_service.add_step_details({"sql_groupby_fix_applied": True, "original_sql": original_sql, "fixed_sql_groupby": sql_query})
 
-                # WORKAROUND: Correct specific SQL pattern for monthly tourist comparison
-                problematic_pattern_1 = "SUM(f.swiss_tourists)"
-                problematic_pattern_2 = "SUM(f.foreign_tourists)"
-                monthly_comparison_keywords = ["month", "swiss", "international", "foreign", "tourist", "bar chart", "visualise"]
-                if (sql_query and
-                    problematic_pattern_1 in sql_query and
-                    problematic_pattern_2 in sql_query and
-                    all(keyword in message.lower() for keyword in monthly_comparison_keywords)):
-                    logger.warning(f"[Stream] Applying workaround for generated SQL: Replaced numeric sum with JSONB extraction for query: {message}")
-                    correct_sql = """
-                    SELECT d.year, d.month, d.month_name,
-                           SUM((f.demographics->>'swiss_tourists')::numeric) as swiss_tourists,
-                           SUM((f.demographics->>'foreign_tourists')::numeric) as foreign_tourists
-                    FROM dw.fact_visitor f
-                    JOIN dw.dim_date d ON f.date_id = d.date_id
-                    WHERE d.year = 2023 -- Assuming 2023, adjust if year needs to be dynamic
-                    GROUP BY d.year, d.month, d.month_name
-                    ORDER BY d.year, d.month;
-                    """
-                    sql_query = correct_sql
-                    self.debug_service.add_step_details({"sql_workaround_applied": True, "corrected_sql": sql_query})
-                else:
-                    self.debug_service.add_step_details({"sql_workaround_applied": False})
-
-                self.debug_service.add_step_details({"generated_sql": sql_query})
+                self.debug_service.add_step_details({"generated_sql": sql_query, "few_shot_examples": len(examples)})
                 yield {"type": "sql_query", "sql_query": sql_query}
             else:
                 sql_query = message # Direct SQL
                 yield {"type": "sql_query", "sql_query": sql_query}
             debug_service.end_step("sql_generation")
+            stage_timer.finish()
 
             # --- Step 3: Execute SQL Query ---
+            stage = "sql_execution"
             debug_service.start_step("sql_execution")
+            stage_timer.start("sql_execution")
             yield {"type": "status", "status": "Executing SQL query..."}
             results = None
             try:
-                results = await self.sql_execution_service.execute_query(sql_query, dw_db)
+                executed_sql = await self._route_to_rollup(sql_query, dw_db, debug_service) if is_natural_language else sql_query
+                results = await self._unless_disconnected(
+                    self._execute_sql(executed_sql, dw_db, use_cache=is_natural_language), is_disconnected, stage)
                 debug_service.add_step_details({"row_count": len(results) if results else 0})
+                if is_natural_language:
+                    sql_status = await self._record_sql_outcome(message, sql_query, examples, is_fallback, results)
                 yield {"type": "sql_results", "results_preview": results[:5] if results else []} # Send preview
+            except ClientDisconnectedError:
+                raise
             except Exception as e:
                 logger.error(f"Error executing SQL: {e}")
+                if is_natural_language:
+                    await self._record_sql_error(message, examples, is_fallback)
                 debug_service.end_step("sql_execution", success=False, error=str(e))
+                stage_timer.finish("error")
                 yield {"type": "error", "content": f"Error executing SQL: {str(e)}"}
                 return
             debug_service.end_step("sql_execution")
+            stage_timer.finish()
 
             # --- Step 4: Generate Visualization ---
+            stage = "visualization"
             debug_service.start_step("visualization")
+            stage_timer.start("visualization")
             visualization = None
             visualization_requested = ("chart" in message.lower() or "visual" in message.lower() or "graph" in message.lower() or "bar" in message.lower() or "plot" in message.lower())
             
             if results and visualization_requested:
                 yield {"type": "status", "status": "Generating visualization..."}
-                # Apply same specialized logic
-                if ("swiss" in message.lower() and ("international" in message.lower() or "foreign" in message.lower()) and "tourist" in message.lower() and "month" in message.lower()):
-                    visualization = self.visualization_service.create_monthly_tourist_comparison(results, message)
-                
-                # If specialized visualization didn't work, use standard visualization
-                if not visualization:
-                    visualization = self.visualization_service.create_visualization(results, message)
-                
-                # Add visualization details to debug info and yield visualization
+                visualization = await self._unless_disconnected(
+                    self._build_visualization(results, message, debug_service), is_disconnected, stage)
                 if visualization:
-                    debug_service.add_step_details({
-                        "visualization_type": visualization.get("type", "unknown"),
-                        "visualization_created": True
-                    })
                     yield {"type": "visualization", "visualization": visualization}
-                else:
-                    debug_service.add_step_details({
-                        "visualization_created": False,
-                        "reason": "Visualization service failed to create visualization"
-                    })
             else:
                 debug_service.add_step_details({
                     "visualization_created": False,
@@ -451,23 +530,33 @@ class ChatService:
                 })
             
             debug_service.end_step("visualization")
+            stage_timer.finish()
 
             # --- Step 5: Generate Final Response ---
+            stage = "response_generation"
             debug_service.start_step("response_generation")
+            stage_timer.start("response_generation")
             yield {"type": "status", "status": "Generating final response..."}
             intent = await self._determine_query_intent(message) if is_natural_language else "direct_sql"
-            content = await self.response_generation_service.generate_response(
-                query=message,
-                sql_query=sql_query,
-                sql_results=results,
-                intent=intent,
-                visualization_info=visualization,
-                context={"schema_context": schema_context}
-            )
+            content = await self._unless_disconnected(
+                self.response_generation_service.generate_response(
+                    query=message,
+                    sql_query=sql_query,
+                    sql_results=results,
+                    intent=intent,
+                    visualization_info=visualization,
+                    context={"schema_context": schema_context}
+                ), is_disconnected, stage)
             debug_service.end_step("response_generation")
+            stage_timer.finish()
+
+            conversation = {"sql_query": sql_query, "content": content, "schema_context": schema_context,
+                            "query_type": query_type, "sql_status": sql_status}
+            if persist:
+                self._persist_conversation(session_id, message, **conversation)
 
             # --- Final Chunk: Content & Debug Info ---
-            yield {
+            final_response = {
                 "type": "final_response",
                 "message_id": message_id,
                 "content": content,
@@ -476,11 +565,26 @@ class ChatService:
                 "status": "completed",
                 "debug_info": debug_service.get_debug_info_for_response()
             }
+            if not persist:
+                final_response["conversation"] = conversation
+            yield final_response
 
             debug_service.end_step("process_chat_stream")
 
+        except ClientDisconnectedError as e:
+            # Nobody is listening any more; stop without an error chunk
+            logger.info(f"Chat stream {message_id} cancelled: {e}")
+            stage_timer.finish("cancelled")
+            CHAT_CANCELLATIONS.labels(endpoint="chat_stream", stage=e.stage, reason="client_disconnect").inc()
+        except asyncio.CancelledError:
+            # Cancelled by the server (e.g. the response task on disconnect or shutdown)
+            logger.info(f"Chat stream {message_id} cancelled during {stage}")
+            stage_timer.finish("cancelled")
+            CHAT_CANCELLATIONS.labels(endpoint="chat_stream", stage=stage, reason="task_cancelled").inc()
+            raise
         except Exception as e:
             logger.error(f"Error processing chat stream: {str(e)}", exc_info=True)
+            stage_timer.finish("error")
             yield {"type": "error", "message_id": message_id, "content": f"An error occurred: {str(e)}", "debug_info": debug_service.get_debug_info_for_response() if 'debug_service' in locals() else None}
         finally:
             if 'debug_service' in locals() and debug_service:
@@ -488,6 +592,117 @@ class ChatService:
                 flow_success = 'e' not in locals()
                 debug_service.end_flow(success=flow_success)
 
+    async def _build_visualization(self, results: List[Dict[str, Any]], message: str,
+                                   debug_service: DebugService) -> Optional[Dict[str, Any]]:
+        """Build the chart in the "cpu" pool, recorded as the visualization_creation debug step.
+
+        The VisualizationService of the pool worker has no debug service, so the step is kept here.
+        """
+        # First try the specialized tourist comparison for Swiss vs. foreign tourists
+        monthly_comparison = ("swiss" in message.lower() and
+            ("international" in message.lower() or "foreign" in message.lower()) and
+            "tourist" in message.lower() and
+            "month" in message.lower())
+        if monthly_comparison:
+            logger.info("Creating monthly Swiss vs international tourist comparison visualization")
+
+        debug_service.start_step("visualization_creation", {"monthly_comparison": monthly_comparison})
+        try:
+            # Chart building is CPU-bound; keep it off the event loop
+            visualization = await get_executor_pool("cpu").run(
+                build_visualization, results, message, monthly_comparison)
+        except Exception as e:
+            debug_service.end_step("visualization_creation", success=False, error=e)
+            raise
+        if visualization:
+            details = {"visualization_type": visualization.get("type", "unknown"), "visualization_created": True}
+        else:
+            details = {"visualization_created": False,
+                       "reason": "Visualization service failed to create visualization"}
+        debug_service.end_step("visualization_creation", details=details)
+        return visualization
+
+    async def _retrieve_sql_examples(self, message: str) -> List[Dict[str, str]]:
+        """Few-shot examples for SQL generation (empty when retrieval is disabled)"""
+        if not self.sql_example_retriever:
+            return []
+        return await self.sql_example_retriever.retrieve(message)
+
+    async def _generate_sql(self, message: str, schema_context: str,
+                            dw_context: Dict[str, Any]) -> Tuple[str, List[Dict[str, str]], Optional[bool]]:
+        """SQL for a question, from the shared SQL cache or generated by the LLM.
+
+        Returns the SQL, the few-shot examples used and whether it is the fallback SQL
+        (None for SQL from the cache, which is neither generated nor a first attempt).
+        """
+        if settings.SQL_CACHE_TTL > 0:
+            cached_sql = await self.cache.aget("sql", self._coalescing_key(message, False))
+            if cached_sql:
+                self.debug_service.add_step_details({"sql_cache_hit": True})
+                return cached_sql, [], None
+        examples = await self._retrieve_sql_examples(message)
+        sql_query = await self.sql_generation_service.generate_query(message, schema_context, dw_context, examples)
+        return sql_query, examples, self.sql_generation_service.is_fallback_sql(message, sql_query)
+
+    async def _record_sql_outcome(self, message: str, sql_query: str, examples: List[Dict[str, str]],
+                                  is_fallback: Optional[bool], results: Optional[List[Dict[str, Any]]]) -> str:
+        """sql_status of an executed question; generated SQL that worked is cached for all workers"""
+        sql_status = get_sql_status(bool(is_fallback), results)
+        if is_fallback is None:
+            return sql_status
+        record_first_attempt(sql_status, examples)
+        if sql_status == SQL_OK and settings.SQL_CACHE_TTL > 0:
+            await self.cache.aset("sql", self._coalescing_key(message, False), sql_query, ttl=settings.SQL_CACHE_TTL)
+        return sql_status
+
+    async def _record_sql_error(self, message: str, examples: List[Dict[str, str]], is_fallback: Optional[bool]) -> None:
+        if is_fallback is None:
+            # Cached SQL that no longer runs (e.g. the data changed): generate it anew next time
+            await self.cache.adelete("sql", self._coalescing_key(message, False))
+        else:
+            record_first_attempt("error", examples)
+
+    @staticmethod
+    def _read_data_version(dw_db: Session) -> Optional[str]:
+        """When the incremental loader last changed the DW ('' if it is not installed, None if unknown)"""
+        try:
+            if not dw_db.execute(text("SELECT to_regclass('dw.etl_watermark') IS NOT NULL")).scalar():
+                return ""
+            return str(dw_db.execute(text("SELECT MAX(updated_at) FROM dw.etl_watermark")).scalar())
+        except Exception as e:
+            logger.warning(f"Could not read the DW data version: {e}")
+            dw_db.rollback()
+            return None
+
+    async def _execute_sql(self, sql_query: str, dw_db: Session, use_cache: bool = True) -> List[Dict[str, Any]]:
+        """Execute SQL; results of identical queries on the same data are shared by all workers for RESULT_CACHE_TTL"""
+        if settings.RESULT_CACHE_TTL <= 0 or not use_cache or dw_db is None:
+            return await self.sql_execution_service.execute_query(sql_query, dw_db)
+        data_version = await get_executor_pool("db").run(self._read_data_version, dw_db)
+        if data_version is None:
+            return await self.sql_execution_service.execute_query(sql_query, dw_db)
+        key = hashlib.sha256(f"{data_version}\n{sql_query}".encode("utf-8")).hexdigest()
+        results = await self.cache.aget("result", key)
+        if results is None:
+            results = await self.sql_execution_service.execute_query(sql_query, dw_db)
+            if results is not None and len(results) <= settings.RESULT_CACHE_MAX_ROWS:
+                await self.cache.aset("result", key, results, ttl=settings.RESULT_CACHE_TTL)
+        return results
+
+    def _persist_conversation(self, session_id: str, message: str, sql_query: Optional[str],
+                              content: Optional[str], schema_context: Optional[str], query_type: str,
+                              sql_status: Optional[str] = None) -> None:
+        """Hand a finished conversation to the write-behind writer (no DB work on the request path)"""
+        if self.conversation_writer:
+            # sql_status decides whether the SQL may serve as a few-shot example later
+            self.conversation_writer.enqueue(
+                session_id=session_id,
+                prompt=message,
+                sql_query=sql_query,
+                response=content,
+                schema_context=schema_context,
+                metadata={"query_type": query_type, "sql_status": sql_status})
+
     def is_conversational_message(self, message: str) -> bool:
         """Detect if a message is conversational rather than a data query"""
         # Clean and normalize the message
@@ -1,9 +1,8 @@
 from sqlalchemy.orm import Session
 from app.db.models import conversation_history
 from app.core.config import settings
-import chromadb
+from app.rag.embedding_index import HashingEmbedder, VectorIndex, get_conversation_index
 import json
-from datetime import datetime
 from typing import Dict, List, Optional, Any
 from sqlalchemy.exc import ProgrammingError
 import logging
@@ -11,108 +10,80 @@ import logging
 logger = logging.getLogger(__name__)
 
 class ConversationService:
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, index: Optional[VectorIndex] = None):
         self.db = db
-        try:
-            # Create an ephemeral client (in-memory)
-            self.chroma_client = chromadb.EphemeralClient()
-            
-            # Get or create the collection
-            self.collection = self.chroma_client.get_or_create_collection(
-                name="conversations",
-                metadata={"hnsw:space": "cosine"}
-            )
-            
-        except Exception as e:
-            print(f"Error initializing ChromaDB client: {str(e)}")
-            raise
-        
+        # Prompt embeddings are kept in a persistent local index shared by all sessions
+        self.index = index or get_conversation_index()
+        self.embedder = HashingEmbedder(self.index.dim)
+
     def save_conversation(self, session_id: str, prompt: str, sql_query: str, 
                          response: str, schema_context: str, metadata: dict = None):
         """Save conversation to both relational DB and vector store"""
+        rows = self.save_conversations([{
+            "session_id": session_id,
+            "prompt": prompt,
+            "sql_query": sql_query,
+            "response": response,
+            "schema_context": schema_context,
+            "metadata": metadata,
+        }])
+        return rows[0] if rows else None
+
+    def save_conversations(self, records: List[Dict[str, Any]]) -> list:
+        """
+        Save a batch of conversations with one multi-row INSERT and one commit.
+
+        Embeddings are computed for the whole batch up front and stored with
+        the rows. Conversations that produced SQL are appended to the index in
+        one add. Returns the inserted rows (empty on failure).
+        """
+        if not records:
+            return []
         try:
-            # Create conversation history record
-            result = self.db.execute(
-                conversation_history.insert().values(
-                    session_id=session_id,
-                    prompt=prompt,
-                    sql_query=sql_query,
-                    response=response,
-                    schema_context=schema_context,
-                    query_metadata=metadata or {}
-                )
-            )
-            self.db.commit()
-            
-            # Get the inserted record's ID
-            conversation_id = result.inserted_primary_key[0]
-            
-            # Generate embedding and save to vector store
-            # Note: In a real implementation, you would use a proper embedding model
-            # For now, we'll use a simple text-based embedding
-            vector_embedding = self._generate_embedding(prompt)
-            
-            # Update the record with the embedding
-            self.db.execute(
-                conversation_history.update()
-                .where(conversation_history.c.id == conversation_id)
-                .values(vector_embedding=vector_embedding)
-            )
+            embeddings = self.embedder.embed([record["prompt"] for record in records])
+            rows = self.db.execute(
+                conversation_history.insert().returning(*conversation_history.c),
+                [{
+                    "session_id": record["session_id"],
+                    "prompt": record["prompt"],
+                    "sql_query": record.get("sql_query"),
+                    "response": record.get("response"),
+                    "schema_context": record.get("schema_context"),
+                    "query_metadata": record.get("metadata") or {},
+                    "vector_embedding": embedding.tolist(),
+                } for record, embedding in zip(records, embeddings)]
+            ).all()
             self.db.commit()
-            
-            # Save to vector store
-            metadata_dict = {
-                "conversation_id": conversation_id,
-                "session_id": session_id,
-                "sql_query": sql_query,
-                "created_at": datetime.utcnow().isoformat(),
-                **(metadata or {})
-            }
-            
-            self.collection.add(
-                documents=[prompt],
-                embeddings=[vector_embedding],
-                metadatas=[metadata_dict],
-                ids=[str(conversation_id)]
-            )
-            
-            # Return the conversation record
-            result = self.db.execute(
-                conversation_history.select()
-                .where(conversation_history.c.id == conversation_id)
-            ).first()
-            
-            return result
+
+            # Only questions answered with SQL are useful to find again
+            indexed = [i for i, row in enumerate(rows) if row.sql_query]
+            self.index.add([rows[i].id for i in indexed], embeddings[indexed])
+            return rows
         except ProgrammingError as e:
             # Handle case where table doesn't exist yet
-            logger.warning(f"Database error in save_conversation: {str(e)}")
+            logger.warning(f"Database error in save_conversations: {str(e)}")
             self.db.rollback()
-            return None
+            return []
         except Exception as e:
-            logger.error(f"Error in save_conversation: {str(e)}")
+            logger.error(f"Error in save_conversations: {str(e)}")
             self.db.rollback()
-            return None
+            return []
     
-    def find_similar_conversations(self, prompt: str, limit: int = 5):
-        """Find similar conversations using vector similarity search"""
+    def find_similar_conversations(self, prompt: str, limit: int = 5, min_similarity: float = 0.0):
+        """Find earlier conversations with SQL whose prompts are similar, most similar first"""
         try:
-            # Generate embedding for the prompt
-            vector_embedding = self._generate_embedding(prompt)
-            
-            # Search in vector store
-            results = self.collection.query(
-                query_embeddings=[vector_embedding],
-                n_results=limit
-            )
-            
+            matches = self.index.search(self.embedder.embed_one(prompt), limit)
+            similarity = {conversation_id: score for conversation_id, score in matches
+                          if score >= min_similarity}
+            if not similarity:
+                return []
+
             # Get full conversation details from relational DB
-            conversation_ids = [int(id) for id in results['ids'][0]]
             conversations = self.db.execute(
                 conversation_history.select()
-                .where(conversation_history.c.id.in_(conversation_ids))
+                .where(conversation_history.c.id.in_(list(similarity)))
             ).all()
-            
-            return conversations
+            return sorted(conversations, key=lambda row: -similarity[row.id])
         except ProgrammingError as e:
             # Handle case where table doesn't exist yet
             logger.warning(f"Database error in find_similar_conversations: {str(e)}")
@@ -120,21 +91,27 @@ class ConversationService:
         except Exception as e:
             logger.error(f"Error in find_similar_conversations: {str(e)}")
             return []
-    
-    def _generate_embedding(self, text: str) -> list:
-        """Generate a simple embedding for text (placeholder)"""
-        # In a real implementation, you would use a proper embedding model
-        # For now, we'll just use character counts as a simple embedding
-        # This is NOT a good embedding strategy for production!
-        embedding = [0] * 100  # 100-dimensional embedding
-        for i, char in enumerate(text):
-            pos = i % 100
-            embedding[pos] += ord(char)
-        # Normalize
-        import math
-        norm = math.sqrt(sum(x*x for x in embedding))
-        return [x/norm for x in embedding] if norm > 0 else embedding
-    
+
+    def rebuild_index(self, batch_size: int = 5000) -> int:
+        """Re-embed all conversations with SQL into an empty index (e.g. after changing the embedder)"""
+        self.index.reset()
+        count = 0
+        last_id = 0
+        while True:
+            rows = self.db.execute(
+                conversation_history.select()
+                .with_only_columns(conversation_history.c.id, conversation_history.c.prompt)
+                .where(conversation_history.c.id > last_id)
+                .where(conversation_history.c.sql_query.isnot(None))
+                .order_by(conversation_history.c.id)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                return count
+            self.index.add([row.id for row in rows], self.embedder.embed([row.prompt for row in rows]))
+            count += len(rows)
+            last_id = rows[-1].id
+
     def get_conversation_history(self, session_id: str):
         """Get all conversations for a session"""
         return self.db.execute(
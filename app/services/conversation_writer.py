@@ -0,0 +1,125 @@
+"""
+Write-behind persistence of chat conversations.
+
+The chat pipelines hand finished conversations to enqueue(), which only puts
+them on an in-memory queue, so persisting adds no latency to the response.
+A background task collects the queue into batches (up to batch_size records
+or flush_interval seconds) and writes each batch with
+ConversationService.save_conversations in the "db" executor pool: one
+multi-row INSERT, one commit, one bulk add to the vector store.
+
+Records still queued are written by close() on shutdown. If the database
+falls behind and the queue fills up, new records are dropped (and counted)
+rather than slowing down chat responses.
+"""
+import asyncio
+import logging
+from typing import Any, Callable, Dict, List, Optional
+
+from app.core.metrics import CONVERSATION_QUEUE_DEPTH, CONVERSATION_WRITES
+from app.utils.executors import get_executor_pool
+
+logger = logging.getLogger(__name__)
+
+# Queued by close(): the writer stops once it has written everything before it
+_STOP = object()
+
+
+class ConversationWriter:
+    """Batches conversation records and persists them in the background"""
+
+    def __init__(self, service_factory: Callable[[], Any], batch_size: int = 50,
+                 flush_interval: float = 1.0, max_queue_size: int = 10000):
+        # The ConversationService is created on first write, in the DB pool
+        self._service_factory = service_factory
+        self._service = None
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue_size)
+        self._task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def from_settings(cls, settings, service_factory: Callable[[], Any]) -> "ConversationWriter":
+        return cls(service_factory,
+                   batch_size=settings.CONVERSATION_BATCH_SIZE,
+                   flush_interval=settings.CONVERSATION_FLUSH_INTERVAL,
+                   max_queue_size=settings.CONVERSATION_QUEUE_SIZE)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def enqueue(self, session_id: str, prompt: str, sql_query: Optional[str], response: Optional[str],
+                schema_context: Optional[str] = None, metadata: Optional[dict] = None) -> bool:
+        """Queue a conversation for persistence; never blocks"""
+        record = {
+            "session_id": session_id,
+            "prompt": prompt,
+            "sql_query": sql_query,
+            "response": response,
+            "schema_context": schema_context,
+            "metadata": metadata,
+        }
+        try:
+            self._queue.put_nowait(record)
+        except asyncio.QueueFull:
+            logger.warning("Conversation queue is full, dropping conversation record")
+            CONVERSATION_WRITES.labels(outcome="dropped").inc()
+            return False
+        CONVERSATION_QUEUE_DEPTH.set(self._queue.qsize())
+        return True
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await self._queue.get()
+            if item is _STOP:
+                return
+            batch = [item]
+            stopping = False
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._write(batch)
+            if stopping:
+                return
+
+    async def _write(self, batch: List[Dict[str, Any]]) -> None:
+        CONVERSATION_QUEUE_DEPTH.set(self._queue.qsize())
+        try:
+            rows = await get_executor_pool("db").run(self._save, batch)
+        except Exception as e:
+            logger.error(f"Error persisting {len(batch)} conversations: {e}")
+            rows = []
+        CONVERSATION_WRITES.labels(outcome="written").inc(len(rows))
+        if len(rows) < len(batch):
+            CONVERSATION_WRITES.labels(outcome="failed").inc(len(batch) - len(rows))
+
+    def _save(self, batch: List[Dict[str, Any]]) -> list:
+        if self._service is None:
+            self._service = self._service_factory()
+        return self._service.save_conversations(batch)
+
+    async def close(self, timeout: float = 30.0) -> None:
+        """Write everything still queued, then stop the background task"""
+        if self._task is None:
+            return
+        # Records queued before the marker are written first
+        await self._queue.put(_STOP)
+        try:
+            await asyncio.wait_for(self._task, timeout)
+            logger.info("Conversation writer flushed")
+        except asyncio.TimeoutError:
+            logger.error(f"Conversation writer did not flush within {timeout}s, "
+                         f"{self._queue.qsize()} records lost")
+        self._task = None
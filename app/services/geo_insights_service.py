@@ -4,30 +4,24 @@ import logging
 import json
 import random
 import traceback
-import time # Added for cache TTL
+from app.utils.shared_cache import get_shared_cache
 
 logger = logging.getLogger(__name__)
 
-# Added Cache Class (assuming it's defined elsewhere or here)
 class GeoInsightsCache:
-    """Simple cache for geospatial data"""
+    """Cache for geospatial data, shared by all workers (see app/utils/shared_cache.py).
+
+    Blocking like the queries of GeoInsightsService; async callers run the service in the "db" pool.
+    """
     def __init__(self, ttl=3600):
-        self._cache = {}
+        self._cache = get_shared_cache()
         self._ttl = ttl
-        self._timestamps = {}
         
     def get(self, key):
-        if key not in self._cache:
-            return None
-        if time.time() - self._timestamps[key] > self._ttl:
-            del self._cache[key]
-            del self._timestamps[key]
-            return None
-        return self._cache[key]
+        return self._cache.get("geo_insights", key)
         
     def set(self, key, value):
-        self._cache[key] = value
-        self._timestamps[key] = time.time()
+        self._cache.set("geo_insights", key, value, ttl=self._ttl)
 
 class GeoInsightsService:
     def __init__(self, db_service: DatabaseService):
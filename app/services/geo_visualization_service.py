@@ -5,7 +5,6 @@ import pandas as pd
 import json
 import logging
 import traceback
-import matplotlib.pyplot as plt
 import base64
 from io import BytesIO
 
@@ -649,6 +648,9 @@ class GeoVisualizationService:
             foreign_tourists = [row['foreign_tourists'] for row in insights]
             total_spend = [row['total_spend'] for row in insights]
 
+            # pyplot is slow to import and only needed here
+            import matplotlib.pyplot as plt
+
             # Create figure with two subplots
             fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(12, 8))
 
@@ -11,6 +11,7 @@ from app.rag.debug_service import DebugService
 from app.utils.intent_parser import QueryIntent
 from app.models.prompt_config import PromptConfig
 from app.core.config import settings
+from app.llm.llm_scheduler import NARRATIVE
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -98,53 +99,38 @@ class ResponseGenerationService:
             # Log the prompt
             logger.debug(f"Response generation prompt: {prompt}")
             
-            # Add timeout handling to LLM call with retries
-            max_retries = 3
-            retry_count = 0
-            last_error = None
+            # Rate limits and transient failures are retried by the LLM scheduler;
+            # the timeout bounds queueing and retries together
+            try:
+                generated_response = await asyncio.wait_for(
+                    self.llm_adapter.agenerate_text(prompt, priority=NARRATIVE),
+                    timeout=self.api_timeout
+                )
+                last_error = None
+                
+                # Check if the response indicates an API error
+                if generated_response.startswith("Error:"):
+                    logger.error(f"LLM API error in response generation: {generated_response}")
+                    last_error = generated_response
+            except asyncio.TimeoutError:
+                logger.error(f"LLM API call timed out after {self.api_timeout} seconds")
+                last_error = f"API timeout after {self.api_timeout}s"
             
-            while retry_count < max_retries:
-                try:
-                    # Generate response using the LLM with timeout
-                    generated_response = await asyncio.wait_for(
-                        self.llm_adapter.agenerate_text(prompt),
-                        timeout=self.api_timeout
-                    )
-                    
-                    # Check if the response indicates an API error
-                    if generated_response.startswith("Error:"):
-                        logger.error(f"LLM API error in response generation: {generated_response}")
-                        last_error = generated_response
-                        retry_count += 1
-                        continue
-                    
-                    # Add debug details if debug service is available
-                    if self.debug_service:
-                        self.debug_service.add_step_details({
-                            "prompt": prompt,
-                            "response_length": len(generated_response) if generated_response else 0,
-                            "retries": retry_count
-                        })
-                        self.debug_service.end_step("llm_response_generation", success=True)
-                    
-                    # Enhance response with visualization information
-                    enhanced_response = self._enhance_response_with_visualization_info(generated_response, visualization_info)
-                    
-                    return enhanced_response
+            if last_error is None:
+                # Add debug details if debug service is available
+                if self.debug_service:
+                    self.debug_service.add_step_details({
+                        "prompt": prompt,
+                        "response_length": len(generated_response) if generated_response else 0
+                    })
+                    self.debug_service.end_step("llm_response_generation", success=True)
+                
+                # Enhance response with visualization information
+                enhanced_response = self._enhance_response_with_visualization_info(generated_response, visualization_info)
                 
-                except asyncio.TimeoutError:
-                    logger.error(f"LLM API call timed out after {self.api_timeout} seconds (attempt {retry_count + 1}/{max_retries})")
-                    last_error = f"API timeout after {self.api_timeout}s"
-                    retry_count += 1
-                    continue
-                except Exception as e:
-                    logger.error(f"Error in LLM call (attempt {retry_count + 1}/{max_retries}): {str(e)}")
-                    last_error = str(e)
-                    retry_count += 1
-                    continue
+                return enhanced_response
             
-            # If we get here, all retries failed
-            logger.error(f"All {max_retries} attempts failed. Last error: {last_error}")
+            logger.error(f"LLM response generation failed: {last_error}")
             if self.debug_service:
                 self.debug_service.end_step("llm_response_generation", success=False, error=last_error)
             
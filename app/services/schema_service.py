@@ -1,5 +1,7 @@
 from typing import Optional, Dict, List
 from app.db.database import get_db
+from app.core.config import settings
+from app.utils.shared_cache import get_shared_cache
 from sqlalchemy import text
 import logging
 
@@ -21,6 +23,13 @@ class SchemaService:
         """Get database schema context with enhanced metadata"""
         if self.schema_context:
             return self.schema_context
+
+        # Built once per cache TTL by whichever worker gets there first (it counts every table's rows)
+        cached = await get_shared_cache().aget("schema", "dw")
+        if cached:
+            self.schema_context = cached["schema_context"]
+            self.table_metadata = cached["table_metadata"]
+            return self.schema_context
             
         try:
             db = next(get_db())
@@ -31,7 +40,8 @@ class SchemaService:
                     column_name,
                     data_type,
                     is_nullable,
-                    column_default
+                    column_default,
+                    col_description(format('%I.%I', table_schema, table_name)::regclass, ordinal_position) AS description
                 FROM 
                     information_schema.columns
                 WHERE 
@@ -48,7 +58,9 @@ class SchemaService:
                     schema_info[table_name] = []
                 nullable = "NULL" if row[3] == 'YES' else "NOT NULL"
                 default = f" DEFAULT {row[4]}" if row[4] else ""
-                schema_info[table_name].append(f"  - {row[1]}: {row[2]} {nullable}{default}")
+                # Column comments describe the typed side tables (e.g. dw.fact_visitor_age_band)
+                description = f" -- {row[5]}" if row[5] else ""
+                schema_info[table_name].append(f"  - {row[1]}: {row[2]} {nullable}{default}{description}")
                 
                 # Store metadata for each table
                 if table_name not in self.table_metadata:
@@ -73,6 +85,11 @@ class SchemaService:
             
             self.schema_context = schema_context
             logger.info(f"Schema context loaded with {len(schema_info)} tables")
+            if settings.SCHEMA_CACHE_TTL > 0:
+                await get_shared_cache().aset("schema", "dw", {
+                    "schema_context": schema_context,
+                    "table_metadata": self.table_metadata,
+                }, ttl=settings.SCHEMA_CACHE_TTL)
             return schema_context
             
         except Exception as e:
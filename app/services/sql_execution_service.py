@@ -1,10 +1,17 @@
+import asyncio
+import concurrent.futures
 import logging
+import threading
 import traceback
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from sqlalchemy.orm import Session
 from sqlalchemy import text
 from app.rag.debug_service import DebugService
 from app.db.database import get_dw_db
+from app.core.config import settings
+from app.core.metrics import DB_QUERY_CANCELLATIONS
+from app.utils.executors import get_executor_pool
+from app.utils.query_guard import QueryGuard, QueryGuardDecision, QueryRejectedError
 
 # Set up logging
 logger = logging.getLogger(__name__)
@@ -12,13 +19,17 @@ logger = logging.getLogger(__name__)
 class SQLExecutionService:
     """Service for executing SQL queries against the DW database"""
     
-    def __init__(self, debug_service: Optional[DebugService] = None):
+    def __init__(self, debug_service: Optional[DebugService] = None, query_guard: Optional[QueryGuard] = None):
         """Initialize the SQL execution service.
         
         Args:
             debug_service: Optional debug service for tracking query execution.
+            query_guard: Optional cost guard, built from settings if not given.
         """
         self.debug_service = debug_service
+        if query_guard is None and settings.QUERY_GUARD_ENABLED:
+            query_guard = QueryGuard.from_settings(settings)
+        self.query_guard = query_guard
 
     async def execute_query(self, sql_query: str, dw_db: Session = None) -> List[Dict[str, Any]]:
         """Execute a SQL query and return the results.
@@ -37,6 +48,8 @@ class SQLExecutionService:
         if self.debug_service:
             self.debug_service.start_step("sql_execution", {"sql_query": sql_query})
         
+        db_session = None
+        session_provided = True
         try:
             logger.info(f"Executing SQL query: {sql_query}")
             
@@ -49,20 +62,9 @@ class SQLExecutionService:
             else:
                 session_provided = True
             
-            # Execute the query
-            result = db_session.execute(text(sql_query))
-            
-            # Extract column names from result
-            columns = result.keys()
-            
-            # Convert result to list of dictionaries
-            rows = []
-            for row in result:
-                row_dict = {}
-                for i, column in enumerate(columns):
-                    # Handle None values
-                    row_dict[column] = row[i]
-                rows.append(row_dict)
+            # Runs in a worker thread so the event loop stays responsive and the
+            # statement can be cancelled when the request goes away
+            rows, columns, guard_decision, sql_query = await self._run_cancellable(sql_query, db_session)
             
             # Log and debug
             result_count = len(rows)
@@ -70,10 +72,14 @@ class SQLExecutionService:
             
             # End debug tracking with success
             if self.debug_service:
-                self.debug_service.end_step(success=True, details={
+                details = {
                     "result_count": result_count,
                     "columns": list(columns)
-                })
+                }
+                if guard_decision:
+                    details["query_guard"] = guard_decision.to_dict()
+                    details["executed_sql"] = sql_query
+                self.debug_service.end_step(success=True, details=details)
             
             # Close session if we created it
             if not session_provided:
@@ -81,19 +87,115 @@ class SQLExecutionService:
             
             return rows
             
+        except asyncio.CancelledError:
+            if self.debug_service:
+                self.debug_service.end_step(success=False, error="cancelled")
+            if db_session is not None and not session_provided:
+                db_session.close()
+            raise
+            
         except Exception as e:
             # Log error and provide debug info
             error_msg = f"Error executing SQL query: {str(e)}"
             logger.error(error_msg)
             logger.error(traceback.format_exc())
             
+            # A failed or cancelled statement aborts the transaction
+            if db_session is not None:
+                try:
+                    db_session.rollback()
+                    if not session_provided:
+                        db_session.close()
+                except Exception:
+                    pass
+            
             # End debug tracking with error
             if self.debug_service:
                 self.debug_service.end_step(success=False, error=str(e))
             
             # Re-raise the exception
+            if isinstance(e, QueryRejectedError):
+                raise
             raise Exception(f"SQL Execution Error: {str(e)}")
             
+    def _run_statements(self, sql_query: str, db_session: Session) -> Tuple[List[Dict[str, Any]], List[str], Optional[QueryGuardDecision], str]:
+        """Guard and execute a query on the session (blocking)"""
+        # Check the planner estimate before the query takes the connection
+        guard_decision = None
+        if self.query_guard:
+            guard_decision = self.query_guard.check(sql_query, db_session)
+            sql_query = guard_decision.sql
+            logger.info(f"Query guard: {guard_decision.to_dict()}")
+            db_session.execute(text(f"SET LOCAL statement_timeout = {guard_decision.statement_timeout_ms}"))
+        
+        # Execute the query
+        result = db_session.execute(text(sql_query))
+        
+        # Extract column names from result
+        columns = result.keys()
+        
+        # Convert result to list of dictionaries
+        rows = []
+        for row in result:
+            row_dict = {}
+            for i, column in enumerate(columns):
+                # Handle None values
+                row_dict[column] = row[i]
+            rows.append(row_dict)
+        
+        if guard_decision:
+            # Later statements in this transaction get the session's timeout again
+            db_session.execute(text("SET LOCAL statement_timeout TO DEFAULT"))
+        
+        return rows, list(columns), guard_decision, sql_query
+
+    async def _run_cancellable(self, sql_query: str, db_session: Session):
+        """Run _run_statements in the DB pool; cancel the statement on the server if the caller is cancelled"""
+        # The worker checks the connection out of the pool (which can block) and
+        # hands the DBAPI connection back so the loop can cancel its statement
+        checked_out = concurrent.futures.Future()
+        cancelled = threading.Event()
+
+        def run():
+            checked_out.set_result(db_session.connection().connection.dbapi_connection)
+            if cancelled.is_set():
+                raise asyncio.CancelledError()
+            return self._run_statements(sql_query, db_session)
+
+        future = get_executor_pool("db").submit(run)
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            # Set before looking at checked_out: either the worker sees the flag
+            # or the loop sees the connection
+            cancelled.set()
+            if checked_out.done():
+                logger.info("Request cancelled, cancelling the running SQL statement")
+                self._cancel_statement(checked_out.result(), db_session)
+            # Wait for the worker to let go of the session before rolling back
+            await asyncio.gather(future, return_exceptions=True)
+            try:
+                db_session.rollback()
+            except Exception as e:
+                logger.warning(f"Rollback after cancellation failed: {e}")
+            raise
+
+    def _cancel_statement(self, dbapi_connection, db_session: Session) -> None:
+        """Cancel the statement running on a connection (driver cancel, pg_cancel_backend as fallback)"""
+        try:
+            dbapi_connection.cancel()
+            DB_QUERY_CANCELLATIONS.labels(method="driver").inc()
+            return
+        except Exception as e:
+            logger.warning(f"Driver-level cancel failed, falling back to pg_cancel_backend: {e}")
+        try:
+            backend_pid = dbapi_connection.get_backend_pid()
+            with db_session.get_bind().connect() as connection:
+                connection.execute(text("SELECT pg_cancel_backend(:pid)"), {"pid": backend_pid})
+            DB_QUERY_CANCELLATIONS.labels(method="pg_cancel_backend").inc()
+        except Exception as e:
+            logger.error(f"Could not cancel the running statement: {e}")
+
     def validate_query(self, sql_query: str) -> bool:
         """Validate that a SQL query is safe to execute.
         
@@ -23,7 +23,13 @@ Your goal is to generate a syntactically correct PostgreSQL query to answer the
     - **DO NOT** assume a JSONB 'visitors' column for these counts.
     - To get the total number of *tourists*, sum the `swiss_tourists` and `foreign_tourists` columns: `SUM(f.swiss_tourists + f.foreign_tourists)`.
     - Use the `total_visitors` column if the query asks for *all* visitor types combined.
-4.  **Handle JSONB Columns (Other):** Other columns might be JSONB (like `demographics`, `dwell_time`). For these, use standard PostgreSQL JSONB operators (`->>`, `->`, etc.) based on the schema description if you need to access nested data.
+4.  **Demographics, Dwell Time and Origins:** Do not parse the JSONB columns `demographics`, `dwell_time`, `top_foreign_countries` or `top_swiss_cantons` of `dw.fact_visitor`. Their contents are available as typed columns in side tables keyed by `fact_id` that also carry `date_id` and `region_id` (join them to `dw.dim_date` / `dw.dim_region` directly):
+    - `dw.fact_visitor_profile`: `male_share`, `female_share`, `avg_dwell_time_mins`
+    - `dw.fact_visitor_age_band`: `age_band`, `share`, `visitors`
+    - `dw.fact_visitor_dwell_bucket`: `dwell_bucket`, `sort_order`, `visitors`
+    - `dw.fact_visitor_origin`: `origin_type` ('foreign_country' or 'swiss_canton'), `origin_name`, `visitors`
+    - Example: `SELECT o.origin_name, SUM(o.visitors) FROM dw.fact_visitor_origin o JOIN dw.dim_date d ON o.date_id = d.date_id WHERE o.origin_type = 'foreign_country' AND d.year = 2023 GROUP BY o.origin_name ORDER BY 2 DESC LIMIT 10`
+    - Use JSONB operators (`->>`, `->`) only for other JSONB columns.
 5.  **Use Context:** Refer to the 'DW CONTEXT' section for available regions, date ranges, and descriptions of key metrics to help formulate correct filters and joins.
 6.  **Join Appropriately:** Join tables within the `dw` schema when necessary (e.g., `dw.fact_visitor f` with `dw.dim_date d`). If you need to join with a table known to be outside the `dw` schema (like `data_lake.aoi_days_raw`, if applicable based on context), use the fully qualified name.
 7.  **Date Filtering and Operations:** 
@@ -99,7 +105,8 @@ class SQLGenerationService:
         self.debug_service = debug_service
         logger.info("SQLGenerationService initialized successfully")
     
-    async def generate_query(self, user_question: str, live_schema_string: str, dw_context: dict = None) -> str:
+    async def generate_query(self, user_question: str, live_schema_string: str, dw_context: dict = None,
+                             examples: Optional[List[Dict[str, str]]] = None) -> str:
         """
         Generate a SQL query based on the user's question.
         
@@ -107,6 +114,7 @@ class SQLGenerationService:
             user_question: The user's natural language question
             live_schema_string: The database schema information
             dw_context: Optional context about the data warehouse
+            examples: Optional similar earlier questions with SQL that worked
             
         Returns:
             A SQL query string
@@ -114,12 +122,13 @@ class SQLGenerationService:
         if self.debug_service:
             self.debug_service.start_step("sql_generation_llm", details={
                 "query_text": user_question,
-                "schema_context_keys": list(filter(None, ["live_schema_string" if live_schema_string else None, "dw_context" if dw_context else None]))
+                "schema_context_keys": list(filter(None, ["live_schema_string" if live_schema_string else None, "dw_context" if dw_context else None])),
+                "few_shot_examples": len(examples or [])
             })
         
         try:
             # Develop prompt for OpenAI with schema and user question
-            prompt = self._build_sql_prompt(user_question, live_schema_string, dw_context)
+            prompt = self._build_sql_prompt(user_question, live_schema_string, dw_context, examples)
             
             # Get raw response from OpenAI
             raw_response = await self.llm_adapter.agenerate_text(prompt)
@@ -192,6 +201,10 @@ class SQLGenerationService:
             logger.info(f"Exception occurred, using fallback SQL: {fallback_sql}")
             return fallback_sql
             
+    def is_fallback_sql(self, user_question: str, sql_query: str) -> bool:
+        """Whether generate_query returned the canned fallback instead of LLM SQL"""
+        return sql_query == self._get_fallback_sql(user_question)
+
     def _get_fallback_sql(self, user_question: str) -> str:
         """Generate a fallback SQL query when LLM generation fails"""
         # Extract year from user question or default to current year
@@ -493,7 +506,8 @@ class SQLGenerationService:
         
         return fixed_query
 
-    def _build_sql_prompt(self, user_question: str, live_schema_string: str, dw_context: dict = None) -> str:
+    def _build_sql_prompt(self, user_question: str, live_schema_string: str, dw_context: dict = None,
+                          examples: Optional[List[Dict[str, str]]] = None) -> str:
         """
         Build the prompt for SQL generation
         
@@ -501,6 +515,7 @@ class SQLGenerationService:
             user_question: The user's question
             live_schema_string: The database schema information
             dw_context: Additional context information
+            examples: Similar earlier questions with SQL that executed successfully
             
         Returns:
             A formatted prompt string
@@ -515,6 +530,14 @@ class SQLGenerationService:
         if dw_context:
             full_prompt += f"--- DW CONTEXT ---\n{json.dumps(dw_context, indent=2)}\n\n"
         
+        # Add similar questions answered earlier, as worked examples
+        if examples:
+            full_prompt += ("--- EXAMPLES ---\n"
+                            "Similar questions answered earlier with queries that ran successfully. "
+                            "Adapt them to the user question; do not copy filters that do not apply.\n\n")
+            for example in examples:
+                full_prompt += f"Question: {example['question']}\nSQL:\n{example['sql']}\n\n"
+        
         # Add the user question
         full_prompt += f"\nUser Question: {user_question}\n\nGenerate the PostgreSQL query:"
         
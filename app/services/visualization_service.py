@@ -1558,3 +1558,27 @@ class VisualizationService:
         except Exception as e:
             logger.error(f"Error creating monthly tourist comparison: {e}", exc_info=True)
             return self._create_fallback_visualization(data, query, str(e))
+
+
+# Service instance of an executor worker (thread or process), see build_visualization
+_worker_service: Optional[VisualizationService] = None
+
+
+def build_visualization(results: List[Dict[str, Any]], query: str,
+                        monthly_comparison: bool = False) -> Optional[Dict[str, Any]]:
+    """
+    Build the chart for a chat answer; the entry point for the "cpu" executor pool.
+
+    Module-level so it can be sent to process workers. It uses a service
+    local to the worker, without DB session or debug service, and returns the
+    chart as JSON-ready dicts, which are cheap to pass back.
+    """
+    global _worker_service
+    if _worker_service is None:
+        _worker_service = VisualizationService()
+    visualization = None
+    if monthly_comparison:
+        visualization = _worker_service.create_monthly_tourist_comparison(results, query)
+    if not visualization:
+        visualization = _worker_service.create_visualization(results, query)
+    return visualization
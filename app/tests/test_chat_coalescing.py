@@ -0,0 +1,73 @@
+import unittest
+import asyncio
+import sys
+import os
+from types import SimpleNamespace
+
+# Add the parent directory to the path to import the application modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app.services.chat_service as chat_service_module
+from app.services.chat_service import ChatService
+from app.utils.single_flight import SingleFlightStream
+
+
+class RecordingWriter:
+    def __init__(self):
+        self.rows = []
+
+    def enqueue(self, **row):
+        self.rows.append(row)
+
+
+class TestChatCoalescing(unittest.TestCase):
+    def setUp(self):
+        """A ChatService with a stub pipeline instead of the real one"""
+        self.runs = 0
+        self.service = ChatService.__new__(ChatService)
+        self.service.schema_service = SimpleNamespace(schema_context="schema")
+        self.service.stream_flights = SingleFlightStream(poll_interval=0.01)
+        self.service.conversation_writer = RecordingWriter()
+        self.service.process_chat_stream = self.pipeline
+        self.session_factory = chat_service_module.DWSessionLocal
+        chat_service_module.DWSessionLocal = lambda: SimpleNamespace(close=lambda: None)
+
+    def tearDown(self):
+        chat_service_module.DWSessionLocal = self.session_factory
+
+    async def pipeline(self, message, session_id, dw_db=None, is_direct_query=False,
+                       is_disconnected=None, message_id=None, persist=True):
+        self.runs += 1
+        yield {"type": "status", "message_id": message_id, "status": "Processing started"}
+        await asyncio.sleep(0.05)
+        final_response = {"type": "final_response", "message_id": message_id, "content": "answer"}
+        if not persist:
+            final_response["conversation"] = {"sql_query": "SELECT 1", "content": "answer", "schema_context": "schema",
+                                              "query_type": "natural_language", "sql_status": "ok"}
+        yield final_response
+
+    async def collect(self, session_id):
+        return [chunk async for chunk in
+                self.service.process_chat_stream_coalesced("visitors in 2023?", session_id)]
+
+    def test_each_subscriber_is_persisted_under_its_own_session(self):
+        async def scenario():
+            leader = asyncio.create_task(self.collect("leader-session"))
+            await asyncio.sleep(0.01)
+            follower = asyncio.create_task(self.collect("follower-session"))
+            return await asyncio.gather(leader, follower)
+
+        leader, follower = asyncio.run(scenario())
+        self.assertEqual(self.runs, 1)
+        rows = self.service.conversation_writer.rows
+        self.assertEqual(sorted(row["session_id"] for row in rows), ["follower-session", "leader-session"])
+        self.assertTrue(all(row["metadata"]["sql_status"] == "ok" for row in rows))
+        # Own message ids, and the internal conversation field is not sent to clients
+        self.assertNotEqual(leader[-1]["message_id"], follower[-1]["message_id"])
+        self.assertEqual({chunk["message_id"] for chunk in follower}, {follower[-1]["message_id"]})
+        self.assertNotIn("conversation", leader[-1])
+        self.assertNotIn("conversation", follower[-1])
+
+
+if __name__ == "__main__":
+    unittest.main()
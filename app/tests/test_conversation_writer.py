@@ -0,0 +1,68 @@
+import unittest
+import asyncio
+import sys
+import os
+
+# Add the parent directory to the path to import the application modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.conversation_writer import ConversationWriter
+from app.utils.executors import shutdown_executor_pools
+
+
+class FakeConversationService:
+    def __init__(self):
+        self.batches = []
+
+    def save_conversations(self, records):
+        self.batches.append([record["prompt"] for record in records])
+        return records
+
+
+class TestConversationWriter(unittest.TestCase):
+    def setUp(self):
+        """Set up the test environment"""
+        self.service = FakeConversationService()
+
+    def tearDown(self):
+        shutdown_executor_pools()
+
+    def enqueue(self, writer, count, start=0):
+        for i in range(start, start + count):
+            writer.enqueue(session_id="s", prompt=f"q{i}", sql_query="SELECT 1", response="r")
+
+    def test_records_are_written_in_batches(self):
+        """Queued records are grouped up to batch_size, the rest after flush_interval"""
+        writer = ConversationWriter(lambda: self.service, batch_size=3, flush_interval=0.05)
+
+        async def scenario():
+            writer.start()
+            self.enqueue(writer, 4)
+            await asyncio.sleep(0.2)
+            await writer.close()
+
+        asyncio.run(scenario())
+        self.assertEqual(self.service.batches, [["q0", "q1", "q2"], ["q3"]])
+
+    def test_close_flushes_queued_records(self):
+        """Records still queued on shutdown are written"""
+        writer = ConversationWriter(lambda: self.service, batch_size=10, flush_interval=60)
+
+        async def scenario():
+            writer.start()
+            self.enqueue(writer, 5)
+            await writer.close()
+
+        asyncio.run(scenario())
+        self.assertEqual(sum(self.service.batches, []), [f"q{i}" for i in range(5)])
+
+    def test_full_queue_drops_instead_of_blocking(self):
+        """enqueue never waits; records beyond the queue size are dropped"""
+        writer = ConversationWriter(lambda: self.service, max_queue_size=2)
+        accepted = [writer.enqueue(session_id="s", prompt=f"q{i}", sql_query=None, response=None)
+                    for i in range(3)]
+        self.assertEqual(accepted, [True, True, False])
+
+
+if __name__ == "__main__":
+    unittest.main()
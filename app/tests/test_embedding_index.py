@@ -0,0 +1,76 @@
+import unittest
+import sys
+import os
+import tempfile
+
+import numpy as np
+
+# Add the parent directory to the path to import the application modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.rag.embedding_index import HashingEmbedder, VectorIndex
+
+
+class TestHashingEmbedder(unittest.TestCase):
+    def test_embeddings_are_unit_vectors_and_deterministic(self):
+        embedder = HashingEmbedder(dim=64)
+        vectors = embedder.embed(["Visitors in Zurich", "", "Visitors in Zurich"])
+        self.assertEqual(vectors.shape, (3, 64))
+        self.assertAlmostEqual(float(np.linalg.norm(vectors[0])), 1.0, places=5)
+        self.assertFalse(vectors[1].any())
+        np.testing.assert_array_equal(vectors[0], vectors[2])
+
+    def test_similar_wording_scores_higher(self):
+        embedder = HashingEmbedder()
+        query = embedder.embed_one("How many visitors were in Zurich last week?")
+        similar = embedder.embed_one("how many visitors were in Bern last week")
+        unrelated = embedder.embed_one("top foreign countries by overnight stays")
+        self.assertGreater(float(query @ similar), float(query @ unrelated))
+
+
+class TestVectorIndex(unittest.TestCase):
+    def setUp(self):
+        """Set up the test environment"""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.directory = self.tmp.name
+        self.embedder = HashingEmbedder(dim=32)
+        self.texts = ["visitors in zurich", "dwell time in bern", "visitors in geneva by month"]
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_search_returns_nearest_first(self):
+        index = VectorIndex(self.directory, 32)
+        index.add([10, 20, 30], self.embedder.embed(self.texts))
+        results = index.search(self.embedder.embed_one("visitors in zurich"), k=2)
+        self.assertEqual([conversation_id for conversation_id, _ in results][0], 10)
+        self.assertEqual(len(results), 2)
+        self.assertGreaterEqual(results[0][1], results[1][1])
+
+    def test_index_persists_and_other_instances_see_appends(self):
+        index = VectorIndex(self.directory, 32)
+        index.add([1, 2], self.embedder.embed(self.texts[:2]))
+        reopened = VectorIndex(self.directory, 32)
+        self.assertEqual(len(reopened), 2)
+        index.add([3], self.embedder.embed(self.texts[2:]))
+        self.assertEqual(reopened.search(self.embedder.embed_one(self.texts[2]), k=1)[0][0], 3)
+
+    def test_dimension_change_starts_a_new_index(self):
+        VectorIndex(self.directory, 32).add([1], self.embedder.embed(self.texts[:1]))
+        self.assertEqual(len(VectorIndex(self.directory, 16)), 0)
+
+    def test_partial_write_is_ignored_and_repaired(self):
+        """A vector row without its id (crash mid-append) does not misalign later rows"""
+        index = VectorIndex(self.directory, 32)
+        index.add([1], self.embedder.embed(self.texts[:1]))
+        with open(os.path.join(self.directory, "vectors.f32"), "ab") as f:
+            f.write(self.embedder.embed(self.texts[1:2]).tobytes())
+        reopened = VectorIndex(self.directory, 32)
+        self.assertEqual(len(reopened), 1)
+        reopened.add([3], self.embedder.embed(self.texts[2:]))
+        results = dict(reopened.search(self.embedder.embed_one(self.texts[2]), k=2))
+        self.assertAlmostEqual(results[3], 1.0, places=5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+import unittest
+import asyncio
+import sys
+import os
+import threading
+import time
+
+# Add the parent directory to the path to import the application modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from prometheus_client import REGISTRY
+
+from app.utils.executors import ExecutorPool
+
+
+def failing():
+    raise ValueError("boom")
+
+
+class TestExecutorPool(unittest.TestCase):
+    def test_thread_pool_runs_off_the_loop_and_records_metrics(self):
+        """Work runs in a pool thread; queue wait and duration are observed"""
+        pool = ExecutorPool("test_threads", max_workers=1)
+
+        async def scenario():
+            loop_thread = threading.get_ident()
+            first = pool.submit(time.sleep, 0.05)
+            second = pool.submit(threading.get_ident)
+            await first
+            return loop_thread, await second
+
+        try:
+            loop_thread, worker_thread = asyncio.run(scenario())
+        finally:
+            pool.shutdown()
+        self.assertNotEqual(loop_thread, worker_thread)
+        self.assertEqual(pool.pending, 0)
+        labels = {"pool": "test_threads"}
+        self.assertEqual(REGISTRY.get_sample_value("executor_task_duration_seconds_count", labels), 2)
+        # The second task waited for the single worker
+        self.assertGreater(REGISTRY.get_sample_value("executor_queue_wait_seconds_sum", labels), 0.03)
+
+    def test_process_pool_returns_results_and_errors(self):
+        """Process workers return plain results and propagate exceptions"""
+        pool = ExecutorPool("test_processes", kind="process", max_workers=1)
+
+        async def scenario():
+            result = await pool.run(pow, 2, 10)
+            with self.assertRaises(ValueError):
+                await pool.run(failing)
+            return result
+
+        try:
+            self.assertEqual(asyncio.run(scenario()), 1024)
+        finally:
+            pool.shutdown()
+
+    def test_unknown_kind_is_rejected(self):
+        with self.assertRaises(ValueError):
+            ExecutorPool("bad", kind="fiber")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,32 @@
+import unittest
+import sys
+import os
+
+# Add the parent directory to the path to import the application modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.join(ROOT, "evaluation"))
+
+from fake_llm_server import SQL, CannedResponder, classify
+from app.services.sql_generation_service import SQLGenerationService
+
+
+class TestFakeLLMServer(unittest.TestCase):
+    def test_sql_prompt_is_classified_by_its_question(self):
+        """The instructions' "Analyze the User Question" must not be taken for the question"""
+        question = "What were the total visitors for July 2023?"
+        prompt = SQLGenerationService(llm_adapter=None)._build_sql_prompt(question, "schema")
+        messages = [{"role": "system", "content": "You are a helpful assistant."},
+                    {"role": "user", "content": prompt}]
+        self.assertEqual(classify(messages), (SQL, question))
+
+    def test_canned_sql_matches_the_question(self):
+        responder = CannedResponder()
+        answer = responder.answer(SQL, "What were the total visitors for July 2023?")
+        self.assertIn("d.month = 7", answer)
+        self.assertNotEqual(answer, responder.answer(SQL, "something else entirely"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,148 @@
+import unittest
+import asyncio
+import sys
+import os
+
+# Add the parent directory to the path to import the application modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.llm.llm_scheduler import (
+    BACKGROUND, INTERACTIVE, NARRATIVE, LLMScheduler, LLMSchedulerBusyError, TokenBucket,
+    retry_after_seconds,
+)
+
+
+class FakeResponse:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class FakeRateLimitError(Exception):
+    def __init__(self, retry_after=None):
+        super().__init__("429 Too Many Requests")
+        headers = {"retry-after": str(retry_after)} if retry_after is not None else {}
+        self.response = FakeResponse(429, headers)
+        self.status_code = 429
+
+
+class TestTokenBucket(unittest.TestCase):
+    def test_refill_and_debt(self):
+        now = [0.0]
+        bucket = TokenBucket(60, clock=lambda: now[0])  # one unit per second
+        self.assertEqual(bucket.time_until(60), 0.0)
+        bucket.consume(70)
+        self.assertAlmostEqual(bucket.time_until(1), 11.0)
+        now[0] = 11.0
+        self.assertEqual(bucket.time_until(1), 0.0)
+        # More than the capacity waits for a full bucket instead of forever
+        self.assertAlmostEqual(bucket.time_until(1000), 59.0)
+
+
+class TestLLMScheduler(unittest.TestCase):
+    def test_priority_order(self):
+        """Waiting interactive calls are admitted before narrative and background ones"""
+        async def scenario():
+            scheduler = LLMScheduler(requests_per_minute=6000, tokens_per_minute=1e9, max_concurrency=1)
+            order = []
+            release = asyncio.Event()
+
+            async def blocker():
+                await release.wait()
+
+            def call(name):
+                async def run():
+                    order.append(name)
+                return run
+
+            first = asyncio.create_task(scheduler.run(blocker, BACKGROUND))
+            await asyncio.sleep(0.01)
+            tasks = [asyncio.create_task(scheduler.run(call(name), priority))
+                     for name, priority in [("background", BACKGROUND), ("narrative", NARRATIVE),
+                                            ("interactive", INTERACTIVE)]]
+            await asyncio.sleep(0.01)
+            self.assertEqual(scheduler.queue_depth, 3)
+            release.set()
+            await asyncio.gather(first, *tasks)
+            return order
+
+        self.assertEqual(asyncio.run(scenario()), ["interactive", "narrative", "background"])
+
+    def test_retry_after_is_respected(self):
+        async def scenario():
+            scheduler = LLMScheduler(requests_per_minute=6000, tokens_per_minute=1e9, max_concurrency=2,
+                                     base_backoff=0.001)
+            attempts = []
+
+            async def flaky():
+                attempts.append(asyncio.get_running_loop().time())
+                if len(attempts) == 1:
+                    raise FakeRateLimitError(retry_after=0.1)
+                return "ok"
+
+            result = await scheduler.run(flaky)
+            return result, attempts
+
+        result, attempts = asyncio.run(scenario())
+        self.assertEqual(result, "ok")
+        self.assertEqual(len(attempts), 2)
+        self.assertGreaterEqual(attempts[1] - attempts[0], 0.1)
+
+    def test_non_retryable_and_exhausted_errors_propagate(self):
+        async def scenario():
+            scheduler = LLMScheduler(requests_per_minute=6000, tokens_per_minute=1e9, max_concurrency=2,
+                                     max_retries=2, base_backoff=0.001)
+            calls = {"bad": 0, "limited": 0}
+
+            async def bad_request():
+                calls["bad"] += 1
+                raise ValueError("400 bad request")
+
+            async def always_limited():
+                calls["limited"] += 1
+                raise FakeRateLimitError()
+
+            with self.assertRaises(ValueError):
+                await scheduler.run(bad_request)
+            with self.assertRaises(FakeRateLimitError):
+                await scheduler.run(always_limited)
+            self.assertEqual(scheduler.in_flight, 0)
+            return calls
+
+        self.assertEqual(asyncio.run(scenario()), {"bad": 1, "limited": 3})
+
+    def test_queue_limit_and_cancellation(self):
+        async def scenario():
+            scheduler = LLMScheduler(requests_per_minute=6000, tokens_per_minute=1e9, max_concurrency=1,
+                                     max_queue_depth=1)
+            release = asyncio.Event()
+
+            async def blocker():
+                await release.wait()
+
+            first = asyncio.create_task(scheduler.run(blocker))
+            await asyncio.sleep(0.01)
+            waiting = asyncio.create_task(scheduler.run(blocker))
+            await asyncio.sleep(0.01)
+            with self.assertRaises(LLMSchedulerBusyError):
+                await scheduler.run(blocker)
+            # A cancelled waiter gives up its place in the queue
+            waiting.cancel()
+            await asyncio.gather(waiting, return_exceptions=True)
+            self.assertEqual(scheduler.queue_depth, 0)
+            release.set()
+            await first
+            self.assertEqual(scheduler.in_flight, 0)
+
+        asyncio.run(scenario())
+
+    def test_retry_after_header_formats(self):
+        self.assertEqual(retry_after_seconds(FakeRateLimitError(retry_after=2)), 2.0)
+        error = FakeRateLimitError()
+        error.response.headers = {"retry-after-ms": "250"}
+        self.assertEqual(retry_after_seconds(error), 0.25)
+        self.assertIsNone(retry_after_seconds(ValueError("no response")))
+
+
+if __name__ == "__main__":
+    unittest.main()
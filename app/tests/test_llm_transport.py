@@ -0,0 +1,81 @@
+import unittest
+import asyncio
+import sys
+import os
+
+import httpx
+
+# Add the parent directory to the path to import the application modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.llm.llm_transport import LatencyTracker, LLMTransport
+
+
+class ScriptedTransport(LLMTransport):
+    """Transport whose attempts take scripted times per endpoint instead of calling the API"""
+
+    def __init__(self, delays, **kwargs):
+        super().__init__(api_key="test", api_bases=["http://primary/v1", "http://hedge/v1"],
+                         deadline=1.0, http_client=httpx.AsyncClient(), **kwargs)
+        self.delays = delays
+        self.started = []
+        self.cancelled = []
+
+    async def _attempt(self, index, deadline, kwargs):
+        self.started.append(index)
+        try:
+            await asyncio.sleep(self.delays[index])
+            return f"reply from {index}"
+        except asyncio.CancelledError:
+            self.cancelled.append(index)
+            raise
+
+
+class TestLatencyTracker(unittest.TestCase):
+    def test_quantile_needs_samples(self):
+        tracker = LatencyTracker(window=100, min_samples=10)
+        for i in range(9):
+            tracker.record(i)
+        self.assertIsNone(tracker.quantile(0.95))
+        for i in range(9, 100):
+            tracker.record(i)
+        self.assertEqual(tracker.quantile(0.95), 95)
+
+
+class TestLLMTransport(unittest.TestCase):
+    def run_transport(self, transport, deadline=1.0):
+        async def scenario():
+            return await transport.chat_completion(deadline=deadline, model="m", messages=[])
+        return asyncio.run(scenario())
+
+    def warm_up(self, transport, seconds):
+        for _ in range(transport.latency.min_samples):
+            transport.latency.record(seconds)
+
+    def test_no_hedge_without_history(self):
+        transport = ScriptedTransport({0: 0.05, 1: 0.0}, hedging=True, hedge_min_delay=0.01)
+        self.assertEqual(self.run_transport(transport), "reply from 0")
+        self.assertEqual(transport.started, [0])
+
+    def test_slow_call_is_hedged_and_loser_cancelled(self):
+        transport = ScriptedTransport({0: 0.5, 1: 0.01}, hedging=True, hedge_min_delay=0.01)
+        self.warm_up(transport, 0.02)
+        self.assertEqual(self.run_transport(transport), "reply from 1")
+        self.assertEqual(transport.started, [0, 1])
+        self.assertEqual(transport.cancelled, [0])
+
+    def test_fast_call_is_not_hedged(self):
+        transport = ScriptedTransport({0: 0.01, 1: 0.01}, hedging=True, hedge_min_delay=0.2)
+        self.warm_up(transport, 0.01)
+        self.assertEqual(self.run_transport(transport), "reply from 0")
+        self.assertEqual(transport.started, [0])
+
+    def test_deadline(self):
+        transport = ScriptedTransport({0: 1.0, 1: 1.0}, hedging=False)
+        with self.assertRaises(asyncio.TimeoutError):
+            self.run_transport(transport, deadline=0.05)
+        self.assertEqual(transport.cancelled, [0])
+
+
+if __name__ == "__main__":
+    unittest.main()
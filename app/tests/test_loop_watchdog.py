@@ -0,0 +1,53 @@
+import unittest
+import asyncio
+import sys
+import os
+import time
+
+# Add the parent directory to the path to import the application modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.loop_watchdog import LoopWatchdog
+
+
+def blocking_call(seconds):
+    time.sleep(seconds)
+
+
+class TestLoopWatchdog(unittest.TestCase):
+    def run_with_watchdog(self, body):
+        watchdog = LoopWatchdog(threshold=0.05, interval=0.01)
+
+        async def scenario():
+            watchdog.start()
+            await asyncio.sleep(0.05)
+            await body()
+            await asyncio.sleep(0.05)
+            await watchdog.stop()
+
+        asyncio.run(scenario())
+        return watchdog
+
+    def test_blocking_call_is_reported_with_its_stack(self):
+        """A sync call on the loop is captured once, attributed to the innermost app frame"""
+        async def handler():
+            blocking_call(0.3)
+
+        watchdog = self.run_with_watchdog(handler)
+        self.assertEqual(len(watchdog.reports), 1)
+        report = watchdog.reports[0]
+        self.assertTrue(report["location"].endswith("test_loop_watchdog.py:blocking_call"), report["location"])
+        self.assertTrue(any("time.sleep" in line for line in report["stack"]))
+        self.assertGreater(report["blocked_seconds"], 0.2)
+
+    def test_awaiting_does_not_report(self):
+        """Time spent awaiting is not a block"""
+        async def handler():
+            await asyncio.sleep(0.3)
+
+        watchdog = self.run_with_watchdog(handler)
+        self.assertEqual(len(watchdog.reports), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+import unittest
+import sys
+import os
+import subprocess
+import tempfile
+
+# Add the parent directory to the path to import the application modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from prometheus_client import REGISTRY
+from sqlalchemy import create_engine
+from sqlalchemy.pool import QueuePool
+
+from app.core.metrics import StageTimer, register_engine_pool
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def sample(name, labels):
+    return REGISTRY.get_sample_value(name, labels)
+
+
+class TestStageTimer(unittest.TestCase):
+    def test_stages_are_observed_with_outcome(self):
+        """Each finished stage adds one observation; starting a stage finishes the previous one"""
+        labels = {"endpoint": "test", "stage": "sql_generation", "outcome": "ok"}
+        before = sample("chat_stage_duration_seconds_count", labels) or 0
+
+        timer = StageTimer("test")
+        timer.start("sql_generation")
+        timer.start("sql_execution")
+        timer.finish("error")
+        timer.finish("error")  # nothing open any more
+
+        self.assertEqual(sample("chat_stage_duration_seconds_count", labels), before + 1)
+        self.assertEqual(sample("chat_stage_duration_seconds_count",
+                                {"endpoint": "test", "stage": "sql_execution", "outcome": "error"}), 1)
+
+
+class TestPoolMetrics(unittest.TestCase):
+    def test_pool_gauges_follow_checkouts(self):
+        """Checked-out connections are reported at scrape time"""
+        engine = create_engine("sqlite://", poolclass=QueuePool, pool_size=2, max_overflow=1)
+        register_engine_pool("test_pool", engine)
+        self.assertEqual(sample("db_pool_size", {"engine": "test_pool"}), 2)
+
+        connections = [engine.connect() for _ in range(3)]
+        self.assertEqual(sample("db_pool_checked_out", {"engine": "test_pool"}), 3)
+        self.assertEqual(sample("db_pool_overflow", {"engine": "test_pool"}), 1)
+
+        for connection in connections:
+            connection.close()
+        self.assertEqual(sample("db_pool_checked_out", {"engine": "test_pool"}), 0)
+        engine.dispose()
+
+
+
+class TestMultiprocessMetrics(unittest.TestCase):
+    def run_worker(self, directory, code):
+        env = dict(os.environ, PROMETHEUS_MULTIPROC_DIR=directory)
+        process = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env,
+                                 capture_output=True, text=True, timeout=60)
+        self.assertEqual(process.returncode, 0, process.stderr[-2000:])
+        return process.stdout
+
+    def test_workers_are_aggregated(self):
+        """Counters are summed over all workers, live gauges over the workers that have not shut down"""
+        record = ("from app.core.metrics import CACHE_LOOKUPS, SSE_CONNECTIONS, mark_worker_exited\n"
+                  "CACHE_LOOKUPS.labels(cache='sql', result='hit').inc(2)\n"
+                  "SSE_CONNECTIONS.labels(endpoint='chat_stream').inc()\n")
+        scrape = ("from app.core.metrics import metrics_registry\n"
+                  "registry = metrics_registry()\n"
+                  "print(registry.get_sample_value('cache_lookups_total', {'cache': 'sql', 'result': 'hit'}))\n"
+                  "print(registry.get_sample_value('sse_connections', {'endpoint': 'chat_stream'}))\n")
+        with tempfile.TemporaryDirectory() as directory:
+            self.run_worker(directory, record)
+            self.run_worker(directory, record + "mark_worker_exited()\n")
+            hits, connections = self.run_worker(directory, scrape).split()
+        self.assertEqual(float(hits), 4.0)
+        # The second worker's open stream is dropped when it marks itself exited
+        self.assertEqual(float(connections), 1.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
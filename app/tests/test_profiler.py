@@ -0,0 +1,80 @@
+import unittest
+import json
+import os
+import sys
+import tempfile
+import time
+
+# Add the parent directory to the path to import the application modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.profiler import ProfileStore, SamplingProfiler, has_profile_access, should_profile
+
+
+def busy_loop(seconds):
+    deadline = time.perf_counter() + seconds
+    total = 0
+    while time.perf_counter() < deadline:
+        total += sum(range(100))
+    return total
+
+
+class TestSamplingProfiler(unittest.TestCase):
+    def test_samples_show_up_in_speedscope_profile(self):
+        """Frames of the profiled code appear in the samples of the calling thread"""
+        profiler = SamplingProfiler(interval=0.002).start()
+        busy_loop(0.1)
+        profiler.stop()
+
+        profile = profiler.to_speedscope("test")
+        names = [frame["name"] for frame in profile["shared"]["frames"]]
+        self.assertIn("busy_loop", names)
+        busy = names.index("busy_loop")
+        main = next(p for p in profile["profiles"] if p["name"] == "MainThread")
+        self.assertTrue(any(busy in stack for stack in main["samples"]))
+        self.assertEqual(len(main["samples"]), len(main["weights"]))
+        # The sampler does not profile itself
+        self.assertNotIn("request-profiler", [p["name"] for p in profile["profiles"]])
+
+    def test_should_profile(self):
+        """Requests are profiled on demand or by the sample rate"""
+        self.assertTrue(should_profile(True, 0.0))
+        self.assertFalse(should_profile(True, 0.0, on_demand=False))
+        self.assertFalse(should_profile(False, 0.0))
+        self.assertTrue(should_profile(False, 0.1, rand=lambda: 0.05))
+        self.assertFalse(should_profile(False, 0.1, rand=lambda: 0.5))
+
+    def test_one_exclusive_profiler_at_a_time(self):
+        first = SamplingProfiler.start_exclusive(interval=0.01)
+        self.assertIsNotNone(first)
+        self.assertIsNone(SamplingProfiler.start_exclusive(interval=0.01))
+        first.stop()
+        first.stop()
+        second = SamplingProfiler.start_exclusive(interval=0.01)
+        self.assertIsNotNone(second)
+        second.stop()
+
+    def test_profile_access(self):
+        self.assertTrue(has_profile_access("", ""))
+        self.assertTrue(has_profile_access("secret", "secret"))
+        self.assertFalse(has_profile_access("", "secret"))
+        self.assertFalse(has_profile_access("guess", "secret"))
+
+
+class TestProfileStore(unittest.TestCase):
+    def test_save_load_and_prune(self):
+        """Profiles are stored by id, invalid ids are refused and old files pruned"""
+        with tempfile.TemporaryDirectory() as directory:
+            store = ProfileStore(directory, max_files=2)
+            profiler = SamplingProfiler().start().stop()
+            self.assertIsNone(store.save("../escape", profiler))
+            for i in range(3):
+                path = store.save(f"msg-{i}", profiler)
+                os.utime(path, (i, i))
+            self.assertIsNone(store.load("msg-0"))
+            with open(store.load("msg-2")) as f:
+                self.assertEqual(json.load(f)["name"], "msg-2")
+
+
+if __name__ == "__main__":
+    unittest.main()
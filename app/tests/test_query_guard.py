@@ -0,0 +1,74 @@
+import unittest
+import sys
+import os
+
+# Add the parent directory to the path to import the application modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.query_guard import QueryGuard, QueryRejectedError, inject_limit, has_top_level_limit, parse_plan
+
+
+class MockResult:
+    def __init__(self, plan):
+        self.plan = plan
+
+    def scalar(self):
+        return self.plan
+
+
+class MockSession:
+    """Returns a fixed EXPLAIN (FORMAT JSON) result"""
+    def __init__(self, total_cost, plan_rows):
+        self.plan = [{"Plan": {"Node Type": "Seq Scan", "Total Cost": total_cost, "Plan Rows": plan_rows}}]
+        self.statements = []
+
+    def execute(self, statement):
+        self.statements.append(str(statement))
+        return MockResult(self.plan)
+
+
+class TestQueryGuard(unittest.TestCase):
+    def setUp(self):
+        """Set up the test environment"""
+        self.guard = QueryGuard(max_cost=100000, max_rows=5000, auto_limit=1000,
+                                min_timeout_ms=2000, max_timeout_ms=15000, cost_units_per_second=100000)
+
+    def test_inject_limit(self):
+        """A LIMIT is appended only when the outer query has none"""
+        self.assertEqual(inject_limit("SELECT * FROM dw.dim_region;", 50), "SELECT * FROM dw.dim_region\nLIMIT 50")
+        self.assertEqual(inject_limit("SELECT 1 -- note", 50), "SELECT 1 -- note\nLIMIT 50")
+        limited = "SELECT * FROM dw.dim_region LIMIT 5"
+        self.assertEqual(inject_limit(limited, 50), limited)
+        self.assertEqual(inject_limit("EXPLAIN SELECT 1", 50), "EXPLAIN SELECT 1")
+
+    def test_nested_limit_is_not_top_level(self):
+        """LIMITs in subqueries or string literals do not count"""
+        self.assertFalse(has_top_level_limit("SELECT * FROM (SELECT region_id FROM dw.dim_region LIMIT 3) r"))
+        self.assertFalse(has_top_level_limit("SELECT 'no limit' AS note"))
+        self.assertTrue(has_top_level_limit("SELECT * FROM dw.dim_region FETCH FIRST 3 ROWS ONLY"))
+
+    def test_timeout_scales_with_cost(self):
+        """Cheap queries get the minimum timeout, expensive ones the maximum"""
+        self.assertEqual(self.guard.timeout_for_cost(10), 2000)
+        self.assertEqual(self.guard.timeout_for_cost(200000), 6000)
+        self.assertEqual(self.guard.timeout_for_cost(10 ** 9), 15000)
+
+    def test_check_rejects_expensive_plans(self):
+        """Plans above the cost or row limits are rejected before execution"""
+        with self.assertRaises(QueryRejectedError):
+            self.guard.check("SELECT * FROM dw.fact_visitor", MockSession(total_cost=500000, plan_rows=1000))
+        with self.assertRaises(QueryRejectedError):
+            self.guard.check("SELECT * FROM dw.fact_visitor LIMIT 10000", MockSession(total_cost=10, plan_rows=10000))
+
+    def test_check_accepts_cheap_plans(self):
+        """Accepted queries get a LIMIT and a statement timeout"""
+        session = MockSession(total_cost=1500.5, plan_rows=12)
+        decision = self.guard.check("SELECT region_id FROM dw.fact_visitor", session)
+        self.assertTrue(decision.limit_injected)
+        self.assertEqual(decision.statement_timeout_ms, 2000)
+        self.assertIn("EXPLAIN (FORMAT JSON)", session.statements[0])
+        self.assertEqual(parse_plan('[{"Plan": {"Total Cost": 1}}]'), {"Total Cost": 1})
+
+
+if __name__ == '__main__':
+    unittest.main()
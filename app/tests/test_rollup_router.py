@@ -0,0 +1,150 @@
+import unittest
+import sys
+import os
+from collections import namedtuple
+
+# Add the parent directory to the path to import the application modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.rollup_router import RollupRouter
+
+EstimateRow = namedtuple("EstimateRow", ["name", "estimate"])
+
+MONTHLY_TOTALS_SQL = """
+SELECT d.year, d.month, SUM(fv.swiss_tourists) AS swiss_tourists
+FROM dw.fact_visitor fv
+JOIN dw.dim_date d ON fv.date_id = d.date_id
+GROUP BY d.year, d.month
+"""
+
+
+class FakeSession:
+    """Answers the pg_class query with fixed rows, or fails"""
+
+    def __init__(self, rows=None, error=None):
+        self.rows = rows or []
+        self.error = error
+        self.rolled_back = False
+
+    def execute(self, statement):
+        if self.error:
+            raise self.error
+        return self
+
+    def fetchall(self):
+        return self.rows
+
+    def rollback(self):
+        self.rolled_back = True
+
+
+class TestRollupRouter(unittest.TestCase):
+    def setUp(self):
+        """Set up the test environment"""
+        self.router = RollupRouter()
+
+    def test_monthly_totals_use_smallest_rollup(self):
+        """Monthly totals without a region need no region grain"""
+        test_sql = """
+        SELECT d.year, d.month, SUM(fv.swiss_tourists) AS swiss_tourists
+        FROM dw.fact_visitor fv
+        JOIN dw.dim_date d ON fv.date_id = d.date_id
+        WHERE d.year = 2023
+        GROUP BY d.year, d.month
+        ORDER BY d.month
+        """
+        rewrite = self.router.route(test_sql)
+        self.assertEqual(rewrite.rollup, "dw.rollup_visitor_month")
+        self.assertIn("FROM dw.rollup_visitor_month fv", rewrite.sql)
+        self.assertNotIn("dw.fact_visitor", rewrite.sql)
+
+    def test_region_and_industry_grain(self):
+        """Grouping by region and industry needs the finest spending rollup"""
+        test_sql = """
+        SELECT r.region_name, i.industry_name, SUM(fs.total_amount) AS total_spending
+        FROM dw.fact_spending fs
+        JOIN dw.dim_region r ON fs.region_id = r.region_id
+        JOIN dw.dim_industry i ON fs.industry_id = i.industry_id
+        JOIN dw.dim_date d ON fs.date_id = d.date_id
+        WHERE EXTRACT(year FROM d.full_date) = 2023
+        GROUP BY r.region_name, i.industry_name
+        """
+        rewrite = self.router.route(test_sql)
+        self.assertEqual(rewrite.rollup, "dw.rollup_spending_region_month_industry")
+
+    def test_day_level_queries_are_not_rewritten(self):
+        """Queries that need daily rows keep the fact table"""
+        test_sql = """
+        SELECT d.full_date, SUM(fv.total_visitors) AS total_visitors
+        FROM dw.fact_visitor fv
+        JOIN dw.dim_date d ON fv.date_id = d.date_id
+        WHERE d.is_weekend = true
+        GROUP BY d.full_date
+        """
+        rewrite = self.router.route(test_sql)
+        self.assertIsNone(rewrite.rollup)
+        self.assertEqual(rewrite.sql, test_sql)
+
+    def test_non_additive_aggregates_are_not_rewritten(self):
+        """AVG and COUNT over rollup rows would differ from the fact rows"""
+        for test_sql in [
+            "SELECT AVG(fv.total_visitors) FROM dw.fact_visitor fv",
+            "SELECT COUNT(*) FROM dw.fact_spending fs",
+            "SELECT fs.region_id, SUM(fs.total_amount) FROM dw.fact_spending fs WHERE fs.total_amount > 100 GROUP BY fs.region_id",
+        ]:
+            self.assertIsNone(self.router.route(test_sql).rollup, test_sql)
+
+    def test_columns_missing_from_rollups(self):
+        """JSONB columns only exist on the fact table"""
+        test_sql = """
+        SELECT fv.region_id, SUM(fv.total_visitors)
+        FROM dw.fact_visitor fv
+        WHERE fv.demographics->>'gender' = 'female'
+        GROUP BY fv.region_id
+        """
+        self.assertIsNone(self.router.route(test_sql).rollup)
+
+    def test_unknown_fact_columns_are_not_dropped(self):
+        """A qualified fact column the router does not know is not in any rollup"""
+        test_sql = """
+        SELECT fv.region_id, SUM(fv.total_visitors)
+        FROM dw.fact_visitor fv
+        WHERE fv.visitor_segment = 'business'
+        GROUP BY fv.region_id
+        """
+        rewrite = self.router.route(test_sql)
+        self.assertIsNone(rewrite.rollup)
+        self.assertIn("visitor_segment", rewrite.reason)
+
+
+class TestRollupAvailability(unittest.TestCase):
+    def test_no_rollups_installed(self):
+        """Without rollup tables in pg_class, queries keep the fact table"""
+        router = RollupRouter()
+        router.load_row_estimates(FakeSession(rows=[]))
+        rewrite = router.route(MONTHLY_TOTALS_SQL)
+        self.assertIsNone(rewrite.rollup)
+        self.assertEqual(rewrite.sql, MONTHLY_TOTALS_SQL)
+
+    def test_only_installed_rollups_are_used(self):
+        """A rollup missing from pg_class is skipped for a larger installed one"""
+        router = RollupRouter()
+        router.load_row_estimates(FakeSession(rows=[EstimateRow("dw.rollup_visitor_region_month", 5000)]))
+        rewrite = router.route(MONTHLY_TOTALS_SQL)
+        self.assertEqual(rewrite.rollup, "dw.rollup_visitor_region_month")
+        self.assertEqual(rewrite.estimated_rows, 5000)
+
+    def test_estimates_that_cannot_be_loaded(self):
+        """When pg_class cannot be read, nothing is routed and the next query tries again"""
+        router = RollupRouter()
+        session = FakeSession(error=RuntimeError("connection lost"))
+        router.load_row_estimates(session)
+        self.assertTrue(session.rolled_back)
+        self.assertFalse(router.estimates_current)
+        self.assertIsNone(router.route(MONTHLY_TOTALS_SQL).rollup)
+        router.load_row_estimates(FakeSession(rows=[EstimateRow("dw.rollup_visitor_month", 100)]))
+        self.assertEqual(router.route(MONTHLY_TOTALS_SQL).rollup, "dw.rollup_visitor_month")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+import unittest
+import asyncio
+import sys
+import os
+import subprocess
+import tempfile
+import time
+
+# Add the parent directory to the path to import the application modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.shared_cache import MemoryCache, SQLiteCache, cache_from_url
+
+
+class TestMemoryCache(unittest.TestCase):
+    def test_namespaces_are_separate(self):
+        cache = MemoryCache()
+        cache.set("sql", "q", "SELECT 1")
+        self.assertEqual(cache.get("sql", "q"), "SELECT 1")
+        self.assertIsNone(cache.get("result", "q"))
+        self.assertEqual(cache.get("result", "q", default=[]), [])
+
+    def test_entries_expire(self):
+        cache = MemoryCache()
+        cache.set("sql", "q", "SELECT 1", ttl=0.05)
+        time.sleep(0.1)
+        self.assertIsNone(cache.get("sql", "q"))
+
+    def test_oldest_entry_is_evicted(self):
+        cache = MemoryCache(max_entries=2)
+        for key in ["a", "b", "c"]:
+            cache.set("result", key, key)
+        self.assertIsNone(cache.get("result", "a"))
+        self.assertEqual(cache.get("result", "c"), "c")
+
+    def test_size_is_bounded_in_bytes(self):
+        cache = MemoryCache(max_bytes=3000)
+        for key in ["a", "b", "c"]:
+            cache.set("result", key, "x" * 1000)
+        self.assertIsNone(cache.get("result", "a"))
+        self.assertEqual(cache.get("result", "c"), "x" * 1000)
+        self.assertLessEqual(cache.size, 3000)
+        # Too large to store at all; nothing else is evicted for it
+        cache.set("result", "huge", "x" * 5000)
+        self.assertIsNone(cache.get("result", "huge"))
+        self.assertEqual(cache.get("result", "c"), "x" * 1000)
+        cache.clear()
+        self.assertEqual(cache.size, 0)
+
+    def test_async_access(self):
+        cache = MemoryCache()
+
+        async def scenario():
+            await cache.aset("sql", "q", "SELECT 1", ttl=60)
+            found = await cache.aget("sql", "q")
+            await cache.adelete("sql", "q")
+            return found, await cache.aget("sql", "q", default="gone")
+
+        self.assertEqual(asyncio.run(scenario()), ("SELECT 1", "gone"))
+
+    def test_empty_results_are_hits(self):
+        cache = MemoryCache()
+        cache.set("result", "q", [])
+        self.assertEqual(cache.get("result", "q"), [])
+
+
+class TestSQLiteCache(unittest.TestCase):
+    def setUp(self):
+        """Set up the test environment"""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "cache.db")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_values_are_shared_between_processes(self):
+        SQLiteCache(self.path).set("schema", "dw", {"schema_context": "Table: dw.fact_visitor"}, ttl=60)
+        code = ("from app.utils.shared_cache import SQLiteCache\n"
+                f"print(SQLiteCache({self.path!r}).get('schema', 'dw')['schema_context'])")
+        process = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, timeout=60)
+        self.assertEqual(process.returncode, 0, process.stderr[-2000:])
+        self.assertEqual(process.stdout.strip(), "Table: dw.fact_visitor")
+
+    def test_entries_expire_and_can_be_deleted(self):
+        cache = SQLiteCache(self.path)
+        cache.set("sql", "old", "SELECT 1", ttl=0.05)
+        cache.set("sql", "kept", "SELECT 2")
+        time.sleep(0.1)
+        self.assertIsNone(cache.get("sql", "old"))
+        self.assertEqual(cache.get("sql", "kept"), "SELECT 2")
+        cache.delete("sql", "kept")
+        self.assertIsNone(cache.get("sql", "kept"))
+
+
+class TestCacheFromURL(unittest.TestCase):
+    def test_backends(self):
+        self.assertIsInstance(cache_from_url(""), MemoryCache)
+        self.assertIsInstance(cache_from_url("memory://"), MemoryCache)
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = cache_from_url(f"sqlite:///{tmp}/cache.db")
+            self.assertIsInstance(cache, SQLiteCache)
+            self.assertEqual(cache.path, f"{tmp}/cache.db")
+        with self.assertRaises(ValueError):
+            cache_from_url("memcached://localhost")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+import unittest
+import asyncio
+import sys
+import os
+
+# Add the parent directory to the path to import the application modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.single_flight import SingleFlightStream
+
+
+class TestSingleFlightStream(unittest.TestCase):
+    def setUp(self):
+        """Set up the test environment"""
+        self.flights = SingleFlightStream(poll_interval=0.01)
+        self.runs = 0
+
+    def producer(self, steps=3, delay=0.02):
+        async def run(all_subscribers_gone):
+            self.runs += 1
+            for i in range(steps):
+                await asyncio.sleep(delay)
+                if await all_subscribers_gone():
+                    return
+                yield {"step": i}
+        return run
+
+    async def collect(self, key, producer, is_disconnected=None):
+        return [event async for event in self.flights.subscribe(key, producer, is_disconnected)]
+
+    def test_concurrent_subscribers_share_one_run(self):
+        """Identical concurrent requests run the producer once and all get every event"""
+        async def scenario():
+            producer = self.producer()
+            first = asyncio.create_task(self.collect("q", producer))
+            await asyncio.sleep(0.03)  # attach after the first event
+            second = asyncio.create_task(self.collect("q", producer))
+            return await asyncio.gather(first, second)
+
+        first, second = asyncio.run(scenario())
+        self.assertEqual(self.runs, 1)
+        self.assertEqual(first, [{"step": 0}, {"step": 1}, {"step": 2}])
+        self.assertEqual(second, first)
+
+    def test_finished_flights_are_not_reused(self):
+        """A request after the flight finished starts a new run"""
+        async def scenario():
+            await self.collect("q", self.producer(steps=1))
+            await self.collect("q", self.producer(steps=1))
+
+        asyncio.run(scenario())
+        self.assertEqual(self.runs, 2)
+
+    def test_producer_stops_when_all_subscribers_leave(self):
+        """The shared run is told to stop once nobody listens"""
+        async def scenario():
+            async def gone():
+                return True
+            events = await self.collect("q", self.producer(steps=50, delay=0.01), gone)
+            await asyncio.sleep(0.05)
+            return events
+
+        events = asyncio.run(scenario())
+        self.assertLess(len(events), 50)
+        self.assertFalse(self.flights.in_flight("q"))
+
+
+if __name__ == '__main__':
+    unittest.main()
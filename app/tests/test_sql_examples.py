@@ -0,0 +1,59 @@
+import unittest
+import sys
+import os
+from types import SimpleNamespace
+
+# Add the parent directory to the path to import the application modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.rag.sql_examples import get_sql_status, select_examples
+from app.services.sql_generation_service import SQLGenerationService
+
+
+def row(prompt, sql, status):
+    return SimpleNamespace(prompt=prompt, sql_query=sql, query_metadata={"sql_status": status})
+
+
+class TestSQLExamples(unittest.TestCase):
+    def test_only_working_llm_sql_is_selected(self):
+        """Fallback, empty and duplicate queries are skipped; similarity order is kept"""
+        rows = [
+            row("visitors in zurich 2023", "SELECT 1", "fallback"),
+            row("visitors in bern 2023", "SELECT 2", "ok"),
+            row("visitors in basel 2023", "SELECT 3", "empty"),
+            row("visitors in bern in 2023", " SELECT 2 ", "ok"),
+            row("visitors in geneva 2023", "SELECT 4", "ok"),
+            row("visitors in lucerne 2023", "SELECT 5", "ok"),
+        ]
+        examples = select_examples(rows, k=2)
+        self.assertEqual([example["sql"] for example in examples], ["SELECT 2", "SELECT 4"])
+        self.assertEqual(examples[0]["question"], "visitors in bern 2023")
+
+    def test_rows_without_metadata_are_skipped(self):
+        rows = [SimpleNamespace(prompt="q", sql_query="SELECT 1", query_metadata=None)]
+        self.assertEqual(select_examples(rows, k=3), [])
+
+    def test_sql_status(self):
+        self.assertEqual(get_sql_status(True, [{"a": 1}]), "fallback")
+        self.assertEqual(get_sql_status(False, [{"a": 1}]), "ok")
+        self.assertEqual(get_sql_status(False, []), "empty")
+
+    def test_examples_are_added_to_the_prompt(self):
+        service = SQLGenerationService(llm_adapter=None)
+        examples = [{"question": "visitors in bern 2023", "sql": "SELECT 2"}]
+        prompt = service._build_sql_prompt("visitors in zurich 2023", "schema", examples=examples)
+        self.assertIn("--- EXAMPLES ---", prompt)
+        self.assertIn("Question: visitors in bern 2023\nSQL:\nSELECT 2", prompt)
+        # The user question comes after the examples
+        self.assertLess(prompt.index("SELECT 2"), prompt.index("User Question: visitors in zurich 2023"))
+        self.assertNotIn("--- EXAMPLES ---", service._build_sql_prompt("q", "schema"))
+
+    def test_fallback_sql_is_recognized(self):
+        service = SQLGenerationService(llm_adapter=None)
+        question = "spending by industry in 2022"
+        self.assertTrue(service.is_fallback_sql(question, service._get_fallback_sql(question)))
+        self.assertFalse(service.is_fallback_sql(question, "SELECT 1"))
+
+
+if __name__ == "__main__":
+    unittest.main()
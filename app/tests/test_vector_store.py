@@ -0,0 +1,88 @@
+import unittest
+import sys
+import os
+import tempfile
+
+# Add the parent directory to the path to import the application modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.db.vector_store import VectorStore
+from app.rag.embedding_index import HashingEmbedder
+
+
+class CountingEmbeddingFunction:
+    """Local embeddings (no model download) that record what was embedded"""
+
+    def __init__(self):
+        self.embedder = HashingEmbedder(dim=64)
+        self.embedded = []
+
+    def __call__(self, input):
+        self.embedded.extend(input)
+        return self.embedder.embed(input).tolist()
+
+
+SCHEMA = {
+    "tables": {
+        "dw.fact_visitor": [
+            {"column_name": "total_visitors", "data_type": "integer"},
+            {"column_name": "date_id", "data_type": "integer"},
+        ],
+        "dw.dim_date": [{"column_name": "full_date", "data_type": "date"}],
+    },
+    "foreign_keys": {
+        "dw.fact_visitor": [{"column": "date_id", "references": "dw.dim_date.date_id"}],
+    },
+}
+
+
+class TestVectorStore(unittest.TestCase):
+    def setUp(self):
+        """Set up the test environment"""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "schema")
+        self.embedding_function = CountingEmbeddingFunction()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def store(self):
+        return VectorStore(path=self.path, embedding_function=self.embedding_function)
+
+    def test_nothing_is_opened_before_first_use(self):
+        self.store()
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_unchanged_schema_is_not_embedded_again(self):
+        self.assertEqual(self.store().add_schema_documents(SCHEMA), 4)
+        self.assertEqual(len(self.embedding_function.embedded), 4)
+
+        # A new instance (e.g. after a restart) finds everything stored
+        store = self.store()
+        self.assertEqual(store.add_schema_documents(SCHEMA), 0)
+        self.assertEqual(len(self.embedding_function.embedded), 4)
+        self.assertEqual(store.collection.count(), 4)
+
+    def test_changed_columns_are_replaced(self):
+        store = self.store()
+        store.add_schema_documents(SCHEMA)
+        changed = {
+            "tables": {**SCHEMA["tables"], "dw.dim_date": [{"column_name": "full_date", "data_type": "timestamp"}]},
+            "foreign_keys": SCHEMA["foreign_keys"],
+        }
+        self.assertEqual(store.add_schema_documents(changed), 1)
+        self.assertEqual(store.collection.count(), 4)
+        types = [result["metadata"]["data_type"] for result in store.query_schema("full_date", n_results=4)
+                 if result["metadata"].get("column_name") == "full_date"]
+        self.assertEqual(types, ["timestamp"])
+
+    def test_documents_from_separate_calls_do_not_collide(self):
+        store = self.store()
+        first = store.add_documents(["Visitors are counted per region and day"])
+        second = store.add_documents(["Spending is recorded per industry"])
+        self.assertNotEqual(first, second)
+        self.assertEqual(store.collection.count(), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
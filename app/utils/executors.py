@@ -0,0 +1,132 @@
+"""
+Executor pools for blocking pipeline work.
+
+Blocking calls must not run on the event loop: while they run, every other
+request (and every open SSE stream) stands still. They go to one of two
+named pools instead:
+- "db": threads for database I/O (psycopg2 releases the GIL while waiting)
+- "cpu": chart building and other pandas/Plotly work; threads by default, or
+  processes (CPU_EXECUTOR_KIND=process) so charts build in parallel with the
+  loop. Process workers receive and return plain data (row dicts, JSON-ready
+  chart dicts), so functions sent there must be module-level and their
+  results cheap to pickle.
+
+Keeping the pools apart means a burst of slow charts cannot take the threads
+that queries need, and the reverse. Each pool exports how many tasks are
+pending, how long they waited for a worker and how long they ran.
+"""
+import asyncio
+import logging
+import multiprocessing
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from app.core.config import settings
+from app.core.metrics import EXECUTOR_PENDING, EXECUTOR_QUEUE_WAIT_SECONDS, EXECUTOR_TASK_SECONDS, EXECUTOR_WORKERS
+
+logger = logging.getLogger(__name__)
+
+THREAD = "thread"
+PROCESS = "process"
+
+
+def _timed_call(fn: Callable, args: tuple, kwargs: dict):
+    """Runs in the worker; wall-clock times are comparable across processes"""
+    started = time.time()
+    result = fn(*args, **kwargs)
+    return started, time.time(), result
+
+
+class ExecutorPool:
+    """A named thread or process pool whose tasks are awaited from the event loop"""
+
+    def __init__(self, name: str, kind: str = THREAD, max_workers: int = 4,
+                 start_method: str = "spawn"):
+        if kind not in (THREAD, PROCESS):
+            raise ValueError(f"Unknown executor kind: {kind}")
+        self.name = name
+        self.kind = kind
+        self.max_workers = max_workers
+        self.start_method = start_method
+        self.pending = 0
+        self._executor: Optional[Executor] = None
+
+    @property
+    def executor(self) -> Executor:
+        # Created on first use so importing the app starts no threads or processes
+        if self._executor is None:
+            if self.kind == PROCESS:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers, mp_context=multiprocessing.get_context(self.start_method))
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix=f"{self.name}-pool")
+            EXECUTOR_WORKERS.labels(pool=self.name).set(self.max_workers)
+            logger.info(f"Started {self.kind} pool '{self.name}' with {self.max_workers} workers")
+        return self._executor
+
+    def submit(self, fn: Callable, *args, **kwargs) -> asyncio.Future:
+        """
+        Run fn(*args, **kwargs) in the pool.
+
+        Returns an asyncio future for the result. Cancelling it does not stop
+        the work already running in the worker.
+        """
+        loop = asyncio.get_running_loop()
+        submitted = time.time()
+        self._set_pending(+1)
+        inner = loop.run_in_executor(self.executor, _timed_call, fn, args, kwargs)
+        outer = loop.create_future()
+
+        def done(future: asyncio.Future) -> None:
+            self._set_pending(-1)
+            if outer.done():
+                return
+            if future.cancelled():
+                outer.cancel()
+            elif future.exception() is not None:
+                outer.set_exception(future.exception())
+            else:
+                started, finished, result = future.result()
+                EXECUTOR_QUEUE_WAIT_SECONDS.labels(pool=self.name).observe(max(started - submitted, 0.0))
+                EXECUTOR_TASK_SECONDS.labels(pool=self.name).observe(max(finished - started, 0.0))
+                outer.set_result(result)
+
+        inner.add_done_callback(done)
+        return outer
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        return await self.submit(fn, *args, **kwargs)
+
+    def _set_pending(self, delta: int) -> None:
+        self.pending += delta
+        EXECUTOR_PENDING.labels(pool=self.name).set(self.pending)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+_pools: Dict[str, ExecutorPool] = {}
+
+
+def get_executor_pool(name: str) -> ExecutorPool:
+    """The process-wide "db" or "cpu" pool, configured from settings"""
+    pool = _pools.get(name)
+    if pool is None:
+        if name == "db":
+            pool = ExecutorPool("db", THREAD, settings.DB_EXECUTOR_WORKERS)
+        elif name == "cpu":
+            pool = ExecutorPool("cpu", settings.CPU_EXECUTOR_KIND, settings.CPU_EXECUTOR_WORKERS)
+        else:
+            raise ValueError(f"Unknown executor pool: {name}")
+        _pools[name] = pool
+    return pool
+
+
+def shutdown_executor_pools() -> None:
+    for pool in _pools.values():
+        pool.shutdown()
+    _pools.clear()
@@ -0,0 +1,123 @@
+"""
+Event-loop blocking detector.
+
+A heartbeat task sleeps for a short interval and measures how late it wakes
+up; that lateness is the event-loop lag, exported as a histogram. A monitor
+thread watches the heartbeat: when the loop has not come back for longer
+than the threshold, something is running synchronously on it, and the
+monitor captures the stack of the loop thread at that moment. The stack is
+logged and counted by the innermost application frame, so every sync call
+on the request path can be found and moved off the loop.
+
+Unlike asyncio's debug mode (slow_callback_duration), this runs in
+production at the cost of one timer wake-up per interval, and it reports
+where the loop is stuck rather than only which callback was slow.
+"""
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+from app.core.metrics import EVENT_LOOP_BLOCK_SECONDS, EVENT_LOOP_BLOCKS, EVENT_LOOP_LAG_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Root of the application code; blocked stacks are attributed to the innermost frame under it
+_APP_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class LoopWatchdog:
+    """Measures event-loop lag and captures the stack of callbacks that block the loop"""
+
+    def __init__(self, threshold: float = 0.1, interval: float = 0.025, stack_depth: int = 25,
+                 app_root: str = _APP_ROOT):
+        self.threshold = threshold
+        self.interval = interval
+        self.stack_depth = stack_depth
+        self.app_root = app_root
+        self.reports: Deque[Dict[str, Any]] = deque(maxlen=50)
+        self._last_beat = time.perf_counter()
+        self._current_report: Optional[Dict[str, Any]] = None
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._monitor_thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    @classmethod
+    def from_settings(cls, settings) -> "LoopWatchdog":
+        return cls(threshold=settings.LOOP_WATCHDOG_THRESHOLD_MS / 1000,
+                   interval=settings.LOOP_WATCHDOG_INTERVAL_MS / 1000)
+
+    def start(self) -> None:
+        """Start watching the running event loop (call from a coroutine on that loop)"""
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.perf_counter()
+        self._stop.clear()
+        self._task = asyncio.get_running_loop().create_task(self._heartbeat())
+        self._monitor_thread = threading.Thread(target=self._monitor, name="loop-watchdog", daemon=True)
+        self._monitor_thread.start()
+        logger.info(f"Event-loop watchdog started (threshold {self.threshold * 1000:.0f}ms)")
+
+    async def stop(self) -> None:
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if self._monitor_thread is not None:
+            self._monitor_thread.join()
+
+    async def _heartbeat(self) -> None:
+        while True:
+            before = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            now = time.perf_counter()
+            lag = max(now - before - self.interval, 0.0)
+            EVENT_LOOP_LAG_SECONDS.observe(lag)
+            self._last_beat = now
+            report = self._current_report
+            if report is not None:
+                # The loop is back; record how long the block lasted
+                self._current_report = None
+                report["blocked_seconds"] = lag
+                EVENT_LOOP_BLOCK_SECONDS.observe(lag)
+                logger.warning(f"Event loop was blocked for {lag * 1000:.0f}ms in {report['location']}")
+
+    def _monitor(self) -> None:
+        while not self._stop.wait(self.interval):
+            stalled = time.perf_counter() - self._last_beat - self.interval
+            if stalled > self.threshold and self._current_report is None:
+                self._report_block(stalled)
+
+    def _report_block(self, stalled: float) -> None:
+        frame = sys._current_frames().get(self._loop_thread_id)
+        if frame is None:
+            return
+        stack = traceback.extract_stack(frame)
+        location = self._location(stack)
+        report = {
+            "location": location,
+            "stalled_seconds": stalled,
+            "stack": traceback.format_list(stack[-self.stack_depth:]),
+            "time": time.time(),
+        }
+        self._current_report = report
+        self.reports.append(report)
+        EVENT_LOOP_BLOCKS.labels(location=location).inc()
+        logger.warning(f"Event loop blocked for more than {stalled * 1000:.0f}ms in {location}; stack:\n"
+                       + "".join(report["stack"]))
+
+    def _location(self, stack: List[traceback.FrameSummary]) -> str:
+        """file:function of the innermost application frame (or of the innermost frame)"""
+        for summary in reversed(stack):
+            if summary.filename.startswith(self.app_root) and summary.filename != __file__:
+                return f"{os.path.relpath(summary.filename, os.path.dirname(self.app_root))}:{summary.name}"
+        summary = stack[-1] if stack else None
+        return f"{os.path.basename(summary.filename)}:{summary.name}" if summary else "unknown"
@@ -0,0 +1,190 @@
+"""
+On-demand sampling profiler for single chat requests.
+
+While a profiled request runs, a background thread samples the Python stacks
+of the process every few milliseconds (sys._current_frames). When the request
+ends the samples are written as a speedscope file (https://www.speedscope.app),
+one sampled profile per thread, so time spent in pandas on the event loop,
+regexes in the SQL fixes, JSON encoding or waiting on the database in an
+executor thread shows up in the flamegraph.
+
+The sampler sees the whole process: when other requests run concurrently,
+their frames appear in the same profile. Profile a quiet instance, or read
+the flamegraph with that in mind. Since every sample walks every thread's
+stack, requests are profiled one at a time (start_exclusive).
+"""
+import hmac
+import json
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+Frame = Tuple[str, str, int]
+
+# Profiles are stored by message id; anything else is refused as a file name
+_PROFILE_ID = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+class SamplingProfiler:
+    """Samples the stacks of all threads at a fixed interval"""
+
+    # Held by the profiler started with start_exclusive() until it stops
+    _exclusive = threading.Lock()
+
+    def __init__(self, interval: float = 0.005, max_depth: int = 128):
+        self.interval = interval
+        self.max_depth = max_depth
+        self._frames: Dict[Frame, int] = {}
+        # thread name -> list of (timestamp, stack as frame indices, root first)
+        self._samples: Dict[str, List[Tuple[float, List[int]]]] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.started_at: Optional[float] = None
+        self.stopped_at: Optional[float] = None
+        self._holds_exclusive = False
+
+    @classmethod
+    def start_exclusive(cls, interval: float = 0.005) -> Optional["SamplingProfiler"]:
+        """Start a profiler unless another one started this way is still running"""
+        if not cls._exclusive.acquire(blocking=False):
+            return None
+        profiler = cls(interval=interval)
+        profiler._holds_exclusive = True
+        return profiler.start()
+
+    def start(self) -> "SamplingProfiler":
+        self.started_at = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> "SamplingProfiler":
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.stopped_at = time.perf_counter()
+        if self._holds_exclusive:
+            self._holds_exclusive = False
+            self._exclusive.release()
+        return self
+
+    def _run(self) -> None:
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            self.sample(exclude={own_id})
+
+    def sample(self, exclude=()) -> None:
+        """Record the current stack of every thread (except the excluded ids)"""
+        now = time.perf_counter()
+        names = {t.ident: t.name for t in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id in exclude:
+                continue
+            stack = []
+            while frame is not None and len(stack) < self.max_depth:
+                code = frame.f_code
+                stack.append(self._frame_index((code.co_name, code.co_filename, frame.f_lineno)))
+                frame = frame.f_back
+            stack.reverse()
+            name = names.get(thread_id, f"thread-{thread_id}")
+            self._samples.setdefault(name, []).append((now, stack))
+
+    def _frame_index(self, frame: Frame) -> int:
+        index = self._frames.get(frame)
+        if index is None:
+            index = self._frames[frame] = len(self._frames)
+        return index
+
+    @property
+    def sample_count(self) -> int:
+        return sum(len(samples) for samples in self._samples.values())
+
+    def to_speedscope(self, name: str) -> dict:
+        """Speedscope file format: one sampled profile per thread, weights in seconds"""
+        frames = [{"name": fn, "file": filename, "line": line}
+                  for (fn, filename, line), _ in sorted(self._frames.items(), key=lambda item: item[1])]
+        end = (self.stopped_at or time.perf_counter()) - (self.started_at or 0)
+        profiles = []
+        for thread_name, samples in sorted(self._samples.items()):
+            # Each sample stands for the time until the next one (the last one for one interval)
+            weights = [later[0] - earlier[0] for earlier, later in zip(samples, samples[1:])]
+            weights.append(self.interval)
+            profiles.append({
+                "type": "sampled",
+                "name": thread_name,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": end,
+                "samples": [stack for _, stack in samples],
+                "weights": weights,
+            })
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "tourism-analytics request profiler",
+            "activeProfileIndex": 0,
+            "shared": {"frames": frames},
+            "profiles": profiles,
+        }
+
+
+def should_profile(requested: bool, sample_rate: float, on_demand: bool = True,
+                   rand: Callable[[], float] = random.random) -> bool:
+    """Profile when asked for (and allowed), or for a sample_rate fraction of all requests"""
+    if requested and on_demand:
+        return True
+    return sample_rate > 0 and rand() < sample_rate
+
+
+def has_profile_access(given_token: str, required_token: str) -> bool:
+    """Whether a request may trigger or download profiles (always, when no token is configured)"""
+    if not required_token:
+        return True
+    return hmac.compare_digest(given_token.encode("utf-8"), required_token.encode("utf-8"))
+
+
+class ProfileStore:
+    """Speedscope files on disk, named by message id, keeping the newest max_files"""
+
+    SUFFIX = ".speedscope.json"
+
+    def __init__(self, directory: str, max_files: int = 200):
+        self.directory = directory
+        self.max_files = max_files
+
+    def path(self, profile_id: str) -> Optional[str]:
+        if not _PROFILE_ID.match(profile_id or ""):
+            return None
+        return os.path.join(self.directory, profile_id + self.SUFFIX)
+
+    def save(self, profile_id: str, profiler: SamplingProfiler) -> Optional[str]:
+        path = self.path(profile_id)
+        if path is None:
+            logger.warning(f"Not storing profile with invalid id {profile_id!r}")
+            return None
+        os.makedirs(self.directory, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(profiler.to_speedscope(profile_id), f)
+        self._prune()
+        return path
+
+    def load(self, profile_id: str) -> Optional[str]:
+        """Path of a stored profile, or None"""
+        path = self.path(profile_id)
+        return path if path and os.path.exists(path) else None
+
+    def _prune(self) -> None:
+        try:
+            files = [os.path.join(self.directory, f) for f in os.listdir(self.directory) if f.endswith(self.SUFFIX)]
+            files.sort(key=os.path.getmtime)
+            for old in files[:max(len(files) - self.max_files, 0)]:
+                os.remove(old)
+        except OSError as e:
+            logger.warning(f"Could not prune stored profiles: {e}")
@@ -0,0 +1,174 @@
+"""
+Pre-execution cost guard for generated SQL.
+
+Before a generated query runs, the guard asks the planner for its estimate
+(EXPLAIN (FORMAT JSON), which does not execute the query) and
+- appends a LIMIT to queries that have none, so an unexpectedly large result
+  is cut off instead of being materialized and serialized
+- rejects queries whose estimated cost or row count is above the configured
+  thresholds, so they never take a pool connection for the length of the
+  statement timeout
+- derives a statement_timeout for the query from its estimated cost, so cheap
+  queries fail fast when the estimate is badly off
+"""
+import re
+import json
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+
+class QueryRejectedError(Exception):
+    """Raised when the planner estimate of a query is above the guard's limits"""
+    pass
+
+
+@dataclass
+class QueryGuardDecision:
+    """What the guard decided for one query"""
+    sql: str
+    original_sql: str
+    estimated_cost: Optional[float] = None
+    estimated_rows: Optional[float] = None
+    limit_injected: bool = False
+    statement_timeout_ms: Optional[int] = None
+    notes: List[str] = field(default_factory=list)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "estimated_cost": self.estimated_cost,
+            "estimated_rows": self.estimated_rows,
+            "limit_injected": self.limit_injected,
+            "statement_timeout_ms": self.statement_timeout_ms,
+            "guard_notes": self.notes,
+        }
+
+
+def _mask_sql(sql: str) -> str:
+    """Replace comments and string literals by spaces, keeping the offsets"""
+    def blank(match):
+        return " " * len(match.group(0))
+    sql = re.sub(r"--[^\n]*", blank, sql)
+    sql = re.sub(r"/\*.*?\*/", blank, sql, flags=re.DOTALL)
+    return re.sub(r"'(?:[^']|'')*'", blank, sql)
+
+
+def has_top_level_limit(sql: str) -> bool:
+    """Whether the outermost query already limits its rows (LIMIT or FETCH FIRST)"""
+    masked = _mask_sql(sql)
+    depth = 0
+    for match in re.finditer(r"[()]|\blimit\b|\bfetch\s+(?:first|next)\b", masked, re.IGNORECASE):
+        token = match.group(0)
+        if token == "(":
+            depth += 1
+        elif token == ")":
+            depth -= 1
+        elif depth == 0:
+            return True
+    return False
+
+
+def inject_limit(sql: str, limit: int) -> str:
+    """Append a LIMIT to a SELECT/WITH query that has none at the top level"""
+    stripped = sql.strip().rstrip(";").rstrip()
+    if not re.match(r"^\s*(select|with)\b", _mask_sql(stripped), re.IGNORECASE):
+        return sql
+    if has_top_level_limit(stripped):
+        return sql
+    # On its own line so a trailing line comment cannot swallow it
+    return f"{stripped}\nLIMIT {int(limit)}"
+
+
+def parse_plan(explain_result: Any) -> Dict[str, Any]:
+    """Return the root plan node of an EXPLAIN (FORMAT JSON) result"""
+    if isinstance(explain_result, (str, bytes)):
+        explain_result = json.loads(explain_result)
+    if isinstance(explain_result, list):
+        explain_result = explain_result[0]
+    return explain_result["Plan"]
+
+
+class QueryGuard:
+    """Checks generated queries against planner estimates before they run"""
+
+    def __init__(self, max_cost: float, max_rows: float, auto_limit: int,
+                 min_timeout_ms: int, max_timeout_ms: int, cost_units_per_second: float):
+        """
+        Args:
+            max_cost: Reject queries with a higher estimated total cost
+            max_rows: Reject queries estimated to return more rows (after the LIMIT)
+            auto_limit: LIMIT appended to queries without one (0 disables)
+            min_timeout_ms: Lower bound of the per-query statement_timeout
+            max_timeout_ms: Upper bound of the per-query statement_timeout
+            cost_units_per_second: Planner cost units this database executes per second
+        """
+        self.max_cost = max_cost
+        self.max_rows = max_rows
+        self.auto_limit = auto_limit
+        self.min_timeout_ms = min_timeout_ms
+        self.max_timeout_ms = max_timeout_ms
+        self.cost_units_per_second = cost_units_per_second
+
+    @classmethod
+    def from_settings(cls, settings) -> "QueryGuard":
+        return cls(
+            max_cost=settings.QUERY_GUARD_MAX_COST,
+            max_rows=settings.QUERY_GUARD_MAX_ROWS,
+            auto_limit=settings.QUERY_GUARD_AUTO_LIMIT,
+            min_timeout_ms=settings.QUERY_GUARD_MIN_TIMEOUT_MS,
+            max_timeout_ms=settings.QUERY_GUARD_MAX_TIMEOUT_MS,
+            cost_units_per_second=settings.QUERY_GUARD_COST_UNITS_PER_SECOND,
+        )
+
+    def timeout_for_cost(self, cost: float) -> int:
+        """Statement timeout for a query of the given estimated cost"""
+        # Three times the expected runtime leaves room for estimation error
+        expected_ms = cost / self.cost_units_per_second * 1000
+        return int(min(self.max_timeout_ms, max(self.min_timeout_ms, expected_ms * 3)))
+
+    def explain(self, sql_query: str, db_session) -> Dict[str, Any]:
+        """Planner estimate of a query (the query itself is not executed)"""
+        result = db_session.execute(text(f"EXPLAIN (FORMAT JSON) {sql_query}")).scalar()
+        return parse_plan(result)
+
+    def check(self, sql_query: str, db_session) -> QueryGuardDecision:
+        """
+        Decide how (and whether) a query should run.
+
+        Args:
+            sql_query: SQL to execute
+            db_session: Session the query will run on
+
+        Returns:
+            QueryGuardDecision with the SQL to execute and its statement timeout
+
+        Raises:
+            QueryRejectedError: If the estimate is above the configured limits
+        """
+        decision = QueryGuardDecision(sql=sql_query, original_sql=sql_query)
+        if self.auto_limit:
+            limited = inject_limit(sql_query, self.auto_limit)
+            if limited != sql_query:
+                decision.sql = limited
+                decision.limit_injected = True
+                decision.notes.append(f"LIMIT {self.auto_limit} added")
+
+        plan = self.explain(decision.sql, db_session)
+        decision.estimated_cost = float(plan.get("Total Cost", 0.0))
+        decision.estimated_rows = float(plan.get("Plan Rows", 0.0))
+
+        if decision.estimated_cost > self.max_cost:
+            raise QueryRejectedError(
+                f"Query rejected: estimated cost {decision.estimated_cost:,.0f} exceeds the limit of "
+                f"{self.max_cost:,.0f}. Narrow the date range or regions, or aggregate the data.")
+        if decision.estimated_rows > self.max_rows:
+            raise QueryRejectedError(
+                f"Query rejected: estimated {decision.estimated_rows:,.0f} result rows exceed the limit of "
+                f"{self.max_rows:,.0f}. Aggregate the data or add a LIMIT.")
+
+        decision.statement_timeout_ms = self.timeout_for_cost(decision.estimated_cost)
+        return decision
@@ -0,0 +1,306 @@
+"""
+Routing of generated SQL to the pre-aggregated rollup tables.
+
+The rollups (app/scripts/dw2/task9_rollup_tables.sql) hold the additive
+measures of dw.fact_visitor and dw.fact_spending summed per month, keyed by
+the date_id of the first day of the month. A query can be answered from a
+rollup by swapping the fact table name when it
+- reads the fact table exactly once,
+- only SUMs the measures (no COUNT/AVG/window functions over fact rows),
+- uses the fact date_id only to join dw.dim_date, and dim_date only for
+  month-level attributes (year, quarter, month, month_name, season),
+- references no fact column the rollup does not have.
+Everything else is left untouched. The check is deliberately conservative:
+a query that is not recognised is simply run against the fact table.
+"""
+import re
+import time
+import logging
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, Iterable, List, Optional
+
+from sqlalchemy import text
+from app.core.metrics import CACHE_LOOKUPS
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class RollupDefinition:
+    """A rollup table and the fact columns it can stand in for"""
+    name: str
+    fact_table: str
+    dimensions: FrozenSet[str]
+    measures: FrozenSet[str]
+    # Used when no row estimates from pg_class are available
+    default_rows: int
+
+
+@dataclass
+class RollupRewrite:
+    """Result of routing one query"""
+    sql: str
+    original_sql: str
+    rollup: Optional[str] = None
+    fact_table: Optional[str] = None
+    estimated_rows: Optional[int] = None
+    reason: str = ""
+
+    @property
+    def rewritten(self) -> bool:
+        return self.rollup is not None
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            "rollup_used": self.rollup,
+            "fact_table": self.fact_table,
+            "rollup_estimated_rows": self.estimated_rows,
+            "rollup_reason": self.reason,
+        }
+
+
+VISITOR_MEASURES = frozenset({
+    "total_visitors", "swiss_tourists", "foreign_tourists",
+    "swiss_locals", "swiss_commuters", "foreign_workers",
+})
+SPENDING_MEASURES = frozenset({"transaction_count", "total_amount"})
+
+# Keep in sync with task9_rollup_tables.sql
+ROLLUPS: List[RollupDefinition] = [
+    RollupDefinition("dw.rollup_visitor_month", "dw.fact_visitor",
+                     frozenset({"date_id", "source_system"}), VISITOR_MEASURES, 50),
+    RollupDefinition("dw.rollup_visitor_region_month", "dw.fact_visitor",
+                     frozenset({"date_id", "region_id", "source_system"}), VISITOR_MEASURES, 5_000),
+    RollupDefinition("dw.rollup_spending_month_industry", "dw.fact_spending",
+                     frozenset({"date_id", "industry_id", "source_system"}), SPENDING_MEASURES, 1_000),
+    RollupDefinition("dw.rollup_spending_region_month", "dw.fact_spending",
+                     frozenset({"date_id", "region_id", "source_system"}), SPENDING_MEASURES, 5_000),
+    RollupDefinition("dw.rollup_spending_region_month_industry", "dw.fact_spending",
+                     frozenset({"date_id", "region_id", "industry_id", "source_system"}), SPENDING_MEASURES, 100_000),
+]
+
+# Columns of the fact tables (app/models/dw_models.py and the dw2 scripts)
+FACT_COLUMNS: Dict[str, FrozenSet[str]] = {
+    "dw.fact_visitor": VISITOR_MEASURES | frozenset({
+        "fact_id", "date_id", "region_id", "source_system", "demographics", "dwell_time",
+        "top_foreign_countries", "top_swiss_cantons", "top_municipalities", "top_last_cantons",
+        "top_last_municipalities", "overnights_from_yesterday", "transaction_metrics", "aoi_id",
+        "load_date", "ingestion_timestamp", "raw_content", "data_quality_metrics",
+        "created_at", "updated_at",
+    }),
+    "dw.fact_spending": SPENDING_MEASURES | frozenset({
+        "fact_id", "date_id", "region_id", "industry_id", "source_system", "avg_transaction",
+        "total_spending", "geo_latitude", "geo_longitude", "geo_point", "batch_id",
+        "load_date", "ingestion_timestamp", "raw_content", "data_quality_metrics",
+        "created_at", "updated_at",
+    }),
+}
+
+# dim_date attributes that are constant within a month
+MONTH_LEVEL_DATE_COLUMNS = frozenset({"year", "quarter", "month", "month_name", "season"})
+DAY_LEVEL_DATE_COLUMNS = frozenset({"full_date", "week", "day", "day_of_week", "is_weekend", "is_holiday"})
+
+# Aggregates/constructs that would count or average rollup rows instead of fact rows
+UNSUPPORTED_PATTERNS = [
+    re.compile(r"\bcount\s*\(", re.IGNORECASE),
+    re.compile(r"\bavg\s*\(", re.IGNORECASE),
+    re.compile(r"\b(min|max)\s*\(", re.IGNORECASE),
+    re.compile(r"\b(stddev\w*|variance|var_\w+|percentile_\w+|array_agg|string_agg|jsonb?_agg)\s*\(", re.IGNORECASE),
+    re.compile(r"\bover\s*\(", re.IGNORECASE),
+    re.compile(r"\.\s*\*|\bselect\s+\*", re.IGNORECASE),
+]
+
+SQL_KEYWORDS = frozenset({
+    "select", "from", "where", "join", "inner", "left", "right", "full", "outer", "cross", "on",
+    "group", "by", "order", "having", "limit", "offset", "as", "and", "or", "not", "in", "is",
+    "null", "sum", "case", "when", "then", "else", "end", "asc", "desc", "with", "distinct",
+    "between", "like", "ilike", "union", "all", "coalesce", "round", "nullif", "cast", "numeric",
+    "integer", "int", "float", "text", "true", "false", "using", "lateral", "exists",
+})
+
+
+def _strip_literals(sql: str) -> str:
+    """Blank out string literals and comments so they are not taken for identifiers"""
+    sql = re.sub(r"--[^\n]*", " ", sql)
+    sql = re.sub(r"/\*.*?\*/", " ", sql, flags=re.DOTALL)
+    # Keep the date part names used by DATE_TRUNC
+    return re.sub(r"'(?!(?:year|quarter|month)')(?:[^']|'')*'", "''", sql, flags=re.IGNORECASE)
+
+
+def _table_aliases(sql: str, table: str) -> List[str]:
+    """Aliases under which a table is referenced (the table name itself if unaliased)"""
+    pattern = re.compile(
+        rf"\b{re.escape(table)}\b(?:\s+(?:as\s+)?(?!(?:{'|'.join(SQL_KEYWORDS)})\b)(\w+))?",
+        re.IGNORECASE,
+    )
+    return [match.group(1) or table for match in pattern.finditer(sql)]
+
+
+def _qualified_refs(sql: str, alias: str) -> List[str]:
+    """Columns referenced as alias.column"""
+    return [m.lower() for m in re.findall(rf"(?<![\w.]){re.escape(alias)}\.(\w+)", sql, re.IGNORECASE)]
+
+
+class RollupRouter:
+    """Rewrites fact-table queries to the smallest rollup that can answer them"""
+
+    def __init__(self, rollups: Optional[Iterable[RollupDefinition]] = None,
+                 estimate_ttl_seconds: int = 3600):
+        self.rollups = list(rollups) if rollups is not None else list(ROLLUPS)
+        self.estimate_ttl_seconds = estimate_ttl_seconds
+        # None until loaded: without a database to ask, every rollup is assumed installed
+        self._row_estimates: Optional[Dict[str, int]] = None
+        self._estimates_loaded_at: Optional[float] = None
+
+    @property
+    def estimates_current(self) -> bool:
+        """Whether the cached row estimates can still be used"""
+        return (self._estimates_loaded_at is not None and
+                time.monotonic() - self._estimates_loaded_at < self.estimate_ttl_seconds)
+
+    def load_row_estimates(self, db_session) -> None:
+        """Read the planner's row estimates of the rollup tables (cached for a while)"""
+        if self.estimates_current:
+            CACHE_LOOKUPS.labels(cache="rollup_estimates", result="hit").inc()
+            return
+        CACHE_LOOKUPS.labels(cache="rollup_estimates", result="miss").inc()
+        try:
+            rows = db_session.execute(text(
+                "SELECT n.nspname || '.' || c.relname AS name, c.reltuples::BIGINT AS estimate "
+                "FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace "
+                "WHERE n.nspname = 'dw' AND c.relname LIKE 'rollup\\_%'"
+            )).fetchall()
+            # reltuples is -1 for tables that were never analyzed
+            self._row_estimates = {row.name: int(row.estimate) for row in rows}
+        except Exception as e:
+            # Which rollups exist is unknown, so none is used until the next try
+            logger.warning(f"Could not load rollup row estimates: {e}")
+            # Leave the session usable for the query itself
+            db_session.rollback()
+            self._row_estimates = {}
+            self._estimates_loaded_at = None
+            return
+        self._estimates_loaded_at = time.monotonic()
+
+    def _estimated_rows(self, rollup: RollupDefinition) -> int:
+        estimate = (self._row_estimates or {}).get(rollup.name, -1)
+        return estimate if estimate >= 0 else rollup.default_rows
+
+    def _available(self, rollup: RollupDefinition) -> bool:
+        # Once estimates are loaded, a rollup missing from pg_class is not installed
+        return self._row_estimates is None or rollup.name in self._row_estimates
+
+    def route(self, sql_query: str) -> RollupRewrite:
+        """
+        Rewrite a query to use a rollup table when that gives the same result.
+
+        Args:
+            sql_query: Generated SQL
+
+        Returns:
+            RollupRewrite with the SQL to execute and which rollup was chosen (if any)
+        """
+        result = RollupRewrite(sql=sql_query, original_sql=sql_query)
+        if not sql_query:
+            result.reason = "empty query"
+            return result
+
+        scrubbed = _strip_literals(sql_query)
+        fact_tables = [t for t in FACT_COLUMNS if re.search(rf"\b{re.escape(t)}\b", scrubbed, re.IGNORECASE)]
+        if len(fact_tables) != 1:
+            result.reason = "no fact table" if not fact_tables else "more than one fact table"
+            return result
+        fact_table = result.fact_table = fact_tables[0]
+
+        aliases = _table_aliases(scrubbed, fact_table)
+        if len(aliases) != 1:
+            result.reason = "fact table referenced more than once"
+            return result
+        alias = aliases[0]
+
+        for pattern in UNSUPPORTED_PATTERNS:
+            match = pattern.search(scrubbed)
+            if match:
+                result.reason = f"unsupported construct '{match.group(0).strip()}'"
+                return result
+
+        # dim_date may only be joined on date_id and used for month-level attributes
+        date_aliases = _table_aliases(scrubbed, "dw.dim_date")
+        if len(date_aliases) > 1:
+            result.reason = "dim_date referenced more than once"
+            return result
+        if date_aliases:
+            date_alias = date_aliases[0]
+            date_join = re.compile(
+                rf"(?<![\w.]){re.escape(alias)}\.date_id\s*=\s*{re.escape(date_alias)}\.date_id\b|"
+                rf"(?<![\w.]){re.escape(date_alias)}\.date_id\s*=\s*{re.escape(alias)}\.date_id\b",
+                re.IGNORECASE,
+            )
+            if len(date_join.findall(scrubbed)) != 1:
+                result.reason = "fact table not joined to dim_date on date_id"
+                return result
+            without_join = date_join.sub(" ", scrubbed)
+            # Month-level expressions over the day's date
+            full_date = rf"(?<![\w.]){re.escape(date_alias)}\.full_date"
+            without_join = re.sub(
+                rf"\bextract\s*\(\s*(?:year|quarter|month)\s+from\s+{full_date}\s*\)|"
+                rf"\bdate_trunc\s*\(\s*'(?:year|quarter|month)'\s*,\s*{full_date}\s*\)",
+                " ", without_join, flags=re.IGNORECASE)
+            day_level = set(_qualified_refs(without_join, date_alias)) - MONTH_LEVEL_DATE_COLUMNS
+            if day_level:
+                result.reason = f"uses day-level date attributes: {', '.join(sorted(day_level))}"
+                return result
+        else:
+            without_join = scrubbed
+
+        # Fact columns used outside of the dim_date join
+        fact_refs = set(_qualified_refs(without_join, alias))
+        if "date_id" in fact_refs:
+            result.reason = "filters or groups on the daily date_id"
+            return result
+
+        # Measures may only appear inside SUM(...)
+        measures_in_sum = set(m.lower() for m in re.findall(
+            rf"\bsum\s*\(\s*(?:{re.escape(alias)}\.)?(\w+)\s*\)", without_join, re.IGNORECASE))
+        fact_columns = FACT_COLUMNS[fact_table]
+        bare_sum_removed = re.sub(
+            rf"\bsum\s*\(\s*(?:{re.escape(alias)}\.)?\w+\s*\)", " ", without_join, flags=re.IGNORECASE)
+        output_aliases = {a.lower() for a in re.findall(r"\bas\s+(\w+)", without_join, re.IGNORECASE)}
+        outside_sum = set(_qualified_refs(bare_sum_removed, alias))
+        unqualified = {
+            token.lower() for token in re.findall(r"(?<![\w.])([a-zA-Z_]\w*)\b(?!\s*\.)", bare_sum_removed)
+        } - output_aliases - SQL_KEYWORDS
+        if "date_id" in unqualified or (date_aliases and unqualified & DAY_LEVEL_DATE_COLUMNS):
+            result.reason = "uses day-level date columns"
+            return result
+        outside_sum |= unqualified & fact_columns
+
+        # Qualified references always count, unqualified ones only if they name a fact column
+        required = fact_refs | (measures_in_sum & fact_columns) | outside_sum
+        measures_needed = required & measures_in_sum
+        dimensions_needed = (required - measures_needed) | {"date_id"}
+
+        candidates = []
+        for rollup in self.rollups:
+            if rollup.fact_table != fact_table or not self._available(rollup):
+                continue
+            measure_outside_sum = outside_sum & rollup.measures
+            if measure_outside_sum:
+                continue
+            if not measures_needed <= rollup.measures:
+                continue
+            if not dimensions_needed <= rollup.dimensions:
+                continue
+            candidates.append(rollup)
+
+        if not candidates:
+            missing = sorted(dimensions_needed | measures_needed)
+            result.reason = f"no rollup covers columns: {', '.join(missing)}"
+            return result
+
+        best = min(candidates, key=self._estimated_rows)
+        result.rollup = best.name
+        result.estimated_rows = self._estimated_rows(best)
+        result.reason = f"month-level aggregate over {', '.join(sorted(measures_needed)) or 'dimensions'}"
+        result.sql = re.sub(rf"\b{re.escape(fact_table)}\b", best.name, sql_query, flags=re.IGNORECASE)
+        return result
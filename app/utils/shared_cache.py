@@ -0,0 +1,241 @@
+"""
+Caches shared by all worker processes of the app.
+
+With several uvicorn workers, per-process dicts multiply warmup work (every
+worker would count the rows of every DW table to build the schema context)
+and split hit rates between the workers. Caches worth sharing go through
+get_shared_cache() instead, whose backend is chosen by SHARED_CACHE_URL:
+- "" or "memory://": a dict in this process (single worker, tests)
+- "sqlite:////dev/shm/tourism_cache.db": a SQLite file, on tmpfs where
+  available; safe for concurrent use by several processes, nothing to deploy
+- "redis://localhost:6379/0": Redis or a Redis-compatible server (needs the
+  redis package)
+
+Entries live in namespaces ("schema", "dw_context", "sql", "result",
+"geo_insights"), are pickled, and expire after their TTL. Every lookup is
+counted in cache_lookups_total by namespace. A failing backend is logged and
+treated as a miss; it never fails a request.
+
+Lookups block (SQLite waits for locks, Redis is a network round trip, large
+results take a while to pickle): code on the event loop uses aget/aset/adelete,
+which run them in the "db" executor pool.
+"""
+import logging
+import os
+from abc import ABC, abstractmethod
+import pickle
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from app.core.config import settings
+from app.core.metrics import CACHE_LOOKUPS
+from app.utils.executors import get_executor_pool
+
+logger = logging.getLogger(__name__)
+
+
+class SharedCache(ABC):
+    """Namespaced get/set on top of a byte store; subclasses implement the store"""
+
+    def get(self, namespace: str, key: str, default: Any = None) -> Any:
+        try:
+            data = self._get(f"{namespace}:{key}")
+        except Exception as e:
+            logger.warning(f"Shared cache read failed ({namespace}): {e}")
+            CACHE_LOOKUPS.labels(cache=namespace, result="error").inc()
+            return default
+        CACHE_LOOKUPS.labels(cache=namespace, result="miss" if data is None else "hit").inc()
+        return default if data is None else pickle.loads(data)
+
+    def set(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        """Store value; ttl in seconds, None keeps it until it is replaced"""
+        try:
+            self._set(f"{namespace}:{key}", pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), ttl)
+        except Exception as e:
+            logger.warning(f"Shared cache write failed ({namespace}): {e}")
+
+    def delete(self, namespace: str, key: str) -> None:
+        try:
+            self._delete(f"{namespace}:{key}")
+        except Exception as e:
+            logger.warning(f"Shared cache delete failed ({namespace}): {e}")
+
+    async def aget(self, namespace: str, key: str, default: Any = None) -> Any:
+        return await get_executor_pool("db").run(self.get, namespace, key, default)
+
+    async def aset(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        await get_executor_pool("db").run(self.set, namespace, key, value, ttl)
+
+    async def adelete(self, namespace: str, key: str) -> None:
+        await get_executor_pool("db").run(self.delete, namespace, key)
+
+    @abstractmethod
+    def _get(self, key: str) -> Optional[bytes]:
+        """Stored bytes of an unexpired entry, or None"""
+
+    @abstractmethod
+    def _set(self, key: str, data: bytes, ttl: Optional[float]) -> None:
+        """Store bytes; ttl in seconds, None for no expiry"""
+
+    @abstractmethod
+    def _delete(self, key: str) -> None:
+        """Remove an entry if present"""
+
+    @abstractmethod
+    def clear(self) -> None:
+        """Remove all entries"""
+
+
+class MemoryCache(SharedCache):
+    """In-process stand-in: not shared, but behaves like the other backends.
+
+    Bounded by entry count and by the total size of the pickled values; values
+    larger than max_bytes are not stored.
+    """
+
+    def __init__(self, max_entries: int = 10000, max_bytes: int = 64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries: Dict[str, Tuple[Optional[float], bytes]] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, data = entry
+            if expires_at is not None and expires_at <= time.time():
+                self._remove(key)
+                return None
+            return data
+
+    def _set(self, key: str, data: bytes, ttl: Optional[float]) -> None:
+        with self._lock:
+            self._remove(key)
+            if len(data) > self.max_bytes:
+                return
+            while self._entries and (len(self._entries) >= self.max_entries
+                                     or self.size + len(data) > self.max_bytes):
+                # Dicts keep insertion order: drop the oldest entry
+                self._remove(next(iter(self._entries)))
+            self._entries[key] = (time.time() + ttl if ttl else None, data)
+            self.size += len(data)
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= len(entry[1])
+
+    def _delete(self, key: str) -> None:
+        with self._lock:
+            self._remove(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+
+class SQLiteCache(SharedCache):
+    """Cache table in a SQLite file that all workers of the host open"""
+
+    # Expired rows are purged every this many writes
+    PURGE_EVERY = 500
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._writes = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL)")
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        # WAL lets readers in other processes proceed while one of them writes
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    @property
+    def _connection(self) -> sqlite3.Connection:
+        # One connection per thread (and per process: workers are spawned, not forked)
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._local.connection = self._connect()
+        return connection
+
+    def _get(self, key: str) -> Optional[bytes]:
+        row = self._connection.execute(
+            "SELECT value FROM cache WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (key, time.time())).fetchone()
+        return row[0] if row else None
+
+    def _set(self, key: str, data: bytes, ttl: Optional[float]) -> None:
+        now = time.time()
+        self._connection.execute("INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                                 (key, data, now + ttl if ttl else None))
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY == 0:
+            self._connection.execute("DELETE FROM cache WHERE expires_at <= ?", (now,))
+
+    def _delete(self, key: str) -> None:
+        self._connection.execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def clear(self) -> None:
+        self._connection.execute("DELETE FROM cache")
+
+
+class RedisCache(SharedCache):
+    """Redis or a Redis-compatible server (KeyDB, Dragonfly, Valkey)"""
+
+    def __init__(self, url: str, prefix: str = "tourism:"):
+        # Optional dependency, only needed when a redis:// URL is configured
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def _get(self, key: str) -> Optional[bytes]:
+        return self.client.get(self.prefix + key)
+
+    def _set(self, key: str, data: bytes, ttl: Optional[float]) -> None:
+        self.client.set(self.prefix + key, data, px=int(ttl * 1000) if ttl else None)
+
+    def _delete(self, key: str) -> None:
+        self.client.delete(self.prefix + key)
+
+    def clear(self) -> None:
+        for key in self.client.scan_iter(match=self.prefix + "*"):
+            self.client.delete(key)
+
+
+def cache_from_url(url: str) -> SharedCache:
+    if not url or url.startswith("memory://"):
+        return MemoryCache(max_bytes=settings.MEMORY_CACHE_MAX_BYTES)
+    if url.startswith("sqlite:///"):
+        return SQLiteCache(url[len("sqlite:///"):])
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisCache(url)
+    raise ValueError(f"Unsupported SHARED_CACHE_URL: {url}")
+
+
+_shared_cache: Optional[SharedCache] = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_shared_cache() -> SharedCache:
+    """The process-wide cache configured by SHARED_CACHE_URL"""
+    global _shared_cache
+    if _shared_cache is None:
+        with _shared_cache_lock:
+            if _shared_cache is None:
+                _shared_cache = cache_from_url(settings.SHARED_CACHE_URL)
+                logger.info(f"Shared cache: {type(_shared_cache).__name__}")
+    return _shared_cache
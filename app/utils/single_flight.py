@@ -0,0 +1,112 @@
+"""
+Single-flight coalescing of streaming pipelines.
+
+Concurrent requests with the same key share one run of the producer: the
+first request starts it, later ones attach to it, and every event the
+producer yields is delivered to all attached subscribers. A subscriber that
+attaches late first receives the events it missed, so each one sees the
+complete stream. The producer is told to stop (through the callback it is
+given) once every subscriber has gone.
+
+Flights are forgotten as soon as they finish; this is not a result cache.
+"""
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# Marks the end of a flight in the subscriber queues
+_END = object()
+
+ProducerFactory = Callable[[Callable[[], Awaitable[bool]]], AsyncIterator[Any]]
+
+
+class _Flight:
+    """One running producer and its subscribers"""
+
+    def __init__(self, key: str):
+        self.key = key
+        self.events: List[Any] = []
+        self.subscribers: Set[asyncio.Queue] = set()
+        self.error: Optional[BaseException] = None
+        self.task: Optional[asyncio.Task] = None
+
+    async def abandoned(self) -> bool:
+        return not self.subscribers
+
+
+class SingleFlightStream:
+    """Shares async event streams between concurrent identical requests"""
+
+    def __init__(self, poll_interval: float = 0.5):
+        """
+        Args:
+            poll_interval: How often a waiting subscriber checks whether its own client is gone
+        """
+        self.poll_interval = poll_interval
+        self._flights: Dict[str, _Flight] = {}
+
+    def in_flight(self, key: str) -> bool:
+        return key in self._flights
+
+    async def subscribe(self, key: str, producer_factory: ProducerFactory,
+                        is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None) -> AsyncIterator[Any]:
+        """
+        Stream the events of the flight for key, starting it if none is running.
+
+        Args:
+            key: Requests with equal keys share a flight
+            producer_factory: Called with an "all subscribers gone" callback, returns the event stream
+            is_disconnected: Optional check whether this subscriber's client has gone
+
+        Yields:
+            The producer's events, from the first one
+        """
+        flight = self._flights.get(key)
+        is_leader = flight is None
+        if is_leader:
+            flight = _Flight(key)
+            self._flights[key] = flight
+
+        queue: asyncio.Queue = asyncio.Queue()
+        for event in flight.events:
+            queue.put_nowait(event)
+        flight.subscribers.add(queue)
+        if is_leader:
+            flight.task = asyncio.create_task(self._run(flight, producer_factory))
+        else:
+            logger.info(f"Request attached to in-flight pipeline ({len(flight.subscribers)} subscribers): {key}")
+
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    if is_disconnected is not None and await is_disconnected():
+                        return
+                    continue
+                if event is _END:
+                    if flight.error is not None:
+                        raise flight.error
+                    return
+                yield event
+        finally:
+            flight.subscribers.discard(queue)
+
+    async def _run(self, flight: _Flight, producer_factory: ProducerFactory) -> None:
+        """Run the producer and fan its events out to the subscribers"""
+        try:
+            async for event in producer_factory(flight.abandoned):
+                flight.events.append(event)
+                for queue in list(flight.subscribers):
+                    queue.put_nowait(event)
+        except Exception as e:
+            logger.error(f"Shared pipeline failed for {flight.key}: {e}")
+            flight.error = e
+        finally:
+            # New requests start a fresh flight from here on
+            if self._flights.get(flight.key) is flight:
+                del self._flights[flight.key]
+            for queue in list(flight.subscribers):
+                queue.put_nowait(_END)
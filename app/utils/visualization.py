@@ -1,7 +1,6 @@
 import logging
 from typing import Dict, Any, List, Optional
 import pandas as pd
-import matplotlib.pyplot as plt
 import base64
 from io import BytesIO
 import json
@@ -46,6 +45,8 @@ def figure_to_base64(fig) -> Optional[str]:
         if fig is None:
             return None
             
+        import matplotlib.pyplot as plt
+
         # Save figure to a temporary buffer.
         buf = BytesIO()
         fig.savefig(buf, format='png', bbox_inches='tight', dpi=300)
@@ -86,11 +87,14 @@ def generate_visualization(data: List[Dict[str, Any]], intent: QueryIntent) -> D
         logger.error(f"Error creating visualization: {str(e)}")
         return None
 
-def create_visualization(data: List[Dict[Any, Any]], query: str) -> Optional[plt.Figure]:
+def create_visualization(data: List[Dict[Any, Any]], query: str) -> Optional["matplotlib.figure.Figure"]:
     """Create visualization based on query results and type"""
     try:
         if not data:
             return None
+
+        # Imported here: pyplot adds ~0.5s to the import of every module using this file
+        import matplotlib.pyplot as plt
             
         df = pd.DataFrame(data)
         
@@ -0,0 +1,320 @@
+# evaluation/fake_llm_server.py
+"""
+Local OpenAI-compatible stand-in for the language model provider.
+
+Point the backend at it to run the full pipeline offline and reproducibly:
+
+    python evaluation/fake_llm_server.py --port 8099 --latency lognormal:0.8,0.4
+    OPENAI_API_BASE=http://127.0.0.1:8099/v1 OPENAI_API_KEY=fake uvicorn app.main:app
+
+It serves POST /v1/chat/completions (streaming and non-streaming) and
+GET /v1/models. The kind of call is recognised from the prompt the backend
+builds: SQL generation ("User Question: ..."), response narratives
+("Original User Query: ...") and JSON extraction (intent parsing).
+
+Modes:
+- canned (default): answers from fixtures/fake_llm_canned.json, matched by a
+  substring of the user question, with a default answer for everything else
+- record: forwards every call to --upstream (the real provider) and stores
+  the replies in the --fixtures file, keyed by a hash of the request
+- replay: answers from the --fixtures file; requests that were not recorded
+  get a 404, or the canned answer with --replay-fallback
+
+Latency is drawn from a configurable distribution (seeded, so runs with the
+same request order see the same delays); streamed replies send their first
+chunk after that latency and the following chunks --chunk-delay apart.
+--rate-limit-fraction answers a share of calls with 429 and Retry-After to
+exercise client backoff.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import math
+import os
+import random
+import re
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# Configure basic logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+DEFAULT_CANNED_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "fake_llm_canned.json")
+
+SQL = "sql"
+NARRATIVE = "narrative"
+JSON = "json"
+
+
+class LatencyModel:
+    """Distribution of response latencies in seconds"""
+
+    def __init__(self, kind: str, params: List[float]):
+        self.kind = kind
+        self.params = params
+
+    @classmethod
+    def parse(cls, spec: str) -> "LatencyModel":
+        """
+        Parse "0.5" / "fixed:0.5", "uniform:0.2,1.5", "normal:0.8,0.2"
+        or "lognormal:0.8,0.4" (median and sigma)
+        """
+        kind, _, params = spec.partition(":")
+        if not params:
+            kind, params = "fixed", kind
+        values = [float(p) for p in params.split(",")]
+        expected = {"fixed": 1, "uniform": 2, "normal": 2, "lognormal": 2}
+        if kind not in expected or len(values) != expected[kind]:
+            raise ValueError(f"Invalid latency spec: {spec}")
+        return cls(kind, values)
+
+    def sample(self, rng: random.Random) -> float:
+        if self.kind == "fixed":
+            return self.params[0]
+        if self.kind == "uniform":
+            return rng.uniform(*self.params)
+        if self.kind == "normal":
+            return max(0.0, rng.gauss(*self.params))
+        median, sigma = self.params
+        return rng.lognormvariate(math.log(median), sigma)
+
+
+def classify(messages: List[Dict[str, Any]]) -> Tuple[str, str]:
+    """Kind of call (SQL, NARRATIVE or JSON) and the user question it is about"""
+    system = " ".join(m.get("content") or "" for m in messages if m.get("role") == "system")
+    prompt = "\n".join(m.get("content") or "" for m in messages if m.get("role") != "system")
+
+    # The question is on its own line at the end; the instructions above it also mention "User Question"
+    questions = re.findall(r"^User Question:\s*(.+)$", prompt, re.M)
+    if questions and "PostgreSQL" in prompt:
+        return SQL, questions[-1].strip()
+    match = re.search(r"Original User Query:\s*(.+)", prompt)
+    if match:
+        return NARRATIVE, match.group(1).strip()
+    match = re.search(r'Query:\s*"(.+?)"', prompt)
+    if "JSON" in system or match:
+        return JSON, match.group(1).strip() if match else prompt.strip()
+    return NARRATIVE, prompt.strip()
+
+
+class CannedResponder:
+    """Answers from the canned fixture file"""
+
+    def __init__(self, path: str = DEFAULT_CANNED_PATH):
+        with open(path, encoding="utf-8") as f:
+            canned = json.load(f)
+        self.default = canned["default"]
+        self.questions = canned.get("questions", [])
+
+    def answer(self, kind: str, question: str) -> str:
+        question = question.lower()
+        entry = next((q for q in self.questions if q["match"] in question and kind in q), self.default)
+        if kind == SQL:
+            return f"```sql\n{entry[SQL]}\n```"
+        if kind == JSON:
+            return json.dumps(entry[JSON])
+        return entry[NARRATIVE]
+
+
+def request_key(body: Dict[str, Any]) -> str:
+    """Stable hash of the parts of a request that determine its reply"""
+    relevant = {k: body.get(k) for k in ("model", "messages", "temperature", "max_tokens", "response_format")}
+    return hashlib.sha256(json.dumps(relevant, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class FixtureStore:
+    """Recorded replies, one JSON file mapping request keys to reply texts"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.entries = json.load(f)
+
+    def get(self, key: str) -> Optional[str]:
+        entry = self.entries.get(key)
+        return entry["content"] if entry else None
+
+    def put(self, key: str, kind: str, question: str, content: str) -> None:
+        self.entries[key] = {"kind": kind, "question": question, "content": content}
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+
+def _count_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def _completion(content: str, model: str, prompt_tokens: int) -> Dict[str, Any]:
+    completion_tokens = _count_tokens(content)
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex[:24]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop",
+        }],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        },
+    }
+
+
+def _chunk(completion_id: str, model: str, delta: Dict[str, Any], finish_reason: Optional[str] = None) -> str:
+    chunk = {
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+    return f"data: {json.dumps(chunk)}\n\n"
+
+
+def _split_chunks(content: str, words_per_chunk: int = 4) -> List[str]:
+    parts = re.findall(r"\S+\s*|\s+", content)
+    return ["".join(parts[i:i + words_per_chunk]) for i in range(0, len(parts), words_per_chunk)] or [""]
+
+
+def _error(status: int, message: str, error_type: str, headers: Optional[Dict[str, str]] = None) -> JSONResponse:
+    return JSONResponse(status_code=status, headers=headers,
+                        content={"error": {"message": message, "type": error_type, "code": None}})
+
+
+def create_app(mode: str = "canned", canned_path: str = DEFAULT_CANNED_PATH,
+               fixtures_path: Optional[str] = None, latency: str = "0",
+               chunk_delay: float = 0.02, seed: int = 0,
+               upstream: Optional[str] = None, upstream_api_key: Optional[str] = None,
+               replay_fallback: bool = False, rate_limit_fraction: float = 0.0) -> FastAPI:
+    """Build the fake provider app (see the module docstring for the options)"""
+    if mode not in ("canned", "record", "replay"):
+        raise ValueError(f"Unknown mode: {mode}")
+    if mode == "record" and not upstream:
+        raise ValueError("Record mode needs an upstream API base")
+    if mode in ("record", "replay") and not fixtures_path:
+        raise ValueError(f"{mode.capitalize()} mode needs a fixtures file")
+
+    app = FastAPI(title="Fake LLM provider")
+    canned = CannedResponder(canned_path)
+    store = FixtureStore(fixtures_path) if fixtures_path else None
+    latency_model = LatencyModel.parse(latency)
+    rng = random.Random(seed)
+    stats = {"requests": 0, "rate_limited": 0, "by_kind": {}}
+
+    async def upstream_reply(body: Dict[str, Any]) -> str:
+        async with httpx.AsyncClient(timeout=120) as client:
+            response = await client.post(
+                f"{upstream.rstrip('/')}/chat/completions",
+                headers={"Authorization": f"Bearer {upstream_api_key}"},
+                json={**body, "stream": False},
+            )
+            response.raise_for_status()
+            return response.json()["choices"][0]["message"]["content"]
+
+    @app.get("/v1/models")
+    async def list_models():
+        return {"object": "list", "data": [{"id": "fake-model", "object": "model", "owned_by": "local"}]}
+
+    @app.get("/stats")
+    async def get_stats():
+        return stats
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        messages = body.get("messages", [])
+        model = body.get("model", "fake-model")
+        kind, question = classify(messages)
+        key = request_key(body)
+        stats["requests"] += 1
+        stats["by_kind"][kind] = stats["by_kind"].get(kind, 0) + 1
+
+        delay = latency_model.sample(rng)
+        if rate_limit_fraction and rng.random() < rate_limit_fraction:
+            stats["rate_limited"] += 1
+            return _error(429, "Rate limit reached (simulated)", "rate_limit_error", {"Retry-After": "1"})
+
+        if mode == "record":
+            try:
+                content = await upstream_reply(body)
+            except httpx.HTTPError as e:
+                logger.error(f"Upstream call failed: {e}")
+                return _error(502, f"Upstream call failed: {e}", "upstream_error")
+            store.put(key, kind, question, content)
+            delay = 0.0  # The upstream call already took its time
+        elif mode == "replay":
+            content = store.get(key)
+            if content is None:
+                if not replay_fallback:
+                    return _error(404, f"No recorded reply for this {kind} request ({key[:12]})", "invalid_request_error")
+                content = canned.answer(kind, question)
+        else:
+            content = canned.answer(kind, question)
+
+        prompt_tokens = sum(_count_tokens(m.get("content") or "") for m in messages)
+        if not body.get("stream"):
+            await asyncio.sleep(delay)
+            return _completion(content, model, prompt_tokens)
+
+        async def stream():
+            completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+            await asyncio.sleep(delay)
+            yield _chunk(completion_id, model, {"role": "assistant", "content": ""})
+            for i, part in enumerate(_split_chunks(content)):
+                if i:
+                    await asyncio.sleep(chunk_delay)
+                yield _chunk(completion_id, model, {"content": part})
+            yield _chunk(completion_id, model, {}, finish_reason="stop")
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenAI-compatible fake LLM server for offline testing")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--mode", choices=["canned", "record", "replay"], default="canned")
+    parser.add_argument("--canned", default=DEFAULT_CANNED_PATH, help="Canned answers file")
+    parser.add_argument("--fixtures", help="Recorded replies file (record and replay modes)")
+    parser.add_argument("--latency", default="0", help='e.g. "0.5", "uniform:0.2,1.5", "lognormal:0.8,0.4"')
+    parser.add_argument("--chunk-delay", type=float, default=0.02, help="Seconds between streamed chunks")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--upstream", default=os.getenv("FAKE_LLM_UPSTREAM"), help="Real API base (record mode)")
+    parser.add_argument("--replay-fallback", action="store_true", help="Use canned answers for unrecorded requests")
+    parser.add_argument("--rate-limit-fraction", type=float, default=0.0, help="Share of calls answered with 429")
+    args = parser.parse_args()
+
+    app = create_app(
+        mode=args.mode, canned_path=args.canned, fixtures_path=args.fixtures,
+        latency=args.latency, chunk_delay=args.chunk_delay, seed=args.seed,
+        upstream=args.upstream, upstream_api_key=os.getenv("FAKE_LLM_UPSTREAM_API_KEY", os.getenv("OPENAI_API_KEY")),
+        replay_fallback=args.replay_fallback, rate_limit_fraction=args.rate_limit_fraction,
+    )
+    logger.info(f"Fake LLM server ({args.mode}) on http://{args.host}:{args.port}/v1")
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+-- Synthetic dw star schema for the load benchmark (evaluation/load_benchmark.py)
+--
+-- Same tables and columns as the dw2 scripts create (the subset the chat
+-- pipeline reads), filled with deterministic pseudo-random data. The
+-- placeholders in braces are filled in by the benchmark:
+--     {start_date}  first day of dim_date
+--     {days}        number of days
+--     {regions}     number of regions
+--     {industries}  number of industries (at most 12)
+-- Never run this against a real warehouse: it drops the dw schema.
+
+DROP SCHEMA IF EXISTS dw CASCADE;
+CREATE SCHEMA dw;
+
+SELECT setseed(0.42);
+
+CREATE TABLE dw.dim_date (
+    date_id INTEGER PRIMARY KEY,
+    full_date DATE NOT NULL,
+    year INTEGER NOT NULL,
+    quarter INTEGER NOT NULL,
+    month INTEGER NOT NULL,
+    month_name VARCHAR(10) NOT NULL,
+    week INTEGER NOT NULL,
+    day INTEGER NOT NULL,
+    day_of_week INTEGER NOT NULL,
+    is_weekend BOOLEAN NOT NULL,
+    is_holiday BOOLEAN NOT NULL,
+    season VARCHAR(10) NOT NULL
+);
+
+INSERT INTO dw.dim_date
+SELECT
+    TO_CHAR(d, 'YYYYMMDD')::INTEGER,
+    d::DATE,
+    EXTRACT(YEAR FROM d)::INTEGER,
+    EXTRACT(QUARTER FROM d)::INTEGER,
+    EXTRACT(MONTH FROM d)::INTEGER,
+    TRIM(TO_CHAR(d, 'Month')),
+    EXTRACT(WEEK FROM d)::INTEGER,
+    EXTRACT(DAY FROM d)::INTEGER,
+    EXTRACT(ISODOW FROM d)::INTEGER,
+    EXTRACT(ISODOW FROM d) IN (6, 7),
+    FALSE,
+    CASE
+        WHEN EXTRACT(MONTH FROM d) IN (12, 1, 2) THEN 'Winter'
+        WHEN EXTRACT(MONTH FROM d) IN (3, 4, 5) THEN 'Spring'
+        WHEN EXTRACT(MONTH FROM d) IN (6, 7, 8) THEN 'Summer'
+        ELSE 'Fall'
+    END
+FROM generate_series(DATE '{start_date}', DATE '{start_date}' + ({days} - 1), INTERVAL '1 day') AS d;
+
+CREATE TABLE dw.dim_region (
+    region_id SERIAL PRIMARY KEY,
+    region_name VARCHAR(100) NOT NULL,
+    region_type VARCHAR(50) NOT NULL,
+    parent_region_id INTEGER REFERENCES dw.dim_region(region_id),
+    country_code CHAR(2),
+    canton_code CHAR(2),
+    population INTEGER,
+    area_sqkm NUMERIC(10,2),
+    is_active BOOLEAN DEFAULT TRUE,
+    latitude DOUBLE PRECISION,
+    longitude DOUBLE PRECISION
+);
+
+INSERT INTO dw.dim_region (region_name, region_type, country_code, canton_code, population, area_sqkm, latitude, longitude)
+SELECT
+    CASE WHEN i <= 8
+         THEN (ARRAY['Ticino', 'Lugano', 'Locarno', 'Bellinzona', 'Mendrisio', 'Ascona', 'Zurich', 'Lucerne'])[i]
+         ELSE 'Region ' || i
+    END,
+    CASE WHEN i IN (1) THEN 'canton' WHEN i <= 8 THEN 'city' ELSE 'tourism_region' END,
+    'CH',
+    CASE WHEN i <= 6 THEN 'TI' WHEN i = 7 THEN 'ZH' ELSE 'LU' END,
+    (5000 + random() * 300000)::INTEGER,
+    (10 + random() * 2000)::NUMERIC(10,2),
+    45.8 + random() * 1.9,
+    5.9 + random() * 4.6
+FROM generate_series(1, {regions}) AS i;
+
+CREATE TABLE dw.dim_industry (
+    industry_id SERIAL PRIMARY KEY,
+    industry_code VARCHAR(20) NOT NULL UNIQUE,
+    industry_name VARCHAR(100) NOT NULL,
+    industry_category VARCHAR(50) NOT NULL,
+    is_active BOOLEAN DEFAULT TRUE
+);
+
+INSERT INTO dw.dim_industry (industry_code, industry_name, industry_category)
+SELECT
+    'IND' || i,
+    (ARRAY['Accommodations', 'Eating Places', 'Retail', 'Groceries', 'Transport', 'Entertainment',
+           'Fuel', 'Health', 'Apparel', 'Sports', 'Culture', 'Services'])[i],
+    CASE WHEN i <= 2 THEN 'Hospitality' WHEN i <= 4 THEN 'Retail' ELSE 'Other' END
+FROM generate_series(1, LEAST({industries}, 12)) AS i;
+
+CREATE TABLE dw.fact_visitor (
+    fact_id SERIAL PRIMARY KEY,
+    date_id INTEGER NOT NULL REFERENCES dw.dim_date(date_id),
+    region_id INTEGER NOT NULL REFERENCES dw.dim_region(region_id),
+    source_system TEXT NOT NULL,
+    total_visitors NUMERIC,
+    swiss_tourists NUMERIC,
+    foreign_tourists NUMERIC,
+    swiss_locals NUMERIC,
+    swiss_commuters NUMERIC,
+    foreign_workers NUMERIC,
+    demographics JSONB,
+    dwell_time JSONB,
+    top_foreign_countries JSONB,
+    top_swiss_cantons JSONB,
+    top_municipalities JSONB,
+    top_last_cantons JSONB,
+    top_last_municipalities JSONB,
+    overnights_from_yesterday JSONB,
+    transaction_metrics JSONB,
+    raw_content JSONB,
+    data_quality_metrics JSONB,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT INTO dw.fact_visitor (date_id, region_id, source_system, total_visitors, swiss_tourists, foreign_tourists,
+                             swiss_locals, swiss_commuters, foreign_workers, demographics)
+SELECT
+    d.date_id,
+    r.region_id,
+    'aoi',
+    v.swiss + v.foreign_ + v.locals,
+    v.swiss,
+    v.foreign_,
+    v.locals,
+    round(v.locals * 0.2),
+    round(v.foreign_ * 0.1),
+    jsonb_build_object('maleProportion', round((0.45 + random() * 0.1)::NUMERIC, 3),
+                       'ageDistribution', jsonb_build_array(0.1, 0.2, 0.3, 0.25, 0.15))
+FROM dw.dim_date d
+CROSS JOIN dw.dim_region r
+CROSS JOIN LATERAL (
+    SELECT
+        round((500 + random() * 2000) * CASE WHEN d.season = 'Summer' THEN 1.6 ELSE 1 END) AS swiss,
+        round((200 + random() * 1500) * CASE WHEN d.season = 'Summer' THEN 2.0 ELSE 1 END) AS foreign_,
+        round(1000 + random() * 4000) AS locals
+    -- Reference the outer row so the values are drawn per fact row
+    WHERE d.date_id IS NOT NULL AND r.region_id IS NOT NULL
+) v;
+
+CREATE INDEX idx_fact_visitor_date_region ON dw.fact_visitor(date_id, region_id);
+
+CREATE TABLE dw.fact_spending (
+    fact_id SERIAL PRIMARY KEY,
+    date_id INTEGER NOT NULL REFERENCES dw.dim_date(date_id),
+    region_id INTEGER NOT NULL REFERENCES dw.dim_region(region_id),
+    industry_id INTEGER NOT NULL REFERENCES dw.dim_industry(industry_id),
+    transaction_count INTEGER NOT NULL,
+    total_amount NUMERIC(12,2) NOT NULL,
+    avg_transaction NUMERIC(12,2),
+    geo_latitude DOUBLE PRECISION,
+    geo_longitude DOUBLE PRECISION,
+    source_system VARCHAR(50) NOT NULL,
+    batch_id INTEGER,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT INTO dw.fact_spending (date_id, region_id, industry_id, transaction_count, total_amount, avg_transaction,
+                              geo_latitude, geo_longitude, source_system)
+SELECT
+    d.date_id,
+    r.region_id,
+    i.industry_id,
+    s.txn,
+    s.amount,
+    round(s.amount / GREATEST(s.txn, 1), 2),
+    r.latitude,
+    r.longitude,
+    'mastercard'
+FROM dw.dim_date d
+CROSS JOIN dw.dim_region r
+CROSS JOIN dw.dim_industry i
+CROSS JOIN LATERAL (
+    SELECT (10 + random() * 400)::INTEGER AS txn, round((500 + random() * 20000)::NUMERIC, 2) AS amount
+    WHERE d.date_id IS NOT NULL AND r.region_id IS NOT NULL AND i.industry_id IS NOT NULL
+) s;
+
+CREATE INDEX idx_fact_spending_date_region ON dw.fact_spending(date_id, region_id);
+CREATE INDEX idx_fact_spending_industry ON dw.fact_spending(industry_id);
+
+-- Conversation store of the chat service
+CREATE TABLE IF NOT EXISTS public.conversation_history (
+    id SERIAL PRIMARY KEY,
+    session_id VARCHAR(100) NOT NULL,
+    prompt TEXT NOT NULL,
+    sql_query TEXT,
+    response TEXT,
+    schema_context TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    query_metadata JSON,
+    vector_embedding JSON
+);
+
+ANALYZE;
@@ -0,0 +1,422 @@
+# evaluation/load_benchmark.py
+"""
+End-to-end load benchmark for /chat and /chat/stream.
+
+Runs the real FastAPI app against a local Postgres seeded with a synthetic
+dw star schema (fixtures/synthetic_dw.sql) and the fake LLM server
+(fake_llm_server.py), drives it with concurrent clients and reports
+throughput, time to first byte, p50/p95/p99 end-to-end latency and the
+per-stage breakdown from the debug spans the pipeline returns. Results are
+written as JSON so runs of different commits can be compared.
+
+    # Seed a scratch database (drops its dw schema!) and run the benchmark
+    python evaluation/load_benchmark.py --dsn postgresql://postgres:pw@localhost:5432/bench \
+        --seed-db --concurrency 1,4,16 --requests 64 --llm-latency lognormal:0.8,0.4
+
+    # Compare two result files
+    python evaluation/load_benchmark.py --compare results/load_a1b2c3d.json results/load_e4f5a6b.json
+
+--app-url benchmarks an already running app instead of starting one; it
+must then be configured against the same database and LLM stand-in.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+import httpx
+import uvicorn
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from fake_llm_server import create_app as create_fake_llm_app
+
+# Configure basic logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+EVALUATION_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(EVALUATION_DIR)
+SYNTHETIC_DW_SQL = os.path.join(EVALUATION_DIR, "fixtures", "synthetic_dw.sql")
+ROLLUP_SQL = os.path.join(REPO_DIR, "app", "scripts", "dw2", "task9_rollup_tables.sql")
+RESULTS_DIR = os.path.join(EVALUATION_DIR, "results")
+
+# Questions with canned answers in fixtures/fake_llm_canned.json
+BENCHMARK_QUESTIONS = [
+    "Show me the total visitors for July 2023",
+    "Which are the top 5 regions by visitor count?",
+    "Create a pie chart of spending distribution across different industries",
+    "Show monthly trends for swiss and foreign visitors in 2023 on a line chart",
+    "Compare spending between 'Eating Places' and 'Accommodations'",
+]
+
+
+# --- Setup ---
+
+def seed_synthetic_dw(dsn: str, start_date: str, days: int, regions: int, industries: int,
+                      rollups: bool = True) -> None:
+    """(Re)create the synthetic dw schema in the database at dsn"""
+    import psycopg2
+
+    with open(SYNTHETIC_DW_SQL, encoding="utf-8") as f:
+        sql = f.read().format(start_date=start_date, days=days, regions=regions, industries=industries)
+    started = time.perf_counter()
+    conn = psycopg2.connect(dsn)
+    try:
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute(sql)
+            if rollups:
+                with open(ROLLUP_SQL, encoding="utf-8") as f:
+                    cur.execute(f.read())
+                cur.execute("SELECT * FROM dw.refresh_rollups('fact_visitor')")
+                cur.execute("SELECT * FROM dw.refresh_rollups('fact_spending')")
+                cur.execute("ANALYZE")
+    finally:
+        conn.close()
+    logger.info(f"Seeded synthetic dw ({days} days, {regions} regions, {industries} industries) "
+                f"in {time.perf_counter() - started:.1f}s")
+
+
+def start_fake_llm(port: int, latency: str, chunk_delay: float, seed: int) -> uvicorn.Server:
+    """Run the fake LLM server in a background thread"""
+    app = create_fake_llm_app(latency=latency, chunk_delay=chunk_delay, seed=seed)
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    deadline = time.time() + 10
+    while not server.started:
+        if time.time() > deadline:
+            raise RuntimeError("Fake LLM server did not start")
+        time.sleep(0.05)
+    return server
+
+
+def app_environment(dsn: str, llm_base: str) -> Dict[str, str]:
+    """Environment that points the app at the benchmark database and LLM stand-in"""
+    url = urlparse(dsn)
+    env = dict(os.environ)
+    # A Unix socket directory (?host=/path) is passed to libpq through PGHOST
+    socket_dir = parse_qs(url.query).get("host", [None])[0]
+    if socket_dir:
+        env["PGHOST"] = socket_dir
+    host = "" if socket_dir else (url.hostname or "localhost")
+    env.update({
+        "DW_DATABASE_URL": dsn,
+        "DB_HOST": host,
+        "DB_PORT": str(url.port or 5432),
+        "DB_USER": url.username or "postgres",
+        "DB_PASSWORD": url.password or "",
+        "DB_NAME": url.path.lstrip("/"),
+        "POSTGRES_HOST": host,
+        "POSTGRES_PORT": str(url.port or 5432),
+        "POSTGRES_USER": url.username or "postgres",
+        "POSTGRES_PASSWORD": url.password or "",
+        "POSTGRES_DB": url.path.lstrip("/"),
+        "OPENAI_API_BASE": llm_base,
+        "OPENAI_API_KEY": "fake-key",
+        "OPENAI_MODEL": "fake-model",
+    })
+    return env
+
+
+def start_app(port: int, env: Dict[str, str], workers: int = 1) -> subprocess.Popen:
+    """Start the FastAPI app with uvicorn and wait until it answers /health"""
+    log_path = os.path.join(RESULTS_DIR, "load_benchmark_app.log")
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    log_file = open(log_path, "w")
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=REPO_DIR, env=env, stdout=log_file, stderr=subprocess.STDOUT,
+    )
+    deadline = time.time() + 120
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"App exited with code {process.returncode}, see {log_path}")
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/health", timeout=1).status_code == 200:
+                logger.info(f"App is up on port {port} (log: {log_path})")
+                return process
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    process.terminate()
+    raise RuntimeError(f"App did not become healthy, see {log_path}")
+
+
+# --- Measurement ---
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """q-th percentile (0-100) with linear interpolation between the closest ranks"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100.0
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def distribution(values: List[float]) -> Dict[str, Optional[float]]:
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "mean": sum(values) / len(values),
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": max(values),
+    }
+
+
+def stage_durations(debug_info: Optional[Dict[str, Any]]) -> Dict[str, float]:
+    """Milliseconds per pipeline stage from the debug spans of a response"""
+    stages: Dict[str, float] = {}
+    for step in (debug_info or {}).get("steps", []) or []:
+        if step.get("duration_ms") is not None:
+            stages[step["name"]] = stages.get(step["name"], 0.0) + float(step["duration_ms"])
+    return stages
+
+
+async def stream_request(client: httpx.AsyncClient, base_url: str, message: str) -> Dict[str, Any]:
+    """One /chat/stream request: TTFB, end-to-end time and the debug spans of the final event"""
+    started = time.perf_counter()
+    result: Dict[str, Any] = {"ok": False, "ttfb": None}
+    payload = {"message": message, "session_id": f"bench-{uuid.uuid4().hex[:8]}"}
+    async with client.stream("POST", f"{base_url}/chat/stream", json=payload) as response:
+        result["status_code"] = response.status_code
+        async for line in response.aiter_lines():
+            if result["ttfb"] is None:
+                result["ttfb"] = time.perf_counter() - started
+            if not line.startswith("data: "):
+                continue
+            try:
+                event = json.loads(line[len("data: "):])
+            except json.JSONDecodeError:
+                continue
+            if event.get("type") == "final_response":
+                result["ok"] = True
+                result["stages"] = stage_durations(event.get("debug_info"))
+            elif event.get("type") == "error":
+                result["error"] = event.get("content")
+    result["latency"] = time.perf_counter() - started
+    return result
+
+
+async def chat_request(client: httpx.AsyncClient, base_url: str, message: str) -> Dict[str, Any]:
+    """One /chat request: time to response headers, end-to-end time and debug spans"""
+    started = time.perf_counter()
+    payload = {"message": message, "session_id": f"bench-{uuid.uuid4().hex[:8]}"}
+    async with client.stream("POST", f"{base_url}/chat", json=payload) as response:
+        ttfb = time.perf_counter() - started
+        body = json.loads(await response.aread())
+    result = {
+        "ok": response.status_code == 200 and body.get("status") != "error",
+        "status_code": response.status_code,
+        "ttfb": ttfb,
+        "latency": time.perf_counter() - started,
+        "stages": stage_durations(body.get("debug_info")),
+    }
+    if not result["ok"]:
+        result["error"] = body.get("error") or body.get("detail")
+    return result
+
+
+async def run_level(base_url: str, endpoint: str, concurrency: int, total_requests: int,
+                    distinct: bool, timeout: float) -> Dict[str, Any]:
+    """Send total_requests requests from concurrency parallel clients and summarize them"""
+    send = stream_request if endpoint == "stream" else chat_request
+    counter = iter(range(total_requests))
+    results: List[Dict[str, Any]] = []
+
+    async def worker(client: httpx.AsyncClient):
+        for i in counter:
+            message = BENCHMARK_QUESTIONS[i % len(BENCHMARK_QUESTIONS)]
+            if distinct:
+                # Defeats coalescing of identical concurrent questions
+                message = f"{message} (request {i})"
+            try:
+                results.append(await send(client, base_url, message))
+            except Exception as e:
+                results.append({"ok": False, "error": f"{type(e).__name__}: {e}", "latency": None, "ttfb": None})
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(timeout=timeout, limits=limits) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        wall = time.perf_counter() - started
+
+    succeeded = [r for r in results if r["ok"]]
+    stage_names = sorted({name for r in succeeded for name in r.get("stages", {})})
+    errors: Dict[str, int] = {}
+    for r in results:
+        if not r["ok"]:
+            key = str(r.get("error"))[:120]
+            errors[key] = errors.get(key, 0) + 1
+    return {
+        "endpoint": endpoint,
+        "concurrency": concurrency,
+        "requests": len(results),
+        "succeeded": len(succeeded),
+        "failed": len(results) - len(succeeded),
+        "wall_seconds": wall,
+        "throughput_rps": len(succeeded) / wall if wall else 0.0,
+        "ttfb_seconds": distribution([r["ttfb"] for r in succeeded if r.get("ttfb") is not None]),
+        "latency_seconds": distribution([r["latency"] for r in succeeded]),
+        "stages_ms": {name: distribution([r["stages"][name] for r in succeeded if name in r["stages"]])
+                      for name in stage_names},
+        "errors": errors,
+    }
+
+
+# --- Reporting ---
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_level(level: Dict[str, Any]) -> None:
+    lat, ttfb = level["latency_seconds"], level["ttfb_seconds"]
+    print(f"\n/{'chat/stream' if level['endpoint'] == 'stream' else 'chat'} "
+          f"concurrency={level['concurrency']}: {level['succeeded']}/{level['requests']} ok, "
+          f"{level['throughput_rps']:.2f} req/s")
+    if lat.get("count"):
+        print(f"  latency  p50 {lat['p50']:.3f}s  p95 {lat['p95']:.3f}s  p99 {lat['p99']:.3f}s  max {lat['max']:.3f}s")
+    if ttfb.get("count"):
+        print(f"  ttfb     p50 {ttfb['p50']:.3f}s  p95 {ttfb['p95']:.3f}s  p99 {ttfb['p99']:.3f}s")
+    for name, stage in level["stages_ms"].items():
+        print(f"  {name:<32} p50 {stage['p50']:>9.1f}ms  p95 {stage['p95']:>9.1f}ms")
+    for error, count in level["errors"].items():
+        print(f"  error x{count}: {error}")
+
+
+def compare(baseline_path: str, candidate_path: str) -> None:
+    """Print the change of throughput and latency percentiles between two result files"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    with open(candidate_path) as f:
+        candidate = json.load(f)
+    print(f"Baseline:  {baseline['meta'].get('commit')} ({baseline_path})")
+    print(f"Candidate: {candidate['meta'].get('commit')} ({candidate_path})")
+
+    def change(old, new):
+        if old is None or new is None:
+            return "n/a"
+        return f"{old:.3f} -> {new:.3f} ({(new - old) / old * 100:+.1f}%)" if old else f"{old:.3f} -> {new:.3f}"
+
+    old_levels = {(l["endpoint"], l["concurrency"]): l for l in baseline["levels"]}
+    for level in candidate["levels"]:
+        old = old_levels.get((level["endpoint"], level["concurrency"]))
+        if not old:
+            continue
+        print(f"\n{level['endpoint']} concurrency={level['concurrency']}")
+        print(f"  throughput req/s {change(old['throughput_rps'], level['throughput_rps'])}")
+        for q in ("p50", "p95", "p99"):
+            print(f"  latency {q}      {change(old['latency_seconds'].get(q), level['latency_seconds'].get(q))}")
+        print(f"  ttfb p50         {change(old['ttfb_seconds'].get('p50'), level['ttfb_seconds'].get('p50'))}")
+
+
+# --- Main ---
+
+async def run_benchmark(args, base_url: str) -> List[Dict[str, Any]]:
+    levels = []
+    for endpoint in args.endpoints.split(","):
+        if args.warmup:
+            await run_level(base_url, endpoint, 1, args.warmup, args.distinct, args.timeout)
+        for concurrency in (int(c) for c in args.concurrency.split(",")):
+            level = await run_level(base_url, endpoint, concurrency, args.requests, args.distinct, args.timeout)
+            print_level(level)
+            levels.append(level)
+    return levels
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end load benchmark for /chat and /chat/stream")
+    parser.add_argument("--dsn", default=os.getenv("BENCHMARK_DSN"), help="Scratch Postgres database for the app")
+    parser.add_argument("--seed-db", action="store_true", help="(Re)create the synthetic dw schema first")
+    parser.add_argument("--no-rollups", action="store_true", help="Do not install the rollup tables when seeding")
+    parser.add_argument("--start-date", default="2023-01-01")
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--regions", type=int, default=30)
+    parser.add_argument("--industries", type=int, default=10)
+    parser.add_argument("--app-url", help="Benchmark a running app instead of starting one")
+    parser.add_argument("--app-port", type=int, default=8181)
+    parser.add_argument("--app-workers", type=int, default=1)
+    parser.add_argument("--llm-port", type=int, default=8099)
+    parser.add_argument("--llm-latency", default="lognormal:0.8,0.4", help="Latency of the fake LLM (see fake_llm_server.py)")
+    parser.add_argument("--llm-chunk-delay", type=float, default=0.02)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--endpoints", default="stream", help="Comma-separated: stream, chat")
+    parser.add_argument("--concurrency", default="1,4,16", help="Comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=50, help="Requests per concurrency level")
+    parser.add_argument("--warmup", type=int, default=3, help="Sequential warm-up requests per endpoint")
+    parser.add_argument("--distinct", action="store_true", help="Make every question unique (no coalescing)")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--output", help="Result file (default: results/load_<commit>_<time>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CANDIDATE"), help="Compare two result files")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    app_process = None
+    if args.app_url:
+        base_url = args.app_url.rstrip("/")
+    else:
+        if not args.dsn:
+            parser.error("--dsn (or BENCHMARK_DSN) is required unless --app-url is given")
+        if args.seed_db:
+            seed_synthetic_dw(args.dsn, args.start_date, args.days, args.regions, args.industries,
+                              rollups=not args.no_rollups)
+        start_fake_llm(args.llm_port, args.llm_latency, args.llm_chunk_delay, args.seed)
+        env = app_environment(args.dsn, f"http://127.0.0.1:{args.llm_port}/v1")
+        app_process = start_app(args.app_port, env, args.app_workers)
+        base_url = f"http://127.0.0.1:{args.app_port}"
+
+    try:
+        levels = asyncio.run(run_benchmark(args, base_url))
+    finally:
+        if app_process is not None:
+            app_process.terminate()
+            app_process.wait(timeout=30)
+
+    commit = git_commit()
+    report = {
+        "meta": {
+            "commit": commit,
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "config": {k: v for k, v in vars(args).items() if k not in ("dsn", "compare")},
+            "dataset": None if args.app_url else {"start_date": args.start_date, "days": args.days,
+                                                  "regions": args.regions, "industries": args.industries},
+        },
+        "levels": levels,
+    }
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"load_{commit or 'nogit'}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+# evaluation/visualization_benchmark.py
+"""
+Micro-benchmarks for VisualizationService and GeoVisualizationService.
+
+Every case runs one chart-pipeline function on a synthetic result set of a
+given shape and size and records its wall time (several rounds: min, median,
+mean) and the peak Python memory it allocates (tracemalloc, which includes
+numpy/pandas buffers, in a separate round so it does not skew the timings).
+
+Result shapes mirror what the SQL stage returns (lists of row dicts with
+Decimal measures and date values):
+- time_series: a date column and two measures
+- categories: a region name (50 distinct) and a measure
+- geo_points: region name, latitude/longitude and a measure
+- single_value: one row with one measure
+
+    # Full suite, 10 to 1,000,000 rows, written to JSON
+    python evaluation/visualization_benchmark.py --max-rows 1000000 --output viz_bench.json
+
+    # Only some functions, compared with an earlier run
+    python evaluation/visualization_benchmark.py --filter time_series --compare viz_bench.json
+
+Under pytest (pytest evaluation/visualization_benchmark.py) every case runs
+once on small inputs as a smoke test; VIZ_BENCH_MAX_ROWS raises the limit.
+"""
+
+import argparse
+import gc
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+import warnings
+from dataclasses import dataclass
+from datetime import date, timedelta
+from decimal import Decimal
+from typing import Any, Callable, Dict, List, Optional
+
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.visualization_service import VisualizationService
+from app.services.geo_visualization_service import GeoVisualizationService
+
+SIZES = [10, 100, 1_000, 10_000, 100_000, 1_000_000]
+
+
+# --- Synthetic result sets ---
+
+def time_series_rows(n: int, seed: int = 0) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    start = date(2020, 1, 1)
+    return [{"date": start + timedelta(days=i),
+             "swiss_tourists": Decimal(rng.randint(100, 5000)),
+             "foreign_tourists": Decimal(rng.randint(50, 4000))} for i in range(n)]
+
+
+def category_rows(n: int, seed: int = 0) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    return [{"region_name": f"Region {i % 50}",
+             "total_visitors": Decimal(rng.randint(100, 100000))} for i in range(n)]
+
+
+def geo_point_rows(n: int, seed: int = 0) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    return [{"region_name": f"Region {i}",
+             "latitude": 45.8 + rng.random() * 1.9,
+             "longitude": 5.9 + rng.random() * 4.6,
+             "total_visitors": Decimal(rng.randint(100, 100000))} for i in range(n)]
+
+
+def single_value_rows(n: int, seed: int = 0) -> List[Dict[str, Any]]:
+    return [{"total_visitors": Decimal(123456)}]
+
+
+def region_rows(n: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """Region records as the geo insight services pass them to GeoVisualizationService"""
+    rng = random.Random(seed)
+    return [{"region_name": f"Region {i}",
+             "central_latitude": 45.8 + rng.random() * 1.9,
+             "central_longitude": 5.9 + rng.random() * 4.6,
+             "total_visitors": rng.randint(100, 100000),
+             "swiss_tourists": rng.randint(50, 50000),
+             "foreign_tourists": rng.randint(50, 50000)} for i in range(n)]
+
+
+def hotspot_rows(n: int, seed: int = 0) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    return [{"latitude": 45.8 + rng.random() * 1.9,
+             "longitude": 5.9 + rng.random() * 4.6,
+             "density": rng.random(),
+             "industry": f"Industry {i % 12}"} for i in range(n)]
+
+
+# --- Cases ---
+
+@dataclass
+class Case:
+    """One benchmarked call: builds its input outside the measurement, then times run(input)"""
+    name: str
+    prepare: Callable[[int], Any]
+    run: Callable[[Any], Any]
+    # Largest input this case makes sense for (single values are always one row)
+    max_rows: Optional[int] = None
+
+
+def build_cases() -> List[Case]:
+    viz = VisualizationService()
+    geo = GeoVisualizationService()
+
+    def frame(make_rows):
+        return lambda n: pd.DataFrame(make_rows(n))
+
+    def with_query(make_rows, query):
+        return lambda n: (make_rows(n), query)
+
+    ts_query = "Show the daily trend of swiss and foreign tourists as a line chart"
+    cat_query = "Which regions have the most visitors?"
+    geo_query = "Show visitors per region on a map"
+    single_query = "How many visitors were there in total?"
+
+    return [
+        Case("create_visualization/time_series", with_query(time_series_rows, ts_query),
+             lambda args: viz.create_visualization(*args)),
+        Case("create_visualization/categories", with_query(category_rows, cat_query),
+             lambda args: viz.create_visualization(*args)),
+        Case("create_visualization/geo_points", with_query(geo_point_rows, geo_query),
+             lambda args: viz.create_visualization(*args)),
+        Case("create_visualization/single_value", with_query(single_value_rows, single_query),
+             lambda args: viz.create_visualization(*args), max_rows=1),
+        Case("_determine_visualization_type/time_series", frame(time_series_rows),
+             lambda df: viz._determine_visualization_type(ts_query, df)),
+        Case("_determine_visualization_type/categories", frame(category_rows),
+             lambda df: viz._determine_visualization_type(cat_query, df)),
+        Case("_hybrid_visualization_selection/time_series", frame(time_series_rows),
+             lambda df: viz._hybrid_visualization_selection(ts_query, df)),
+        Case("_hybrid_visualization_selection/geo_points", frame(geo_point_rows),
+             lambda df: viz._hybrid_visualization_selection(geo_query, df)),
+        Case("_is_date_column/date_objects", lambda n: pd.DataFrame(time_series_rows(n))["date"],
+             viz._is_date_column),
+        Case("_is_date_column/strings", lambda n: pd.DataFrame(category_rows(n))["region_name"],
+             viz._is_date_column),
+        Case("_create_time_series/time_series", frame(time_series_rows),
+             lambda df: viz._create_time_series(df, ts_query)),
+        Case("_create_map_visualization/geo_points", frame(geo_point_rows),
+             lambda df: viz._create_map_visualization(df, "region_name", "total_visitors", geo_query)),
+        Case("geo.create_region_map/regions", region_rows, geo.create_region_map),
+        Case("geo.create_hotspot_map/hotspots", hotspot_rows, geo.create_hotspot_map),
+        Case("geo.create_visitor_distribution_chart/regions", region_rows, geo.create_visitor_distribution_chart),
+    ]
+
+
+# --- Measurement ---
+
+def measure(case: Case, rows: int, rounds: int, max_seconds: float) -> Dict[str, Any]:
+    """Time case.run on an input of the given size and record its peak allocation"""
+    data = case.prepare(rows)
+    times = []
+    error = None
+    for _ in range(rounds):
+        gc.collect()
+        started = time.perf_counter()
+        try:
+            case.run(data)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            break
+        times.append(time.perf_counter() - started)
+        # Large inputs get fewer rounds
+        if sum(times) > max_seconds:
+            break
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        case.run(data)
+    except Exception:
+        pass
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    result = {
+        "case": case.name,
+        "rows": rows,
+        "rounds": len(times),
+        "peak_memory_mb": peak / (1024 * 1024),
+    }
+    if times:
+        result.update({
+            "min_s": min(times),
+            "median_s": statistics.median(times),
+            "mean_s": statistics.mean(times),
+        })
+    if error:
+        result["error"] = error
+    return result
+
+
+def run_suite(sizes: List[int], rounds: int = 5, max_seconds: float = 10.0,
+              name_filter: Optional[str] = None) -> List[Dict[str, Any]]:
+    results = []
+    for case in build_cases():
+        if name_filter and name_filter not in case.name:
+            continue
+        for rows in sizes:
+            if case.max_rows is not None and rows > case.max_rows:
+                continue
+            result = measure(case, rows, rounds, max_seconds)
+            results.append(result)
+            timing = f"{result['median_s'] * 1000:>10.2f}ms median" if "median_s" in result else "      failed"
+            print(f"{case.name:<52} {rows:>9} rows {timing}  {result['peak_memory_mb']:>9.1f}MB peak"
+                  + (f"  ({result['error']})" if "error" in result else ""))
+    return results
+
+
+def compare(baseline: List[Dict[str, Any]], results: List[Dict[str, Any]]) -> None:
+    old = {(r["case"], r["rows"]): r for r in baseline}
+    print("\nChange against baseline (median time, peak memory):")
+    for r in results:
+        b = old.get((r["case"], r["rows"]))
+        if not b or "median_s" not in b or "median_s" not in r:
+            continue
+        time_change = (r["median_s"] - b["median_s"]) / b["median_s"] * 100
+        mem_change = ((r["peak_memory_mb"] - b["peak_memory_mb"]) / b["peak_memory_mb"] * 100
+                      if b["peak_memory_mb"] else 0.0)
+        print(f"{r['case']:<52} {r['rows']:>9} rows  time {time_change:+7.1f}%  memory {mem_change:+7.1f}%")
+
+
+# --- pytest entry point (smoke run) ---
+
+def test_visualization_benchmarks_smoke():
+    """Every case runs on small inputs without raising"""
+    logging.disable(logging.CRITICAL)
+    try:
+        max_rows = int(os.getenv("VIZ_BENCH_MAX_ROWS", "100"))
+        results = run_suite([s for s in SIZES if s <= max_rows] or [SIZES[0]], rounds=1)
+    finally:
+        logging.disable(logging.NOTSET)
+    failed = [r for r in results if "error" in r]
+    assert not failed, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks of the visualization services")
+    parser.add_argument("--max-rows", type=int, default=100_000, help="Largest result set (up to 1,000,000)")
+    parser.add_argument("--sizes", help="Comma-separated row counts instead of 10..max-rows")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--max-seconds", type=float, default=10.0, help="Stop adding rounds after this much time per case")
+    parser.add_argument("--filter", help="Only cases whose name contains this")
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--compare", help="Baseline JSON file to compare with")
+    args = parser.parse_args()
+
+    # The services log per call (and per row in places) and plotly emits pandas
+    # deprecation warnings; keep both out of the timings
+    logging.disable(logging.CRITICAL)
+    warnings.simplefilter("ignore")
+    sizes = ([int(s) for s in args.sizes.split(",")] if args.sizes
+             else [s for s in SIZES if s <= args.max_rows])
+    results = run_suite(sizes, args.rounds, args.max_seconds, args.filter)
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f)["results"], results)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"sizes": sizes, "rounds": args.rounds, "results": results}, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+"""
+Cached data-access layer for the Streamlit dashboards.
+
+Every widget interaction triggers a full script rerun in Streamlit, so the
+dashboard pages must not open a new connection and scan a whole view on each
+rerun. This module keeps one connection pool per database configuration
+(``st.cache_resource``), caches query results keyed by view name, projected
+columns and filters (``st.cache_data`` with a TTL) and exposes an explicit
+refresh hook that refreshes the materialized views and drops stale results.
+"""
+import os
+import logging
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import pandas as pd
+import psycopg2
+import psycopg2.extras
+from psycopg2 import pool, sql
+import streamlit as st
+
+logger = logging.getLogger(__name__)
+
+# Cache lifetimes (seconds). The views are refreshed in batch, so results can
+# be kept for a while; the refresh hook below clears them explicitly.
+VIEW_CACHE_TTL = int(os.getenv("DASHBOARD_VIEW_CACHE_TTL", "900"))
+LOOKUP_CACHE_TTL = int(os.getenv("DASHBOARD_LOOKUP_CACHE_TTL", "3600"))
+
+POOL_MIN_CONN = int(os.getenv("DASHBOARD_POOL_MIN_CONN", "1"))
+POOL_MAX_CONN = int(os.getenv("DASHBOARD_POOL_MAX_CONN", "5"))
+
+# Columns each dashboard actually reads from the geo_insights views. Loading
+# only these instead of SELECT * keeps arrays and geometries off the wire.
+VIEW_COLUMNS: Dict[str, Tuple[str, ...]] = {
+    "choropleth_analytics": (
+        "region_name",
+        "swiss_tourists",
+        "foreign_tourists",
+        "total_visitors",
+        "foreign_tourist_percentage",
+        "total_spend",
+        "avg_transaction_value",
+        "daily_spend",
+        "spend_per_visitor",
+        "industry_count",
+        "top_industry",
+    ),
+    "region_centers": (
+        "region_id",
+        "geo_type",
+        "geo_name",
+        "avg_lat",
+        "avg_lon",
+        "point_count",
+    ),
+}
+
+# Columns of data_lake.municipality_monthly_stats used by the Swisscom Insights page
+MUNICIPALITY_MONTH_COLUMNS: Tuple[str, ...] = (
+    "region_id", "region_name", "municipality_name", "month", "year",
+    "days_with_data", "total_visitors",
+    "swiss_commuters", "swiss_locals", "swiss_tourists",
+    "foreign_workers", "foreign_tourists",
+    "dwell_time_counts", "male_proportion", "age_distribution",
+)
+
+
+def get_default_db_config() -> Dict[str, str]:
+    """Database configuration from the environment, as used by the dashboards"""
+    return {
+        "host": os.getenv("DB_HOST", "3.76.40.121"),
+        "port": os.getenv("DB_PORT", "5432"),
+        "dbname": os.getenv("DB_NAME", "trip_dw"),
+        "user": os.getenv("DB_USER", "postgres"),
+        "password": os.getenv("DB_PASSWORD", "336699"),
+    }
+
+
+@st.cache_resource(show_spinner=False)
+def get_connection_pool(db_config: Dict[str, str]) -> pool.ThreadedConnectionPool:
+    """Return the shared connection pool for a database configuration.
+
+    Cached with ``st.cache_resource`` so all sessions and reruns of the
+    Streamlit server share the same pool.
+    """
+    logger.info(f"Creating dashboard connection pool for {db_config.get('dbname')}@{db_config.get('host')}")
+    return pool.ThreadedConnectionPool(POOL_MIN_CONN, POOL_MAX_CONN, **db_config)
+
+
+@contextmanager
+def pooled_connection(db_config: Optional[Dict[str, str]] = None):
+    """Borrow a connection from the pool and hand it back afterwards"""
+    db_pool = get_connection_pool(db_config or get_default_db_config())
+    conn = db_pool.getconn()
+    broken = False
+    try:
+        yield conn
+        conn.commit()
+    except psycopg2.Error:
+        broken = conn.closed != 0
+        if not broken:
+            conn.rollback()
+        raise
+    finally:
+        db_pool.putconn(conn, close=broken)
+
+
+def _normalize_filters(filters: Optional[Dict[str, Any]]) -> Tuple[Tuple[str, Any], ...]:
+    """Turn a filter dict into a sorted tuple so it hashes stably as a cache key"""
+    if not filters:
+        return ()
+    return tuple(sorted(filters.items()))
+
+
+def _build_select(schema: str, relation: str, columns: Iterable[str],
+                  filters: Tuple[Tuple[str, Any], ...]) -> Tuple[sql.Composed, List[Any]]:
+    """Compose a projected, filtered SELECT with safely quoted identifiers"""
+    query = sql.SQL("SELECT {columns} FROM {schema}.{relation}").format(
+        columns=sql.SQL(", ").join(sql.Identifier(c) for c in columns),
+        schema=sql.Identifier(schema),
+        relation=sql.Identifier(relation),
+    )
+    params: List[Any] = []
+    if filters:
+        conditions = []
+        for column, value in filters:
+            conditions.append(sql.SQL("{} = %s").format(sql.Identifier(column)))
+            params.append(value)
+        query = query + sql.SQL(" WHERE ") + sql.SQL(" AND ").join(conditions)
+    return query, params
+
+
+@st.cache_data(ttl=VIEW_CACHE_TTL, show_spinner=False)
+def _cached_select(db_config: Dict[str, str], schema: str, relation: str,
+                   columns: Tuple[str, ...],
+                   filters: Tuple[Tuple[str, Any], ...]) -> pd.DataFrame:
+    query, params = _build_select(schema, relation, columns, filters)
+    with pooled_connection(db_config) as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
+            names = [desc[0] for desc in cursor.description]
+    return pd.DataFrame(rows, columns=names)
+
+
+def load_view(view_name: str, columns: Optional[Iterable[str]] = None,
+              filters: Optional[Dict[str, Any]] = None,
+              db_config: Optional[Dict[str, str]] = None,
+              schema: str = "geo_insights") -> pd.DataFrame:
+    """
+    Load a projected, filtered slice of a view through the result cache.
+
+    Args:
+        view_name: Name of the view (without schema)
+        columns: Columns to select; defaults to VIEW_COLUMNS[view_name]
+        filters: Optional equality filters, column -> value
+        db_config: psycopg2 connection kwargs; defaults to the environment
+        schema: Schema of the view
+
+    Returns:
+        DataFrame with the requested columns (empty on error)
+    """
+    projected = tuple(columns) if columns is not None else VIEW_COLUMNS.get(view_name)
+    if not projected:
+        raise ValueError(f"No column projection defined for view '{view_name}'")
+    try:
+        return _cached_select(db_config or get_default_db_config(), schema, view_name,
+                              projected, _normalize_filters(filters))
+    except psycopg2.Error as e:
+        logger.error(f"Error loading {schema}.{view_name}: {e}")
+        st.error(f"Error loading data from {view_name}: {str(e)}")
+        return pd.DataFrame(columns=list(projected))
+
+
+@st.cache_data(ttl=LOOKUP_CACHE_TTL, show_spinner=False)
+def fetch_region_municipalities(db_config: Dict[str, str], region_id: str,
+                                limit: int = 20) -> List[Dict[str, Any]]:
+    """Top municipalities of a region by visitors, from the municipality monthly stats"""
+    query = """
+        SELECT 
+            municipality_name,
+            SUM(total_visitors) AS total_visitors
+        FROM 
+            data_lake.municipality_monthly_stats
+        WHERE 
+            region_id = %s
+        GROUP BY 
+            municipality_name
+        ORDER BY 
+            total_visitors DESC
+        LIMIT %s;
+    """
+    with pooled_connection(db_config) as conn:
+        with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cursor:
+            cursor.execute(query, (region_id, limit))
+            return [dict(row) for row in cursor.fetchall()]
+
+
+def fetch_municipality_month(db_config: Dict[str, str], region_id: str, municipality: str,
+                             month: int, year: int = 2023) -> Optional[Dict[str, Any]]:
+    """Pre-aggregated stats of one municipality for one month (None if there is no data)"""
+    df = _cached_select(
+        db_config, "data_lake", "municipality_monthly_stats", MUNICIPALITY_MONTH_COLUMNS,
+        _normalize_filters({"region_id": region_id, "municipality_name": municipality,
+                            "month": month, "year": year}),
+    )
+    if df.empty:
+        return None
+    return df.iloc[0].to_dict()
+
+
+def clear_cached_data() -> None:
+    """Drop all cached query results (connection pools are kept)"""
+    _cached_select.clear()
+    fetch_region_municipalities.clear()
+    logger.info("Dashboard data caches cleared")
+
+
+# data_lake views read by the dashboards, in dependency order (see
+# app/scripts/refresh_materialized_views.py), and whether they have the unique
+# index that REFRESH ... CONCURRENTLY needs
+DASHBOARD_DATA_LAKE_VIEWS = (
+    ("data_lake.swisscom_dashboard_view", False),
+    ("data_lake.municipality_monthly_stats", True),
+)
+
+
+def refresh_materialized_views(db_config: Optional[Dict[str, str]] = None) -> bool:
+    """
+    Refresh the materialized views behind the dashboards and invalidate cached results.
+
+    This is the explicit refresh hook for the dashboards: cached data is only
+    dropped once the views themselves hold new data, so pages never re-read a
+    view that has not changed. Covers the geo_insights views and the data_lake
+    views of the Swisscom Insights page; views that are not installed are skipped.
+    """
+    try:
+        with pooled_connection(db_config) as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT geo_insights.refresh_all_views();")
+                for view, concurrently in DASHBOARD_DATA_LAKE_VIEWS:
+                    cursor.execute("SELECT to_regclass(%s) IS NOT NULL;", (view,))
+                    if not cursor.fetchone()[0]:
+                        continue
+                    schema, name = view.split(".")
+                    statement = "REFRESH MATERIALIZED VIEW CONCURRENTLY {}" if concurrently else "REFRESH MATERIALIZED VIEW {}"
+                    cursor.execute(sql.SQL(statement).format(sql.Identifier(schema, name)))
+    except psycopg2.Error as e:
+        logger.error(f"Error refreshing materialized views: {e}")
+        st.error(f"Error refreshing materialized views: {str(e)}")
+        return False
+    clear_cached_data()
+    return True
+
+
+def render_refresh_controls(db_config: Optional[Dict[str, str]] = None) -> None:
+    """Sidebar controls to reload cached data or refresh the underlying views"""
+    with st.sidebar.expander("Data Refresh"):
+        st.caption(f"Results are cached for {VIEW_CACHE_TTL // 60} minutes.")
+        if st.button("Reload cached data", key="reload_cached_data"):
+            clear_cached_data()
+            st.rerun()
+        if st.button("Refresh materialized views", key="refresh_materialized_views"):
+            with st.spinner("Refreshing materialized views..."):
+                if refresh_materialized_views(db_config):
+                    st.success("Views refreshed.")
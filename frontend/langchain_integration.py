@@ -11,6 +11,12 @@ import json
 import streamlit as st
 import logging
 
+# Reuse the backend's pooled LLM connections when it is importable (running from the repository)
+try:
+    from app.llm.llm_transport import get_sync_http_client
+except ImportError:
+    get_sync_http_client = None
+
 # Configure logging
 logger = logging.getLogger(__name__)
 
@@ -64,7 +70,8 @@ class LangChainSQLHelper:
                 )
                 
                 # Initialize language model
-                llm = OpenAI(temperature=0, openai_api_key=self.openai_api_key)
+                llm_options = {"http_client": get_sync_http_client()} if get_sync_http_client else {}
+                llm = OpenAI(temperature=0, openai_api_key=self.openai_api_key, **llm_options)
                 
                 # Create SQL toolkit
                 toolkit = SQLDatabaseToolkit(db=self._db, llm=llm)
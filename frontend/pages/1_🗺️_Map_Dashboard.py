@@ -2,8 +2,6 @@ import streamlit as st
 import geopandas as gpd
 import folium
 import os
-import psycopg2
-from psycopg2 import sql
 from streamlit_folium import st_folium
 import pandas as pd
 import folium.plugins as plugins
@@ -18,6 +16,10 @@ import re
 import sys
 from pathlib import Path
 
+# Make the frontend modules importable from the pages directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from data_access import get_default_db_config, load_view, render_refresh_controls
+
 # Load environment variables
 load_dotenv()
 
@@ -82,13 +84,6 @@ def locate_file(relative_path, search_paths=None):
     
     return None  # File not found
 
-# Database connection parameters
-DB_HOST = os.getenv("DB_HOST", "3.76.40.121")
-DB_PORT = os.getenv("DB_PORT", "5432")
-DB_NAME = os.getenv("DB_NAME", "trip_dw")
-DB_USER = os.getenv("DB_USER", "postgres")
-DB_PASSWORD = os.getenv("DB_PASSWORD", "336699")
-
 # Add custom CSS for better styling
 st.markdown("""
 <style>
@@ -144,26 +139,6 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-def connect_to_db():
-    """Establish connection to PostgreSQL database"""
-    try:
-        # Create the connection
-        conn = psycopg2.connect(
-            host=DB_HOST,
-            port=DB_PORT,
-            dbname=DB_NAME,
-            user=DB_USER,
-            password=DB_PASSWORD
-        )
-        
-        # Set up cursor and schema permissions
-        cursor = conn.cursor()
-        cursor.execute('SET search_path TO geo_insights, public;')
-        return conn, cursor
-    except psycopg2.Error as e:
-        st.error(f"Database connection error: {str(e)}")
-        return None, None
-
 def load_shapefile_data():
     """Load data from Ticino shapefile or create fallback data"""
     try:
@@ -281,27 +256,9 @@ def create_fallback_data():
     
     return gdf
 
-def load_view_data(view_name):
-    """Load data from a specific view in the database"""
-    conn, cursor = connect_to_db()
-    if conn and cursor:
-        try:
-            query = sql.SQL("""
-                SELECT * FROM geo_insights.{}
-            """).format(sql.Identifier(view_name))
-            
-            # Use pandas read_sql for better type handling
-            df = pd.read_sql(query.as_string(conn), conn)
-            
-            return df
-        except Exception as e:
-            st.error(f"Error loading data from {view_name}: {str(e)}")
-        finally:
-            if cursor:
-                cursor.close()
-            if conn:
-                conn.close()
-    return pd.DataFrame()
+def load_view_data(view_name, columns=None):
+    """Load the projected columns of a geo_insights view through the cached data layer"""
+    return load_view(view_name, columns=columns, db_config=get_default_db_config())
 
 def create_choropleth_map(gdf, data_df, region_col, value_col, title, color_scale='YlOrRd'):
     """Create a choropleth map by adding database values to the GeoJSON"""
@@ -1110,7 +1067,10 @@ def main():
         list(view_options.keys()),
         key="main_view_selector"
     )
-    
+
+    # Cache invalidation / materialized view refresh
+    render_refresh_controls(get_default_db_config())
+
     # Display selected view
     if selected_view_name:
         view_options[selected_view_name]()
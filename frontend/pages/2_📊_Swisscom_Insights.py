@@ -1,12 +1,16 @@
 import streamlit as st
 import pandas as pd
 import psycopg2
-import psycopg2.extras
 import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import datetime
-import json
+import os
+import sys
+
+# Make the frontend modules importable from the pages directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from data_access import fetch_municipality_month, fetch_region_municipalities, render_refresh_controls
 
 # Set page config for wide layout and page title/icon
 st.set_page_config(page_title="Swisscom Insights", page_icon="📊", layout="wide")
@@ -30,145 +34,28 @@ if 'db_config' not in st.session_state or not all(st.session_state.db_config.val
     st.error("Database configuration is missing or incomplete...") # Abridged error
     st.stop() 
 
-# --- Database Connection ---
-def connect_to_db():
-    """Establish connection to PostgreSQL database using config from session state"""
-    db_config = st.session_state.db_config
-    try:
-        conn = psycopg2.connect(**db_config)
-        cursor = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
-        # Set the search path to include the data_lake schema
-        cursor.execute('SET search_path TO data_lake, public;')
-        # schema_info = "" # Removed schema info display from sidebar
-        # if "schema" in db_config and db_config["schema"]:
-        #     schema_info = f" (Schema: {db_config['schema']})"
-        # st.sidebar.success(f"DB Connected: {db_config['dbname']}@{db_config['host']}{schema_info}") # REMOVED THIS LINE
-        return conn, cursor
-    except psycopg2.Error as e:
-        st.error(f"Database connection error: {str(e)}")
-        st.sidebar.error("Connection Failed")
-        return None, None
+# --- Data Access (pooled + cached, see data_access.py) ---
+# Bellinzonese region ID
+BELLINZONESE_REGION_ID = 'f7883818-99e1-4d20-b09a-5171bf16133a'
 
 # --- Fetch Bellinzonese Municipalities ---
-def fetch_bellinzonese_municipalities(cursor):
+def fetch_bellinzonese_municipalities():
     """Fetch list of municipalities in the Bellinzonese region"""
     try:
-        # Bellinzonese region ID
-        bellinzonese_id = 'f7883818-99e1-4d20-b09a-5171bf16133a'
-        
-        query = """
-            WITH municipality_data AS (
-                SELECT 
-                    jsonb_array_elements(top_swiss_municipalities)->>'name' AS municipality_name,
-                    (jsonb_array_elements(top_swiss_municipalities)->>'visitors')::INTEGER AS visitor_count
-                FROM 
-                    swisscom_dashboard_view
-                WHERE 
-                    region_id = %s
-                    AND top_swiss_municipalities IS NOT NULL
-            )
-            SELECT 
-                municipality_name,
-                SUM(visitor_count) AS total_visitors
-            FROM 
-                municipality_data
-            GROUP BY 
-                municipality_name
-            ORDER BY 
-                total_visitors DESC
-            LIMIT 20;
-        """
-        cursor.execute(query, (bellinzonese_id,))
-        results = cursor.fetchall()
-        
-        # Convert to list of dictionaries
-        municipalities = [dict(row) for row in results]
-        return municipalities
-    except Exception as e:
+        return fetch_region_municipalities(st.session_state.db_config, BELLINZONESE_REGION_ID)
+    except psycopg2.Error as e:
         st.error(f"Error fetching municipalities: {str(e)}")
         return []
 
 # --- Fetch Dashboard Data for Municipality ---
-def fetch_municipality_data(cursor, municipality, month):
-    """Fetch data for a specific municipality and month"""
-    try:
-        # Bellinzonese region ID
-        bellinzonese_id = 'f7883818-99e1-4d20-b09a-5171bf16133a'
-        
-        # First get the region-level data
-        region_query = """
-            SELECT 
-                region_id, region_name, month, year,
-                swiss_commuters, swiss_locals, swiss_tourists, 
-                foreign_workers, foreign_tourists, total_visitors,
-                dwelltimes, demographics, top_swiss_municipalities
-            FROM 
-                data_lake.swisscom_dashboard_view
-            WHERE 
-                region_id = %s AND month = %s AND year = 2023
-        """
-        params = (bellinzonese_id, month)
-        
-        cursor.execute(region_query, params)
-        region_results = cursor.fetchall()
-        
-        if not region_results:
-            return pd.DataFrame()
-        
-        # Process data to extract municipality information
-        municipality_data = []
-        for row in region_results:
-            row_dict = dict(row)
-            
-            if row_dict['top_swiss_municipalities'] is not None:
-                try:
-                    # Parse JSON if needed
-                    if isinstance(row_dict['top_swiss_municipalities'], str):
-                        municipalities_list = json.loads(row_dict['top_swiss_municipalities'])
-                    else:
-                        municipalities_list = row_dict['top_swiss_municipalities']
-                    
-                    # Find the specified municipality in the list
-                    muni_entry = next((item for item in municipalities_list if item.get('name') == municipality), None)
-                    
-                    if muni_entry:
-                        # Create a copy of the row for this municipality
-                        muni_row = row_dict.copy()
-                        
-                        # Set visitor count for this municipality
-                        muni_visitors = int(muni_entry.get('visitors', 0))
-                        
-                        # Preserve other data but scale down based on municipality proportion
-                        total_visitors = row_dict['total_visitors'] if pd.notna(row_dict['total_visitors']) else 0
-                        
-                        if total_visitors > 0:
-                            # Scale factor to adjust all visitor categories
-                            scale_factor = muni_visitors / total_visitors
-                            muni_row['swiss_commuters'] = int(row_dict['swiss_commuters'] * scale_factor) if pd.notna(row_dict['swiss_commuters']) else 0
-                            muni_row['swiss_locals'] = int(row_dict['swiss_locals'] * scale_factor) if pd.notna(row_dict['swiss_locals']) else 0
-                            muni_row['swiss_tourists'] = int(row_dict['swiss_tourists'] * scale_factor) if pd.notna(row_dict['swiss_tourists']) else 0
-                            muni_row['foreign_workers'] = int(row_dict['foreign_workers'] * scale_factor) if pd.notna(row_dict['foreign_workers']) else 0
-                            muni_row['foreign_tourists'] = int(row_dict['foreign_tourists'] * scale_factor) if pd.notna(row_dict['foreign_tourists']) else 0
-                            muni_row['total_visitors'] = muni_visitors
-                        else:
-                            # If total_visitors is 0, just use the municipality visitors
-                            muni_row['total_visitors'] = muni_visitors
-                            # Simple distribution of visitor types
-                            muni_row['swiss_commuters'] = int(muni_visitors * 0.2)
-                            muni_row['swiss_locals'] = int(muni_visitors * 0.3)
-                            muni_row['swiss_tourists'] = int(muni_visitors * 0.3)
-                            muni_row['foreign_workers'] = int(muni_visitors * 0.05)
-                            muni_row['foreign_tourists'] = int(muni_visitors * 0.15)
-                        
-                        municipality_data.append(muni_row)
-                except (json.JSONDecodeError, TypeError) as e:
-                    st.warning(f"Error parsing municipality data: {str(e)}")
-                    continue
-        
-        return pd.DataFrame(municipality_data)
-    except Exception as e:
-        st.error(f"Error fetching municipality data: {str(e)}")
-        return pd.DataFrame()
+def fetch_municipality_data(municipality, month):
+    """Fetch the pre-aggregated stats for a specific municipality and month.
+
+    The JSON unnesting and per-day scaling happen in the
+    data_lake.municipality_monthly_stats materialized view, so this is a single
+    indexed (and cached) lookup. Returns None if there is no data.
+    """
+    return fetch_municipality_month(st.session_state.db_config, BELLINZONESE_REGION_ID, municipality, month)
 
 # --- Mock Data Generation ---
 def get_sample_data(municipality, month, year=2023):
@@ -264,43 +151,35 @@ def render_filters():
         {"name": "Isone", "total_visitors": 45789}
     ]
     
-    # Connect to DB and try to get actual municipalities
+    # Try to get actual municipalities (cached, see data_access.py)
     municipalities_list = default_municipalities
-    conn, cursor = None, None
     try:
-        conn, cursor = connect_to_db()
-        if conn and cursor:
-            # Using the function that fetches municipalities, assuming it exists
-            # NOTE: Ensure 'fetch_bellinzonese_municipalities' is defined correctly elsewhere
-            municipalities_from_db = fetch_bellinzonese_municipalities(cursor)
-            if municipalities_from_db and len(municipalities_from_db) > 0:
-                # Filter to focus on specific Bellinzonese municipalities if needed
-                # Or just use the list directly if the fetch function returns the desired ones
-                bellinzonese_municipalities = []
-                target_munis = {"Bellinzona", "Arbedo-Castione", "Cadenazzo", "Riviera", "Isone"}
-                for muni in municipalities_from_db:
-                    # Assuming fetch_bellinzonese_municipalities returns dicts with 'municipality_name'
-                    if muni.get('municipality_name') in target_munis:
-                        bellinzonese_municipalities.append({
-                            "name": muni['municipality_name'],
-                            # We might not need total_visitors here, just the names
-                            # "total_visitors": muni.get('total_visitors', 0) 
-                        })
-                
-                # If we found our target municipalities, use them
-                if bellinzonese_municipalities:
-                    municipalities_list = bellinzonese_municipalities
-                else:
-                    st.warning("Target municipalities not found in DB query result. Using defaults.") 
+        municipalities_from_db = fetch_bellinzonese_municipalities()
+        if municipalities_from_db and len(municipalities_from_db) > 0:
+            # Filter to focus on specific Bellinzonese municipalities if needed
+            # Or just use the list directly if the fetch function returns the desired ones
+            bellinzonese_municipalities = []
+            target_munis = {"Bellinzona", "Arbedo-Castione", "Cadenazzo", "Riviera", "Isone"}
+            for muni in municipalities_from_db:
+                # Assuming fetch_bellinzonese_municipalities returns dicts with 'municipality_name'
+                if muni.get('municipality_name') in target_munis:
+                    bellinzonese_municipalities.append({
+                        "name": muni['municipality_name'],
+                        # We might not need total_visitors here, just the names
+                        # "total_visitors": muni.get('total_visitors', 0) 
+                    })
+            
+            # If we found our target municipalities, use them
+            if bellinzonese_municipalities:
+                municipalities_list = bellinzonese_municipalities
             else:
-                 st.warning("No municipalities found via DB query. Using defaults.")
+                st.warning("Target municipalities not found in DB query result. Using defaults.") 
+        else:
+             st.warning("No municipalities found via DB query. Using defaults.")
     except NameError:
         st.warning("`fetch_bellinzonese_municipalities` function not found. Using default list.")        
     except Exception as e:
         st.warning(f"Could not fetch municipality list from database, using defaults: {str(e)}")
-    finally:
-        if cursor: cursor.close()
-        if conn: conn.close()
     
     # Set up municipality options from the determined list
     municipality_names = sorted([m["name"] for m in municipalities_list])
@@ -438,72 +317,48 @@ def render_tabs(data):
         plot_or_info(data.get("top_municipalities"), plot_muni_bar, "Areas Bar")
 
 # --- Data Processing Helper Functions ---
-def process_fetched_data(df, selected_municipality):
-    """Process the DataFrame (containing municipality-specific data)."""
-    # The input df should now be the result from fetch_municipality_data,
-    # which already attempted to filter/scale for the specific municipality.
-    if df.empty:
-        st.warning("Processing function received empty DataFrame.")
+DWELL_RANGES = ["0.5-1h", "1-2h", "2-3h", "3-4h", "4-5h", "5-6h", "6-7h", "7-8h", "8-24h"]
+AGE_GROUPS = ["0-19", "20-39", "40-64", "65+"]
+
+def _to_int(value):
+    """Convert a possibly missing numeric value to int"""
+    return int(value) if value is not None and pd.notna(value) else 0
+
+def process_fetched_data(stats, selected_municipality):
+    """Build the chart DataFrames from one municipality_monthly_stats row."""
+    if not stats:
+        st.warning("Processing function received no data.")
         return None
 
-    # Aggregate visitor categories (from potentially scaled data)
-    tourist_categories_data = [
-        {"name": "Swiss Commuters", "value": df['swiss_commuters'].sum()},
-        {"name": "Swiss Locals", "value": df['swiss_locals'].sum()},
-        {"name": "Swiss Tourists", "value": df['swiss_tourists'].sum()},
-        {"name": "Foreign Workers", "value": df['foreign_workers'].sum()},
-        {"name": "Foreign Tourists", "value": df['foreign_tourists'].sum()}
-    ]
-    tourist_categories_df = pd.DataFrame(tourist_categories_data)
+    # Visitor categories (already scaled to the municipality in SQL)
+    tourist_categories_df = pd.DataFrame([
+        {"name": "Swiss Commuters", "value": _to_int(stats.get('swiss_commuters'))},
+        {"name": "Swiss Locals", "value": _to_int(stats.get('swiss_locals'))},
+        {"name": "Swiss Tourists", "value": _to_int(stats.get('swiss_tourists'))},
+        {"name": "Foreign Workers", "value": _to_int(stats.get('foreign_workers'))},
+        {"name": "Foreign Tourists", "value": _to_int(stats.get('foreign_tourists'))}
+    ])
     tourist_categories_df = tourist_categories_df[tourist_categories_df['value'] > 0] 
 
-    # Aggregate dwell times (from potentially scaled data)
-    dwell_time_data = []
-    dwell_ranges = [
-        {"range": "0.5-1h", "idx": 0, "sort": 1}, {"range": "1-2h", "idx": 1, "sort": 2},
-        {"range": "2-3h", "idx": 2, "sort": 3}, {"range": "3-4h", "idx": 3, "sort": 4},
-        {"range": "4-5h", "idx": 4, "sort": 5}, {"range": "5-6h", "idx": 5, "sort": 6},
-        {"range": "6-7h", "idx": 6, "sort": 7}, {"range": "7-8h", "idx": 7, "sort": 8},
-        {"range": "8-24h", "idx": 8, "sort": 9}
-    ]
-    dwell_totals = {r['range']: 0 for r in dwell_ranges}
-    for dwell_json_list in df['dwelltimes'].dropna():
-        if isinstance(dwell_json_list, str):
-            try: dwell_json_list = json.loads(dwell_json_list)
-            except json.JSONDecodeError: continue # Skip malformed JSON
-        if isinstance(dwell_json_list, list):
-            for idx, count in enumerate(dwell_json_list):
-                 if idx < len(dwell_ranges):
-                     range_name = dwell_ranges[idx]['range']
-                     dwell_totals[range_name] += int(count) if isinstance(count, (int, float)) else 0
-                     
-    for r in dwell_ranges:
-        dwell_time_data.append({"range": r['range'], "value": dwell_totals[r['range']], "sort_order": r['sort']})
-    dwell_time_df = pd.DataFrame(dwell_time_data)
-
-    # Aggregate demographics (from potentially scaled data)
+    # Dwell times (monthly totals per range)
+    dwell_counts = list(stats.get('dwell_time_counts') or [])
+    dwell_counts += [0] * (len(DWELL_RANGES) - len(dwell_counts))
+    dwell_time_df = pd.DataFrame([
+        {"range": r, "value": _to_int(dwell_counts[i]), "sort_order": i + 1}
+        for i, r in enumerate(DWELL_RANGES)
+    ])
+
+    # Demographics (visitor-weighted proportions), defaults if none were reported
+    male_prop = stats.get('male_proportion')
+    avg_male_prop = float(male_prop) if male_prop is not None and pd.notna(male_prop) else 0.5
+    age_dist = list(stats.get('age_distribution') or [])
+    if len(age_dist) != len(AGE_GROUPS):
+        age_dist = [0.25] * len(AGE_GROUPS)
+
+    total_monthly_visitors = _to_int(stats.get('total_visitors'))
     age_gender_data = []
-    age_groups = ["0-19", "20-39", "40-64", "65+"]
-    daily_demos = []
-    total_pop_for_demo = 0
-    for index, row in df[['demographics', 'total_visitors']].dropna().iterrows():
-        demo_json = row['demographics']
-        total_visitors_day = row['total_visitors']
-        if isinstance(demo_json, str):
-             try: demo_json = json.loads(demo_json)
-             except json.JSONDecodeError: continue
-        if isinstance(demo_json, dict) and 'maleProportion' in demo_json and 'ageDistribution' in demo_json: # Simplified check
-             male_prop = float(demo_json['maleProportion'])
-             age_dist = [float(p) for p in demo_json['ageDistribution']]
-             daily_demos.append({'male_prop': male_prop, 'age_dist': age_dist, 'total': total_visitors_day})
-             total_pop_for_demo += total_visitors_day
-             
-    # Use the helper, but the fallback total is just the sum of the input df
-    avg_male_prop, avg_age_dist = calculate_avg_demographics(daily_demos, total_pop_for_demo, df['total_visitors'].sum())
-    
-    total_monthly_visitors = df['total_visitors'].sum()
-    for i, age_group in enumerate(age_groups):
-        total_age_group = avg_age_dist[i] * total_monthly_visitors
+    for i, age_group in enumerate(AGE_GROUPS):
+        total_age_group = float(age_dist[i]) * total_monthly_visitors
         male_count = int(round(total_age_group * avg_male_prop))
         female_count = int(round(total_age_group * (1 - avg_male_prop)))
         age_gender_data.append({"age": age_group, "male": male_count, "female": female_count, "sort_order": i + 1})
@@ -526,9 +381,8 @@ def process_fetched_data(df, selected_municipality):
         areas = [f"Area {i+1}" for i in range(5)] # Default areas
         
     area_distribution = [0.35, 0.25, 0.20, 0.12, 0.08] # Sample distribution
-    total_visitors_final = df['total_visitors'].sum() # Total from input df
     for i, area in enumerate(areas):
-        visitor_count = int(round(total_visitors_final * area_distribution[i]))
+        visitor_count = int(round(total_monthly_visitors * area_distribution[i]))
         top_municipalities_data.append({"name": area, "value": visitor_count})
             
     top_municipalities_df = pd.DataFrame(top_municipalities_data)
@@ -541,21 +395,6 @@ def process_fetched_data(df, selected_municipality):
         "age_gender": age_gender_df,
         "top_municipalities": top_municipalities_df # This now contains area data
     }
-    
-# --- (Helper function for demographics needed) ---
-def calculate_avg_demographics(daily_demos, total_pop_for_demo, total_visitors_fallback):
-    """Helper to calculate average demographic proportions."""
-    age_groups = ["0-19", "20-39", "40-64", "65+"] # Define age groups
-    if total_pop_for_demo > 0:
-        avg_male_prop = sum(d['male_prop'] * d['total'] for d in daily_demos) / total_pop_for_demo
-        avg_age_dist = [sum(d['age_dist'][i] * d['total'] for d in daily_demos) / total_pop_for_demo for i in range(len(age_groups))]
-    elif daily_demos: # Fallback to simple average
-        avg_male_prop = sum(d['male_prop'] for d in daily_demos) / len(daily_demos)
-        avg_age_dist = [sum(d['age_dist'][i] for d in daily_demos) / len(daily_demos) for i in range(len(age_groups))]
-    else: # No demographic data
-        avg_male_prop = 0.5 # Default guess
-        avg_age_dist = [0.25] * len(age_groups) # Default guess
-    return avg_male_prop, avg_age_dist
 
 # --- Main App Logic --- 
 def run_page():
@@ -578,39 +417,28 @@ def run_page():
     use_mock_data = False
     db_connected_status = False
 
-    conn, cursor = connect_to_db()
-    
-    if conn and cursor:
+    try:
+        # Fetch data specifically for the selected municipality (cached per region/month)
+        col1.info(f"Attempting data retrieval for {selected_municipality} / {selected_month_name}...")
+        fetched_stats = fetch_municipality_data(selected_municipality, selected_month_id)
         db_connected_status = True
-        try:
-            # Fetch data specifically for the selected municipality
-            col1.info(f"Attempting data retrieval for {selected_municipality} / {selected_month_name}...")
-            fetched_df = fetch_municipality_data(cursor, selected_municipality, selected_month_id)
+        
+        if not fetched_stats:
+            col1.warning(f"No data found in the database for {selected_municipality} in {selected_month_name}. Using sample data.")
+            use_mock_data = True
+        else:
+            col1.success("Data found. Processing...")
+            # Process the municipality-specific data
+            processed_data = process_fetched_data(fetched_stats, selected_municipality)
             
-            if fetched_df.empty:
-                col1.warning(f"No data found in the database for {selected_municipality} in {selected_month_name}. Using sample data.")
-                use_mock_data = True
+            if processed_data:
+                 col1.success(f"Displaying data for {selected_municipality}.")
             else:
-                col1.success("Data found. Processing...")
-                # Process the municipality-specific data
-                processed_data = process_fetched_data(fetched_df, selected_municipality)
-                
-                if processed_data:
-                     col1.success(f"Displaying data for {selected_municipality}.")
-                else:
-                     col1.error(f"Error processing fetched data for {selected_municipality}. Using sample data.")
-                     use_mock_data = True
-
-        except Exception as e:
-            col1.error(f"Error during database query or processing: {str(e)}")
-            use_mock_data = True
-        
-        finally:
-            if cursor: cursor.close()
-            if conn: conn.close()
-    else:
-        db_connected_status = False
-        col1.warning("Database connection failed. Using sample data.")
+                 col1.error(f"Error processing fetched data for {selected_municipality}. Using sample data.")
+                 use_mock_data = True
+
+    except Exception as e:
+        col1.error(f"Error during database query or processing: {str(e)}")
         use_mock_data = True
     
     st.session_state.db_connected = db_connected_status
@@ -639,6 +467,9 @@ def render_sidebar():
         """
     )
     
+    # Cache invalidation / materialized view refresh
+    render_refresh_controls(st.session_state.db_config)
+
     # Show database connection status
     status = "🟢 Connected" if st.session_state.get('db_connected', False) else "⚪ Not Connected"
     st.sidebar.markdown(f"**DB Status**: {status}")
@@ -1,7 +1,30 @@
 #!/usr/bin/env python3
+"""
+Start the API server.
+
+    python run_server.py                  # development: one worker, auto-reload
+    python run_server.py --workers 4      # production: 4 worker processes
+
+With several workers (--workers or WEB_CONCURRENCY):
+- caches are shared between them through SHARED_CACHE_URL (see
+  app/utils/shared_cache.py); when it is not set, a SQLite file on tmpfs is used
+- the LLM provider budgets (LLM_REQUESTS_PER_MINUTE, LLM_TOKENS_PER_MINUTE,
+  LLM_MAX_CONCURRENCY) are divided between the workers, since every worker
+  runs its own LLM scheduler
+- /metrics aggregates all workers through PROMETHEUS_MULTIPROC_DIR
+- the schema context and DW context snapshot are built once here, before the
+  workers start, so no worker has to build them on its first request
+"""
+import argparse
+import asyncio
+import glob
 import os
+import shutil
 import sys
 import subprocess
+import tempfile
+from typing import Optional
+
 import uvicorn
 
 def ensure_dependencies():
@@ -23,17 +46,103 @@ def ensure_dependencies():
     except Exception as e:
         print(f"Warning: Error checking dependencies: {e}")
 
+def configure_shared_cache(workers: int):
+    """Give all workers one cache unless SHARED_CACHE_URL already names one"""
+    if workers > 1 and not os.getenv("SHARED_CACHE_URL"):
+        directory = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+        os.environ["SHARED_CACHE_URL"] = f"sqlite:///{os.path.join(directory, 'tourism_cache.db')}"
+    print(f"Shared cache: {os.getenv('SHARED_CACHE_URL') or 'memory:// (this process only)'}")
+
+def configure_llm_budgets(workers: int):
+    """Give each worker its share of the provider's rate limits and concurrency"""
+    if workers <= 1:
+        return
+    from app.core.config import settings
+
+    os.environ["LLM_REQUESTS_PER_MINUTE"] = str(settings.LLM_REQUESTS_PER_MINUTE / workers)
+    os.environ["LLM_TOKENS_PER_MINUTE"] = str(settings.LLM_TOKENS_PER_MINUTE / workers)
+    os.environ["LLM_MAX_CONCURRENCY"] = str(max(settings.LLM_MAX_CONCURRENCY // workers, 1))
+    print(f"LLM budget per worker: {os.environ['LLM_REQUESTS_PER_MINUTE']} requests/min, "
+          f"{os.environ['LLM_TOKENS_PER_MINUTE']} tokens/min, {os.environ['LLM_MAX_CONCURRENCY']} concurrent")
+
+def configure_metrics(workers: int) -> Optional[str]:
+    """Let /metrics aggregate the workers: each writes its metrics to PROMETHEUS_MULTIPROC_DIR.
+
+    Returns the directory when it was created here (and is removed on exit).
+    """
+    if workers <= 1:
+        return None
+    created = None
+    directory = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if not directory:
+        directory = created = tempfile.mkdtemp(prefix="tourism_metrics_")
+    os.makedirs(directory, exist_ok=True)
+    # Files of an earlier run would be added to this one's counters
+    for path in glob.glob(os.path.join(directory, "*.db")):
+        os.remove(path)
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = directory
+    print(f"Metrics of all workers collected in {directory}")
+    return created
+
+def preload():
+    """Build the shared schema context and DW context snapshot before the workers start"""
+    try:
+        from app.db.database import DWSessionLocal
+        from app.rag.dw_context_service import DWContextService
+        from app.services.schema_service import SchemaService
+        from app.utils.executors import shutdown_executor_pools
+
+        asyncio.run(SchemaService().get_schema_context())
+        dw_db = DWSessionLocal()
+        try:
+            asyncio.run(DWContextService(dw_db)._get_context_snapshot())
+        finally:
+            dw_db.close()
+            shutdown_executor_pools()
+        print("Preloaded schema and DW context.")
+    except Exception as e:
+        # Workers build them on first use instead
+        print(f"Warning: Preloading failed: {e}")
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Start the API server")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Worker processes (default: WEB_CONCURRENCY; without either, one reloading worker)")
+    parser.add_argument("--reload", action="store_true",
+                        help="Restart on code changes (development; implies one worker)")
+    parser.add_argument("--skip-dependency-check", action="store_true")
+    args = parser.parse_args()
+    if args.workers is None and os.getenv("WEB_CONCURRENCY"):
+        args.workers = int(os.environ["WEB_CONCURRENCY"])
+    # Without a worker count, keep the development default of one reloading worker
+    reload = args.reload or args.workers is None
+    workers = 1 if reload else max(args.workers, 1)
+
     # Set up Python path
     sys.path.insert(0, os.path.abspath('.'))
-    
+
     # Check dependencies
-    ensure_dependencies()
-    
+    if not args.skip_dependency_check:
+        ensure_dependencies()
+
+    configure_shared_cache(workers)
+    configure_llm_budgets(workers)
+    if workers > 1 and not os.environ["SHARED_CACHE_URL"].startswith("memory://"):
+        preload()
+    # After preloading, so this process's own metrics stay out of the workers' aggregate
+    metrics_directory = configure_metrics(workers)
+
     # Start uvicorn server with the main app
-    print("Starting server on port 8081...")
-    uvicorn.run("app.main:app", 
-                host="0.0.0.0", 
-                port=8081, 
-                reload=True, 
-                log_level="info") 
\ No newline at end of file
+    print(f"Starting server on port {args.port} with {workers} worker(s)...")
+    try:
+        uvicorn.run("app.main:app",
+                    host=args.host,
+                    port=args.port,
+                    reload=reload,
+                    workers=workers,
+                    log_level="info")
+    finally:
+        if metrics_directory:
+            shutil.rmtree(metrics_directory, ignore_errors=True)